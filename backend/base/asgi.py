@@ -5,6 +5,9 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
+
+Bajo un servidor ASGI (ej: uvicorn base.asgi:application) las vistas async, como
+/api/global-search-async/, corren en el event loop sin ocupar un hilo por request.
 """
 
 import os
@@ -14,3 +17,10 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'base.settings')
 
 application = get_asgi_application()
+
+# Después de configurar Django: la tabla de códigos de barra lista antes del primer escaneo.
+# Opt-in (CODIGOS_BARRA_PRECARGAR): importar este módulo no debe leer la BD por defecto
+from punto_venta.codigos import tabla_codigos  # noqa: E402
+
+if tabla_codigos.precargar_al_iniciar:
+    tabla_codigos.precargar()
@@ -30,6 +30,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'modulo_principal',
     'punto_venta',
     'rest_framework',
@@ -40,6 +41,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Primero: mide el request completo (queries, tiempo en BD, N+1, Server-Timing)
+    'modulo_principal.middleware.InstrumentacionSQLMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -51,6 +54,31 @@ MIDDLEWARE = [
 ]
 
 
+# Instrumentación por request (ver modulo_principal.middleware). Funciona con DEBUG=False
+INSTRUMENTACION_SQL = {
+    'ACTIVA': env.bool('INSTRUMENTACION_SQL', default=True),
+    'MUESTREO': env.float('INSTRUMENTACION_MUESTREO', default=0.1),
+    'UMBRAL_REPETIDAS': 5,
+    'LENTO_MS': 500,
+    'SERVER_TIMING': True,
+}
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'modulo_principal.instrumentacion': {
+            'handlers': ['console'],
+            'level': env('INSTRUMENTACION_LOG_LEVEL', default='INFO'),
+            'propagate': True,
+        },
+    },
+}
+
+
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:8000",
     "http://localhost:5173",
@@ -89,6 +117,13 @@ DATABASES = {
 }
 
 
+# Caché: locmem por defecto; con varios workers usar uno compartido
+# (ej: CACHE_URL=redis://...) para que las invalidaciones lleguen a todos
+CACHES = {
+    'default': env.cache('CACHE_URL', default='locmemcache://'),
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -132,6 +167,47 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL ='modulo_principal.UsuarioCustom'
 
+# Búsqueda global: 'auto' (trigramas si PostgreSQL tiene pg_trgm, si no tabla de tokens),
+# 'trigram', 'tokens', 'icontains' o ruta a una clase propia
+SEARCH_BACKEND = env('SEARCH_BACKEND', default='auto')
+
+# Búsqueda global async (/api/global-search-async/, servida por base.asgi): las tres secciones
+# corren en paralelo en un pool de hilos propio, cada una con un tope de tiempo en segundos
+BUSQUEDA_ASYNC = {
+    'TIMEOUT_SECCION': env.float('BUSQUEDA_TIMEOUT_SECCION', default=0.5),
+    'HILOS': env.int('BUSQUEDA_HILOS', default=12),
+}
+
+# Autocompletado en memoria (por proceso): tope de memoria del LRU de prefijos (el índice
+# de claves no tiene tope, crece con el catálogo), sugerencias máximas y cada cuánto se
+# reconstruye para ver cambios de otros procesos (en un hilo aparte, sin frenar consultas)
+AUTOCOMPLETADO = {
+    'MAX_BYTES': env.int('AUTOCOMPLETADO_MAX_BYTES', default=8 * 1024 * 1024),
+    'MAX_RESULTADOS': 8,
+    'REFRESCO_SEGUNDOS': 300,
+    'SEGUNDO_PLANO': True,
+}
+
+# Puntos de reposición (punto_venta.reposicion, comando calcular_reposicion): ventana de
+# ventas en días, demora de entrega del proveedor en días y nivel de servicio (0-1)
+REPOSICION = {
+    'VENTANA_DIAS': env.int('REPOSICION_VENTANA_DIAS', default=90),
+    'DIAS_ENTREGA': env.int('REPOSICION_DIAS_ENTREGA', default=7),
+    'NIVEL_SERVICIO': env.float('REPOSICION_NIVEL_SERVICIO', default=0.95),
+}
+
+# Tabla de códigos de barra del mostrador en memoria (punto_venta.codigos): cada cuánto se
+# piden a la BD los productos cambiados en otros procesos, solape de esa consulta, cada
+# cuánto se reconstruye entera y si se precarga al arrancar el servidor (wsgi/asgi). La
+# precarga es opt-in (CODIGOS_BARRA_PRECARGAR=true en los servidores de caja): importar
+# base.wsgi/base.asgi también pasa en runserver, tests y herramientas, y ahí no debe leer la BD
+CODIGOS_BARRA = {
+    'SINCRONIZACION_SEGUNDOS': env.int('CODIGOS_BARRA_SINCRONIZACION', default=2),
+    'MARGEN_SEGUNDOS': 2,
+    'REFRESCO_COMPLETO_SEGUNDOS': 3600,
+    'PRECARGAR': env.bool('CODIGOS_BARRA_PRECARGAR', default=False),
+}
+
 REST_FRAMEWORK = {
         'DEFAULT_AUTHENTICATION_CLASSES': (
             'modulo_principal.authentication.CustomJWTAuthentication',
@@ -155,6 +231,24 @@ SIMPLE_JWT = {
     'ALGORITHM': 'HS256',
     'SIGNING_KEY':SECRET_KEY,
     'AUTH_HEADER_TYPES':('Bearer',),
+    # Revocación propia (modulo_principal.revocacion): token_blacklist no está instalada
+    'TOKEN_REFRESH_SERIALIZER': 'modulo_principal.serializers.TokenRefreshRevocableSerializer',
+}
+
+
+# Caché en proceso de los usuarios autenticados por JWT (ver modulo_principal.authentication):
+# evita la query de usuario en cada request; se invalida al guardar/desactivar/cambiar clave
+JWT_CACHE_USUARIOS = {
+    'TTL_SEGUNDOS': env.int('JWT_CACHE_USUARIOS_TTL', default=60),
+    'MAX_USUARIOS': 2048,
+}
+
+# jti revocados (refresh rotados y logout) en BD, consultados vía filtro de Bloom en
+# memoria (ver modulo_principal.revocacion): sin query por request en el caso normal
+REVOCACION_TOKENS = {
+    'SINCRONIZACION_SEGUNDOS': env.int('REVOCACION_TOKENS_SINCRONIZACION', default=5),
+    'CAPACIDAD_BLOOM': 100_000,
+    'TASA_FALSOS_POSITIVOS': 0.01,
 }
 
 
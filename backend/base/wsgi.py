@@ -5,3 +5,10 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'base.settings')
 
 application = get_wsgi_application()
+
+# Después de configurar Django: la tabla de códigos de barra lista antes del primer escaneo.
+# Opt-in (CODIGOS_BARRA_PRECARGAR): importar este módulo no debe leer la BD por defecto
+from punto_venta.codigos import tabla_codigos  # noqa: E402
+
+if tabla_codigos.precargar_al_iniciar:
+    tabla_codigos.precargar()
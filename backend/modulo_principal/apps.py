@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class ModuloPrincipalConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'modulo_principal'
+
+    def ready(self):
+        from . import signals # noqa: F401 (registra los receivers)
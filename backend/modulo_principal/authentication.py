@@ -1,8 +1,89 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
 from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import datetime_from_epoch
 from django.conf import settings
 
+from .revocacion import registro_revocaciones
+from .utils.cache import invalidar_version_usuario, version_usuario
+
+CONFIG_POR_DEFECTO = {
+    'TTL_SEGUNDOS': 60,     # Tope de vida de una entrada (cota de desfase entre procesos)
+    'MAX_USUARIOS': 2048,   # Entradas (usuario, token) en el LRU
+}
+
+
+class CacheUsuarios:
+    """
+    Usuarios ya validados, en memoria del proceso: (user_id, jti) -> usuario.
+
+    - LRU acotado por MAX_USUARIOS y TTL por entrada.
+    - Cada acierto compara la versión del usuario en el caché de Django
+      (utils.cache.version_usuario): guardar, desactivar o cambiar la clave de un
+      usuario la incrementa (signals.py) y sus entradas dejan de servir en todos los
+      procesos si el caché es compartido. Con locmem, el TTL acota el desfase.
+    - Se entrega una copia: una vista que modifique request.user no toca la entrada.
+    """
+
+    def __init__(self, max_usuarios=None, ttl_segundos=None):
+        config = {**CONFIG_POR_DEFECTO, **getattr(settings, 'JWT_CACHE_USUARIOS', {})}
+        self.max_usuarios = max_usuarios or config['MAX_USUARIOS']
+        self.ttl_segundos = ttl_segundos or config['TTL_SEGUNDOS']
+        self._lock = threading.Lock()
+        self._entradas = OrderedDict()  # (user_id, jti) -> (usuario, version, vence)
+
+    def obtener(self, user_id, jti):
+        clave = (str(user_id), jti)
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is None:
+                return None
+            usuario, version, vence = entrada
+            if time.monotonic() >= vence:
+                del self._entradas[clave]
+                return None
+            self._entradas.move_to_end(clave)
+        if version != version_usuario(user_id):
+            self.descartar(user_id)
+            return None
+        return copy.copy(usuario)
+
+    def guardar(self, user_id, jti, usuario, version):
+        with self._lock:
+            self._entradas[(str(user_id), jti)] = (
+                copy.copy(usuario), version, time.monotonic() + self.ttl_segundos
+            )
+            self._entradas.move_to_end((str(user_id), jti))
+            while len(self._entradas) > self.max_usuarios:
+                self._entradas.popitem(last=False)
+
+    def descartar(self, user_id):
+        user_id = str(user_id)
+        with self._lock:
+            for clave in [clave for clave in self._entradas if clave[0] == user_id]:
+                del self._entradas[clave]
+
+    def limpiar(self):
+        with self._lock:
+            self._entradas.clear()
+
+    def __len__(self):
+        return len(self._entradas)
+
+
+cache_usuarios = CacheUsuarios()
+
+
+def invalidar_usuario(user_id):
+    """Descarta el usuario de este proceso y sube su versión para los demás."""
+    cache_usuarios.descartar(user_id)
+    invalidar_version_usuario(user_id)
 
-#
 
 class CustomJWTAuthentication(JWTAuthentication):
     def authenticate(self, request):
@@ -19,4 +100,40 @@ class CustomJWTAuthentication(JWTAuthentication):
         validated_token = self.get_validated_token(raw_token)
 
         return self.get_user(validated_token), validated_token
-    
\ No newline at end of file
+
+    def get_validated_token(self, raw_token):
+        validated_token = super().get_validated_token(raw_token)
+        # Access revocado por logout. Filtro de Bloom en memoria: sin query en el caso normal
+        jti = validated_token.get(api_settings.JTI_CLAIM)
+        if jti and registro_revocaciones.esta_revocado(jti, datetime_from_epoch(validated_token['exp'])):
+            raise InvalidToken("Token revocado")
+        return validated_token
+
+    def get_user(self, validated_token):
+        # Sin el claim la validación estándar levanta el error adecuado
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        if user_id is None:
+            return super().get_user(validated_token)
+
+        jti = validated_token.get(api_settings.JTI_CLAIM)
+        usuario = cache_usuarios.obtener(user_id, jti)
+        if usuario is not None:
+            return usuario
+
+        # La versión se lee ANTES de ir a la BD: si el usuario cambia entremedio, la
+        # entrada nace con la versión vieja y el siguiente acierto la descarta
+        version = version_usuario(user_id)
+        usuario = super().get_user(validated_token) # Query + checks (activo, revocación por clave)
+        cache_usuarios.guardar(user_id, jti, usuario, version)
+        return usuario
+
+
+class JWTSinConsultaAuthentication(CustomJWTAuthentication):
+    """
+    Modo sin estado para endpoints de solo lectura: el usuario se arma con los claims del
+    token (TokenUser: id, sin BD ni caché). No ve desactivaciones ni cambios de clave
+    hasta que el token expira (ACCESS_TOKEN_LIFETIME). Uso: authentication_classes = [...].
+    """
+
+    def get_user(self, validated_token):
+        return api_settings.TOKEN_USER_CLASS(validated_token)
@@ -0,0 +1,471 @@
+"""
+Importación masiva de catálogos de proveedor (CSV de productos o de lotes).
+
+Tres fases, cada una reanudable:
+1. Carga: el archivo se lee en streaming y se vuelca por tandas a una tabla de staging
+   (FilaImportacionProducto/FilaImportacionLote). Solo se convierten tipos y largos.
+2. Validación: las reglas de Producto.clean/Lote.clean (campos inmutables, unicidad de
+   codigo_serie y de (producto, codigo_lote)) como UPDATEs set-based sobre el staging.
+3. Aplicación: upsert (bulk_create con update_conflicts) de las filas válidas por tandas,
+   con un checkpoint por tanda.
+
+Las filas con error no se aplican y quedan en el reporte (reporte_errores).
+"""
+import csv
+import hashlib
+import io
+from datetime import datetime
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+from django.db.models import Case, CharField, Exists, F, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Cast, Concat
+from django.utils import timezone
+
+from .models import Laboratorio, Lote, MovimientoStock, Producto
+from .models.importacion import FilaImportacionLote, FilaImportacionProducto, ImportacionInventario
+from .models.inventario import inventario_importado, lotes_creados_en_bloque
+from .utils.cache import invalidar_lotes
+
+TAMANO_TANDA = 5000
+VERDADERO = {'1', 'true', 'si', 'sí', 's', 'x', 'yes'}
+FALSO = {'0', 'false', 'no', 'n', ''}
+FORMATOS_FECHA = ('%Y-%m-%d', '%d-%m-%Y', '%d/%m/%Y')
+MAXIMO_ENTERO = 2147483647  # PositiveIntegerField (integer de 32 bits)
+
+
+def huella_archivo(archivo):
+    """sha256 del archivo (leído por bloques) y vuelve al inicio."""
+    sha = hashlib.sha256()
+    for bloque in iter(lambda: archivo.read(1024 * 1024), b''):
+        sha.update(bloque)
+    archivo.seek(0)
+    return sha.hexdigest()
+
+
+#----------------------------------------------------CONVERSORES------------------------------------------
+# Cada conversor devuelve (valor, error). El error es None si el valor es válido.
+def texto(max_length, requerido=True):
+    def convertir(valor):
+        valor = valor.strip()
+        if requerido and not valor:
+            return valor, "Este campo es obligatorio."
+        if max_length and len(valor) > max_length:
+            return valor[:255], f"Máximo {max_length} caracteres."
+        return valor, None
+    return convertir
+
+
+def entero(valor):
+    valor = valor.strip()
+    if not valor:
+        return None, "Este campo es obligatorio."
+    try:
+        numero = int(valor)
+    except ValueError:
+        return None, f"'{valor}' no es un número entero."
+    if numero < 0:
+        return None, "Debe ser mayor o igual a 0."
+    if numero > MAXIMO_ENTERO:
+        return None, f"Debe ser menor o igual a {MAXIMO_ENTERO}."
+    return numero, None
+
+
+def booleano(valor):
+    valor = valor.strip().lower()
+    if valor in VERDADERO:
+        return True, None
+    if valor in FALSO:
+        return False, None
+    return None, f"'{valor}' no es un valor sí/no."
+
+
+def fecha(valor):
+    valor = valor.strip()
+    if not valor:
+        return None, "Este campo es obligatorio."
+    for formato in FORMATOS_FECHA:
+        try:
+            return datetime.strptime(valor, formato).date(), None
+        except ValueError:
+            continue
+    return None, f"'{valor}' no es una fecha válida (AAAA-MM-DD)."
+
+
+def _largo(modelo, campo):
+    return modelo._meta.get_field(campo).max_length
+
+
+#----------------------------------------------------IMPORTADORES------------------------------------------
+class Importador:
+    modelo_fila = None
+    # columna del CSV -> conversor (todas obligatorias en el encabezado)
+    conversores = {}
+    # Columnas del reporte de errores (además de fila y errores)
+    columnas_reporte = ()
+
+    def __init__(self, importacion, tamano_tanda=TAMANO_TANDA):
+        self.importacion = importacion
+        self.tamano_tanda = tamano_tanda
+
+    @property
+    def filas(self):
+        return self.modelo_fila.objects.filter(importacion=self.importacion)
+
+    def procesar(self, archivo=None, aplicar=True):
+        """Ejecuta (o retoma) las fases pendientes según el estado guardado."""
+        if self.importacion.estado == ImportacionInventario.CARGANDO:
+            if archivo is None:
+                raise ValidationError({'archivo': "La importación no terminó de cargarse: hay que enviar el archivo."})
+            self.cargar(archivo)
+            self.validar()
+        if aplicar and self.importacion.estado == ImportacionInventario.VALIDADA:
+            self.aplicar()
+        return self.importacion
+
+    # ------------------------------ 1. Carga ------------------------------
+    def cargar(self, archivo):
+        texto_archivo = io.TextIOWrapper(archivo, encoding='utf-8-sig', newline='')
+        try:
+            encabezado = texto_archivo.readline()
+            # Planillas exportadas con configuración regional es-CL usan ';'
+            delimitador = ';' if encabezado.count(';') > encabezado.count(',') else ','
+            columnas = [c.strip().lower() for c in next(csv.reader([encabezado], delimiter=delimitador), [])]
+            faltantes = [c for c in self.conversores if c not in columnas]
+            if faltantes:
+                raise ValidationError({'archivo': f"Faltan columnas: {', '.join(faltantes)}."})
+
+            lector = csv.reader(texto_archivo, delimiter=delimitador)
+            # Reanudación: las filas ya volcadas se saltan sin convertirlas
+            for _ in islice(lector, self.importacion.filas_leidas):
+                pass
+            numero = self.importacion.filas_leidas + 1  # la línea 1 es el encabezado
+            while True:
+                tanda = list(islice(lector, self.tamano_tanda))
+                if not tanda:
+                    break
+                filas = []
+                for valores in tanda:
+                    numero += 1
+                    filas.append(self.construir_fila(numero, dict(zip(columnas, valores))))
+                # Staging + contador en la misma transacción: una tanda entra completa o no entra
+                with transaction.atomic():
+                    self.modelo_fila.objects.bulk_create(filas)
+                    self.importacion.filas_leidas += len(filas)
+                    self.importacion.save(update_fields=['filas_leidas', 'actualizada'])
+        finally:
+            texto_archivo.detach()  # No cerrar el archivo del llamador
+
+    def construir_fila(self, numero, datos):
+        valores = {}
+        errores = []
+        for columna, convertir in self.conversores.items():
+            valor, error = convertir(datos.get(columna) or '')
+            valores[columna] = valor
+            if error:
+                errores.append(f"{columna}: {error}")
+        return self.modelo_fila(importacion=self.importacion, fila=numero, errores='; '.join(errores), **valores)
+
+    # ------------------------------ 2. Validación ------------------------------
+    def validar(self):
+        if connection.vendor == 'postgresql':
+            # Recién cargada la tabla no tiene estadísticas: sin ANALYZE el planner
+            # resuelve las subconsultas correlacionadas con seq scans (N x N)
+            with connection.cursor() as cursor:
+                cursor.execute(f'ANALYZE {connection.ops.quote_name(self.modelo_fila._meta.db_table)}')
+        with transaction.atomic():
+            self.reglas()
+            self.importacion.filas_con_error = self.filas.exclude(errores='').count()
+            self.importacion.estado = ImportacionInventario.VALIDADA
+            self.importacion.save(update_fields=['filas_con_error', 'estado', 'actualizada'])
+
+    def reglas(self):
+        raise NotImplementedError
+
+    @staticmethod
+    def con_error(*partes):
+        """Expresión UPDATE que agrega un mensaje a `errores` (separado por '; ')."""
+        separador = Case(When(errores='', then=Value('')), default=Value('; '), output_field=CharField())
+        return Concat('errores', separador, *partes, output_field=CharField())
+
+    def marcar_duplicados(self, *claves):
+        """Filas que repiten la clave de una fila anterior del mismo archivo."""
+        misma_clave = {campo: OuterRef(campo) for campo in claves}
+        anterior = self.filas.filter(**misma_clave, fila__lt=OuterRef('fila'))
+        primera = self.filas.filter(**misma_clave).order_by('fila').values('fila')[:1]
+        self.filas.filter(Exists(anterior)).update(errores=self.con_error(
+            Value(f"{claves[-1]}: Duplicado en el archivo (primera aparición en la fila "),
+            Cast(Subquery(primera), CharField()),
+            Value(").")
+        ))
+
+    # ------------------------------ 3. Aplicación ------------------------------
+    def aplicar(self):
+        """
+        Cada tanda relee la importación con select_for_update y parte de SU checkpoint:
+        dos /aplicar/ simultáneos se turnan por tanda en vez de aplicar dos veces las mismas
+        filas. El checkpoint avanza con un UPDATE condicionado al valor leído (en SQLite
+        select_for_update no bloquea: ahí es el UPDATE el que detecta la carrera).
+        """
+        if self._estado_actual() != ImportacionInventario.VALIDADA:
+            raise ValidationError({'estado': "Solo se puede aplicar una importación validada."})
+        self.preparar_aplicacion()
+        validas = self.filas.filter(errores='').order_by('fila')
+        importaciones = ImportacionInventario.objects.filter(pk=self.importacion.pk)
+        while True:
+            # Upsert + checkpoint juntos: al reanudar se sigue desde la última tanda confirmada
+            with transaction.atomic():
+                estado, ultima = importaciones.select_for_update().values_list('estado', 'ultima_fila_aplicada').get()
+                if estado != ImportacionInventario.VALIDADA:
+                    break # Otra solicitud la terminó
+                tanda = list(validas.filter(fila__gt=ultima)[:self.tamano_tanda])
+                if not tanda:
+                    break
+                self.aplicar_tanda(tanda)
+                avanzo = importaciones.filter(ultima_fila_aplicada=ultima).update(
+                    ultima_fila_aplicada=tanda[-1].fila,
+                    filas_aplicadas=F('filas_aplicadas') + len(tanda),
+                    actualizada=timezone.now(),
+                )
+                if not avanzo: # Rollback de la tanda: otra solicitud ya la aplicó
+                    raise ValidationError({'estado': "La importación se está aplicando en otra solicitud."})
+
+        importaciones.filter(estado=ImportacionInventario.VALIDADA).update(
+            estado=ImportacionInventario.COMPLETADA, actualizada=timezone.now()
+        )
+        self.importacion.refresh_from_db()
+
+    def _estado_actual(self):
+        # El estado en memoria puede ser viejo: otra solicitud pudo aplicarla
+        return ImportacionInventario.objects.filter(pk=self.importacion.pk).values_list('estado', flat=True).get()
+
+    def preparar_aplicacion(self):
+        pass
+
+    def aplicar_tanda(self, tanda):
+        raise NotImplementedError
+
+    # ------------------------------ Reporte ------------------------------
+    def reporte_errores(self):
+        """Queryset de filas rechazadas, en orden de archivo."""
+        return self.filas.exclude(errores='').order_by('fila')
+
+
+class ImportadorProductos(Importador):
+    """
+    Clave: codigo_serie. Si ya existe se actualiza (upsert); el laboratorio se busca
+    por nombre y se crea si no existe.
+    """
+    modelo_fila = FilaImportacionProducto
+    conversores = {
+        'codigo_serie': texto(_largo(Producto, 'codigo_serie')),
+        'nombre': texto(_largo(Producto, 'nombre')),
+        'descripcion': texto(None, requerido=False),
+        'laboratorio': texto(_largo(Laboratorio, 'nombre')),
+        'cantidad_mg': entero,
+        'cantidad_capsulas': entero,
+        'es_bioequivalente': booleano,
+        'precio_venta': entero,
+    }
+    columnas_reporte = ('codigo_serie', 'nombre', 'laboratorio')
+    campos_actualizables = [
+        'nombre', 'descripcion', 'laboratorio', 'cantidad_mg',
+        'cantidad_capsulas', 'es_bioequivalente', 'precio_venta',
+    ]
+
+    def reglas(self):
+        filas = self.filas
+        # 1. codigo_serie único dentro del archivo
+        self.marcar_duplicados('codigo_serie')
+
+        # 2. Producto existente con el mismo código -> será un UPDATE
+        filas.update(producto_ref=Subquery(
+            Producto.objects.filter(codigo_serie=OuterRef('codigo_serie')).values('id')[:1]
+        ))
+
+        # 3. Producto.clean: con lotes asociados no cambian mg ni cápsulas
+        con_lotes = Exists(Lote.objects.filter(producto_id=OuterRef('producto_ref')))
+        for campo in ('cantidad_mg', 'cantidad_capsulas'):
+            actual = Subquery(Producto.objects.filter(pk=OuterRef('producto_ref')).values(campo)[:1])
+            filas.filter(con_lotes, **{f'{campo}__isnull': False}).exclude(**{campo: actual}).update(
+                errores=self.con_error(Value(f"{campo}: Denegado: Producto con lotes asociados."))
+            )
+
+    def preparar_aplicacion(self):
+        validas = self.filas.filter(errores='')
+        nombres = set(validas.values_list('laboratorio', flat=True).distinct())
+        existentes = set(Laboratorio.objects.filter(nombre__in=nombres).values_list('nombre', flat=True))
+        if nombres - existentes:
+            with transaction.atomic():
+                Laboratorio.objects.bulk_create(
+                    [Laboratorio(nombre=nombre) for nombre in sorted(nombres - existentes)],
+                    ignore_conflicts=True,
+                )
+                nuevos = list(Laboratorio.objects.filter(nombre__in=nombres - existentes))
+                inventario_importado.send(sender=Laboratorio, instancias=nuevos)
+        validas.update(laboratorio_ref=Subquery(
+            Laboratorio.objects.filter(nombre=OuterRef('laboratorio')).values('id')[:1]
+        ))
+
+    def aplicar_tanda(self, tanda):
+        Producto.objects.bulk_create(
+            [
+                Producto(
+                    codigo_serie=fila.codigo_serie,
+                    nombre=fila.nombre,
+                    descripcion=fila.descripcion,
+                    laboratorio_id=fila.laboratorio_ref,
+                    cantidad_mg=fila.cantidad_mg,
+                    cantidad_capsulas=fila.cantidad_capsulas,
+                    es_bioequivalente=fila.es_bioequivalente,
+                    precio_venta=fila.precio_venta,
+                )
+                for fila in tanda
+            ],
+            update_conflicts=True,
+            unique_fields=['codigo_serie'],
+            # auto_now solo aplica a las altas: en el upsert hay que pedirlo explícito
+            update_fields=[*self.campos_actualizables, 'actualizado'],
+        )
+        # bulk_create no emite post_save: índices de búsqueda/autocompletado vía señal
+        productos = list(Producto.objects.filter(codigo_serie__in=[fila.codigo_serie for fila in tanda]))
+        inventario_importado.send(sender=Producto, instancias=productos)
+
+
+class ImportadorLotes(Importador):
+    """
+    Clave: (codigo_serie del producto, codigo_lote). Un lote existente solo actualiza
+    cantidad y defectuoso: producto, código y fechas son inmutables (Lote.clean).
+    """
+    modelo_fila = FilaImportacionLote
+    conversores = {
+        'codigo_serie': texto(_largo(Producto, 'codigo_serie')),
+        'codigo_lote': texto(_largo(Lote, 'codigo_lote')),
+        'fecha_creacion': fecha,
+        'fecha_vencimiento': fecha,
+        'cantidad': entero,
+        'defectuoso': booleano,
+    }
+    columnas_reporte = ('codigo_serie', 'codigo_lote')
+    mensajes_inmutables = {
+        'fecha_creacion': "Denegado: No puedes cambiar la fecha de creación.",
+        'fecha_vencimiento': "Denegado: No puedes cambiar la fecha de vencimiento.",
+    }
+
+    def reglas(self):
+        filas = self.filas
+        # 1. El producto debe existir
+        filas.update(producto_ref=Subquery(
+            Producto.objects.filter(codigo_serie=OuterRef('codigo_serie')).values('id')[:1]
+        ))
+        filas.filter(producto_ref__isnull=True).exclude(codigo_serie='').update(
+            errores=self.con_error(Value("codigo_serie: No existe un producto con este código."))
+        )
+
+        # 2. (producto, codigo_lote) único dentro del archivo
+        self.marcar_duplicados('codigo_serie', 'codigo_lote')
+
+        # 3. Lote existente -> UPDATE, sin tocar los campos inmutables
+        filas.filter(producto_ref__isnull=False).update(lote_ref=Subquery(
+            Lote.objects.filter(
+                producto_id=OuterRef('producto_ref'), codigo_lote=OuterRef('codigo_lote')
+            ).values('id')[:1]
+        ))
+        for campo, mensaje in self.mensajes_inmutables.items():
+            actual = Subquery(Lote.objects.filter(pk=OuterRef('lote_ref')).values(campo)[:1])
+            filas.filter(lote_ref__isnull=False, **{f'{campo}__isnull': False}).exclude(**{campo: actual}).update(
+                errores=self.con_error(Value(f"{campo}: {mensaje}"))
+            )
+
+    def aplicar_tanda(self, tanda):
+        """
+        Existente o nuevo se decide aquí, no con lote_ref: la validación pudo correr mucho
+        antes (aplicar=false) y otro proceso pudo crear el lote entretanto. Las altas
+        entran con cantidad 0 (ON CONFLICT DO NOTHING) para que todos los lotes de la tanda
+        existan y queden bloqueados; la cantidad llega con el upsert y el movimiento es la
+        diferencia contra la cantidad bloqueada. Así el libro suma lo mismo que el lote
+        aunque dos importaciones traigan el mismo lote a la vez.
+        """
+        claves = {(fila.producto_ref, fila.codigo_lote): fila for fila in tanda}
+        producto_ids = {producto_id for producto_id, _ in claves}
+        de_la_tanda = Lote.objects.filter(
+            producto_id__in=producto_ids, codigo_lote__in={codigo for _, codigo in claves}
+        )
+        previos = {
+            (producto_id, codigo) for producto_id, codigo in de_la_tanda.values_list('producto_id', 'codigo_lote')
+        }
+
+        altas = []
+        for clave, fila in claves.items():
+            if clave in previos:
+                continue
+            lote = Lote(
+                producto_id=fila.producto_ref, codigo_lote=fila.codigo_lote, fecha_creacion=fila.fecha_creacion,
+                fecha_vencimiento=fila.fecha_vencimiento, cantidad=fila.cantidad, defectuoso=fila.defectuoso,
+            )
+            lote.aplicar_regla_activo()
+            lote.cantidad = 0
+            altas.append(lote)
+        Lote.objects.bulk_create(altas, ignore_conflicts=True)
+
+        # Cantidades vigentes, bloqueadas hasta el commit de la tanda
+        anteriores = {
+            (producto_id, codigo): (pk, cantidad)
+            for pk, producto_id, codigo, cantidad in de_la_tanda.select_for_update().order_by('pk').values_list(
+                'pk', 'producto_id', 'codigo_lote', 'cantidad'
+            )
+            if (producto_id, codigo) in claves
+        }
+        Lote.objects.bulk_create(
+            [
+                Lote(
+                    producto_id=fila.producto_ref, codigo_lote=fila.codigo_lote, fecha_creacion=fila.fecha_creacion,
+                    fecha_vencimiento=fila.fecha_vencimiento, cantidad=fila.cantidad, defectuoso=fila.defectuoso,
+                )
+                for fila in tanda
+            ],
+            update_conflicts=True, unique_fields=['producto', 'codigo_lote'], update_fields=['cantidad', 'defectuoso'],
+        )
+        existentes = [pk for clave, (pk, _) in anteriores.items() if clave in previos]
+        # Misma regla para los existentes (el upsert no toca 'activo')
+        Lote.objects.filter(pk__in=existentes).filter(Q(cantidad=0) | Q(defectuoso=True)).update(activo=False)
+        Producto.objects.filter(pk__in=producto_ids).recalcular_stock(sincronizar_activo=True)
+
+        movimientos = [
+            (pk, MovimientoStock.AJUSTE if clave in previos else MovimientoStock.RECEPCION, claves[clave].cantidad - cantidad)
+            for clave, (pk, cantidad) in anteriores.items()
+        ]
+        nuevos = list(Lote.objects.filter(pk__in=[pk for clave, (pk, _) in anteriores.items() if clave not in previos]))
+        if nuevos:
+            lotes_creados_en_bloque.send(sender=Lote, lotes=nuevos)
+        MovimientoStock.objects.registrar(movimientos, referencia=f'importacion:{self.importacion.pk}')
+        transaction.on_commit(invalidar_lotes)
+
+
+IMPORTADORES = {
+    ImportacionInventario.PRODUCTOS: ImportadorProductos,
+    ImportacionInventario.LOTES: ImportadorLotes,
+}
+
+
+def get_importador(importacion, tamano_tanda=TAMANO_TANDA):
+    return IMPORTADORES[importacion.tipo](importacion, tamano_tanda=tamano_tanda)
+
+
+def importar(tipo, archivo, nombre_archivo='', aplicar=True, tamano_tanda=TAMANO_TANDA):
+    """Crea la importación y ejecuta las fases. `archivo` es binario (open(..., 'rb') o un upload)."""
+    if tipo not in IMPORTADORES:
+        raise ValidationError({'tipo': f"Tipo no soportado. Opciones: {', '.join(IMPORTADORES)}."})
+    importacion = ImportacionInventario.objects.create(
+        tipo=tipo, nombre_archivo=nombre_archivo[:255], huella=huella_archivo(archivo)
+    )
+    return get_importador(importacion, tamano_tanda).procesar(archivo, aplicar=aplicar)
+
+
+def reanudar(importacion, archivo=None, aplicar=True, tamano_tanda=TAMANO_TANDA):
+    """Retoma una importación interrumpida; si no terminó de cargarse exige el mismo archivo."""
+    if archivo is not None and importacion.estado == ImportacionInventario.CARGANDO:
+        if huella_archivo(archivo) != importacion.huella:
+            raise ValidationError({'archivo': "El archivo no coincide con el de la importación original."})
+    return get_importador(importacion, tamano_tanda).procesar(archivo, aplicar=aplicar)
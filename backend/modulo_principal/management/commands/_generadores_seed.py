@@ -0,0 +1,103 @@
+"""
+Generadores de filas para seed_data.
+
+Funciones puras (sin ORM ni conexión a BD) para poder ejecutarlas en un pool de
+procesos. Cada tanda usa su propio Random sembrado con (semilla, tabla, índice):
+el resultado no depende del número de procesos ni del orden en que terminan.
+
+Las filas son tuplas en el orden de las COLUMNAS_* (listas para COPY/bulk_create).
+Las FK se devuelven como índices (0..n-1) y el proceso principal las traduce a ids.
+"""
+import random
+from datetime import timedelta
+
+from faker import Faker
+
+COLUMNAS_LABORATORIO = ('nombre', 'direccion', 'telefono')
+COLUMNAS_PRODUCTO = (
+    'laboratorio_id', 'nombre', 'descripcion', 'cantidad_mg', 'cantidad_capsulas',
+    'es_bioequivalente', 'codigo_serie', 'precio_venta', 'activo', 'stock_disponible', 'tiene_stock',
+)
+COLUMNAS_LOTE = (
+    'producto_id', 'codigo_lote', 'fecha_creacion', 'fecha_vencimiento', 'cantidad', 'defectuoso', 'activo',
+)
+
+NOMBRES_MEDICINA = [
+    'Paracetamol', 'Ibuprofeno', 'Amoxicilina', 'Clorfenamina',
+    'Losartán', 'Metformina', 'Omeprazol', 'Salbutamol',
+]
+# Faker es lento por fila: cada tanda genera un pool de valores y luego sortea
+TAMANO_POOL_FAKER = 200
+
+
+def _azar(semilla, tabla, indice):
+    return random.Random(f'{semilla}:{tabla}:{indice}')
+
+
+def _faker(azar):
+    fake = Faker('es_CL')
+    fake.seed_instance(azar.getrandbits(32))
+    return fake
+
+
+def ean13(numero):
+    """EAN-13 válido y único por número: prefijo 780 (Chile) + 9 dígitos + dígito verificador."""
+    base = f'780{numero:09d}'
+    suma = sum(int(d) * (3 if i % 2 else 1) for i, d in enumerate(base))
+    return base + str((10 - suma % 10) % 10)
+
+
+def generar_laboratorios(tarea):
+    semilla, indice, desde, hasta = tarea
+    azar = _azar(semilla, 'laboratorio', indice)
+    fake = _faker(azar)
+    filas = []
+    for numero in range(desde, hasta):
+        # El número garantiza la unicidad del nombre sin depender de fake.unique
+        filas.append((
+            f'Laboratorio {fake.company()} {numero + 1}',
+            fake.address(),
+            fake.phone_number()[:15],
+        ))
+    return filas
+
+
+def generar_productos(tarea):
+    semilla, indice, desde, hasta, total_laboratorios = tarea
+    azar = _azar(semilla, 'producto', indice)
+    fake = _faker(azar)
+    apellidos = [fake.last_name() for _ in range(TAMANO_POOL_FAKER)]
+    descripciones = [fake.text(max_nb_chars=60) for _ in range(TAMANO_POOL_FAKER)]
+    filas = []
+    for numero in range(desde, hasta):
+        filas.append((
+            azar.randrange(total_laboratorios),
+            f'{azar.choice(NOMBRES_MEDICINA)} {azar.choice(apellidos)} {azar.randint(100, 999)}',
+            azar.choice(descripciones),
+            azar.choice([10, 50, 100, 500, 1000]),
+            azar.choice([10, 20, 30, 60]),
+            azar.random() < 0.5,
+            ean13(numero),
+            azar.randint(1000, 25000),
+            True, 0, False, # activo, stock_disponible, tiene_stock (los recalcula seed_data)
+        ))
+    return filas
+
+
+def generar_lotes(tarea):
+    semilla, indice, desde, hasta, total_productos, hoy = tarea
+    azar = _azar(semilla, 'lote', indice)
+    letras = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+    filas = []
+    for numero in range(desde, hasta):
+        fecha_creacion = hoy - timedelta(days=azar.randint(0, 730))
+        filas.append((
+            azar.randrange(total_productos),
+            f"L-{''.join(azar.choices(letras, k=4))}-{numero:07d}",
+            fecha_creacion,
+            fecha_creacion + timedelta(days=azar.randint(365, 1095)),
+            azar.randint(50, 5000),
+            azar.random() < 0.25,
+            True,
+        ))
+    return filas
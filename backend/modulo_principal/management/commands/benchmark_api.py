@@ -0,0 +1,237 @@
+import gc
+import json
+import statistics
+import time
+import tracemalloc
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from modulo_principal.models import Laboratorio, Lote, Producto
+
+BASELINE_POR_DEFECTO = Path(settings.BASE_DIR) / 'benchmarks' / 'baseline.json'
+USUARIO_BENCHMARK = 'benchmark'
+CLAVE_BENCHMARK = 'benchmark-local-123'
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide latencia (p50/p95/p99), queries SQL y memoria pico de los endpoints principales '
+        'y compara contra un baseline JSON: falla si alguna métrica empeora más que el umbral.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--escala', type=float, default=0.05,
+            help='Si la BD está vacía, carga esta fracción de seed_data (default: 0.05).'
+        )
+        parser.add_argument('--iteraciones', type=int, default=30, help='Requests medidos por escenario (default: 30).')
+        parser.add_argument('--baseline', default=str(BASELINE_POR_DEFECTO), help='Archivo JSON del baseline.')
+        parser.add_argument(
+            '--guardar-baseline', action='store_true',
+            help='Escribe los resultados como nuevo baseline en vez de comparar.'
+        )
+        parser.add_argument(
+            '--umbral', type=float, default=0.25,
+            help='Empeoramiento relativo tolerado en p95 y memoria (default: 0.25 = 25%%).'
+        )
+        parser.add_argument(
+            '--tolerancia-ms', type=float, default=2.0,
+            help='Holgura absoluta en p95 para no fallar por ruido en endpoints muy rápidos (default: 2ms).'
+        )
+        parser.add_argument('--solo', action='append', help='Ejecuta solo este escenario (repetible).')
+        parser.add_argument('--salida', help='Guarda también los resultados de esta corrida en este JSON.')
+
+    def handle(self, *args, **options):
+        if options['iteraciones'] < 2:
+            raise CommandError('--iteraciones debe ser al menos 2.')
+
+        if not Producto.objects.exists():
+            self.stdout.write(self.style.WARNING(f"BD vacía: cargando seed_data --escala {options['escala']}"))
+            call_command('seed_data', escala=options['escala'], stdout=self.stdout)
+
+        escenarios = self.construir_escenarios()
+        if options['solo']:
+            desconocidos = set(options['solo']) - {e['nombre'] for e in escenarios}
+            if desconocidos:
+                raise CommandError(f"Escenarios desconocidos: {', '.join(sorted(desconocidos))}")
+            escenarios = [e for e in escenarios if e['nombre'] in options['solo']]
+
+        resultados = {
+            'meta': {
+                'motor': connection.vendor,
+                'laboratorios': Laboratorio.objects.count(),
+                'productos': Producto.objects.count(),
+                'lotes': Lote.objects.count(),
+                'iteraciones': options['iteraciones'],
+            },
+            'escenarios': {},
+        }
+        self.stdout.write(
+            f"{resultados['meta']['motor']}: {resultados['meta']['productos']} productos, "
+            f"{resultados['meta']['lotes']} lotes"
+        )
+        for escenario in escenarios:
+            metricas = self.medir(escenario, options['iteraciones'])
+            resultados['escenarios'][escenario['nombre']] = metricas
+            self.stdout.write(
+                f"{escenario['nombre']:>26}: p50={metricas['p50_ms']:.2f}ms p95={metricas['p95_ms']:.2f}ms "
+                f"p99={metricas['p99_ms']:.2f}ms queries={metricas['queries']} memoria={metricas['memoria_kb']}KB"
+            )
+
+        if options['salida']:
+            self.escribir(Path(options['salida']), resultados)
+
+        ruta_baseline = Path(options['baseline'])
+        if options['guardar_baseline']:
+            self.escribir(ruta_baseline, resultados)
+            self.stdout.write(self.style.SUCCESS(f'Baseline guardado en {ruta_baseline}'))
+            return
+        if not ruta_baseline.exists():
+            self.stdout.write(self.style.WARNING(
+                f'No existe {ruta_baseline}: ejecuta con --guardar-baseline para crearlo.'
+            ))
+            return
+
+        baseline = json.loads(ruta_baseline.read_text(encoding='utf-8'))
+        regresiones = self.comparar(baseline, resultados, options['umbral'], options['tolerancia_ms'])
+        if regresiones:
+            raise CommandError('Regresiones respecto al baseline:\n  ' + '\n  '.join(regresiones))
+        self.stdout.write(self.style.SUCCESS('Sin regresiones respecto al baseline.'))
+
+    # ------------------------------ Escenarios ------------------------------
+    def construir_escenarios(self):
+        """Requests representativos; los términos de búsqueda salen de los datos cargados."""
+        hoy = timezone.localdate()
+        producto = Producto.objects.order_by('pk').values('nombre', 'laboratorio_id').first()
+        termino = producto['nombre'].split()[0][:5]
+        desde, hasta = hoy.isoformat(), (hoy + timedelta(days=90)).isoformat()
+
+        usuario = self.usuario_benchmark()
+        credenciales = json.dumps({'username': USUARIO_BENCHMARK, 'password': CLAVE_BENCHMARK})
+        refresh = RefreshToken.for_user(usuario)
+        cookies_sesion = {
+            settings.AUTH_COOKIE: str(refresh.access_token),
+            settings.AUTH_COOKIE_REFRESH: str(refresh),
+        }
+
+        return [
+            {'nombre': 'productos_lista', 'url': '/api/productos/'},
+            {'nombre': 'productos_filtro', 'url': '/api/productos/?activo=true&tiene_stock=true&cantidad_mg__gte=100'},
+            {'nombre': 'productos_laboratorio', 'url': f"/api/productos/?laboratorio={producto['laboratorio_id']}"},
+            {'nombre': 'productos_orden_precio', 'url': '/api/productos/?ordering=-precio_venta'},
+            {'nombre': 'productos_search', 'url': f'/api/productos/?search={termino}'},
+            {'nombre': 'productos_cursor', 'url': '/api/productos/?cursor='},
+            {'nombre': 'productos_simple_list', 'url': '/api/productos/simple_list/'},
+            {'nombre': 'laboratorios_simple_list', 'url': '/api/laboratorios/simple_list/'},
+            {'nombre': 'lotes_vencen_90_dias', 'url': f'/api/lotes/?fecha_vencimiento__gte={desde}&fecha_vencimiento__lte={hasta}'},
+            {'nombre': 'lotes_creados_desde', 'url': f'/api/lotes/?fecha_creacion__gte={desde}&ordering=fecha_creacion'},
+            {'nombre': 'busqueda_global', 'url': f'/api/global-search/?q={termino}'},
+            {
+                'nombre': 'token_obtener', 'metodo': 'post', 'url': '/api/token/', 'cuerpo': credenciales,
+                # El hash de la clave domina (PBKDF2): pocas iteraciones bastan
+                'max_iteraciones': 10,
+            },
+            {'nombre': 'token_refrescar', 'metodo': 'post', 'url': '/api/token/refresh/', 'cookies': cookies_sesion},
+            {'nombre': 'perfil_usuario', 'url': '/api/me/', 'cookies': cookies_sesion},
+        ]
+
+    def usuario_benchmark(self):
+        User = get_user_model()
+        usuario, creado = User.objects.get_or_create(username=USUARIO_BENCHMARK)
+        if creado or not usuario.check_password(CLAVE_BENCHMARK):
+            usuario.set_password(CLAVE_BENCHMARK)
+            usuario.save(update_fields=['password'])
+        return usuario
+
+    # ------------------------------ Medición ------------------------------
+    def medir(self, escenario, iteraciones):
+        client = Client(HTTP_HOST='localhost')
+        for nombre, valor in escenario.get('cookies', {}).items():
+            client.cookies[nombre] = valor
+
+        def ejecutar():
+            if escenario.get('metodo', 'get') == 'post':
+                respuesta = client.post(escenario['url'], escenario.get('cuerpo', '{}'), content_type='application/json')
+            else:
+                respuesta = client.get(escenario['url'])
+            if respuesta.status_code >= 400:
+                raise CommandError(f"{escenario['nombre']}: HTTP {respuesta.status_code} en {escenario['url']}")
+            return respuesta
+
+        for _ in range(3): # Calentamiento (conexión, caché, índice en memoria)
+            ejecutar()
+
+        # Queries y memoria en pasadas aparte para no contaminar la latencia.
+        # Se cuentan con execute_wrapper: connection.queries se vacía en cada request_started
+        queries = []
+        def contar(execute, sql, params, many, context):
+            queries.append(sql)
+            return execute(sql, params, many, context)
+        with connection.execute_wrapper(contar):
+            ejecutar()
+        tracemalloc.start()
+        try:
+            ejecutar()
+            _, pico = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        tiempos = []
+        # Sin pausas del recolector de ciclos en medio de un request medido
+        gc.collect()
+        gc.disable()
+        try:
+            for _ in range(min(iteraciones, escenario.get('max_iteraciones', iteraciones))):
+                inicio = time.perf_counter()
+                ejecutar()
+                tiempos.append((time.perf_counter() - inicio) * 1000)
+        finally:
+            gc.enable()
+
+        percentiles = statistics.quantiles(tiempos, n=100)
+        return {
+            'p50_ms': round(percentiles[49], 3),
+            'p95_ms': round(percentiles[94], 3),
+            'p99_ms': round(percentiles[98], 3),
+            'queries': len(queries),
+            'memoria_kb': round(pico / 1024),
+        }
+
+    # ------------------------------ Baseline ------------------------------
+    def comparar(self, baseline, resultados, umbral, tolerancia_ms):
+        meta_base, meta = baseline.get('meta', {}), resultados['meta']
+        for clave in ('motor', 'productos', 'lotes'):
+            if meta_base.get(clave) != meta[clave]:
+                self.stdout.write(self.style.WARNING(
+                    f"El baseline se midió con {clave}={meta_base.get(clave)} (ahora {meta[clave]}): "
+                    "la comparación puede no ser representativa."
+                ))
+
+        regresiones = []
+        for nombre, actual in resultados['escenarios'].items():
+            base = baseline.get('escenarios', {}).get(nombre)
+            if base is None:
+                continue # Escenario nuevo: entra al baseline la próxima vez que se guarde
+            limite_p95 = base['p95_ms'] * (1 + umbral) + tolerancia_ms
+            if actual['p95_ms'] > limite_p95:
+                regresiones.append(f"{nombre}: p95 {actual['p95_ms']:.2f}ms > {limite_p95:.2f}ms (baseline {base['p95_ms']:.2f}ms)")
+            # El número de queries es determinista: cualquier aumento es una regresión (N+1)
+            if actual['queries'] > base['queries']:
+                regresiones.append(f"{nombre}: {actual['queries']} queries (baseline {base['queries']})")
+            limite_memoria = base['memoria_kb'] * (1 + umbral) + 64
+            if actual['memoria_kb'] > limite_memoria:
+                regresiones.append(f"{nombre}: memoria {actual['memoria_kb']}KB > {limite_memoria:.0f}KB (baseline {base['memoria_kb']}KB)")
+        return regresiones
+
+    def escribir(self, ruta, datos):
+        ruta.parent.mkdir(parents=True, exist_ok=True)
+        ruta.write_text(json.dumps(datos, indent=2, ensure_ascii=False) + '\n', encoding='utf-8')
@@ -0,0 +1,118 @@
+import asyncio
+import random
+import statistics
+import time
+
+from asgiref.sync import ThreadSensitiveContext
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+from django.test import AsyncClient, override_settings
+
+from modulo_principal.models import Laboratorio, Lote, Producto
+from modulo_principal.search import BACKENDS, cerrar_pool_busqueda, get_search_backend
+
+VISTAS = [('sync', '/api/global-search/'), ('async', '/api/global-search-async/')]
+
+
+class Command(BaseCommand):
+    help = 'Mide la latencia (p50/p95) de la búsqueda global sobre los datos cargados (ej: seed_data)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--consultas', type=int, default=300, help='Consultas por backend (default: 300).')
+        parser.add_argument(
+            '--backend', action='append', choices=['auto', *BACKENDS],
+            help="Backend a medir (repetible). Default: 'icontains' (línea base) y 'auto'."
+        )
+        parser.add_argument('--semilla', type=int, default=42)
+        parser.add_argument(
+            '--vistas', action='store_true',
+            help='Compara GlobalSearchView (sync) con GlobalSearchAsyncView por el handler ASGI (request completo).'
+        )
+        parser.add_argument('--concurrencia', type=int, default=1, help='Requests simultáneos con --vistas (default: 1).')
+
+    def handle(self, *args, **options):
+        if not Producto.objects.exists():
+            raise CommandError('No hay datos: ejecuta primero python manage.py seed_data')
+
+        azar = random.Random(options['semilla'])
+        consultas = self.generar_consultas(azar, options['consultas'])
+        backends = options['backend'] or ['icontains', 'auto']
+
+        self.stdout.write(f'{len(consultas)} consultas (prefijos de 3-6 caracteres)')
+        if options['vistas']:
+            try:
+                # AsyncClient fija el header Host en 'testserver'
+                with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+                    asyncio.run(self.medir_vistas(consultas, max(1, options['concurrencia'])))
+            finally:
+                cerrar_pool_busqueda()
+            return
+
+        for nombre in backends:
+            backend = get_search_backend(nombre)
+            # Calentamiento (conexión, caché del planner)
+            for consulta in consultas[:10]:
+                backend.buscar(consulta)
+
+            tiempos = []
+            for consulta in consultas:
+                inicio = time.perf_counter()
+                backend.buscar(consulta)
+                tiempos.append((time.perf_counter() - inicio) * 1000)
+
+            percentiles = statistics.quantiles(tiempos, n=100)
+            self.stdout.write(self.style.SUCCESS(
+                f'{nombre:>10} ({type(backend).__name__}): '
+                f'p50={percentiles[49]:.2f}ms p95={percentiles[94]:.2f}ms max={max(tiempos):.2f}ms'
+            ))
+
+    async def medir_vistas(self, consultas, concurrencia):
+        """
+        Mismas consultas contra ambas vistas a través de AsyncClient (handler ASGI con
+        middlewares). Cada request en su ThreadSensitiveContext, como en base.asgi: las vistas
+        sync de requests simultáneos no comparten hilo.
+        """
+        client = AsyncClient()
+
+        async def pedir(url, consulta, tiempos):
+            async with ThreadSensitiveContext():
+                inicio = time.perf_counter()
+                response = await client.get(url, {'q': consulta})
+                tiempos.append((time.perf_counter() - inicio) * 1000)
+            if response.status_code != 200:
+                raise CommandError(f'{url}?q={consulta} respondió {response.status_code}')
+
+        resultados = {}
+        for nombre, url in VISTAS:
+            for consulta in consultas[:10]: # Calentamiento (conexiones del pool, planner)
+                await pedir(url, consulta, [])
+            tiempos = []
+            inicio = time.perf_counter()
+            for i in range(0, len(consultas), concurrencia):
+                await asyncio.gather(*[pedir(url, c, tiempos) for c in consultas[i:i + concurrencia]])
+            segundos = time.perf_counter() - inicio
+
+            percentiles = statistics.quantiles(tiempos, n=100)
+            resultados[nombre] = percentiles[49]
+            self.stdout.write(self.style.SUCCESS(
+                f'{nombre:>6} {url}: p50={percentiles[49]:.2f}ms p95={percentiles[94]:.2f}ms '
+                f'max={max(tiempos):.2f}ms ({len(tiempos) / segundos:.0f} req/s, concurrencia={concurrencia})'
+            ))
+        self.stdout.write(f"p50 async/sync: {resultados['async'] / resultados['sync']:.2f}x")
+
+    def generar_consultas(self, azar, cantidad):
+        """Fragmentos reales de nombres, códigos de barra, lotes y laboratorios."""
+        muestras = []
+        for modelo, campo in [
+            (Producto, 'nombre'), (Producto, 'codigo_serie'),
+            (Lote, 'codigo_lote'), (Laboratorio, 'nombre'),
+        ]:
+            valores = list(modelo.objects.order_by('?').values_list(campo, flat=True)[:cantidad])
+            muestras.extend(valores)
+
+        consultas = []
+        for _ in range(cantidad):
+            palabras = azar.choice(muestras).split()
+            palabra = azar.choice(palabras)
+            consultas.append(palabra[:azar.randint(3, 6)])
+        return [c for c in consultas if len(c) >= 3] or ['par']
@@ -0,0 +1,65 @@
+import gc
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+
+from modulo_principal.views import LaboratorioViewSet, LoteViewSet, ProductoViewSet
+
+VIEWSETS = {'productos': ProductoViewSet, 'lotes': LoteViewSet, 'laboratorios': LaboratorioViewSet}
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara, por tamaño de página, el ModelSerializer (instancias + select_related) con la '
+        'lectura rápida de list/retrieve (ValoresSerializer sobre .values()): query + serialización + JSON.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--filas', type=int, nargs='+', default=[100, 500, 1000], help='Tamaños de página.')
+        parser.add_argument('--iteraciones', type=int, default=30)
+        parser.add_argument('--recurso', choices=list(VIEWSETS), action='append', help='Default: productos y lotes.')
+
+    def handle(self, *args, **options):
+        renderer = JSONRenderer()
+        for recurso in options['recurso'] or ['productos', 'lotes']:
+            viewset = VIEWSETS[recurso]()
+            queryset = viewset.get_queryset()
+            # Desempate por pk: con empates en el orden, dos queries pueden traer filas distintas
+            queryset = queryset.order_by(*(queryset.query.order_by or queryset.model._meta.ordering), 'pk')
+            if not queryset.exists():
+                raise CommandError('No hay datos: ejecuta primero python manage.py seed_data')
+
+            for filas in options['filas']:
+                def modelo():
+                    return renderer.render(viewset.serializer_class(queryset[:filas], many=True).data)
+
+                def valores():
+                    lectura = viewset.lectura_rapida
+                    return renderer.render(lectura.serializar(queryset.values(*lectura.columnas)[:filas]))
+
+                if modelo() != valores():
+                    raise CommandError(f'{recurso}: la lectura rápida no produce el mismo JSON.')
+
+                p50_modelo = self.medir(modelo, options['iteraciones'])
+                p50_valores = self.medir(valores, options['iteraciones'])
+                self.stdout.write(self.style.SUCCESS(
+                    f'{recurso:>12} {filas:>5} filas: ModelSerializer p50={p50_modelo:.2f}ms  '
+                    f'values() p50={p50_valores:.2f}ms  ({p50_modelo / p50_valores:.1f}x)'
+                ))
+
+    def medir(self, funcion, iteraciones):
+        for _ in range(3): # Calentamiento
+            funcion()
+        tiempos = []
+        gc.collect()
+        gc.disable()
+        try:
+            for _ in range(iteraciones):
+                inicio = time.perf_counter()
+                funcion()
+                tiempos.append((time.perf_counter() - inicio) * 1000)
+        finally:
+            gc.enable()
+        return statistics.median(tiempos)
@@ -0,0 +1,374 @@
+import asyncio
+import json
+import random
+import secrets
+import statistics
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from http.cookies import SimpleCookie
+from urllib.error import HTTPError
+from urllib.parse import urlencode
+from urllib.request import Request, urlopen
+
+from asgiref.sync import ThreadSensitiveContext, sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import AsyncClient, override_settings
+from django.test.testcases import LiveServerThread
+
+from modulo_principal.models import Laboratorio, Lote, Producto
+
+PREFIJO_USUARIO = 'carga-'
+# Límites superiores (ms) de los baldes del histograma; el último balde es "más que eso"
+BALDES_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000]
+# Tiempo medio (s) que el cajero "piensa" después de cada acción, antes de --factor-espera
+PAUSAS = {'tecla': 0.15, 'buscar': 2.0, 'productos': 3.0, 'lote': 5.0}
+ORDENAMIENTOS = ['nombre', '-nombre', 'precio_venta', '-precio_venta', 'cantidad_mg', 'laboratorio__nombre', '-stock_disponible']
+
+
+#----------------------------------------------CLIENTES-----------------------------------------
+class ClienteASGI:
+    """
+    Requests por el handler ASGI en el mismo proceso (AsyncClient, con middlewares). Cada
+    request en su ThreadSensitiveContext, como en base.asgi: las vistas sync de terminales
+    distintas no comparten hilo. Las cookies de la sesión quedan en el AsyncClient.
+    """
+
+    def __init__(self):
+        self.client = AsyncClient(raise_request_exception=False) # Un 500 cuenta como error, no aborta
+
+    async def solicitar(self, metodo, ruta, datos=None):
+        async with ThreadSensitiveContext():
+            if metodo == 'post':
+                response = await self.client.post(ruta, datos or {}, content_type='application/json')
+            else:
+                response = await self.client.get(ruta)
+        return response.status_code
+
+
+class ClienteHTTP:
+    """
+    Requests HTTP reales contra un servidor (LiveServerThread, runserver, uvicorn base.asgi).
+    urllib es bloqueante: cada request corre en el ejecutor (un hilo por terminal). Cookies
+    a mano: el cookiejar de urllib no devuelve las de domain=localhost.
+    """
+
+    def __init__(self, url_base, ejecutor):
+        self.url_base = url_base.rstrip('/')
+        self.ejecutor = ejecutor
+        self.cookies = {}
+
+    async def solicitar(self, metodo, ruta, datos=None):
+        return await asyncio.get_running_loop().run_in_executor(self.ejecutor, self._solicitar, metodo, ruta, datos)
+
+    def _solicitar(self, metodo, ruta, datos):
+        cuerpo = json.dumps(datos or {}).encode() if metodo == 'post' else None
+        peticion = Request(self.url_base + ruta, data=cuerpo, method=metodo.upper())
+        if cuerpo is not None:
+            peticion.add_header('Content-Type', 'application/json')
+        if self.cookies:
+            peticion.add_header('Cookie', '; '.join(f'{k}={v}' for k, v in self.cookies.items()))
+        try:
+            with urlopen(peticion, timeout=30) as respuesta:
+                respuesta.read()
+                estado, encabezados = respuesta.status, respuesta.headers
+        except HTTPError as error:
+            error.read()
+            estado, encabezados = error.code, error.headers
+        for linea in encabezados.get_all('Set-Cookie') or []:
+            for morsel in SimpleCookie(linea).values():
+                self.cookies[morsel.key] = morsel.value
+        return estado
+
+
+#----------------------------------------------ESTADÍSTICAS-----------------------------------------
+class Estadisticas:
+    """Latencias y errores por endpoint. Error = status >= 400 o sin respuesta (status 0)."""
+
+    def __init__(self):
+        self.latencias = defaultdict(list)
+        self.errores = defaultdict(Counter)
+
+    def registrar(self, endpoint, ms, estado):
+        self.latencias[endpoint].append(ms)
+        if estado == 0 or estado >= 400:
+            self.errores[endpoint][estado] += 1
+
+    @staticmethod
+    def histograma(latencias):
+        baldes = [0] * (len(BALDES_MS) + 1)
+        for ms in latencias:
+            baldes[next((i for i, limite in enumerate(BALDES_MS) if ms <= limite), len(BALDES_MS))] += 1
+        etiquetas = [f'<={limite}ms' for limite in BALDES_MS] + [f'>{BALDES_MS[-1]}ms']
+        return dict(zip(etiquetas, baldes))
+
+    def resumen(self, segundos):
+        resultado = {}
+        for endpoint, latencias in sorted(self.latencias.items()):
+            # quantiles necesita 2 datos; con uno solo todos los percentiles son ese dato
+            percentiles = statistics.quantiles(latencias, n=100) if len(latencias) > 1 else latencias * 99
+            errores = sum(self.errores[endpoint].values())
+            resultado[endpoint] = {
+                'requests': len(latencias),
+                'req_s': round(len(latencias) / segundos, 2),
+                'errores': errores,
+                'tasa_error': round(errores / len(latencias), 4),
+                'estados_error': {str(estado): n for estado, n in self.errores[endpoint].items()},
+                'p50_ms': round(percentiles[49], 2),
+                'p95_ms': round(percentiles[94], 2),
+                'p99_ms': round(percentiles[98], 2),
+                'max_ms': round(max(latencias), 2),
+                'histograma': self.histograma(latencias),
+            }
+        return resultado
+
+
+#----------------------------------------------TERMINAL-----------------------------------------
+async def simular_terminal(numero, cliente, muestra, config, estadisticas, inicio, fin):
+    """
+    Una caja: inicia sesión con cookies, renueva el token cada `refresco` segundos y
+    hasta `fin` alterna búsquedas tecleadas, listados de productos y ajustes de lote
+    (+1 y -1: el stock queda igual), con pausas exponenciales entre acciones.
+    """
+    azar = random.Random(f"{config['semilla']}-{numero}")
+    acciones, pesos = zip(*config['mezcla'].items())
+
+    async def pedir(endpoint, metodo, ruta, datos=None):
+        antes = time.perf_counter()
+        try:
+            estado = await cliente.solicitar(metodo, ruta, datos)
+        except Exception: # Conexión rechazada, timeout...
+            estado = 0
+        estadisticas.registrar(endpoint, (time.perf_counter() - antes) * 1000, estado)
+        return estado
+
+    async def pausa(media):
+        restante = fin - time.monotonic()
+        if config['factor_espera'] and restante > 0:
+            await asyncio.sleep(min(azar.expovariate(1 / (media * config['factor_espera'])), restante))
+
+    # Rampa: las terminales abren sesión repartidas en los primeros `rampa` segundos
+    await asyncio.sleep(max(0, inicio + azar.uniform(0, config['rampa']) - time.monotonic()))
+    credenciales = {'username': f'{PREFIJO_USUARIO}{numero:03d}', 'password': config['clave']}
+    if await pedir('login', 'post', '/api/token/', credenciales) != 200:
+        return
+    await pedir('perfil', 'get', '/api/me/')
+    proximo_refresco = time.monotonic() + config['refresco'] * azar.uniform(0.5, 1)
+
+    while time.monotonic() < fin:
+        if time.monotonic() >= proximo_refresco:
+            await pedir('refresh', 'post', '/api/token/refresh/')
+            proximo_refresco = time.monotonic() + config['refresco']
+
+        accion = azar.choices(acciones, pesos)[0]
+        if accion == 'buscar':
+            # Teclea un prefijo de un nombre real: una búsqueda por tecla desde la tercera
+            palabra = azar.choice(muestra['nombres']).split()[0]
+            for largo in range(3, min(len(palabra), azar.randint(4, 8)) + 1):
+                await pedir('busqueda', 'get', f"/api/global-search/?{urlencode({'q': palabra[:largo]})}")
+                await pausa(PAUSAS['tecla'])
+        elif accion == 'productos':
+            parametros = {'ordering': azar.choice(ORDENAMIENTOS)}
+            if azar.random() < 0.5:
+                parametros['activo'] = 'true'
+            if azar.random() < 0.3:
+                parametros['tiene_stock'] = 'true'
+            if azar.random() < 0.3:
+                parametros['laboratorio'] = azar.choice(muestra['laboratorios'])
+            if azar.random() < 0.2:
+                parametros['cantidad_mg__gte'] = azar.choice([100, 250, 500])
+            if azar.random() < 0.2:
+                parametros['search'] = azar.choice(muestra['nombres']).split()[0][:4]
+            if azar.random() < 0.3:
+                parametros['cursor'] = '' # Modo keyset (ver InventarioPagination)
+            await pedir('productos', 'get', f'/api/productos/?{urlencode(parametros)}')
+        else:
+            ruta = f"/api/lotes/{azar.choice(muestra['lotes'])}/movimientos/"
+            for cantidad in (1, -1):
+                await pedir('lote_movimiento', 'post', ruta, {'tipo': 'ajuste', 'cantidad': cantidad, 'referencia': 'carga_terminales'})
+        await pausa(PAUSAS[accion])
+
+
+#----------------------------------------------COMANDO-----------------------------------------
+class Command(BaseCommand):
+    help = (
+        'Prueba de carga de la API como la usan las cajas: N terminales inician sesión con '
+        'cookies, teclean búsquedas, listan productos con filtros y ajustan lotes, con pausas '
+        'realistas. Reporta req/s, errores e histograma de latencias por endpoint. Los ajustes '
+        'de lote se compensan (+1/-1), pero quedan en el libro de movimientos: usar una BD de prueba. '
+        'Los usuarios carga-NNN se crean con una clave al azar y se borran al terminar.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--terminales', type=int, default=10, help='Cajas simultáneas (default: 10).')
+        parser.add_argument('--duracion', type=float, default=30, help='Segundos de carga (default: 30).')
+        parser.add_argument('--rampa', type=float, default=5, help='Segundos en que se reparten los logins (default: 5).')
+        parser.add_argument(
+            '--modo', choices=['asgi', 'servidor'], default='asgi',
+            help="asgi: handler ASGI en este proceso, sin red. servidor: levanta un servidor HTTP "
+                 "de prueba en localhost y le pega por sockets. Ignorado con --url."
+        )
+        parser.add_argument(
+            '--url',
+            help='Servidor ya levantado (ej: http://localhost:8000 con uvicorn base.asgi y N workers). '
+                 'Usar localhost: las cookies de sesión van con domain=localhost.'
+        )
+        parser.add_argument(
+            '--mezcla', default='buscar=5,productos=3,lote=1',
+            help='Pesos de cada acción (default: buscar=5,productos=3,lote=1).'
+        )
+        parser.add_argument(
+            '--factor-espera', type=float, default=1.0,
+            help='Escala las pausas entre acciones: 0 = sin pausas, a saturación (default: 1).'
+        )
+        parser.add_argument('--refresco', type=float, default=60, help='Segundos entre renovaciones del token (default: 60).')
+        parser.add_argument(
+            '--max-errores', type=float, default=0.01,
+            help='Fracción de requests con error tolerada; si se supera el comando falla (default: 0.01).'
+        )
+        parser.add_argument('--salida', help='Guarda el resumen por endpoint en este JSON.')
+        parser.add_argument('--semilla', type=int, default=7)
+
+    def handle(self, *args, **options):
+        if options['terminales'] < 1 or options['duracion'] <= 0:
+            raise CommandError('--terminales y --duracion deben ser mayores que 0.')
+        config = {
+            'mezcla': self.leer_mezcla(options['mezcla']),
+            'factor_espera': max(options['factor_espera'], 0),
+            'refresco': max(options['refresco'], 1),
+            'rampa': max(options['rampa'], 0),
+            'semilla': options['semilla'],
+        }
+        muestra = self.leer_muestra()
+        config['clave'], creados = self.preparar_usuarios(options['terminales'])
+
+        servidor = None
+        estadisticas = Estadisticas()
+        try:
+            if options['url']:
+                destino = options['url']
+            elif options['modo'] == 'servidor':
+                servidor = LiveServerThread('localhost', static_handler=lambda app: app)
+                servidor.daemon = True
+                servidor.start()
+                servidor.is_ready.wait()
+                if servidor.error:
+                    raise servidor.error
+                destino = f'http://localhost:{servidor.port}'
+            else:
+                destino = None
+
+            # AsyncClient fija el header Host en 'testserver'
+            with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+                segundos = asyncio.run(self.cargar(destino, options, config, muestra, estadisticas))
+        finally:
+            if servidor is not None:
+                servidor.terminate()
+            connections.close_all()
+            get_user_model().objects.filter(pk__in=creados).delete()
+
+        resumen = estadisticas.resumen(segundos)
+        self.reportar(resumen, segundos, options, destino)
+        if options['salida']:
+            with open(options['salida'], 'w', encoding='utf-8') as archivo:
+                json.dump({'segundos': round(segundos, 2), 'terminales': options['terminales'], 'endpoints': resumen}, archivo, indent=2)
+
+        total = sum(datos['requests'] for datos in resumen.values())
+        errores = sum(datos['errores'] for datos in resumen.values())
+        if not total or 'login' not in resumen or resumen['login']['errores'] == resumen['login']['requests']:
+            raise CommandError('Ninguna terminal pudo iniciar sesión: revisa --url (debe ser localhost) y la BD.')
+        if errores / total > options['max_errores']:
+            raise CommandError(f"{errores} de {total} requests con error ({errores / total:.1%} > {options['max_errores']:.1%}).")
+
+    async def cargar(self, destino, options, config, muestra, estadisticas):
+        ejecutor = ThreadPoolExecutor(options['terminales']) if destino else None
+        try:
+            clientes = [
+                ClienteHTTP(destino, ejecutor) if destino else ClienteASGI()
+                for _ in range(options['terminales'])
+            ]
+            inicio = time.monotonic()
+            fin = inicio + options['rampa'] + options['duracion']
+            await asyncio.gather(*[
+                simular_terminal(numero, cliente, muestra, config, estadisticas, inicio, fin)
+                for numero, cliente in enumerate(clientes)
+            ])
+            return time.monotonic() - inicio
+        finally:
+            if ejecutor is not None:
+                ejecutor.shutdown()
+            # Las vistas sync corrieron en hilos de asgiref: sus conexiones no las cierra close_all()
+            await sync_to_async(connections.close_all, thread_sensitive=True)()
+
+    @staticmethod
+    def leer_mezcla(texto):
+        mezcla = {}
+        for parte in filter(None, texto.split(',')):
+            accion, _, peso = parte.partition('=')
+            if accion.strip() not in PAUSAS or accion.strip() == 'tecla':
+                raise CommandError(f"Acción desconocida en --mezcla: '{accion}' (buscar, productos, lote).")
+            try:
+                mezcla[accion.strip()] = float(peso)
+            except ValueError:
+                raise CommandError(f"Peso inválido en --mezcla: '{parte}'.")
+        if not mezcla or sum(mezcla.values()) <= 0 or min(mezcla.values()) < 0:
+            raise CommandError('--mezcla necesita al menos un peso positivo.')
+        return mezcla
+
+    @staticmethod
+    def leer_muestra():
+        """Nombres, laboratorios y lotes reales, leídos una vez antes de la carga."""
+        muestra = {
+            'nombres': list(Producto.objects.filter(activo=True).order_by('?').values_list('nombre', flat=True)[:500]),
+            'laboratorios': list(Laboratorio.objects.values_list('pk', flat=True)[:200]),
+            'lotes': list(Lote.objects.filter(activo=True, defectuoso=False).order_by('?').values_list('pk', flat=True)[:500]),
+        }
+        if not all(muestra.values()):
+            raise CommandError('No hay datos suficientes: ejecuta primero python manage.py seed_data')
+        return muestra
+
+    @staticmethod
+    def preparar_usuarios(cantidad):
+        """
+        Crea carga-000..N con una clave al azar de esta corrida. Devuelve (clave, pks):
+        handle() los borra al terminar. Un carga-NNN que ya exista no se toca.
+        """
+        User = get_user_model()
+        nombres = [f'{PREFIJO_USUARIO}{numero:03d}' for numero in range(cantidad)]
+        existentes = list(User.objects.filter(username__in=nombres).values_list('username', flat=True)[:5])
+        if existentes:
+            raise CommandError(
+                f"Ya existen usuarios de carga ({', '.join(existentes)}): quedaron de una corrida "
+                f"anterior o son reales. Bórralos antes de correr la prueba."
+            )
+        clave = secrets.token_urlsafe(18)
+        encriptada = make_password(clave) # Un solo hash para todos: el costo es por usuario
+        creados = User.objects.bulk_create([User(username=nombre, password=encriptada) for nombre in nombres])
+        return clave, [usuario.pk for usuario in creados]
+
+    def reportar(self, resumen, segundos, options, destino):
+        self.stdout.write(
+            f"{options['terminales']} terminales durante {segundos:.1f}s contra "
+            f"{destino or 'el handler ASGI (en proceso)'}"
+        )
+        self.stdout.write(f"{'endpoint':<16}{'requests':>9}{'req/s':>9}{'errores':>9}{'p50':>10}{'p95':>10}{'p99':>10}")
+        for endpoint, datos in resumen.items():
+            self.stdout.write(
+                f"{endpoint:<16}{datos['requests']:>9}{datos['req_s']:>9.1f}{datos['errores']:>9}"
+                f"{datos['p50_ms']:>8.1f}ms{datos['p95_ms']:>8.1f}ms{datos['p99_ms']:>8.1f}ms"
+            )
+        for endpoint, datos in resumen.items():
+            self.stdout.write(f'\n{endpoint}')
+            mayor = max(datos['histograma'].values())
+            for balde, cantidad in datos['histograma'].items():
+                if cantidad:
+                    self.stdout.write(f"  {balde:>9} {cantidad:>7} {'#' * max(1, round(40 * cantidad / mayor))}")
+        total = sum(datos['requests'] for datos in resumen.values())
+        errores = sum(datos['errores'] for datos in resumen.values())
+        self.stdout.write(self.style.SUCCESS(
+            f'\n✓ {total} requests, {total / segundos:.1f} req/s, {errores} errores ({errores / max(total, 1):.2%})'
+        ))
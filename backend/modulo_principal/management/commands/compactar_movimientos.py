@@ -0,0 +1,40 @@
+import time
+from datetime import datetime, time as dt_time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from modulo_principal.models import SnapshotStock
+
+
+class Command(BaseCommand):
+    help = (
+        'Compacta el libro de movimientos de stock en snapshots por lote (ej: cron diario). '
+        'Las consultas de stock a una fecha leen un snapshot + los movimientos posteriores.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--corte', type=str,
+            help='Fecha YYYY-MM-DD: snapshot al inicio de ese día (default: hoy a las 00:00).'
+        )
+        parser.add_argument('--tamano-tanda', type=int, default=5000, help='Snapshots por INSERT (default: 5000).')
+
+    def handle(self, *args, **options):
+        if options['corte']:
+            try:
+                dia = datetime.strptime(options['corte'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError('--corte debe tener formato YYYY-MM-DD.')
+        else:
+            dia = timezone.localdate()
+        # Corte en el pasado (inicio del día): los movimientos en curso quedan para la próxima vez
+        corte = timezone.make_aware(datetime.combine(dia, dt_time.min))
+        if corte > timezone.now():
+            raise CommandError('El corte no puede estar en el futuro.')
+
+        inicio = time.perf_counter()
+        creados = SnapshotStock.objects.compactar(corte, tamano_tanda=options['tamano_tanda'])
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ {creados} snapshots al {corte:%Y-%m-%d %H:%M} en {time.perf_counter() - inicio:.1f}s.'
+        ))
@@ -0,0 +1,43 @@
+import time
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from modulo_principal.models import Lote
+
+
+class Command(BaseCommand):
+    help = (
+        'Desactiva en bloque los lotes vencidos y recalcula stock y estado de sus productos '
+        '(ej: cron nocturno). Idempotente: una segunda corrida no cambia nada.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fecha', type=str,
+            help='Fecha YYYY-MM-DD: se desactivan los lotes que vencen antes de ese día (default: hoy).'
+        )
+        parser.add_argument(
+            '--tamano-tanda', type=int, default=1000,
+            help='Lotes por transacción: tandas chicas mantienen cortos los locks (default: 1000).'
+        )
+
+    def handle(self, *args, **options):
+        if options['fecha']:
+            try:
+                hoy = datetime.strptime(options['fecha'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError('--fecha debe tener formato YYYY-MM-DD.')
+        else:
+            hoy = timezone.localdate()
+        if options['tamano_tanda'] < 1:
+            raise CommandError('--tamano-tanda debe ser mayor que 0.')
+
+        inicio = time.perf_counter()
+        totales = Lote.objects.desactivar_vencidos(hoy, tamano_tanda=options['tamano_tanda'])
+        self.stdout.write(self.style.SUCCESS(
+            f"✓ {totales['lotes']} lotes vencidos desactivados, {totales['productos']} productos "
+            f"recalculados ({totales['productos_desactivados']} desactivados) "
+            f"en {time.perf_counter() - inicio:.1f}s."
+        ))
@@ -0,0 +1,62 @@
+import csv
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from modulo_principal.importacion import IMPORTADORES, TAMANO_TANDA, get_importador, importar, reanudar
+from modulo_principal.models import ImportacionInventario
+
+
+class Command(BaseCommand):
+    help = (
+        'Importa un CSV de proveedor (productos o lotes) vía tablas de staging: validación '
+        'set-based, upsert por tandas y reporte de errores por fila. Reanudable con --reanudar.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', nargs='?', help='Ruta del CSV (UTF-8, separador , o ;).')
+        parser.add_argument('--tipo', choices=list(IMPORTADORES), help='Contenido del archivo.')
+        parser.add_argument('--reanudar', type=int, metavar='ID', help='Retoma la importación ID donde quedó.')
+        parser.add_argument('--solo-validar', action='store_true', help='Carga y valida, sin aplicar cambios.')
+        parser.add_argument('--tamano-tanda', type=int, default=TAMANO_TANDA)
+        parser.add_argument('--reporte', help='Escribe las filas rechazadas en este CSV.')
+
+    def handle(self, *args, **options):
+        aplicar = not options['solo_validar']
+        archivo = open(options['archivo'], 'rb') if options['archivo'] else None
+        try:
+            if options['reanudar']:
+                try:
+                    importacion = ImportacionInventario.objects.get(pk=options['reanudar'])
+                except ImportacionInventario.DoesNotExist:
+                    raise CommandError(f"No existe la importación {options['reanudar']}.")
+                importacion = reanudar(importacion, archivo, aplicar=aplicar, tamano_tanda=options['tamano_tanda'])
+            else:
+                if archivo is None or not options['tipo']:
+                    raise CommandError('Indica el archivo y --tipo (o --reanudar ID).')
+                importacion = importar(
+                    options['tipo'], archivo, nombre_archivo=options['archivo'],
+                    aplicar=aplicar, tamano_tanda=options['tamano_tanda'],
+                )
+        except ValidationError as e:
+            raise CommandError('; '.join(f'{campo}: {" ".join(m)}' for campo, m in e.message_dict.items()))
+        finally:
+            if archivo is not None:
+                archivo.close()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Importación {importacion.pk} ({importacion.tipo}): {importacion.estado}. '
+            f'{importacion.filas_leidas} filas leídas, {importacion.filas_aplicadas} aplicadas, '
+            f'{importacion.filas_con_error} con error.'
+        ))
+        if options['reporte'] and importacion.filas_con_error:
+            self.escribir_reporte(importacion, options['reporte'])
+
+    def escribir_reporte(self, importacion, ruta):
+        importador = get_importador(importacion)
+        columnas = ['fila', *importador.columnas_reporte, 'errores']
+        with open(ruta, 'w', newline='', encoding='utf-8') as salida:
+            writer = csv.writer(salida)
+            writer.writerow(columnas)
+            writer.writerows(importador.reporte_errores().values_list(*columnas).iterator(chunk_size=2000))
+        self.stdout.write(f'Reporte de errores: {ruta}')
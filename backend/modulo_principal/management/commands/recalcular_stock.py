@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from modulo_principal.models import Producto
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye y/o verifica los contadores de stock desnormalizados de Producto'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verificar', action='store_true',
+            help='Solo verifica: lista productos desincronizados y falla si hay alguno.'
+        )
+        parser.add_argument(
+            '--mostrar', type=int, default=20,
+            help='Máximo de productos desincronizados a listar (default: 20).'
+        )
+
+    def handle(self, *args, **options):
+        desincronizados = Producto.objects.con_stock_desincronizado()
+        total_malos = desincronizados.count()
+
+        if total_malos:
+            self.stdout.write(self.style.WARNING(f'{total_malos} productos con stock desincronizado.'))
+            muestra = desincronizados.values_list(
+                'id', 'nombre', 'stock_disponible', 'stock_calculado'
+            )[:options['mostrar']]
+            for pk, nombre, guardado, real in muestra:
+                self.stdout.write(f'  #{pk} {nombre}: guardado={guardado} real={real}')
+        else:
+            self.stdout.write(self.style.SUCCESS('✓ Contadores de stock consistentes.'))
+
+        if options['verificar']:
+            if total_malos:
+                raise CommandError('Verificación fallida: ejecuta recalcular_stock sin --verificar.')
+            return
+
+        # Reconstrucción completa en un solo UPDATE set-based
+        with transaction.atomic():
+            actualizados = Producto.objects.all().recalcular_stock()
+        self.stdout.write(self.style.SUCCESS(f'✓ Stock recalculado en {actualizados} productos.'))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from modulo_principal.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye el índice de la búsqueda global (tabla de tokens si el backend la usa)'
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        nombre = type(backend).__name__
+
+        with transaction.atomic():
+            total = backend.reconstruir()
+
+        self.stdout.write(self.style.SUCCESS(f'✓ Índice de búsqueda reconstruido ({nombre}): {total} términos.'))
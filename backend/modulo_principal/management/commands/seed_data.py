@@ -1,106 +1,225 @@
-from django.core.management.base import BaseCommand
-from django.db import transaction
-from faker import Faker
-import random
-from datetime import timedelta
+import csv
+import io
+import multiprocessing
+import os
+import time
+from collections import deque
+from datetime import datetime, timezone as dt_timezone
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, transaction
 from django.utils import timezone
-# CAMBIA ESTO POR TUS MODELOS REALES
-from modulo_principal.models import Laboratorio, Producto, Lote
+
+from modulo_principal.models import Laboratorio, Producto, Lote, MovimientoStock
+from modulo_principal.search import get_search_backend
+from modulo_principal.utils.cache import invalidar_lotes
+
+from ._generadores_seed import (
+    COLUMNAS_LABORATORIO, COLUMNAS_PRODUCTO, COLUMNAS_LOTE,
+    generar_laboratorios, generar_productos, generar_lotes,
+)
+
+# Tamaños del dataset completo (--escala 1)
+CANT_LABS = 1000
+CANT_PRODS = 50000
+CANT_LOTES = 150000
+
 
 class Command(BaseCommand):
-    help = 'Seed de alto rendimiento (Bulk Create)'
+    help = (
+        'Seed masivo y reproducible: genera por tandas en un pool de procesos y carga con '
+        'COPY en PostgreSQL (bulk_create en otros motores). Memoria acotada por --tamano-tanda.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--escala', type=float, default=1.0,
+            help=f'Fracción del dataset completo ({CANT_PRODS} productos, {CANT_LOTES} lotes). Ej: 20 = 3M lotes.'
+        )
+        parser.add_argument('--laboratorios', type=int, help='Cantidad exacta de laboratorios (ignora --escala).')
+        parser.add_argument('--productos', type=int, help='Cantidad exacta de productos (ignora --escala).')
+        parser.add_argument('--lotes', type=int, help='Cantidad exacta de lotes (ignora --escala).')
+        parser.add_argument('--semilla', type=int, default=42, help='Misma semilla = mismos datos (default: 42).')
+        parser.add_argument('--tamano-tanda', type=int, default=10000, help='Filas por tanda (default: 10000).')
+        parser.add_argument(
+            '--procesos', type=int, default=min(4, os.cpu_count() or 1),
+            help='Procesos generadores (1 = sin pool).'
+        )
+        parser.add_argument('--sin-busqueda', action='store_true', help='No reconstruye el índice de búsqueda.')
+
+    def handle(self, *args, **options):
+        escala = options['escala']
+        cantidades = {
+            'laboratorios': options['laboratorios'] if options['laboratorios'] is not None else max(1, int(CANT_LABS * escala)),
+            'productos': options['productos'] if options['productos'] is not None else max(1, int(CANT_PRODS * escala)),
+            'lotes': options['lotes'] if options['lotes'] is not None else max(1, int(CANT_LOTES * escala)),
+        }
+        if min(cantidades.values()) < 1 or options['tamano_tanda'] < 1:
+            raise CommandError('Las cantidades y --tamano-tanda deben ser mayores que cero.')
+
+        self.semilla = options['semilla']
+        self.tamano_tanda = options['tamano_tanda']
+        self.usar_copy = connection.vendor == 'postgresql'
+        self.stdout.write(self.style.WARNING(
+            f"Iniciando SEED (semilla={self.semilla}, {'COPY' if self.usar_copy else 'bulk_create'}): "
+            f"{cantidades['laboratorios']} laboratorios, {cantidades['productos']} productos, "
+            f"{cantidades['lotes']} lotes..."
+        ))
+
+        self.procesos = options['procesos']
+        self.pool = self.crear_pool(self.procesos)
+        try:
+            self.sembrar(cantidades)
+        finally:
+            if self.pool is not None:
+                self.pool.terminate()
+
+        self.stdout.write(self.style.SUCCESS(f'🚀 SEED FINALIZADO: ~{sum(cantidades.values())} registros creados.'))
+
+        # bulk_create/COPY no pasan por Lote.save(): contadores de stock en un UPDATE
+        Producto.objects.recalcular_stock()
+        self.stdout.write(self.style.SUCCESS('✓ Stock de productos recalculado.'))
+        # Tampoco disparan señales: caché de reportes e índice de búsqueda a mano
+        invalidar_lotes()
+        if not options['sin_busqueda']:
+            total_terminos = get_search_backend().reconstruir()
+            self.stdout.write(self.style.SUCCESS(f'✓ Índice de búsqueda: {total_terminos} términos.'))
 
-    def handle(self, *args, **kwargs):
-        fake = Faker('es_CL')
-        self.stdout.write(self.style.WARNING('Iniciando SEED MASIVO (Modo Turbo)...'))
+    def crear_pool(self, procesos):
+        if procesos <= 1:
+            return None
+        if connection.in_atomic_block:
+            # No se puede cerrar la conexión dentro de una transacción (ej: tests)
+            self.stdout.write(self.style.WARNING('Dentro de una transacción: generando sin pool.'))
+            return None
+        # Los hijos no deben heredar el socket de la BD abierto
+        connections.close_all()
+        metodos = multiprocessing.get_all_start_methods()
+        contexto = multiprocessing.get_context('fork' if 'fork' in metodos else 'spawn')
+        return contexto.Pool(procesos)
 
-        # Cantidades
-        CANT_LABS = 1000       # No necesitas tantos laboratorios
-        CANT_PRODS = 50000     # 50k productos
-        CANT_LOTES = 150000    # 150k lotes (Total ~200k registros)
+    def sembrar(self, cantidades):
+        # Offsets: al re-ejecutar sobre una BD con datos, nombres/EAN/códigos no chocan
+        lab_inicio = Laboratorio.objects.count()
+        prod_inicio = Producto.objects.count()
+        lote_inicio = Lote.objects.count()
+        ultimo_lote_id = Lote.objects.order_by('-id').values_list('id', flat=True).first() or 0
+        hoy = timezone.localdate()
 
+        # 1. LABORATORIOS
+        self.cargar(Laboratorio, COLUMNAS_LABORATORIO, generar_laboratorios, [
+            (self.semilla, i, desde, hasta)
+            for i, (desde, hasta) in enumerate(self.tandas(lab_inicio, cantidades['laboratorios']))
+        ])
+        # Las FK se generan como índices: se traducen a ids con estas listas
+        lab_ids = list(Laboratorio.objects.order_by('id').values_list('id', flat=True))
+
+        # 2. PRODUCTOS
+        self.cargar(Producto, COLUMNAS_PRODUCTO, generar_productos, [
+            (self.semilla, i, desde, hasta, len(lab_ids))
+            for i, (desde, hasta) in enumerate(self.tandas(prod_inicio, cantidades['productos']))
+        ], fk=lab_ids)
+        del lab_ids
+        prod_ids = list(Producto.objects.order_by('id').values_list('id', flat=True))
+
+        # 3. LOTES
+        self.cargar(Lote, COLUMNAS_LOTE, generar_lotes, [
+            (self.semilla, i, desde, hasta, len(prod_ids), hoy)
+            for i, (desde, hasta) in enumerate(self.tandas(lote_inicio, cantidades['lotes']))
+        ], fk=prod_ids)
+
+        # 4. MOVIMIENTOS: una recepción por lote nuevo, para que el libro cuadre con la cantidad
+        self.registrar_recepciones(ultimo_lote_id)
+
+    def tandas(self, inicio, cantidad):
+        for desde in range(inicio, inicio + cantidad, self.tamano_tanda):
+            yield desde, min(desde + self.tamano_tanda, inicio + cantidad)
+
+    def generar(self, funcion, tareas):
+        """
+        Tandas en orden. Con pool, los procesos generan las siguientes mientras se carga
+        la actual, con a lo más 2 tandas por proceso en vuelo (memoria acotada).
+        """
+        if self.pool is None:
+            for tarea in tareas:
+                yield funcion(tarea)
+            return
+        pendientes = iter(tareas)
+        en_vuelo = deque(
+            self.pool.apply_async(funcion, (tarea,))
+            for tarea in islice(pendientes, self.procesos * 2)
+        )
+        while en_vuelo:
+            filas = en_vuelo.popleft().get()
+            siguiente = next(pendientes, None)
+            if siguiente is not None:
+                en_vuelo.append(self.pool.apply_async(funcion, (siguiente,)))
+            yield filas
+
+    def cargar(self, modelo, columnas, funcion, tareas, fk=None):
+        nombre = modelo._meta.verbose_name_plural
+        inicio = time.perf_counter()
+        total = 0
         with transaction.atomic():
-            # ==========================================
-            # 1. LABORATORIOS (Bulk Create)
-            # ==========================================
-            self.stdout.write(f'Generando {CANT_LABS} laboratorios en memoria...')
-            labs_buffer = []
-            for _ in range(CANT_LABS):
-                labs_buffer.append(
-                    Laboratorio(
-                        nombre=f"Laboratorio {fake.unique.company()}",
-                        direccion=fake.address(),
-                        telefono=fake.phone_number()[:15]
-                    )
-                )
-            
-            # INSERT MASIVO 1
-            Laboratorio.objects.bulk_create(labs_buffer, batch_size=1000)
-            self.stdout.write(self.style.SUCCESS('✓ Laboratorios insertados.'))
-
-            # TRUCO PRO: Recuperamos solo los IDs para no llenar la RAM con objetos pesados
-            lab_ids = list(Laboratorio.objects.values_list('id', flat=True))
-
-            # ==========================================
-            # 2. PRODUCTOS (Bulk Create)
-            # ==========================================
-            self.stdout.write(f'Generando {CANT_PRODS} productos en memoria...')
-            prods_buffer = []
-            nombres_medicina = ['Paracetamol', 'Ibuprofeno', 'Amoxicilina', 'Clorfenamina', 
-                              'Losartán', 'Metformina', 'Omeprazol', 'Salbutamol']
-
-            for _ in range(CANT_PRODS):
-                # Asignamos ID directamente para evitar queries extra
-                lab_id = random.choice(lab_ids) 
-                nombre_prod = f"{random.choice(nombres_medicina)} {fake.last_name()} {random.randint(100,999)}"
-
-                prods_buffer.append(
-                    Producto(
-                        laboratorio_id=lab_id, # Usamos _id para asignar el entero directo
-                        nombre=nombre_prod,
-                        descripcion=fake.text(max_nb_chars=60),
-                        cantidad_mg=random.choice([10, 50, 100, 500, 1000]),
-                        cantidad_capsulas=random.choice([10, 20, 30, 60]),
-                        es_bioequivalente=random.choice([True, False]),
-                        codigo_serie=fake.ean13(),
-                        precio_venta=random.randint(1000, 25000),
-                        activo=True
-                    )
-                )
-
-            # INSERT MASIVO 2
-            Producto.objects.bulk_create(prods_buffer, batch_size=5000)
-            self.stdout.write(self.style.SUCCESS('✓ Productos insertados.'))
-
-            # Recuperamos IDs de productos
-            prod_ids = list(Producto.objects.values_list('id', flat=True))
-
-            # ==========================================
-            # 3. LOTES (Bulk Create)
-            # ==========================================
-            self.stdout.write(f'Generando {CANT_LOTES} lotes en memoria...')
-            lotes_buffer = []
-
-            for _ in range(CANT_LOTES):
-                prod_id = random.choice(prod_ids)
-                fecha_creacion = fake.date_between(start_date='-2y', end_date='today')
-                dias_vencimiento = random.randint(365, 1095)
-                fecha_vencimiento = fecha_creacion + timedelta(days=dias_vencimiento)
-
-                lotes_buffer.append(
-                    Lote(
-                        producto_id=prod_id,
-                        codigo_lote=f"L-{fake.bothify(text='????-####').upper()}",
-                        fecha_creacion=fecha_creacion,
-                        fecha_vencimiento=fecha_vencimiento,
-                        cantidad=random.randint(50, 5000),
-                        defectuoso=random.choice([True, False, False, False]),
-                        activo=True
+            for filas in self.generar(funcion, tareas):
+                if fk is not None: # Primera columna: índice de la FK -> id real
+                    filas = [(fk[fila[0]],) + fila[1:] for fila in filas]
+                if self.usar_copy:
+                    self.copiar(modelo, columnas, filas)
+                else:
+                    modelo.objects.bulk_create(
+                        [modelo(**dict(zip(columnas, fila))) for fila in filas], batch_size=5000
                     )
-                )
+                total += len(filas)
+        segundos = time.perf_counter() - inicio
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ {total} {nombre} insertados en {segundos:.1f}s ({total / max(segundos, 1e-9):,.0f} filas/s).'
+        ))
 
-            # INSERT MASIVO 3 (Aquí es donde Docker suele sufrir si no usas batch_size)
-            Lote.objects.bulk_create(lotes_buffer, batch_size=5000)
-            self.stdout.write(self.style.SUCCESS('✓ Lotes insertados.'))
+    def registrar_recepciones(self, desde_id):
+        columnas = ('lote_id', 'tipo', 'cantidad', 'fecha', 'referencia')
+        inicio = time.perf_counter()
+        total = 0
+        # Iterar dentro de la transacción: el cursor de servidor no se materializa (WITH HOLD)
+        with transaction.atomic():
+            lotes = (
+                Lote.objects.filter(pk__gt=desde_id, cantidad__gt=0).order_by()
+                .values_list('id', 'cantidad', 'fecha_creacion')
+                .iterator(chunk_size=self.tamano_tanda)
+            )
+            while tanda := list(islice(lotes, self.tamano_tanda)):
+                filas = [
+                    (lote_id, MovimientoStock.RECEPCION, cantidad,
+                     datetime.combine(fecha, datetime.min.time(), tzinfo=dt_timezone.utc), 'seed')
+                    for lote_id, cantidad, fecha in tanda
+                ]
+                if self.usar_copy:
+                    self.copiar(MovimientoStock, columnas, filas)
+                else:
+                    MovimientoStock.objects.bulk_create(
+                        [MovimientoStock(**dict(zip(columnas, fila))) for fila in filas], batch_size=5000
+                    )
+                total += len(filas)
+        segundos = time.perf_counter() - inicio
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ {total} movimientos de stock insertados en {segundos:.1f}s ({total / max(segundos, 1e-9):,.0f} filas/s).'
+        ))
 
-        self.stdout.write(self.style.SUCCESS(f'🚀 SEED FINALIZADO: ~{CANT_LABS + CANT_PRODS + CANT_LOTES} registros creados.'))
\ No newline at end of file
+    def copiar(self, modelo, columnas, filas):
+        """COPY ... FROM STDIN (formato CSV) de una tanda: sin INSERTs ni objetos del ORM."""
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(filas)
+        buffer.seek(0)
+        quote = connection.ops.quote_name
+        sql = (
+            f'COPY {quote(modelo._meta.db_table)} ({", ".join(quote(c) for c in columnas)}) '
+            'FROM STDIN WITH (FORMAT csv)'
+        )
+        with connection.cursor() as cursor:
+            crudo = cursor.cursor
+            if hasattr(crudo, 'copy_expert'): # psycopg2
+                crudo.copy_expert(sql, buffer)
+            else: # psycopg 3
+                with crudo.copy(sql) as copia:
+                    copia.write(buffer.getvalue())
@@ -0,0 +1,154 @@
+import json
+import logging
+import random
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger('modulo_principal.instrumentacion')
+
+CONFIG_POR_DEFECTO = {
+    'ACTIVA': True,
+    'MUESTREO': 0.1,          # Fracción de requests instrumentados (0..1)
+    'UMBRAL_REPETIDAS': 5,    # Misma SQL >= N veces en un request -> sospecha de N+1
+    'LENTO_MS': 500,          # Requests más lentos que esto se loguean aunque no salgan en el muestreo
+    'SERVER_TIMING': True,
+}
+
+
+class MedidorSQL:
+    """Callable para connection.execute_wrapper(): cuenta queries, tiempo y SQL repetida."""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_ms = 0.0
+        self.sentencias = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_ms += (time.perf_counter() - inicio) * 1000
+            self.queries += 1
+            # La SQL llega con placeholders (%s): la misma plantilla = la misma query en un loop
+            self.sentencias[sql] += 1
+
+    def repetidas(self, umbral):
+        return [(sql, veces) for sql, veces in self.sentencias.most_common() if veces >= umbral]
+
+
+class InstrumentacionSQLMiddleware:
+    """
+    Mide cada request sin necesidad de DEBUG (connection.queries solo existe con DEBUG=True).
+
+    - Requests muestreados: envuelve las conexiones con execute_wrapper y registra
+      queries, tiempo en BD y SQL repetida (N+1, ej: un aggregate por fila en un serializer).
+    - Todos: tiempo total. Header Server-Timing (db/app/total) y una línea JSON por request
+      en el logger 'modulo_principal.instrumentacion' (muestreados, lentos o con N+1).
+
+    Configuración en settings.INSTRUMENTACION_SQL (ver CONFIG_POR_DEFECTO).
+
+    Bajo ASGI no fuerza la cadena a modo sync. Se miden las queries del hilo de las vistas
+    sync del request; las que una vista async lanza en otros hilos (ej: la búsqueda global
+    async) quedan solo en el tiempo total.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.config = {**CONFIG_POR_DEFECTO, **getattr(settings, 'INSTRUMENTACION_SQL', {})}
+        self.es_async = iscoroutinefunction(get_response)
+        if self.es_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.es_async:
+            return self.__acall__(request)
+        if not self.config['ACTIVA']:
+            return self.get_response(request)
+
+        medidor = self.muestrear()
+        inicio = time.perf_counter()
+        with ExitStack() as stack:
+            if medidor is not None:
+                for conexion in connections.all():
+                    stack.enter_context(conexion.execute_wrapper(medidor))
+            response = self.get_response(request)
+        return self.terminar(request, response, inicio, medidor)
+
+    async def __acall__(self, request):
+        if not self.config['ACTIVA']:
+            return await self.get_response(request)
+
+        medidor = self.muestrear()
+        inicio = time.perf_counter()
+        if medidor is not None:
+            # Las vistas sync de este request corren en un mismo hilo (ThreadSensitiveContext):
+            # el wrapper se instala en las conexiones de ese hilo
+            await sync_to_async(self.envolver_conexiones)(medidor)
+        try:
+            response = await self.get_response(request)
+        finally:
+            if medidor is not None:
+                await sync_to_async(self.desenvolver_conexiones)(medidor)
+        return self.terminar(request, response, inicio, medidor)
+
+    def muestrear(self):
+        return MedidorSQL() if random.random() < self.config['MUESTREO'] else None
+
+    @staticmethod
+    def envolver_conexiones(medidor):
+        for conexion in connections.all():
+            conexion.execute_wrappers.append(medidor)
+
+    @staticmethod
+    def desenvolver_conexiones(medidor):
+        for conexion in connections.all():
+            if medidor in conexion.execute_wrappers:
+                conexion.execute_wrappers.remove(medidor)
+
+    def terminar(self, request, response, inicio, medidor):
+        total_ms = (time.perf_counter() - inicio) * 1000
+
+        repetidas = medidor.repetidas(self.config['UMBRAL_REPETIDAS']) if medidor else []
+        if self.config['SERVER_TIMING']:
+            response['Server-Timing'] = self.server_timing(total_ms, medidor)
+        if medidor is not None or repetidas or total_ms >= self.config['LENTO_MS']:
+            self.registrar(request, response, total_ms, medidor, repetidas)
+        return response
+
+    @staticmethod
+    def server_timing(total_ms, medidor):
+        metricas = []
+        if medidor is not None:
+            metricas.append(f'db;dur={medidor.db_ms:.1f};desc="{medidor.queries} queries"')
+            metricas.append(f'app;dur={total_ms - medidor.db_ms:.1f}')
+        metricas.append(f'total;dur={total_ms:.1f}')
+        return ', '.join(metricas)
+
+    def registrar(self, request, response, total_ms, medidor, repetidas):
+        match = getattr(request, 'resolver_match', None)
+        linea = {
+            'metodo': request.method,
+            'ruta': request.path,
+            'vista': match.view_name if match else None,
+            'estado': response.status_code,
+            'total_ms': round(total_ms, 2),
+        }
+        if medidor is not None:
+            linea.update({
+                'queries': medidor.queries,
+                'db_ms': round(medidor.db_ms, 2),
+                'queries_repetidas': sum(veces for _, veces in repetidas),
+            })
+        if repetidas:
+            linea['n_mas_1'] = [{'sql': sql[:300], 'veces': veces} for sql, veces in repetidas[:3]]
+            logger.warning(json.dumps(linea, ensure_ascii=False))
+        else:
+            logger.info(json.dumps(linea, ensure_ascii=False))
@@ -0,0 +1,73 @@
+# Generated by Django 6.0 on 2026-10-18 13:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Exists, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def poblar_stock(apps, schema_editor):
+    # Backfill set-based: un único UPDATE con subconsultas correlacionadas
+    Producto = apps.get_model('modulo_principal', 'Producto')
+    Lote = apps.get_model('modulo_principal', 'Lote')
+    disponibles = Lote.objects.filter(producto=OuterRef('pk'), activo=True, defectuoso=False)
+    total = disponibles.order_by().values('producto').annotate(total=Sum('cantidad')).values('total')
+    Producto.objects.update(
+        stock_disponible=Coalesce(Subquery(total), 0),
+        tiene_stock=Exists(disponibles.filter(cantidad__gt=0)),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('modulo_principal', '0002_alter_producto_codigo_serie'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='producto',
+            name='stock_disponible',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Stock Disponible'),
+        ),
+        migrations.AddField(
+            model_name='producto',
+            name='tiene_stock',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='lote',
+            name='activo',
+            field=models.BooleanField(default=True, help_text='Estado del lote'),
+        ),
+        migrations.AlterField(
+            model_name='lote',
+            name='defectuoso',
+            field=models.BooleanField(default=False, help_text='Lote con alerta sanitaria'),
+        ),
+        migrations.AlterField(
+            model_name='lote',
+            name='fecha_creacion',
+            field=models.DateField(),
+        ),
+        migrations.AlterField(
+            model_name='lote',
+            name='producto',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='lotes', to='modulo_principal.producto'),
+        ),
+        migrations.AlterField(
+            model_name='producto',
+            name='cantidad_capsulas',
+            field=models.PositiveIntegerField(verbose_name='Unidades por Caja'),
+        ),
+        migrations.AlterField(
+            model_name='producto',
+            name='cantidad_mg',
+            field=models.PositiveIntegerField(verbose_name='Miligramos (mg)'),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['-activo', '-stock_disponible', 'nombre'], name='producto_orden_stock_idx'),
+        ),
+        migrations.RunPython(poblar_stock, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 6.0 on 2026-10-18 13:48
+
+from django.db import DatabaseError, migrations, models, transaction
+
+
+# Índices GIN de trigramas para la búsqueda global (solo PostgreSQL)
+INDICES_TRIGRAMA = [
+    ('producto_nombre_trgm_idx', 'modulo_principal_producto', 'nombre'),
+    ('producto_codigo_trgm_idx', 'modulo_principal_producto', 'codigo_serie'),
+    ('lote_codigo_trgm_idx', 'modulo_principal_lote', 'codigo_lote'),
+    ('laboratorio_nombre_trgm_idx', 'modulo_principal_laboratorio', 'nombre'),
+]
+
+
+def crear_indices_trigrama(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    # Sin pg_trgm instalado (o sin permisos) la búsqueda cae al backend de tokens
+    try:
+        with transaction.atomic(using=schema_editor.connection.alias):
+            schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    except DatabaseError:
+        return
+    for nombre, tabla, columna in INDICES_TRIGRAMA:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {nombre} ON {tabla} USING gin ({columna} gin_trgm_ops)'
+        )
+
+
+def borrar_indices_trigrama(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for nombre, _, _ in INDICES_TRIGRAMA:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {nombre}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('modulo_principal', '0003_producto_stock_disponible'),
+    ]
+
+    operations = [
+        # No-op fuera de PostgreSQL
+        migrations.RunPython(crear_indices_trigrama, borrar_indices_trigrama),
+        migrations.CreateModel(
+            name='TerminoBusqueda',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('producto', 'Producto'), ('lote', 'Lote'), ('laboratorio', 'Laboratorio')], max_length=12)),
+                ('objeto_id', models.PositiveBigIntegerField()),
+                ('token', models.CharField(max_length=100)),
+            ],
+            options={
+                'verbose_name': 'Término de Búsqueda',
+                'verbose_name_plural': 'Términos de Búsqueda',
+                'indexes': [models.Index(fields=['tipo', 'token'], name='termino_tipo_token_idx'), models.Index(fields=['tipo', 'objeto_id'], name='termino_tipo_objeto_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 6.0 on 2026-10-18 13:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('modulo_principal', '0004_busqueda_global'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='lote',
+            index=models.Index(fields=['activo', 'defectuoso', 'fecha_vencimiento'], include=('cantidad', 'producto'), name='lote_vigencia_idx'),
+        ),
+    ]
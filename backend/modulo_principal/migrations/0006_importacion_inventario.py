@@ -0,0 +1,79 @@
+# Generated by Django 6.0 on 2026-10-18 14:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('modulo_principal', '0005_lote_vigencia_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportacionInventario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('productos', 'Productos'), ('lotes', 'Lotes')], max_length=10)),
+                ('estado', models.CharField(choices=[('cargando', 'Cargando'), ('validada', 'Validada'), ('completada', 'Completada')], default='cargando', max_length=10)),
+                ('nombre_archivo', models.CharField(blank=True, max_length=255)),
+                ('huella', models.CharField(max_length=64)),
+                ('filas_leidas', models.PositiveIntegerField(default=0)),
+                ('filas_con_error', models.PositiveIntegerField(default=0)),
+                ('ultima_fila_aplicada', models.PositiveIntegerField(default=0)),
+                ('filas_aplicadas', models.PositiveIntegerField(default=0)),
+                ('creada', models.DateTimeField(auto_now_add=True)),
+                ('actualizada', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Importación de inventario',
+                'verbose_name_plural': 'Importaciones de inventario',
+                'ordering': ['-creada'],
+            },
+        ),
+        migrations.CreateModel(
+            name='FilaImportacionProducto',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fila', models.PositiveIntegerField(help_text='Línea del archivo (la 1 es el encabezado)')),
+                ('codigo_serie', models.CharField(blank=True, max_length=255)),
+                ('nombre', models.CharField(blank=True, max_length=255)),
+                ('descripcion', models.TextField(blank=True)),
+                ('laboratorio', models.CharField(blank=True, max_length=255)),
+                ('cantidad_mg', models.PositiveIntegerField(null=True)),
+                ('cantidad_capsulas', models.PositiveIntegerField(null=True)),
+                ('es_bioequivalente', models.BooleanField(null=True)),
+                ('precio_venta', models.PositiveIntegerField(null=True)),
+                ('laboratorio_ref', models.BigIntegerField(null=True)),
+                ('producto_ref', models.BigIntegerField(null=True)),
+                ('errores', models.TextField(blank=True, default='')),
+                ('importacion', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='filas_producto', to='modulo_principal.importacioninventario')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['importacion', 'codigo_serie'], name='imp_producto_codigo_idx')],
+                'unique_together': {('importacion', 'fila')},
+            },
+        ),
+        migrations.CreateModel(
+            name='FilaImportacionLote',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fila', models.PositiveIntegerField(help_text='Línea del archivo (la 1 es el encabezado)')),
+                ('codigo_serie', models.CharField(blank=True, max_length=255)),
+                ('codigo_lote', models.CharField(blank=True, max_length=255)),
+                ('fecha_creacion', models.DateField(null=True)),
+                ('fecha_vencimiento', models.DateField(null=True)),
+                ('cantidad', models.PositiveIntegerField(null=True)),
+                ('defectuoso', models.BooleanField(null=True)),
+                ('producto_ref', models.BigIntegerField(null=True)),
+                ('lote_ref', models.BigIntegerField(null=True)),
+                ('errores', models.TextField(blank=True, default='')),
+                ('importacion', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='filas_lote', to='modulo_principal.importacioninventario')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['importacion', 'codigo_serie', 'codigo_lote'], name='imp_lote_codigo_idx')],
+                'unique_together': {('importacion', 'fila')},
+            },
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 6.0 on 2026-10-18 14:22
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('modulo_principal', '0006_importacion_inventario'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MovimientoStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('recepcion', 'Recepción'), ('venta', 'Venta'), ('ajuste', 'Ajuste'), ('defecto', 'Baja por defecto'), ('vencimiento', 'Baja por vencimiento')], max_length=12)),
+                ('cantidad', models.IntegerField(help_text='Variación con signo: positiva entra, negativa sale')),
+                ('fecha', models.DateTimeField(default=django.utils.timezone.now)),
+                ('referencia', models.CharField(blank=True, help_text='Origen: venta, importación, usuario...', max_length=100)),
+                ('lote', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='movimientos', to='modulo_principal.lote')),
+            ],
+            options={
+                'verbose_name': 'Movimiento de stock',
+                'verbose_name_plural': 'Movimientos de stock',
+                'ordering': ['fecha', 'id'],
+                'indexes': [models.Index(fields=['lote', 'fecha'], include=('cantidad',), name='movimiento_lote_fecha_idx'), models.Index(fields=['fecha'], name='movimiento_fecha_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='SnapshotStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('corte', models.DateTimeField()),
+                ('cantidad', models.IntegerField()),
+                ('lote', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='snapshots_stock', to='modulo_principal.lote')),
+            ],
+            options={
+                'verbose_name': 'Snapshot de stock',
+                'verbose_name_plural': 'Snapshots de stock',
+                'unique_together': {('lote', 'corte')},
+            },
+        ),
+        # Saldo inicial: un ajuste por lote con stock, así el libro cuadra con Lote.cantidad
+        migrations.RunSQL(
+            sql="""
+                INSERT INTO modulo_principal_movimientostock (lote_id, tipo, cantidad, fecha, referencia)
+                SELECT id, 'ajuste', cantidad, CURRENT_TIMESTAMP, 'saldo inicial'
+                FROM modulo_principal_lote WHERE cantidad > 0
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 6.0 on 2026-10-18 14:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('modulo_principal', '0008_token_revocado'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='lote',
+            index=models.Index(fields=['defectuoso', '-activo', 'fecha_vencimiento', 'id'], name='lote_orden_smart_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lote',
+            index=models.Index(condition=models.Q(('activo', True), ('defectuoso', False)), fields=['producto', 'fecha_vencimiento', 'id'], include=('cantidad',), name='lote_disponible_idx'),
+        ),
+    ]
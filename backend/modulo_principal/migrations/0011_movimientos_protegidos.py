@@ -0,0 +1,24 @@
+# Generated by Django 6.0 on 2026-10-18 18:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('modulo_principal', '0010_producto_actualizado'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='movimientostock',
+            name='lote',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, related_name='movimientos', to='modulo_principal.lote'),
+        ),
+        migrations.AlterField(
+            model_name='snapshotstock',
+            name='lote',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, related_name='snapshots_stock', to='modulo_principal.lote'),
+        ),
+    ]
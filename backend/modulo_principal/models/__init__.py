@@ -1,9 +1,14 @@
-from .usuarios import UsuarioCustom
+from .usuarios import UsuarioCustom, TokenRevocado
 from .inventario import Laboratorio,Producto,Lote
+from .busqueda import TerminoBusqueda
+from .importacion import ImportacionInventario, FilaImportacionProducto, FilaImportacionLote
+from .movimientos import MovimientoStock, SnapshotStock
 
 
 
 __all__ = [
-    'UsuarioCustom','Laboratorio',
-    'Producto','Lote'
+    'UsuarioCustom','TokenRevocado','Laboratorio',
+    'Producto','Lote','TerminoBusqueda',
+    'ImportacionInventario','FilaImportacionProducto','FilaImportacionLote',
+    'MovimientoStock','SnapshotStock'
 ]
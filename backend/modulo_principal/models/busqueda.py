@@ -0,0 +1,35 @@
+from django.db import models
+
+
+#-----------------------------------TÉRMINOS DE BÚSQUEDA-----------------------------------
+class TerminoBusqueda(models.Model):
+    """
+    Índice invertido para la búsqueda global cuando no hay pg_trgm (ej: SQLite).
+    Lo mantienen las señales de Producto/Lote/Laboratorio (ver modulo_principal.signals)
+    y se reconstruye con: python manage.py reconstruir_busqueda
+    """
+    PRODUCTO = 'producto'
+    LOTE = 'lote'
+    LABORATORIO = 'laboratorio'
+    TIPOS = [
+        (PRODUCTO, 'Producto'),
+        (LOTE, 'Lote'),
+        (LABORATORIO, 'Laboratorio'),
+    ]
+
+    tipo = models.CharField(max_length=12, choices=TIPOS)
+    objeto_id = models.PositiveBigIntegerField()
+    token = models.CharField(max_length=100)
+
+    def __str__(self):
+        return f"{self.tipo}:{self.objeto_id} {self.token}"
+
+    class Meta:
+        verbose_name = "Término de Búsqueda"
+        verbose_name_plural = "Términos de Búsqueda"
+        indexes = [
+            # Búsqueda por prefijo: token >= q AND token < q + '￿' (usa el B-tree)
+            models.Index(fields=['tipo', 'token'], name='termino_tipo_token_idx'),
+            # Reindexado / borrado de un objeto
+            models.Index(fields=['tipo', 'objeto_id'], name='termino_tipo_objeto_idx'),
+        ]
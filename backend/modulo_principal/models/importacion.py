@@ -0,0 +1,76 @@
+from django.db import models
+
+
+#----------------------------------------------------IMPORTACIÓN MASIVA------------------------------------------
+class ImportacionInventario(models.Model):
+    """
+    Un archivo CSV de proveedor (productos o lotes) en proceso de importación.
+    Guarda el avance de cada fase para poder reanudar archivos grandes (ver importacion.py).
+    """
+    PRODUCTOS, LOTES = 'productos', 'lotes'
+    TIPOS = [(PRODUCTOS, 'Productos'), (LOTES, 'Lotes')]
+
+    CARGANDO, VALIDADA, COMPLETADA = 'cargando', 'validada', 'completada'
+    ESTADOS = [(CARGANDO, 'Cargando'), (VALIDADA, 'Validada'), (COMPLETADA, 'Completada')]
+
+    tipo = models.CharField(max_length=10, choices=TIPOS)
+    estado = models.CharField(max_length=10, choices=ESTADOS, default=CARGANDO)
+    nombre_archivo = models.CharField(max_length=255, blank=True)
+    # sha256 del archivo: al reanudar se exige el mismo archivo
+    huella = models.CharField(max_length=64)
+    filas_leidas = models.PositiveIntegerField(default=0)
+    filas_con_error = models.PositiveIntegerField(default=0)
+    # Último número de fila ya aplicado (checkpoint de la fase de aplicación)
+    ultima_fila_aplicada = models.PositiveIntegerField(default=0)
+    filas_aplicadas = models.PositiveIntegerField(default=0)
+    creada = models.DateTimeField(auto_now_add=True)
+    actualizada = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Importación {self.pk} ({self.tipo}, {self.estado})"
+
+    class Meta:
+        verbose_name = "Importación de inventario"
+        verbose_name_plural = "Importaciones de inventario"
+        ordering = ['-creada']
+
+
+# Tablas de staging: el archivo se vuelca tal cual (valores ya tipados o NULL si no se
+# pudieron convertir) y las reglas de negocio se aplican con UPDATEs set-based.
+# Las referencias a tablas reales son enteros sin FK para no bloquear ni validar fila a fila.
+class FilaImportacionProducto(models.Model):
+    importacion = models.ForeignKey(ImportacionInventario, on_delete=models.CASCADE, related_name='filas_producto')
+    fila = models.PositiveIntegerField(help_text="Línea del archivo (la 1 es el encabezado)")
+    codigo_serie = models.CharField(max_length=255, blank=True)
+    nombre = models.CharField(max_length=255, blank=True)
+    descripcion = models.TextField(blank=True)
+    laboratorio = models.CharField(max_length=255, blank=True)
+    cantidad_mg = models.PositiveIntegerField(null=True)
+    cantidad_capsulas = models.PositiveIntegerField(null=True)
+    es_bioequivalente = models.BooleanField(null=True)
+    precio_venta = models.PositiveIntegerField(null=True)
+    laboratorio_ref = models.BigIntegerField(null=True)
+    producto_ref = models.BigIntegerField(null=True)
+    errores = models.TextField(blank=True, default='')
+
+    class Meta:
+        unique_together = ('importacion', 'fila')
+        indexes = [models.Index(fields=['importacion', 'codigo_serie'], name='imp_producto_codigo_idx')]
+
+
+class FilaImportacionLote(models.Model):
+    importacion = models.ForeignKey(ImportacionInventario, on_delete=models.CASCADE, related_name='filas_lote')
+    fila = models.PositiveIntegerField(help_text="Línea del archivo (la 1 es el encabezado)")
+    codigo_serie = models.CharField(max_length=255, blank=True)
+    codigo_lote = models.CharField(max_length=255, blank=True)
+    fecha_creacion = models.DateField(null=True)
+    fecha_vencimiento = models.DateField(null=True)
+    cantidad = models.PositiveIntegerField(null=True)
+    defectuoso = models.BooleanField(null=True)
+    producto_ref = models.BigIntegerField(null=True)
+    lote_ref = models.BigIntegerField(null=True)
+    errores = models.TextField(blank=True, default='')
+
+    class Meta:
+        unique_together = ('importacion', 'fila')
+        indexes = [models.Index(fields=['importacion', 'codigo_serie', 'codigo_lote'], name='imp_lote_codigo_idx')]
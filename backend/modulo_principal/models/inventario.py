@@ -1,10 +1,16 @@
 from django.db import models
+from django.db.models import Exists, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce, Now
 from django.core.validators import MinValueValidator
 from django.core.exceptions import ValidationError, PermissionDenied
 from django.db import transaction
+from django.dispatch import Signal
+from django.utils import timezone
+
+from .mixins import CambiosRastreadosMixin
 
 #--------------------------------------LABORATORIO-------------------------------
-class Laboratorio(models.Model):
+class Laboratorio(CambiosRastreadosMixin, models.Model):
     nombre = models.CharField(max_length=150, unique=True, verbose_name="Nombre del Laboratorio")
     direccion = models.CharField(max_length=255, blank=True, null=True)
     telefono = models.CharField(max_length=20, blank=True, null=True)
@@ -12,14 +18,12 @@ class Laboratorio(models.Model):
     def __str__(self):
         return self.nombre
     
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self._original_nombre = self.nombre 
+    campos_rastreados = ('nombre',)
     
     def clean(self):
         if self.pk:
             # Validación: No cambiar nombre si hay productos vinculados
-            if self.productos.exists() and self.nombre != self._original_nombre:
+            if 'nombre' in self.campos_modificados() and self.productos.exists():
                 raise ValidationError({'nombre': "Denegado: No puedes cambiar el nombre de un laboratorio con productos asociados"})
 
     def save(self, *args, **kwargs):
@@ -33,7 +37,53 @@ class Laboratorio(models.Model):
 
 
 #--------------------------------------PRODUCTO--------------------------------------
-class Producto(models.Model):
+class ProductoQuerySet(models.QuerySet):
+
+    @staticmethod
+    def _lotes_disponibles():
+        # Lotes que cuentan como stock real: activos y sanos
+        return Lote.objects.filter(producto=OuterRef('pk'), activo=True, defectuoso=False)
+
+    def stock_real(self):
+        """Expresión (subconsulta) con el stock calculado desde los lotes."""
+        total = (
+            self._lotes_disponibles()
+            .order_by()
+            .values('producto')
+            .annotate(total=Sum('cantidad'))
+            .values('total')
+        )
+        return Coalesce(Subquery(total), 0)
+
+    def tiene_stock_real(self):
+        return Exists(self._lotes_disponibles().filter(cantidad__gt=0))
+
+    def recalcular_stock(self, sincronizar_activo=False):
+        """
+        Recalcula los contadores de stock con un solo UPDATE (set-based).
+        Si sincronizar_activo=True también aplica la regla de auto-activación.
+        """
+        valores = {
+            'stock_disponible': self.stock_real(),
+            'tiene_stock': self.tiene_stock_real(),
+            'actualizado': Now(),
+        }
+        if sincronizar_activo:
+            valores['activo'] = self.tiene_stock_real()
+        return self.update(**valores)
+
+    def con_stock_desincronizado(self):
+        """Productos cuyo contador no coincide con la suma real de sus lotes."""
+        return self.annotate(
+            stock_calculado=self.stock_real(),
+            tiene_stock_calculado=self.tiene_stock_real(),
+        ).exclude(
+            stock_disponible=models.F('stock_calculado'),
+            tiene_stock=models.F('tiene_stock_calculado'),
+        )
+
+
+class Producto(CambiosRastreadosMixin, models.Model):
     laboratorio = models.ForeignKey(
         Laboratorio, 
         on_delete=models.PROTECT, 
@@ -49,70 +99,201 @@ class Producto(models.Model):
     precio_venta = models.PositiveIntegerField(default=0)
     activo = models.BooleanField(default=True)
 
+    # Contadores desnormalizados: los mantiene Lote.save()/delete() dentro de la misma transacción.
+    # Si se sospecha desincronización: python manage.py recalcular_stock --verificar
+    stock_disponible = models.PositiveIntegerField(default=0, editable=False, verbose_name="Stock Disponible")
+    tiene_stock = models.BooleanField(default=False, editable=False)
+    # Último cambio (save, importación o UPDATE de stock): la tabla de códigos de barra del
+    # mostrador (punto_venta.codigos) se sincroniza pidiendo solo lo posterior
+    actualizado = models.DateTimeField(auto_now=True, db_default=Now(), db_index=True)
+
+    objects = ProductoQuerySet.as_manager()
+
     @property
     def stock_total(self):
-        # Solo sumamos lotes activos y no defectuosos
-        return self.lotes.filter(
-            activo=True, 
-            defectuoso=False
-        ).aggregate(total=models.Sum('cantidad'))['total'] or 0
+        # Solo lotes activos y no defectuosos (ver ProductoQuerySet.stock_real)
+        return self.stock_disponible
     
     def __str__(self):
         return f"{self.nombre} {self.cantidad_mg}mg"
     
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self._original_codigo_serie = self.codigo_serie
-        self._original_cantidad_mg = self.cantidad_mg
-        self._original_cantidad_capsulas = self.cantidad_capsulas
+    # Inmutables si el producto ya tiene lotes
+    campos_rastreados = ('codigo_serie', 'cantidad_mg', 'cantidad_capsulas')
         
     def clean(self):
-        if self.pk and self.lotes.exists():
-            errors = {}
-            if self.codigo_serie != self._original_codigo_serie:
-                errors['codigo_serie'] = "Denegado: Producto con lotes asociados."
-            if self.cantidad_capsulas != self._original_cantidad_capsulas:
-                errors['cantidad_capsulas'] = "Denegado: Producto con lotes asociados."
-            if self.cantidad_mg != self._original_cantidad_mg:
-                errors['cantidad_mg'] = "Denegado: Producto con lotes asociados."
-            
-            if errors:
-                raise ValidationError(errors)
+        # Primero la comparación en memoria; solo si algo cambió consultamos los lotes
+        modificados = self.campos_modificados()
+        if modificados and self.lotes.exists():
+            errors = {
+                campo: "Denegado: Producto con lotes asociados."
+                for campo in self.campos_rastreados if campo in modificados
+            }
+            raise ValidationError(errors)
     
     def save(self, *args, **kwargs):
         self.full_clean()
         super().save(*args, **kwargs)
 
+    def delete(self, *args, **kwargs):
+        # Los lotes caen en cascada, pero no los que tienen movimientos (ni el producto con ventas)
+        try:
+            return super().delete(*args, **kwargs)
+        except models.ProtectedError:
+            raise PermissionDenied(
+                f"El producto {self.nombre} tiene lotes con movimientos o ventas registradas. "
+                "No se puede eliminar: desactívalo."
+            )
+
     def actualizar_estado_basado_en_stock(self):
         """
         Regla de Negocio: Si el producto se queda sin stock real en todos sus lotes,
         se desactiva automáticamente. Si recupera stock, se activa.
+        Recalcula además los contadores de stock en el mismo UPDATE.
         """
-        tiene_stock = self.lotes.filter(activo=True, cantidad__gt=0).exists()
-        
-        stock_changed = False
-        if not tiene_stock and self.activo:
-            self.activo = False
-            stock_changed = True
-        elif tiene_stock and not self.activo:
-            self.activo = True
-            stock_changed = True
-        
-        if stock_changed:
-            # Guardamos solo el campo activo para evitar recursión infinita o validaciones pesadas
-            self.save(update_fields=['activo'])
+        qs = Producto.objects.filter(pk=self.pk)
+        qs.recalcular_stock(sincronizar_activo=True)
+        # Sincronizamos la instancia en memoria (no pasa por save() ni full_clean())
+        self.stock_disponible, self.tiene_stock, self.activo = qs.values_list(
+            'stock_disponible', 'tiene_stock', 'activo'
+        ).get()
 
     class Meta:
         verbose_name = "Producto"
         ordering = ['nombre']
+        indexes = [
+            # Ordenamiento por defecto del listado: -activo, stock desc, nombre
+            models.Index(fields=['-activo', '-stock_disponible', 'nombre'], name='producto_orden_stock_idx'),
+        ]
 
 
 #----------------------------------------------------LOTE------------------------------------------
+# bulk_create no emite post_save: los índices de búsqueda escuchan esta señal (ver signals.py)
+lotes_creados_en_bloque = Signal()
+# Altas/actualizaciones masivas de productos y laboratorios (importacion.py): instancias=[...]
+inventario_importado = Signal()
+# Desactivación masiva por vencimiento (UPDATE sin post_save): lote_ids=[...]
+lotes_vencidos_desactivados = Signal()
+
+
 class LoteManager(models.Manager):
     def delete(self):
         raise PermissionDenied("Borrado masivo deshabilitado por integridad de datos.")
 
-class Lote(models.Model):
+    def validar_en_bloque(self, lotes):
+        """
+        Valida un envío completo en memoria + 2 queries (productos existentes y
+        unique_together contra la BD). Devuelve {indice_fila: [mensajes]}.
+        """
+        errores = {}
+
+        def agregar(i, campo, mensaje):
+            errores.setdefault(str(i), []).append(f"{campo}: {mensaje}")
+
+        # 1. Validaciones de campo (sin BD: el FK se valida abajo en una sola query)
+        for i, lote in enumerate(lotes):
+            try:
+                lote.clean_fields(exclude=['producto'])
+            except ValidationError as e:
+                for campo, mensajes in e.message_dict.items():
+                    for mensaje in mensajes:
+                        agregar(i, campo, mensaje)
+
+        producto_ids = {lote.producto_id for lote in lotes if lote.producto_id is not None}
+        existentes = set(Producto.objects.filter(pk__in=producto_ids).values_list('id', flat=True))
+
+        # 2. Producto existente y duplicados dentro del mismo envío
+        vistos = {}
+        for i, lote in enumerate(lotes):
+            if lote.producto_id not in existentes:
+                agregar(i, 'producto', f"No existe el producto {lote.producto_id}.")
+            clave = (lote.producto_id, lote.codigo_lote)
+            if clave in vistos:
+                agregar(i, 'codigo_lote', f"Duplicado dentro del envío (fila {vistos[clave]}).")
+            else:
+                vistos[clave] = i
+
+        # 3. unique_together ('producto', 'codigo_lote') contra la BD en una sola query
+        ocupados = set(
+            self.filter(
+                producto_id__in=producto_ids,
+                codigo_lote__in={lote.codigo_lote for lote in lotes},
+            ).order_by().values_list('producto_id', 'codigo_lote')
+        )
+        for i, lote in enumerate(lotes):
+            if (lote.producto_id, lote.codigo_lote) in ocupados:
+                agregar(i, 'codigo_lote', f"Ya existe el lote {lote.codigo_lote} para este producto.")
+
+        return errores
+
+    def crear_en_bloque(self, lotes, batch_size=1000):
+        """
+        Alta masiva (ej: recepción de un proveedor) con las mismas reglas que Lote.save(),
+        pero set-based: validación en bloque, bulk_create, y stock/estado de los
+        productos afectados recalculados en UN UPDATE. Todo en una transacción.
+        """
+        from .movimientos import MovimientoStock # movimientos.py importa Lote
+
+        errores = self.validar_en_bloque(lotes)
+        if errores:
+            raise ValidationError(errores)
+
+        for lote in lotes:
+            lote.aplicar_regla_activo()
+
+        with transaction.atomic():
+            creados = self.bulk_create(lotes, batch_size=batch_size)
+            MovimientoStock.objects.registrar(
+                (lote.pk, MovimientoStock.RECEPCION, lote.cantidad) for lote in creados
+            )
+            Producto.objects.filter(
+                pk__in={lote.producto_id for lote in lotes}
+            ).recalcular_stock(sincronizar_activo=True)
+            lotes_creados_en_bloque.send(sender=self.model, lotes=creados)
+        return creados
+
+    def desactivar_vencidos(self, hoy=None, tamano_tanda=1000):
+        """
+        Desactiva los lotes activos con fecha_vencimiento < hoy y recalcula stock y estado
+        (regla de auto-activación) de sus productos. Set-based y en tandas: cada tanda es una
+        transacción corta (SELECT, 2 UPDATE y un conteo), sin pasar por Lote.save(). La cantidad no
+        cambia, así que no hay movimientos que registrar. Idempotente.
+        Devuelve {'lotes': n, 'productos': n, 'productos_desactivados': n}.
+        """
+        hoy = hoy or timezone.localdate()
+        totales = {'lotes': 0, 'productos': 0, 'productos_desactivados': 0}
+        vencidos = pendientes = self.filter(activo=True, fecha_vencimiento__lt=hoy).order_by('producto_id', 'id')
+        while True:
+            with transaction.atomic():
+                # skip_locked: un lote bloqueado por una venta en curso queda para la próxima
+                # corrida en vez de frenar el job (y las terminales) esperando el lock
+                tanda = list(
+                    pendientes.select_for_update(skip_locked=True).values_list('id', 'producto_id')[:tamano_tanda]
+                )
+                if not tanda:
+                    break
+                lote_ids = [lote_id for lote_id, _ in tanda]
+                producto_ids = {producto_id for _, producto_id in tanda}
+                self.filter(pk__in=lote_ids).update(activo=False)
+
+                productos = Producto.objects.filter(pk__in=producto_ids)
+                totales['productos_desactivados'] += productos.filter(activo=True).exclude(
+                    productos.tiene_stock_real()
+                ).count()
+                totales['productos'] += productos.recalcular_stock(sincronizar_activo=True)
+                totales['lotes'] += len(lote_ids)
+                lotes_vencidos_desactivados.send(sender=self.model, lote_ids=lote_ids)
+            if len(tanda) < tamano_tanda:
+                break
+            # Keyset por (producto, id): cada tanda sigue el índice del FK desde donde quedó la
+            # anterior (sin reordenar todos los vencidos pendientes) y los lotes de un mismo
+            # producto caen casi siempre en la misma tanda (un solo recálculo del producto)
+            ultimo_id, ultimo_producto = tanda[-1]
+            pendientes = vencidos.filter(producto_id__gte=ultimo_producto).exclude(
+                producto_id=ultimo_producto, id__lte=ultimo_id
+            )
+        return totales
+
+class Lote(CambiosRastreadosMixin, models.Model):
     # Producto OBLIGATORIO (null=False por defecto)
     producto = models.ForeignKey(
         Producto, 
@@ -133,27 +314,28 @@ class Lote(models.Model):
 
     objects = LoteManager()
 
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self._original_producto_id = self.producto_id
-        self._original_codigo_lote = self.codigo_lote
-        self._original_fecha_creacion = self.fecha_creacion
-        self._original_fecha_vencimiento = self.fecha_vencimiento
+    campos_rastreados = ('producto_id', 'codigo_lote', 'fecha_creacion', 'fecha_vencimiento')
 
     def __str__(self):
         return f"Lote {self.codigo_lote}"
 
+    def aplicar_regla_activo(self):
+        # Si no hay stock O está defectuoso -> Se desactiva
+        if self.cantidad == 0 or self.defectuoso:
+            self.activo = False
+
     def clean(self):
         if self.pk:
             errors = {}
             # Validaciones de inmutabilidad
-            if self.producto_id != self._original_producto_id:
+            modificados = self.campos_modificados()
+            if 'producto_id' in modificados:
                 errors['producto_id'] = "Denegado: No puedes cambiar el producto."
-            if self.codigo_lote != self._original_codigo_lote:
+            if 'codigo_lote' in modificados:
                 errors['codigo_lote'] = "Denegado: No puedes cambiar el código de lote."
-            if self.fecha_creacion != self._original_fecha_creacion:
+            if 'fecha_creacion' in modificados:
                 errors['fecha_creacion'] = "Denegado: No puedes cambiar la fecha de creación."
-            if self.fecha_vencimiento != self._original_fecha_vencimiento:
+            if 'fecha_vencimiento' in modificados:
                 errors['fecha_vencimiento'] = "Denegado: No puedes cambiar la fecha de vencimiento."
        
 
@@ -161,24 +343,59 @@ class Lote(models.Model):
                 raise ValidationError(errors)
 
     def save(self, *args, **kwargs):
+        from .movimientos import MovimientoStock # movimientos.py importa Lote
+
         # 1. Ejecutar validaciones estándar
         self.full_clean()
 
         # 2. REGLA DE NEGOCIO: Auto-desactivación
-        # Si no hay stock O está defectuoso -> Se desactiva
-        if self.cantidad == 0 or self.defectuoso:
-            self.activo = False
+        self.aplicar_regla_activo()
         
-        # 3. Guardar el Lote primero
-        super().save(*args, **kwargs)
+        with transaction.atomic():
+            # 3. Guardar el Lote primero. La variación de cantidad se mide contra la BD
+            # (bloqueando la fila): si otra terminal vendió entremedio, el libro igual cuadra
+            if self._state.adding:
+                variacion, tipo = self.cantidad, MovimientoStock.RECEPCION
+            else:
+                update_fields = kwargs.get('update_fields')
+                anterior = None
+                if update_fields is None or 'cantidad' in update_fields:
+                    anterior = type(self)._base_manager.select_for_update().filter(
+                        pk=self.pk
+                    ).values_list('cantidad', flat=True).first()
+                variacion = 0 if anterior is None else self.cantidad - anterior
+                tipo = MovimientoStock.AJUSTE
+            super().save(*args, **kwargs)
+            MovimientoStock.objects.registrar([(self.pk, tipo, variacion)])
 
-        # 4. REGLA DE NEGOCIO (Trigger): Actualizar al padre (Producto)
-        # Usamos atomicidad por si algo falla, no quede inconsistente
-        try:
+            # 4. REGLA DE NEGOCIO (Trigger): Actualizar al padre (Producto)
+            # Stock y estado del producto se actualizan en la misma transacción que el lote
             self.producto.actualizar_estado_basado_en_stock()
-        except Exception as e:
-            # Loggear error pero no detener el guardado del lote si no es crítico
-            print(f"Error actualizando estado del producto: {e}")
+
+    def mover_stock(self, tipo, cantidad, referencia=''):
+        """
+        Suma `cantidad` (con signo) al lote y la registra en el libro de movimientos con su
+        tipo (ver MovimientoStock.TIPOS). Para bajas por defecto o vencimiento, recepciones
+        parciales, etc. No pasa por full_clean(): solo cambia cantidad/activo.
+        """
+        from .movimientos import MovimientoStock # movimientos.py importa Lote
+
+        with transaction.atomic():
+            actual = type(self)._base_manager.select_for_update().filter(
+                pk=self.pk
+            ).values_list('cantidad', flat=True).get()
+            if actual + cantidad < 0:
+                raise ValidationError({
+                    'cantidad': f"El lote {self.codigo_lote} tiene {actual} unidades: no se pueden descontar {-cantidad}."
+                })
+            self.cantidad = actual + cantidad
+            self.aplicar_regla_activo()
+            super().save(update_fields=['cantidad', 'activo'])
+            movimiento = MovimientoStock.objects.create(
+                lote=self, tipo=tipo, cantidad=cantidad, referencia=referencia
+            )
+            self.producto.actualizar_estado_basado_en_stock()
+        return movimiento
 
     def delete(self, *args, **kwargs):
         """
@@ -192,9 +409,42 @@ class Lote(models.Model):
                 "No se puede eliminar. Ajusta el stock a 0 o desactívalo."
             )
         
-        # Si la cantidad es 0, asumimos que es un registro basura o vacío y permitimos borrar.
-        super().delete(*args, **kwargs)
+        # Si la cantidad es 0, asumimos que es un registro basura o vacío y permitimos borrar,
+        # salvo que ya tenga movimientos: el libro es append-only (MovimientoStock.lote PROTECT)
+        try:
+            with transaction.atomic():
+                resultado = super().delete(*args, **kwargs)
+                Producto.objects.filter(pk=self.producto_id).recalcular_stock()
+        except models.ProtectedError:
+            raise PermissionDenied(
+                f"El lote {self.codigo_lote} tiene movimientos de stock registrados. "
+                "No se puede eliminar: desactívalo."
+            )
+        return resultado
 
     class Meta:
         unique_together = ('producto', 'codigo_lote')
-        ordering = ['fecha_vencimiento']
\ No newline at end of file
+        ordering = ['fecha_vencimiento']
+        indexes = [
+            # Reporte de vencimientos y lotes vendibles: activo=True, defectuoso=False, rango de fechas
+            models.Index(
+                fields=['activo', 'defectuoso', 'fecha_vencimiento'],
+                include=['cantidad', 'producto'], # Solo PostgreSQL (covering index)
+                name='lote_vigencia_idx',
+            ),
+            # Smart sorting del listado (LoteViewSet) + pk de desempate del cursor: la
+            # primera página es un index scan con LIMIT, sin ordenar la tabla completa
+            models.Index(
+                fields=['defectuoso', '-activo', 'fecha_vencimiento', 'id'],
+                name='lote_orden_smart_idx',
+            ),
+            # Parcial sobre los lotes que cuentan como stock (activos y sanos):
+            # - ProductoQuerySet.stock_real / tiene_stock_real: producto = X, index-only con cantidad
+            # - FEFO de punto_venta (lotes_elegibles): producto = X ordenado por (vencimiento, id)
+            models.Index(
+                fields=['producto', 'fecha_vencimiento', 'id'],
+                include=['cantidad'],
+                condition=models.Q(activo=True, defectuoso=False),
+                name='lote_disponible_idx',
+            ),
+        ]
\ No newline at end of file
@@ -0,0 +1,71 @@
+class CambiosRastreadosMixin:
+    """
+    Detecta cambios en campos "inmutables" sin sobreescribir __init__.
+
+    El snapshot antiguo en __init__ leía cada campo rastreado: con .only()/defer()
+    eso disparaba un refresh_from_db por campo diferido y por fila. Aquí:
+    - Los originales se registran solo para campos efectivamente cargados
+      (from_db, refresh_from_db y después de save()).
+    - campos_modificados() compara de forma perezosa (en clean()). Si un campo
+      diferido fue asignado sin leerse antes, se consulta su original en UNA query.
+
+    Las clases definen `campos_rastreados` con attnames (ej: 'producto_id').
+    """
+    campos_rastreados = ()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instancia = super().from_db(db, field_names, values)
+        # field_names/values contienen solo los campos cargados (sin diferidos)
+        instancia._valores_originales = {
+            campo: valor for campo, valor in zip(field_names, values)
+            if campo in cls.campos_rastreados
+        }
+        return instancia
+
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        super().refresh_from_db(using=using, fields=fields, **kwargs)
+        self._registrar_originales(self._attnames(fields) if fields else None)
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        update_fields = kwargs.get('update_fields')
+        self._registrar_originales(self._attnames(update_fields) if update_fields else None)
+
+    def _attnames(self, campos):
+        attnames = set()
+        for campo in campos:
+            attnames.add(self._meta.get_field(campo).attname)
+        return attnames
+
+    def _registrar_originales(self, campos=None):
+        originales = self.__dict__.setdefault('_valores_originales', {})
+        diferidos = self.get_deferred_fields()
+        for campo in self.campos_rastreados:
+            if campo in diferidos or (campos is not None and campo not in campos):
+                continue
+            originales[campo] = getattr(self, campo)
+
+    def campos_modificados(self):
+        """attnames rastreados cuyo valor actual difiere del guardado en BD."""
+        if self.pk is None:
+            return set()
+
+        originales = self.__dict__.get('_valores_originales', {})
+        diferidos = self.get_deferred_fields()
+        modificados = set()
+        sin_original = []
+        for campo in self.campos_rastreados:
+            if campo in diferidos:
+                continue # Nunca se leyó ni se asignó: no puede haber cambiado
+            if campo in originales:
+                if getattr(self, campo) != originales[campo]:
+                    modificados.add(campo)
+            else:
+                sin_original.append(campo)
+
+        if sin_original:
+            en_bd = type(self)._base_manager.filter(pk=self.pk).values(*sin_original).first()
+            if en_bd is not None:
+                modificados.update(c for c in sin_original if getattr(self, c) != en_bd[c])
+        return modificados
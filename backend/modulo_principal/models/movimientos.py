@@ -0,0 +1,149 @@
+from datetime import datetime, timezone as dt_timezone
+
+from django.core.exceptions import PermissionDenied
+from django.db import models, transaction
+from django.db.models import Exists, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .inventario import Lote
+
+# Corte "nulo" para lotes sin snapshot: todos sus movimientos cuentan
+SIN_CORTE = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+#----------------------------------------------MOVIMIENTOS DE STOCK-----------------------------------------
+class MovimientoStockQuerySet(models.QuerySet):
+    """Libro de movimientos append-only: solo se agregan filas."""
+
+    def update(self, **kwargs):
+        raise PermissionDenied("Los movimientos de stock no se modifican: registra un ajuste.")
+
+    def delete(self):
+        raise PermissionDenied("Los movimientos de stock no se borran: registra un ajuste.")
+
+    def registrar(self, movimientos, referencia='', fecha=None):
+        """
+        Alta en un solo INSERT. `movimientos` es un iterable de (lote_id, tipo, cantidad);
+        las variaciones 0 se omiten. Todos comparten fecha y referencia.
+        """
+        fecha = fecha or timezone.now()
+        return self.bulk_create([
+            MovimientoStock(lote_id=lote_id, tipo=tipo, cantidad=cantidad, fecha=fecha, referencia=referencia)
+            for lote_id, tipo, cantidad in movimientos if cantidad
+        ], batch_size=5000)
+
+
+class MovimientoStock(models.Model):
+    """
+    Cada cambio de Lote.cantidad deja aquí su variación con signo (Lote.save, Lote.mover_stock,
+    ventas, altas en bloque e importaciones). La cantidad de un lote es la suma de sus movimientos.
+    """
+    RECEPCION, VENTA, AJUSTE, DEFECTO, VENCIMIENTO = 'recepcion', 'venta', 'ajuste', 'defecto', 'vencimiento'
+    TIPOS = [
+        (RECEPCION, 'Recepción'), (VENTA, 'Venta'), (AJUSTE, 'Ajuste'),
+        (DEFECTO, 'Baja por defecto'), (VENCIMIENTO, 'Baja por vencimiento'),
+    ]
+
+    # Sin índice propio: lo cubre movimiento_lote_fecha_idx (lote es su primera columna).
+    # PROTECT: borrar el lote no puede llevarse su historial; con movimientos se desactiva
+    lote = models.ForeignKey(Lote, on_delete=models.PROTECT, related_name='movimientos', db_index=False)
+    tipo = models.CharField(max_length=12, choices=TIPOS)
+    cantidad = models.IntegerField(help_text="Variación con signo: positiva entra, negativa sale")
+    fecha = models.DateTimeField(default=timezone.now)
+    referencia = models.CharField(max_length=100, blank=True, help_text="Origen: venta, importación, usuario...")
+
+    objects = MovimientoStockQuerySet.as_manager()
+
+    def __str__(self):
+        return f"{self.get_tipo_display()} {self.cantidad:+d} (lote {self.lote_id})"
+
+    def save(self, *args, **kwargs):
+        if self.pk is not None:
+            raise PermissionDenied("Los movimientos de stock no se modifican: registra un ajuste.")
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise PermissionDenied("Los movimientos de stock no se borran: registra un ajuste.")
+
+    class Meta:
+        verbose_name = "Movimiento de stock"
+        verbose_name_plural = "Movimientos de stock"
+        ordering = ['fecha', 'id']
+        indexes = [
+            # Historial de un lote y "cola" posterior a su snapshot: rango de fechas por lote
+            models.Index(fields=['lote', 'fecha'], include=['cantidad'], name='movimiento_lote_fecha_idx'),
+            # Consultas por período sobre todos los lotes (ej: movimientos del último año)
+            models.Index(fields=['fecha'], name='movimiento_fecha_idx'),
+        ]
+
+
+#----------------------------------------------SNAPSHOTS DE STOCK-----------------------------------------
+class SnapshotStockQuerySet(models.QuerySet):
+
+    def anotar_stock_al(self, lotes, momento):
+        """
+        Anota `stock_al` en un queryset de lotes: cantidad al `momento` = último snapshot
+        con corte <= momento + movimientos entre ese corte y el momento (cola acotada
+        por la frecuencia de compactación). Set-based, sin recorrer el historial completo.
+        """
+        ultimo = self.filter(lote=OuterRef('pk'), corte__lte=momento).order_by('-corte')
+        lotes = lotes.annotate(
+            corte_snapshot=Coalesce(Subquery(ultimo.values('corte')[:1]), Value(SIN_CORTE)),
+            stock_snapshot=Coalesce(Subquery(ultimo.values('cantidad')[:1]), 0),
+        )
+        cola = (
+            MovimientoStock.objects
+            .filter(lote=OuterRef('pk'), fecha__gt=OuterRef('corte_snapshot'), fecha__lte=momento)
+            .order_by()
+            .values('lote')
+            .annotate(total=Sum('cantidad'))
+            .values('total')
+        )
+        return lotes.annotate(stock_al=F('stock_snapshot') + Coalesce(Subquery(cola), 0))
+
+    def compactar(self, corte, tamano_tanda=5000):
+        """
+        Crea un snapshot al `corte` para cada lote con movimientos posteriores a su último
+        snapshot. Los movimientos no se borran (el libro es append-only): el snapshot solo
+        acota cuántos hay que sumar para saber el stock en una fecha. Idempotente.
+        """
+        ultimo_corte = self.filter(lote=OuterRef('pk')).order_by('-corte').values('corte')[:1]
+        pendientes = (
+            Lote.objects.order_by()
+            .annotate(ultimo_corte=Coalesce(Subquery(ultimo_corte), Value(SIN_CORTE)))
+            .filter(Exists(MovimientoStock.objects.filter(
+                lote=OuterRef('pk'), fecha__gt=OuterRef('ultimo_corte'), fecha__lte=corte,
+            )))
+        )
+        total = 0
+        # Dentro de la transacción: el cursor de servidor no se materializa (WITH HOLD)
+        with transaction.atomic():
+            filas = self.anotar_stock_al(pendientes, corte).values_list('id', 'stock_al').iterator(chunk_size=tamano_tanda)
+            tanda = []
+            for lote_id, cantidad in filas:
+                tanda.append(SnapshotStock(lote_id=lote_id, corte=corte, cantidad=cantidad))
+                if len(tanda) == tamano_tanda:
+                    total += len(self.bulk_create(tanda, ignore_conflicts=True))
+                    tanda = []
+            if tanda:
+                total += len(self.bulk_create(tanda, ignore_conflicts=True))
+        return total
+
+
+class SnapshotStock(models.Model):
+    """Cantidad de un lote en un corte (incluye todos sus movimientos con fecha <= corte)."""
+    lote = models.ForeignKey(Lote, on_delete=models.PROTECT, related_name='snapshots_stock', db_index=False)
+    corte = models.DateTimeField()
+    cantidad = models.IntegerField()
+
+    objects = SnapshotStockQuerySet.as_manager()
+
+    def __str__(self):
+        return f"Lote {self.lote_id} al {self.corte:%Y-%m-%d %H:%M}: {self.cantidad}"
+
+    class Meta:
+        verbose_name = "Snapshot de stock"
+        verbose_name_plural = "Snapshots de stock"
+        # El índice único (lote, corte) resuelve "último snapshot antes de X" con un index scan
+        unique_together = ('lote', 'corte')
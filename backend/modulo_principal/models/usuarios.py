@@ -12,4 +12,18 @@ class UsuarioCustom(AbstractUser):
 
     def __str__(self):
         return f"{self.username}({self.get_full_name()})"
-    
\ No newline at end of file
+    
+
+#Tokens JWT revocados (refresh rotados, logout). Se consultan vía revocacion.py, no directo
+class TokenRevocado(models.Model):
+    jti = models.CharField(max_length=255, unique=True)
+    # exp del token: pasada esta fecha el token ya no valida y la fila se puede borrar
+    expira = models.DateTimeField(db_index=True)
+    creado = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"Token {self.jti} (expira {self.expira:%Y-%m-%d %H:%M})"
+
+    class Meta:
+        verbose_name = "Token revocado"
+        verbose_name_plural = "Tokens revocados"
@@ -0,0 +1,187 @@
+"""
+Revocación de tokens JWT (refresh rotados y logout) sin una query por request.
+
+Los jti revocados viven en la tabla TokenRevocado. Cada proceso mantiene:
+- Un filtro de Bloom con todos los jti revocados vigentes: si dice "no está" (el caso
+  normal), el token no fue revocado y no se toca la BD.
+- Un conjunto con expiración de los jti ya consultados: revocados confirmados y
+  falsos positivos del filtro, hasta el exp de su token. Un positivo va a la BD una vez.
+
+Las revocaciones de otros procesos llegan con una sincronización incremental cada
+SINCRONIZACION_SEGUNDOS (una query por intervalo, no por request). Un filtro de Bloom
+no permite borrar: se reconstruye desde la BD cuando pasa REFRESH_TOKEN_LIFETIME
+(todo lo que tenía ya expiró) o cuando supera su capacidad, y ahí se podan las filas expiradas.
+"""
+import hashlib
+import math
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import datetime_from_epoch
+
+from .models import TokenRevocado
+
+CONFIG_POR_DEFECTO = {
+    'SINCRONIZACION_SEGUNDOS': 5,    # Desfase máximo con revocaciones hechas en otros procesos
+    'CAPACIDAD_BLOOM': 100_000,      # Revocados vigentes esperados (se duplica si se supera)
+    'TASA_FALSOS_POSITIVOS': 0.01,
+}
+# Solape de la sincronización incremental: filas que confirmaron su transacción tarde
+MARGEN_SINCRONIZACION = timedelta(seconds=5)
+
+
+class FiltroBloom:
+    """Bits en un bytearray; k posiciones por doble hashing sobre un blake2b de 128 bits."""
+
+    def __init__(self, capacidad, tasa_falsos_positivos=0.01):
+        self.capacidad = max(1, capacidad)
+        self.bits = max(64, math.ceil(-self.capacidad * math.log(tasa_falsos_positivos) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.bits / self.capacidad * math.log(2)))
+        self.elementos = 0
+        self._arreglo = bytearray((self.bits + 7) // 8)
+
+    def _posiciones(self, clave):
+        digest = hashlib.blake2b(clave.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.bits for i in range(self.hashes)]
+
+    def agregar(self, clave):
+        posiciones = self._posiciones(clave)
+        if all(self._arreglo[p >> 3] & (1 << (p & 7)) for p in posiciones):
+            return # Ya estaba (o colisión): no infla el conteo
+        for p in posiciones:
+            self._arreglo[p >> 3] |= 1 << (p & 7)
+        self.elementos += 1
+
+    def __contains__(self, clave):
+        return all(self._arreglo[p >> 3] & (1 << (p & 7)) for p in self._posiciones(clave))
+
+    @property
+    def lleno(self):
+        return self.elementos > self.capacidad
+
+
+class RegistroRevocaciones:
+
+    def __init__(self):
+        config = {**CONFIG_POR_DEFECTO, **getattr(settings, 'REVOCACION_TOKENS', {})}
+        self.sincronizacion_segundos = config['SINCRONIZACION_SEGUNDOS']
+        self.capacidad = config['CAPACIDAD_BLOOM']
+        self.tasa_falsos_positivos = config['TASA_FALSOS_POSITIVOS']
+        self._lock = threading.Lock()
+        self._lock_sincronizacion = threading.Lock()
+        self.reiniciar()
+
+    def reiniciar(self):
+        with self._lock:
+            self._bloom = None
+            self._consultados = {}      # jti -> (revocado, expira) ya resueltos contra la BD
+            self._marca = None          # 'creado' hasta donde se sincronizó
+            self._reconstruido_en = None
+            self._sincronizado_en = 0.0
+
+    # ------------------------------ Consulta ------------------------------
+    def esta_revocado(self, jti, expira, estricto=False):
+        """
+        `expira`: exp del token (datetime). Con estricto=True consulta siempre la BD
+        (ej: refresh sin rotación, donde el desfase entre procesos no se tolera).
+        """
+        if estricto:
+            return TokenRevocado.objects.filter(jti=jti).exists()
+
+        self._sincronizar()
+        with self._lock:
+            if jti not in self._bloom:
+                return False
+            consultado = self._consultados.get(jti)
+        if consultado is not None:
+            return consultado[0]
+
+        revocado = TokenRevocado.objects.filter(jti=jti).exists()
+        with self._lock:
+            self._consultados[jti] = (revocado, expira)
+        return revocado
+
+    # ------------------------------ Alta ------------------------------
+    def revocar(self, jti, expira):
+        """
+        INSERT idempotente. Devuelve False si el jti ya estaba revocado: al rotar un
+        refresh, de dos requests concurrentes con el mismo token solo una gana.
+        """
+        try:
+            with transaction.atomic():
+                TokenRevocado.objects.create(jti=jti, expira=expira)
+            nuevo = True
+        except IntegrityError:
+            nuevo = False
+        # El filtro se actualiza al confirmar: un rollback no deja revocaciones fantasma
+        transaction.on_commit(lambda: self._registrar_local(jti, expira))
+        return nuevo
+
+    def revocar_token(self, token):
+        return self.revocar(token[api_settings.JTI_CLAIM], datetime_from_epoch(token['exp']))
+
+    def _registrar_local(self, jti, expira):
+        with self._lock:
+            if self._bloom is not None:
+                self._bloom.agregar(jti)
+            self._consultados[jti] = (True, expira)
+
+    # ------------------------------ Sincronización ------------------------------
+    def _sincronizar(self):
+        if self._bloom is not None and time.monotonic() - self._sincronizado_en < self.sincronizacion_segundos:
+            return
+        # Un solo hilo sincroniza; los demás siguen con el estado actual (salvo al arrancar)
+        if not self._lock_sincronizacion.acquire(blocking=self._bloom is None):
+            return
+        try:
+            if self._bloom is not None and time.monotonic() - self._sincronizado_en < self.sincronizacion_segundos:
+                return
+            vida_refresh = api_settings.REFRESH_TOKEN_LIFETIME
+            if (self._bloom is None or self._bloom.lleno
+                    or timezone.now() - self._reconstruido_en >= vida_refresh):
+                self._reconstruir()
+            else:
+                self._incremental()
+            self._sincronizado_en = time.monotonic()
+        finally:
+            self._lock_sincronizacion.release()
+
+    def _reconstruir(self):
+        ahora = timezone.now()
+        TokenRevocado.objects.filter(expira__lte=ahora).delete() # Ya no validan de todas formas
+        vigentes = TokenRevocado.objects.filter(expira__gt=ahora)
+        capacidad = self.capacidad
+        while capacidad < vigentes.count():
+            capacidad *= 2
+        bloom = FiltroBloom(capacidad, self.tasa_falsos_positivos)
+        for jti in vigentes.values_list('jti', flat=True).iterator(chunk_size=5000):
+            bloom.agregar(jti)
+        with self._lock:
+            self._bloom = bloom
+            self._consultados = {
+                jti: (revocado, expira) for jti, (revocado, expira) in self._consultados.items() if expira > ahora
+            }
+            self._marca = ahora
+            self._reconstruido_en = ahora
+
+    def _incremental(self):
+        marca = timezone.now()
+        nuevos = list(
+            TokenRevocado.objects.filter(creado__gte=self._marca - MARGEN_SINCRONIZACION)
+            .values_list('jti', 'expira')
+        )
+        with self._lock:
+            for jti, expira in nuevos:
+                self._bloom.agregar(jti)
+                self._consultados[jti] = (True, expira)
+            self._marca = marca
+
+
+registro_revocaciones = RegistroRevocaciones()
@@ -0,0 +1,38 @@
+from functools import lru_cache
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .backends import (
+    BaseSearchBackend,
+    IcontainsSearchBackend,
+    TrigramSearchBackend,
+    TokenSearchBackend,
+    cerrar_pool_busqueda,
+    trigram_disponible,
+)
+
+BACKENDS = {
+    'icontains': IcontainsSearchBackend,
+    'trigram': TrigramSearchBackend,
+    'tokens': TokenSearchBackend,
+}
+
+
+@lru_cache(maxsize=None)
+def get_search_backend(nombre=None):
+    """
+    Resuelve settings.SEARCH_BACKEND ('auto', 'trigram', 'tokens', 'icontains' o ruta
+    a una clase). 'auto' usa trigramas si PostgreSQL tiene pg_trgm, si no la tabla de tokens.
+    """
+    nombre = nombre or getattr(settings, 'SEARCH_BACKEND', 'auto')
+    if nombre == 'auto':
+        nombre = 'trigram' if trigram_disponible() else 'tokens'
+    clase = BACKENDS[nombre] if nombre in BACKENDS else import_string(nombre)
+    return clase()
+
+
+__all__ = [
+    'get_search_backend', 'BaseSearchBackend', 'IcontainsSearchBackend',
+    'TrigramSearchBackend', 'TokenSearchBackend', 'cerrar_pool_busqueda',
+]
@@ -0,0 +1,311 @@
+import logging
+import sys
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import DatabaseError, connection
+
+from ..models import Laboratorio, Lote, Producto
+from .backends import compacto, palabras
+
+PRODUCTO, LABORATORIO, LOTE = 'producto', 'laboratorio', 'lote'
+# Prioridad de tipo a igualdad de clave (productos primero)
+ORDEN_TIPO = {PRODUCTO: 0, LABORATORIO: 1, LOTE: 2}
+TIPOS = {Producto: PRODUCTO, Laboratorio: LABORATORIO, Lote: LOTE}
+TIPO_POR_ORDEN = {orden: tipo for tipo, orden in ORDEN_TIPO.items()}
+# Referencia a un objeto en un solo int: orden_tipo << BITS_ID | id (ordena igual que (orden, id))
+BITS_ID = 40
+MASCARA_ID = (1 << BITS_ID) - 1
+# Lo que cuesta una entrada del LRU además de la clave y el array (nodo, slot y tabla
+# del OrderedDict), medido con tracemalloc
+COSTO_ENTRADA_CACHE = 140
+
+logger = logging.getLogger('modulo_principal.autocompletado')
+
+
+def claves_producto(nombre, codigo_serie):
+    return set(palabras(nombre)) | {compacto(codigo_serie)}
+
+
+def claves_laboratorio(nombre):
+    return set(palabras(nombre))
+
+
+def claves_lote(codigo_lote):
+    return {compacto(codigo_lote)}
+
+
+def _referencia(tipo, pk):
+    return ORDEN_TIPO[tipo] << BITS_ID | pk
+
+
+def _claves_objeto(ref, titulo, extra):
+    # Las claves se derivan de lo guardado en _objetos: no se guarda un set por objeto
+    tipo = TIPO_POR_ORDEN[ref >> BITS_ID]
+    if tipo == PRODUCTO:
+        return claves_producto(titulo, extra)
+    if tipo == LABORATORIO:
+        return claves_laboratorio(titulo)
+    return claves_lote(titulo)
+
+
+class IndicePrefijos:
+    """
+    Índice de autocompletado en memoria del proceso (no toca la BD al consultar).
+
+    - Las claves (palabras de nombres, códigos de barra y de lote) viven en una lista
+      ordenada de strings internados (las palabras repetidas son un solo string), con un
+      array('q') paralelo de referencias (orden_tipo << BITS_ID | id), como la tabla de
+      punto_venta/codigos.py: sin una tupla por clave. Un prefijo es un rango que se
+      ubica con bisect en O(log n). Por objeto solo se guarda (titulo, extra); sus claves
+      se recalculan al filtrar o al quitarlo.
+    - Los resultados ya resueltos por prefijo (arrays de referencias) se guardan en un
+      LRU acotado por MAX_BYTES, contando el array, la clave y el costo de la entrada;
+      los prefijos fríos se expulsan primero. MAX_BYTES NO acota el índice en sí, que
+      crece con el catálogo: ~250 bytes por clave, ~70 MB por proceso con 50k productos
+      y 150k lotes (ver estadisticas()).
+    - Se construye al primer uso y se mantiene con señales post_save/post_delete.
+      Cada proceso tiene su propio índice: REFRESCO_SEGUNDOS fuerza una reconstrucción
+      periódica para recoger cambios hechos en otros procesos. Esa reconstrucción lee la
+      BD sin tomar el lock (en un hilo aparte con SEGUNDO_PLANO) y solo reemplaza las
+      estructuras bajo el lock: mientras tanto se sigue respondiendo con el índice anterior.
+    """
+
+    def __init__(self, max_bytes=None, max_resultados=None, refresco_segundos=None, segundo_plano=None):
+        config = getattr(settings, 'AUTOCOMPLETADO', {})
+        self.max_bytes = max_bytes or config.get('MAX_BYTES', 8 * 1024 * 1024)
+        self.max_resultados = max_resultados or config.get('MAX_RESULTADOS', 8)
+        self.refresco_segundos = refresco_segundos or config.get('REFRESCO_SEGUNDOS', 300)
+        self.segundo_plano = config.get('SEGUNDO_PLANO', True) if segundo_plano is None else segundo_plano
+
+        self._lock = threading.RLock()
+        self._lock_construccion = threading.Lock() # Una sola construcción a la vez
+        self._claves = []       # Ordenada por (clave, referencia); _refs va en paralelo
+        self._refs = array('q')
+        self._objetos = {}      # referencia -> (titulo, extra); extra de un lote: su vencimiento
+        self._cache = OrderedDict()  # prefijo -> array('q') de referencias
+        self._bytes_cache = 0
+        self._construido_en = None
+        # Cambios confirmados mientras se lee la BD: se reaplican sobre el índice nuevo
+        # (la lectura pudo no verlos). None = no hay construcción en curso
+        self._pendientes = None
+
+    # ------------------------------ Construcción ------------------------------
+    @property
+    def construido(self):
+        return self._construido_en is not None
+
+    def construir(self):
+        with self._lock_construccion:
+            self._construir()
+
+    def _construir(self):
+        # Se llama con _lock_construccion tomado
+        with self._lock:
+            self._pendientes = []
+        try:
+            objetos = {}
+            for pk, nombre, codigo in Producto.objects.values_list('id', 'nombre', 'codigo_serie').iterator(chunk_size=5000):
+                objetos[_referencia(PRODUCTO, pk)] = (nombre, codigo)
+            for pk, nombre in Laboratorio.objects.values_list('id', 'nombre').iterator(chunk_size=5000):
+                objetos[_referencia(LABORATORIO, pk)] = (nombre, '')
+            for pk, codigo, vence in Lote.objects.values_list('id', 'codigo_lote', 'fecha_vencimiento').iterator(chunk_size=5000):
+                objetos[_referencia(LOTE, pk)] = (codigo, vence)
+
+            entradas = sorted(
+                (sys.intern(clave), ref) for ref, (titulo, extra) in objetos.items()
+                for clave in _claves_objeto(ref, titulo, extra)
+            )
+            claves = [clave for clave, _ in entradas]
+            refs = array('q', [ref for _, ref in entradas])
+            del entradas
+            with self._lock:
+                self._objetos = objetos
+                self._claves = claves
+                self._refs = refs
+                self._cache.clear()
+                self._bytes_cache = 0
+                for ref, nuevo in self._pendientes:
+                    self._quitar(ref)
+                    if nuevo is not None:
+                        self._poner(ref, nuevo)
+                self._construido_en = time.monotonic()
+        finally:
+            with self._lock:
+                self._pendientes = None
+
+    def _asegurar_construido(self):
+        if self._construido_en is None:
+            with self._lock_construccion: # Primer uso: no hay índice viejo con qué responder
+                if self._construido_en is None:
+                    self._construir()
+            return
+        if time.monotonic() - self._construido_en <= self.refresco_segundos:
+            return
+        if not self._lock_construccion.acquire(blocking=False):
+            return # Otro hilo ya reconstruye: se responde con el índice actual
+        if self.segundo_plano:
+            threading.Thread(target=self._reconstruir, args=(True,), daemon=True).start()
+        else:
+            self._reconstruir()
+
+    def _reconstruir(self, en_hilo=False):
+        # Se llama con _lock_construccion tomado; lo libera al terminar
+        try:
+            if self._construido_en is not None and time.monotonic() - self._construido_en > self.refresco_segundos:
+                self._construir()
+        except DatabaseError:
+            logger.exception('No se pudo reconstruir el índice de autocompletado')
+            self._construido_en = time.monotonic() # Reintenta en el próximo intervalo, no en cada tecla
+        finally:
+            self._lock_construccion.release()
+            if en_hilo:
+                connection.close() # La conexión de este hilo no la cierra ningún request
+
+    # ------------------------------ Consulta ------------------------------
+    def buscar(self, query, limite=None):
+        limite = min(limite or self.max_resultados, self.max_resultados)
+        terminos = palabras(query)
+        if not terminos:
+            return []
+        # Sin espacios: código compacto ('L-AB1' -> 'lab1'); con espacios: filtra por el resto de palabras
+        prefijo = compacto(query) if len(query.split()) == 1 else terminos[0]
+        resto = terminos[1:] if len(query.split()) > 1 else []
+
+        self._asegurar_construido()
+        with self._lock:
+            encontrados = self._resolver(prefijo)
+            resultado = []
+            for ref in encontrados:
+                titulo, extra = self._objetos[ref]
+                if resto:
+                    claves = _claves_objeto(ref, titulo, extra)
+                    if not all(any(c.startswith(t) for c in claves) for t in resto):
+                        continue
+                tipo = TIPO_POR_ORDEN[ref >> BITS_ID]
+                if tipo == LOTE:
+                    extra = f"Vence: {extra}"
+                resultado.append({'tipo': tipo, 'id': ref & MASCARA_ID, 'titulo': titulo, 'extra': extra})
+                if len(resultado) >= limite:
+                    break
+            return resultado
+
+    def _resolver(self, prefijo):
+        cacheado = self._cache.get(prefijo)
+        if cacheado is not None:
+            self._cache.move_to_end(prefijo)
+            return cacheado
+
+        # Con palabras extra hay que filtrar: se materializan más candidatos que el límite
+        tope = self.max_resultados * 4
+        vistos = array('q')
+        i = bisect_left(self._claves, prefijo)
+        while i < len(self._claves) and len(vistos) < tope and self._claves[i].startswith(prefijo):
+            if self._refs[i] not in vistos:
+                vistos.append(self._refs[i])
+            i += 1
+
+        self._guardar_en_cache(prefijo, vistos)
+        return vistos
+
+    def _guardar_en_cache(self, prefijo, resultado):
+        self._cache[prefijo] = resultado
+        self._bytes_cache += self._peso(prefijo, resultado)
+        # LRU: expulsar prefijos fríos hasta respetar el tope de memoria
+        while self._bytes_cache > self.max_bytes and len(self._cache) > 1:
+            viejo, valor = self._cache.popitem(last=False)
+            self._bytes_cache -= self._peso(viejo, valor)
+
+    @staticmethod
+    def _peso(prefijo, resultado):
+        # getsizeof de un array incluye sus datos (no hay objetos aparte que sumar)
+        return sys.getsizeof(prefijo) + sys.getsizeof(resultado) + COSTO_ENTRADA_CACHE
+
+    def _invalidar_prefijos(self, claves):
+        for clave in claves:
+            for largo in range(1, len(clave) + 1):
+                valor = self._cache.pop(clave[:largo], None)
+                if valor is not None:
+                    self._bytes_cache -= self._peso(clave[:largo], valor)
+
+    # ------------------------------ Mantenimiento ------------------------------
+    def actualizar(self, instancia):
+        tipo = TIPOS.get(type(instancia))
+        if tipo is None:
+            return
+        if tipo == PRODUCTO:
+            nuevo = (instancia.nombre, instancia.codigo_serie)
+        elif tipo == LABORATORIO:
+            nuevo = (instancia.nombre, '')
+        else:
+            nuevo = (instancia.codigo_lote, instancia.fecha_vencimiento)
+        self._aplicar(tipo, instancia.pk, nuevo)
+
+    def actualizar_en_bloque(self, instancias):
+        for instancia in instancias:
+            self.actualizar(instancia)
+
+    def eliminar(self, modelo, pk):
+        """Recibe modelo y pk (no la instancia): tras post_delete Django deja pk en None."""
+        tipo = TIPOS.get(modelo)
+        if tipo is not None:
+            self._aplicar(tipo, pk, None)
+
+    def _aplicar(self, tipo, pk, nuevo):
+        ref = _referencia(tipo, pk)
+        with self._lock:
+            if self._pendientes is not None:
+                self._pendientes.append((ref, nuevo))
+            if not self.construido:
+                return # Se cargará completo en el primer uso
+            self._quitar(ref)
+            if nuevo is not None:
+                self._poner(ref, nuevo)
+
+    def _posicion(self, clave, ref):
+        # Las claves iguales forman un rango ordenado por referencia
+        inicio = bisect_left(self._claves, clave)
+        fin = bisect_right(self._claves, clave, inicio)
+        return bisect_left(self._refs, ref, inicio, fin), fin
+
+    def _poner(self, ref, nuevo):
+        self._objetos[ref] = nuevo
+        claves = _claves_objeto(ref, *nuevo)
+        for clave in claves:
+            i, _ = self._posicion(clave, ref)
+            self._claves.insert(i, sys.intern(clave))
+            self._refs.insert(i, ref)
+        self._invalidar_prefijos(claves)
+
+    def _quitar(self, ref):
+        anterior = self._objetos.pop(ref, None)
+        if anterior is None:
+            return
+        claves = _claves_objeto(ref, *anterior)
+        for clave in claves:
+            i, fin = self._posicion(clave, ref)
+            if i < fin and self._refs[i] == ref:
+                del self._claves[i]
+                del self._refs[i]
+        self._invalidar_prefijos(claves)
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                'objetos': len(self._objetos),
+                'claves': len(self._claves),
+                'bytes_claves': (
+                    sys.getsizeof(self._claves) + sys.getsizeof(self._refs)
+                    + sum(sys.getsizeof(clave) for clave in set(self._claves))
+                ),
+                'prefijos_en_cache': len(self._cache),
+                'bytes_cache': self._bytes_cache,
+            }
+
+
+# Instancia única por proceso
+indice_autocompletado = IndicePrefijos()
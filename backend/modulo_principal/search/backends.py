@@ -0,0 +1,403 @@
+import asyncio
+import re
+import threading
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import OperationalError, connection, transaction
+from django.db.models import Case, Count, FloatField, IntegerField, Q, Sum, Value, When
+from django.db.models.functions import Greatest
+
+from ..models import Laboratorio, Lote, Producto, TerminoBusqueda
+
+
+# Columnas que necesita GlobalSearchView (se traen con values(): sin instanciar modelos)
+CAMPOS_PRODUCTO = ('id', 'nombre', 'cantidad_mg', 'codigo_serie', 'laboratorio__nombre')
+CAMPOS_LOTE = ('id', 'codigo_lote', 'fecha_vencimiento', 'producto__nombre')
+CAMPOS_LABORATORIO = ('id', 'nombre', 'telefono')
+SECCIONES = ('productos', 'lotes', 'laboratorios')
+
+# Pool de hilos propio de la búsqueda async: cada hilo conserva su conexión a la BD
+# (abrir una por sección costaría más que la query). Máximo HILOS conexiones por proceso.
+_pool_busqueda = None
+_pool_lock = threading.Lock()
+
+
+def pool_busqueda():
+    global _pool_busqueda
+    with _pool_lock:
+        if _pool_busqueda is None:
+            _pool_busqueda = ThreadPoolExecutor(
+                max_workers=settings.BUSQUEDA_ASYNC['HILOS'], thread_name_prefix='busqueda'
+            )
+        return _pool_busqueda
+
+
+def cerrar_pool_busqueda():
+    """Termina los hilos (y con ellos sus conexiones). Ej: antes de borrar la BD de tests."""
+    global _pool_busqueda
+    with _pool_lock:
+        if _pool_busqueda is not None:
+            _pool_busqueda.shutdown(wait=True)
+            _pool_busqueda = None
+
+
+def normalizar(texto):
+    """Minúsculas y sin tildes: 'Losartán Ñuñoa' -> 'losartan nunoa'."""
+    texto = unicodedata.normalize('NFKD', texto or '')
+    return ''.join(c for c in texto if not unicodedata.combining(c)).lower()
+
+
+def palabras(texto):
+    return re.findall(r'[a-z0-9]+', normalizar(texto))
+
+
+def compacto(texto):
+    """Código sin separadores: 'L-ABCD-1234' -> 'labcd1234'."""
+    return ''.join(palabras(texto))
+
+
+class BaseSearchBackend:
+    """
+    Contrato de un backend de búsqueda global. Cada sección devuelve una lista
+    de dicts (values()) ya ordenada por relevancia.
+    """
+
+    def buscar(self, query, limite=5):
+        return {
+            'productos': self.buscar_productos(query, limite),
+            'lotes': self.buscar_lotes(query, limite),
+            'laboratorios': self.buscar_laboratorios(query, limite),
+        }
+
+    async def abuscar(self, query, limite=5, timeout=None):
+        """
+        Variante async de buscar(): las tres secciones corren a la vez, cada una en un hilo
+        del pool de búsqueda con su propia conexión, así la latencia es la de la sección más
+        lenta y no la suma. (El ORM async de Django no sirve para esto: aget()/alist()
+        ejecutan todo en un mismo hilo, una query tras otra.)
+
+        Una sección que excede `timeout` segundos vuelve vacía y queda en 'incompletas'.
+        """
+        buscar_seccion = sync_to_async(self._buscar_seccion, thread_sensitive=False, executor=pool_busqueda())
+        resultados = await asyncio.gather(*[
+            asyncio.wait_for(buscar_seccion(seccion, query, limite, timeout), timeout)
+            for seccion in SECCIONES
+        ], return_exceptions=True)
+
+        data = {'incompletas': []}
+        for seccion, resultado in zip(SECCIONES, resultados):
+            if isinstance(resultado, (TimeoutError, OperationalError)): # OperationalError: statement_timeout
+                data['incompletas'].append(seccion)
+                resultado = []
+            elif isinstance(resultado, BaseException):
+                raise resultado
+            data[seccion] = resultado
+        return data
+
+    def _buscar_seccion(self, seccion, query, limite, timeout):
+        # Hilo del pool: no hay request_finished que cierre la conexión, se reutiliza
+        # mientras sirva (solo se revisa si hubo errores)
+        if connection.errors_occurred:
+            connection.close_if_unusable_or_obsolete()
+        buscar = getattr(self, f'buscar_{seccion}')
+        if timeout and connection.vendor == 'postgresql':
+            # El tope también corta la query en el servidor: el hilo no queda ocupado
+            with transaction.atomic():
+                with connection.cursor() as cursor:
+                    cursor.execute('SET LOCAL statement_timeout = %s', [max(1, int(timeout * 1000))])
+                return buscar(query, limite)
+        return buscar(query, limite)
+
+    def buscar_productos(self, query, limite):
+        raise NotImplementedError
+
+    def buscar_lotes(self, query, limite):
+        raise NotImplementedError
+
+    def buscar_laboratorios(self, query, limite):
+        raise NotImplementedError
+
+    # Mantenimiento del índice (solo lo necesitan backends con tablas propias)
+    def indexar(self, instancia, created=False, update_fields=None):
+        pass
+
+    def indexar_en_bloque(self, instancias):
+        pass
+
+    def reindexar_en_bloque(self, instancias):
+        """Upserts masivos: instancias nuevas o ya indexadas (reemplaza sus términos)."""
+        for instancia in instancias:
+            self.desindexar(instancia)
+        self.indexar_en_bloque(instancias)
+
+    def desindexar(self, instancia):
+        pass
+
+    def reconstruir(self):
+        return 0
+
+
+#----------------------------------------ICONTAINS (legado)----------------------------------------
+class IcontainsSearchBackend(BaseSearchBackend):
+    """Comportamiento original (seq scan). Se conserva como línea base del benchmark."""
+
+    def buscar_productos(self, query, limite):
+        return list(
+            Producto.objects.filter(
+                Q(nombre__icontains=query) |
+                Q(codigo_serie__icontains=query) |
+                Q(laboratorio__nombre__icontains=query)
+            ).values(*CAMPOS_PRODUCTO)[:limite]
+        )
+
+    def buscar_lotes(self, query, limite):
+        return list(Lote.objects.filter(codigo_lote__icontains=query).values(*CAMPOS_LOTE)[:limite])
+
+    def buscar_laboratorios(self, query, limite):
+        return list(Laboratorio.objects.filter(nombre__icontains=query).values(*CAMPOS_LABORATORIO)[:limite])
+
+
+#----------------------------------------TRIGRAMAS (PostgreSQL)----------------------------------------
+class TrigramSearchBackend(BaseSearchBackend):
+    """
+    PostgreSQL + pg_trgm. Los índices GIN (gin_trgm_ops) de la migración 0004 aceleran
+    tanto ILIKE '%q%' como los operadores de similitud (%>), y el orden es por similitud.
+    """
+
+    def buscar_productos(self, query, limite):
+        from django.contrib.postgres.search import TrigramWordSimilarity
+
+        labs = Laboratorio.objects.filter(
+            Q(nombre__icontains=query) | Q(nombre__trigram_word_similar=query)
+        ).values('id')
+
+        relevancia = Greatest(
+            TrigramWordSimilarity(query, 'nombre'),
+            TrigramWordSimilarity(query, 'laboratorio__nombre'),
+            Case(When(codigo_serie__startswith=query, then=Value(1.0)), default=Value(0.0)),
+            output_field=FloatField(),
+        )
+        return list(
+            Producto.objects.filter(
+                Q(nombre__icontains=query) |
+                Q(nombre__trigram_word_similar=query) |
+                Q(codigo_serie__startswith=query) |
+                Q(laboratorio_id__in=labs)
+            )
+            .annotate(relevancia=relevancia)
+            .order_by('-relevancia', '-activo', 'nombre')
+            .values(*CAMPOS_PRODUCTO)[:limite]
+        )
+
+    def buscar_lotes(self, query, limite):
+        from django.contrib.postgres.search import TrigramSimilarity
+
+        return list(
+            Lote.objects.filter(
+                Q(codigo_lote__icontains=query) | Q(codigo_lote__trigram_similar=query)
+            )
+            .annotate(relevancia=TrigramSimilarity('codigo_lote', query))
+            .order_by('-relevancia', 'fecha_vencimiento')
+            .values(*CAMPOS_LOTE)[:limite]
+        )
+
+    def buscar_laboratorios(self, query, limite):
+        from django.contrib.postgres.search import TrigramWordSimilarity
+
+        return list(
+            Laboratorio.objects.filter(
+                Q(nombre__icontains=query) | Q(nombre__trigram_word_similar=query)
+            )
+            .annotate(relevancia=TrigramWordSimilarity(query, 'nombre'))
+            .order_by('-relevancia', 'nombre')
+            .values(*CAMPOS_LABORATORIO)[:limite]
+        )
+
+
+#----------------------------------------TOKENS (fallback)----------------------------------------
+class TokenSearchBackend(BaseSearchBackend):
+    """
+    Fallback sin pg_trgm: tabla TerminoBusqueda (índice invertido) con búsqueda por
+    prefijo de palabra sobre un B-tree. Relevancia = términos coincidentes + exactos.
+    """
+    MODELOS = {
+        Producto: TerminoBusqueda.PRODUCTO,
+        Lote: TerminoBusqueda.LOTE,
+        Laboratorio: TerminoBusqueda.LABORATORIO,
+    }
+    LARGO_TOKEN = 100
+    LOTE_ESCRITURA = 5000
+
+    # ------------------------- Tokens por modelo -------------------------
+    @classmethod
+    def tokens_producto(cls, nombre, codigo_serie):
+        return cls._limpiar(palabras(nombre) + [compacto(codigo_serie)])
+
+    @classmethod
+    def tokens_lote(cls, codigo_lote):
+        return cls._limpiar(palabras(codigo_lote) + [compacto(codigo_lote)])
+
+    @classmethod
+    def tokens_laboratorio(cls, nombre):
+        return cls._limpiar(palabras(nombre))
+
+    @classmethod
+    def _limpiar(cls, tokens):
+        return {t[:cls.LARGO_TOKEN] for t in tokens if len(t) >= 2}
+
+    def _tokens(self, instancia):
+        if isinstance(instancia, Producto):
+            return self.tokens_producto(instancia.nombre, instancia.codigo_serie)
+        if isinstance(instancia, Lote):
+            return self.tokens_lote(instancia.codigo_lote)
+        return self.tokens_laboratorio(instancia.nombre)
+
+    # ------------------------- Mantenimiento -------------------------
+    def indexar(self, instancia, created=False, update_fields=None):
+        tipo = self.MODELOS.get(type(instancia))
+        if tipo is None:
+            return
+        # codigo_lote es inmutable (Lote.clean): basta con indexar al crear
+        if tipo == TerminoBusqueda.LOTE and not created:
+            return
+        if update_fields is not None and not {'nombre', 'codigo_serie'} & set(update_fields):
+            return
+
+        if not created:
+            self.desindexar(instancia)
+        TerminoBusqueda.objects.bulk_create([
+            TerminoBusqueda(tipo=tipo, objeto_id=instancia.pk, token=token)
+            for token in self._tokens(instancia)
+        ])
+
+    def indexar_en_bloque(self, instancias):
+        """Altas masivas (bulk_create): todos los términos en un solo INSERT por lote."""
+        TerminoBusqueda.objects.bulk_create([
+            TerminoBusqueda(tipo=self.MODELOS[type(instancia)], objeto_id=instancia.pk, token=token)
+            for instancia in instancias
+            for token in self._tokens(instancia)
+        ], batch_size=self.LOTE_ESCRITURA)
+
+    def reindexar_en_bloque(self, instancias):
+        # Un DELETE por tipo en vez de uno por instancia
+        ids_por_tipo = {}
+        for instancia in instancias:
+            ids_por_tipo.setdefault(self.MODELOS[type(instancia)], []).append(instancia.pk)
+        for tipo, ids in ids_por_tipo.items():
+            TerminoBusqueda.objects.filter(tipo=tipo, objeto_id__in=ids).delete()
+        self.indexar_en_bloque(instancias)
+
+    def desindexar(self, instancia):
+        tipo = self.MODELOS.get(type(instancia))
+        if tipo is not None:
+            TerminoBusqueda.objects.filter(tipo=tipo, objeto_id=instancia.pk).delete()
+
+    def reconstruir(self):
+        TerminoBusqueda.objects.all().delete()
+        fuentes = [
+            (TerminoBusqueda.LABORATORIO, Laboratorio.objects.values_list('id', 'nombre'),
+             lambda fila: self.tokens_laboratorio(fila[1])),
+            (TerminoBusqueda.PRODUCTO, Producto.objects.values_list('id', 'nombre', 'codigo_serie'),
+             lambda fila: self.tokens_producto(fila[1], fila[2])),
+            (TerminoBusqueda.LOTE, Lote.objects.values_list('id', 'codigo_lote'),
+             lambda fila: self.tokens_lote(fila[1])),
+        ]
+        total = 0
+        buffer = []
+        for tipo, filas, tokenizar in fuentes:
+            for fila in filas.order_by().iterator(chunk_size=self.LOTE_ESCRITURA):
+                buffer.extend(
+                    TerminoBusqueda(tipo=tipo, objeto_id=fila[0], token=token)
+                    for token in tokenizar(fila)
+                )
+                if len(buffer) >= self.LOTE_ESCRITURA:
+                    TerminoBusqueda.objects.bulk_create(buffer)
+                    total += len(buffer)
+                    buffer = []
+        TerminoBusqueda.objects.bulk_create(buffer)
+        return total + len(buffer)
+
+    # ------------------------- Consultas -------------------------
+    @staticmethod
+    def _prefijo(termino):
+        # Rango de prefijo en vez de LIKE: usa el índice (tipo, token) en cualquier motor
+        return Q(token__gte=termino, token__lt=termino + '￿')
+
+    def _ranking(self, tipo, query, limite):
+        """ids de objetos ordenados por relevancia (una sola consulta agrupada)."""
+        # Sin espacios ('L-AB12', 'paracet') es un solo término: el código compacto.
+        # Con espacios ('paracetamol gar') cada palabra es un término.
+        terminos = self._limpiar(palabras(query) if len(query.split()) > 1 else [compacto(query)])
+        if not terminos:
+            return []
+
+        if len(terminos) == 1:
+            # Caso típico (una palabra): recorrido ordenado del índice con LIMIT, sin GROUP BY.
+            # Dentro del rango de prefijo el token exacto es el menor -> queda primero.
+            termino = terminos.pop()
+            ids = []
+            filas = (
+                TerminoBusqueda.objects.filter(self._prefijo(termino), tipo=tipo)
+                .order_by('token', 'objeto_id')
+                .values_list('objeto_id', flat=True)[:limite * 4]
+            )
+            for objeto_id in filas:
+                if objeto_id not in ids:
+                    ids.append(objeto_id)
+            return ids[:limite]
+
+        condicion = Q()
+        for termino in terminos:
+            condicion |= self._prefijo(termino)
+
+        filas = (
+            TerminoBusqueda.objects.filter(condicion, tipo=tipo)
+            .values('objeto_id')
+            .annotate(
+                coincidencias=Count('id'),
+                exactas=Sum(Case(When(token__in=terminos, then=1), default=0, output_field=IntegerField())),
+            )
+            .order_by('-coincidencias', '-exactas', 'objeto_id')[:limite]
+        )
+        return [fila['objeto_id'] for fila in filas]
+
+    @staticmethod
+    def _en_orden(queryset, ids, campos):
+        por_id = {fila['id']: fila for fila in queryset.filter(pk__in=ids).values(*campos)}
+        return [por_id[pk] for pk in ids if pk in por_id]
+
+    def buscar_productos(self, query, limite):
+        ids = self._ranking(TerminoBusqueda.PRODUCTO, query, limite)
+        resultado = self._en_orden(Producto.objects.all(), ids, CAMPOS_PRODUCTO)
+
+        # Completar con productos de laboratorios que coinciden (menor relevancia)
+        faltan = limite - len(resultado)
+        if faltan > 0:
+            labs = self._ranking(TerminoBusqueda.LABORATORIO, query, limite)
+            if labs:
+                resultado += list(
+                    Producto.objects.filter(laboratorio_id__in=labs)
+                    .exclude(pk__in=ids)
+                    .order_by('-activo', 'nombre')
+                    .values(*CAMPOS_PRODUCTO)[:faltan]
+                )
+        return resultado
+
+    def buscar_lotes(self, query, limite):
+        ids = self._ranking(TerminoBusqueda.LOTE, query, limite)
+        return self._en_orden(Lote.objects.all(), ids, CAMPOS_LOTE)
+
+    def buscar_laboratorios(self, query, limite):
+        ids = self._ranking(TerminoBusqueda.LABORATORIO, query, limite)
+        return self._en_orden(Laboratorio.objects.all(), ids, CAMPOS_LABORATORIO)
+
+
+def trigram_disponible():
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+        return cursor.fetchone() is not None
@@ -1,5 +1,8 @@
 from .usuarioSerializer import UsuarioListaSerializer,UsuarioRegistroSerializer
-from .inventarioSerializer import ProductoSerializer,LaboratorioSerializer,LoteSerializer
+from .inventarioSerializer import ProductoSerializer,LaboratorioSerializer,LoteSerializer,LoteBloqueSerializer,MovimientoStockSerializer
+from .importacionSerializer import ImportacionSerializer,ImportacionArchivoSerializer
+from .tokenSerializer import TokenRefreshRevocableSerializer
+from .valoresSerializer import ValoresSerializer
 
 __all__ = [
     'UsuarioListaSerializer',
@@ -7,4 +10,10 @@ __all__ = [
     'ProductoSerializer',
     'LaboratorioSerializer',
     'LoteSerializer',
+    'LoteBloqueSerializer',
+    'MovimientoStockSerializer',
+    'ImportacionSerializer',
+    'ImportacionArchivoSerializer',
+    'TokenRefreshRevocableSerializer',
+    'ValoresSerializer',
 ]
\ No newline at end of file
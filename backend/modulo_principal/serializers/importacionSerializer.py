@@ -0,0 +1,20 @@
+from rest_framework import serializers
+
+from ..models import ImportacionInventario
+
+
+class ImportacionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ImportacionInventario
+        fields = [
+            'id', 'tipo', 'estado', 'nombre_archivo', 'filas_leidas', 'filas_con_error',
+            'filas_aplicadas', 'creada', 'actualizada',
+        ]
+        read_only_fields = fields
+
+
+class ImportacionArchivoSerializer(serializers.Serializer):
+    """Entrada de POST /importaciones/ (multipart) y de /reanudar/."""
+    archivo = serializers.FileField(required=False)
+    tipo = serializers.ChoiceField(choices=ImportacionInventario.TIPOS, required=False)
+    aplicar = serializers.BooleanField(default=True)
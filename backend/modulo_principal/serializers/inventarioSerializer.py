@@ -1,4 +1,4 @@
-from ..models import Producto,Laboratorio,Lote
+from ..models import Producto,Laboratorio,Lote,MovimientoStock
 from rest_framework import serializers
 
 
@@ -8,6 +8,9 @@ from rest_framework import serializers
 class ProductoSerializer(serializers.ModelSerializer):
     laboratorio_nombre = serializers.CharField(source='laboratorio.nombre',read_only=True)
     
+    stock_disponible = serializers.IntegerField(read_only=True)
+    tiene_stock = serializers.BooleanField(read_only=True)
+    
     class Meta:
         model = Producto
         fields = '__all__'
@@ -20,6 +23,36 @@ class LoteSerializer(serializers.ModelSerializer):
         model = Lote
         fields = '__all__'
 
+class LoteBloqueSerializer(serializers.Serializer):
+    """
+    Entrada del alta masiva: solo validación de formato (sin queries por fila).
+    Existencia del producto y unique_together se validan en bloque en LoteManager.
+    """
+    producto = serializers.IntegerField(min_value=1)
+    codigo_lote = serializers.CharField(max_length=50)
+    fecha_creacion = serializers.DateField()
+    fecha_vencimiento = serializers.DateField()
+    cantidad = serializers.IntegerField(min_value=0)
+    defectuoso = serializers.BooleanField(default=False)
+    activo = serializers.BooleanField(default=True)
+
+    def to_lote(self, datos):
+        datos = dict(datos)
+        return Lote(producto_id=datos.pop('producto'), **datos)
+
+class MovimientoStockSerializer(serializers.ModelSerializer):
+    """Alta de un movimiento tipado sobre un lote (ver Lote.mover_stock). Son inmutables."""
+
+    class Meta:
+        model = MovimientoStock
+        fields = ['id', 'lote', 'tipo', 'cantidad', 'fecha', 'referencia']
+        read_only_fields = ['id', 'lote', 'fecha']
+
+    def validate_cantidad(self, value):
+        if value == 0:
+            raise serializers.ValidationError("La variación no puede ser cero.")
+        return value
+
 #---------------Laboratorios--------------
 
 class LaboratorioSerializer(serializers.ModelSerializer):
@@ -0,0 +1,30 @@
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import datetime_from_epoch
+
+from ..revocacion import registro_revocaciones
+
+
+class TokenRefreshRevocableSerializer(TokenRefreshSerializer):
+    """
+    Refresh con revocación en TokenRevocado (reemplaza a la app token_blacklist, que no
+    está instalada). Con ROTATE_REFRESH_TOKENS + BLACKLIST_AFTER_ROTATION cada refresh es
+    de un solo uso: su jti se revoca al rotar y un segundo uso se rechaza.
+    """
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        jti = refresh[api_settings.JTI_CLAIM]
+
+        if api_settings.ROTATE_REFRESH_TOKENS and api_settings.BLACKLIST_AFTER_ROTATION:
+            data = super().validate(attrs)
+            # El INSERT único decide: de dos refresh concurrentes con el mismo token gana uno
+            if not registro_revocaciones.revocar(jti, datetime_from_epoch(refresh['exp'])):
+                raise InvalidToken("Token revocado")
+            return data
+
+        # Sin rotación el mismo refresh se reutiliza: el logout de otro proceso debe verse ya
+        if registro_revocaciones.esta_revocado(jti, datetime_from_epoch(refresh['exp']), estricto=True):
+            raise InvalidToken("Token revocado")
+        return super().validate(attrs)
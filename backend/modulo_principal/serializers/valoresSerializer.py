@@ -0,0 +1,62 @@
+from rest_framework import serializers
+
+# Campos cuyo to_representation no cambia un valor que ya viene tipado desde values()
+# (int, str, bool, fk como id): se copian tal cual
+CAMPOS_IDENTIDAD = (
+    serializers.IntegerField,
+    serializers.CharField,
+    serializers.BooleanField,
+    serializers.ChoiceField,
+    serializers.PrimaryKeyRelatedField,
+)
+
+
+class ValoresSerializer:
+    """
+    Camino de lectura rápido de un ModelSerializer: mismas claves, orden y formato, pero a
+    partir de filas de .values() (sin instanciar modelos ni recorrer Field por Field).
+
+    Los mapeadores se compilan una vez desde los campos del serializer original, así un
+    campo nuevo en el ModelSerializer aparece también aquí:
+    - source 'laboratorio.nombre' -> columna 'laboratorio__nombre' (JOIN en la misma query)
+    - FK 'laboratorio' -> columna 'laboratorio' (el id)
+    - Fechas y otros tipos pasan por el to_representation del campo; None queda None.
+
+    Uso: queryset.values(*lectura.columnas) y lectura.serializar(filas).
+    """
+
+    def __init__(self, serializer_class):
+        self.serializer_class = serializer_class
+        self._mapeadores = None
+
+    def _compilar(self):
+        mapeadores = []
+        for nombre, campo in self.serializer_class().fields.items():
+            if campo.write_only:
+                continue
+            if campo.source == '*' or isinstance(campo, (serializers.SerializerMethodField, serializers.BaseSerializer)):
+                raise TypeError(f"{self.serializer_class.__name__}.{nombre}: campo no soportado por ValoresSerializer")
+            columna = '__'.join(campo.source_attrs)
+            conversor = None if isinstance(campo, CAMPOS_IDENTIDAD) else campo.to_representation
+            mapeadores.append((nombre, columna, conversor))
+        return mapeadores
+
+    @property
+    def mapeadores(self):
+        if self._mapeadores is None:
+            self._mapeadores = self._compilar()
+        return self._mapeadores
+
+    @property
+    def columnas(self):
+        return [columna for _, columna, _ in self.mapeadores]
+
+    def serializar_fila(self, fila):
+        return {
+            nombre: fila[columna] if conversor is None or fila[columna] is None else conversor(fila[columna])
+            for nombre, columna, conversor in self.mapeadores
+        }
+
+    def serializar(self, filas):
+        serializar_fila = self.serializar_fila
+        return [serializar_fila(fila) for fila in filas]
@@ -0,0 +1,94 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .authentication import invalidar_usuario
+from .models import Producto, Lote, Laboratorio, UsuarioCustom
+from .models.inventario import inventario_importado, lotes_creados_en_bloque, lotes_vencidos_desactivados
+from .search import get_search_backend
+from .search.autocompletado import indice_autocompletado
+from .utils.cache import invalidar_lotes
+
+
+#-----------------------------------BÚSQUEDA GLOBAL-----------------------------------
+@receiver(post_save, sender=Producto)
+@receiver(post_save, sender=Lote)
+@receiver(post_save, sender=Laboratorio)
+def indexar_busqueda(sender, instance, created=False, raw=False, update_fields=None, **kwargs):
+    if raw: # loaddata
+        return
+    get_search_backend().indexar(instance, created=created, update_fields=update_fields)
+
+
+@receiver(post_delete, sender=Producto)
+@receiver(post_delete, sender=Lote)
+@receiver(post_delete, sender=Laboratorio)
+def desindexar_busqueda(sender, instance, **kwargs):
+    get_search_backend().desindexar(instance)
+
+
+@receiver(lotes_creados_en_bloque)
+def indexar_busqueda_en_bloque(sender, lotes, **kwargs):
+    get_search_backend().indexar_en_bloque(lotes)
+
+
+@receiver(inventario_importado)
+def reindexar_busqueda_importacion(sender, instancias, **kwargs):
+    # Upsert: pueden ser altas o cambios de nombre, se reemplazan sus términos
+    get_search_backend().reindexar_en_bloque(instancias)
+
+
+#-----------------------------------AUTOCOMPLETADO-----------------------------------
+# on_commit: el índice en memoria solo refleja cambios confirmados (un rollback no deja fantasmas)
+@receiver(post_save, sender=Producto)
+@receiver(post_save, sender=Lote)
+@receiver(post_save, sender=Laboratorio)
+def actualizar_autocompletado(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    transaction.on_commit(lambda: indice_autocompletado.actualizar(instance))
+
+
+@receiver(post_delete, sender=Producto)
+@receiver(post_delete, sender=Lote)
+@receiver(post_delete, sender=Laboratorio)
+def eliminar_autocompletado(sender, instance, **kwargs):
+    modelo, pk = type(instance), instance.pk # Tras post_delete Django deja pk en None
+    transaction.on_commit(lambda: indice_autocompletado.eliminar(modelo, pk))
+
+
+@receiver(lotes_creados_en_bloque)
+def actualizar_autocompletado_en_bloque(sender, lotes, **kwargs):
+    transaction.on_commit(lambda: indice_autocompletado.actualizar_en_bloque(lotes))
+
+
+@receiver(inventario_importado)
+def actualizar_autocompletado_importacion(sender, instancias, **kwargs):
+    transaction.on_commit(lambda: indice_autocompletado.actualizar_en_bloque(instancias))
+
+
+#-----------------------------------CACHÉ DEPENDIENTE DE LOTES-----------------------------------
+# El reporte de vencimientos también muestra precio de venta y nombre del laboratorio
+@receiver(post_save, sender=Lote)
+@receiver(post_delete, sender=Lote)
+@receiver(post_save, sender=Producto)
+@receiver(post_delete, sender=Producto)
+@receiver(post_save, sender=Laboratorio)
+@receiver(post_delete, sender=Laboratorio)
+@receiver(lotes_creados_en_bloque)
+@receiver(lotes_vencidos_desactivados)
+@receiver(inventario_importado)
+def invalidar_cache_lotes(sender, **kwargs):
+    transaction.on_commit(invalidar_lotes)
+
+
+#-----------------------------------CACHÉ DE USUARIOS (JWT)-----------------------------------
+# Guardar cubre desactivación (is_active) y cambio de clave (set_password + save)
+@receiver(post_save, sender=UsuarioCustom)
+@receiver(post_delete, sender=UsuarioCustom)
+def invalidar_cache_usuario(sender, instance, update_fields=None, **kwargs):
+    # update_last_login (en cada login) no cambia nada de lo que valida el token
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    pk = instance.pk # Tras post_delete Django deja pk en None
+    transaction.on_commit(lambda: invalidar_usuario(pk))
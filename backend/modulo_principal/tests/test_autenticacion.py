@@ -0,0 +1,125 @@
+import pytest
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+from ..authentication import JWTSinConsultaAuthentication, cache_usuarios
+from ..models import TokenRevocado, UsuarioCustom
+from ..revocacion import FiltroBloom, registro_revocaciones
+
+
+@pytest.mark.django_db(transaction=True) # La invalidación corre en on_commit
+class TestCacheUsuariosJWT:
+
+    def setup_method(self):
+        cache.clear()
+        cache_usuarios.limpiar()
+        self.usuario = UsuarioCustom.objects.create_user(username="cajero", password="clave-segura-1")
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.usuario)}')
+
+    def consultas_usuario(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/me/')
+        return response, [q for q in ctx.captured_queries if 'usuariocustom' in q['sql'].lower()]
+
+    def test_segunda_request_sin_query_de_usuario(self):
+        response, queries = self.consultas_usuario()
+        assert response.status_code == 200 and len(queries) == 1
+        response, queries = self.consultas_usuario()
+        assert response.status_code == 200 and queries == []
+        assert response.data['username'] == "cajero"
+
+    def test_guardar_o_desactivar_invalida(self):
+        self.consultas_usuario()
+        self.usuario.first_name = "Ana"
+        self.usuario.save()
+        response, queries = self.consultas_usuario()
+        assert len(queries) == 1 and response.data['first_name'] == "Ana"
+
+        self.usuario.is_active = False
+        self.usuario.save()
+        assert self.client.get('/api/me/').status_code == 401
+
+    def test_version_expulsada_no_revalida_entradas_viejas(self):
+        """Desactivado en otro proceso y luego expulsada su versión del caché: la entrada no revive."""
+        from ..utils.cache import _clave_version_usuario, invalidar_version_usuario
+        cache.delete(_clave_version_usuario(self.usuario.pk)) # La entrada nace sin versión guardada
+        token = AccessToken.for_user(self.usuario)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.consultas_usuario()
+        assert cache_usuarios.obtener(self.usuario.pk, token['jti']) is not None
+
+        invalidar_version_usuario(self.usuario.pk) # Lo que ve este proceso de una desactivación ajena
+        cache.delete(_clave_version_usuario(self.usuario.pk))
+        assert cache_usuarios.obtener(self.usuario.pk, token['jti']) is None
+
+    def test_token_distinto_es_otra_entrada(self):
+        self.consultas_usuario()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.usuario)}')
+        _, queries = self.consultas_usuario()
+        assert len(queries) == 1
+        assert len(cache_usuarios) == 2
+
+    def test_modo_sin_consulta(self):
+        token = AccessToken.for_user(self.usuario)
+        request = RequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {token}')
+        with CaptureQueriesContext(connection) as ctx:
+            usuario, _ = JWTSinConsultaAuthentication().authenticate(request)
+        assert ctx.captured_queries == []
+        assert str(usuario.id) == str(self.usuario.pk) and usuario.is_authenticated
+
+
+@pytest.mark.django_db(transaction=True) # El filtro local se actualiza en on_commit
+class TestRevocacionTokens:
+
+    def setup_method(self):
+        cache.clear()
+        cache_usuarios.limpiar()
+        registro_revocaciones.reiniciar()
+        self.usuario = UsuarioCustom.objects.create_user(username="cajero", password="clave-segura-1")
+        self.refresh = RefreshToken.for_user(self.usuario)
+        self.client = APIClient()
+        self.client.cookies[settings.AUTH_COOKIE] = str(self.refresh.access_token)
+        self.client.cookies[settings.AUTH_COOKIE_REFRESH] = str(self.refresh)
+
+    def test_refresh_rotado_no_se_reutiliza(self):
+        assert self.client.post('/api/token/refresh/').status_code == 200
+        nuevo = self.client.cookies[settings.AUTH_COOKIE_REFRESH].value
+        assert nuevo != str(self.refresh)
+        assert TokenRevocado.objects.filter(jti=self.refresh['jti']).exists()
+
+        # El refresh nuevo sirve; el anterior (ej: robado) ya no
+        assert self.client.post('/api/token/refresh/').status_code == 200
+        self.client.cookies[settings.AUTH_COOKIE_REFRESH] = str(self.refresh)
+        assert self.client.post('/api/token/refresh/').status_code == 401
+
+    def test_logout_revoca_refresh_y_access(self):
+        access = self.client.cookies[settings.AUTH_COOKIE].value
+        refresh = self.client.cookies[settings.AUTH_COOKIE_REFRESH].value
+        assert self.client.post('/api/logout/').status_code == 200
+        assert TokenRevocado.objects.count() == 2
+
+        otro = APIClient()
+        otro.cookies[settings.AUTH_COOKIE_REFRESH] = refresh
+        assert otro.post('/api/token/refresh/').status_code == 401
+        otro.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+        assert otro.get('/api/me/').status_code == 401
+
+    def test_token_vigente_sin_query_de_revocacion(self):
+        self.client.get('/api/me/') # Primera carga del filtro y del usuario
+        with CaptureQueriesContext(connection) as ctx:
+            assert self.client.get('/api/me/').status_code == 200
+        assert ctx.captured_queries == []
+
+    def test_filtro_bloom(self):
+        bloom = FiltroBloom(1000, 0.01)
+        for i in range(1000):
+            bloom.agregar(f"revocado-{i}")
+        assert all(f"revocado-{i}" in bloom for i in range(1000)) # Sin falsos negativos
+        falsos_positivos = sum(f"vigente-{i}" in bloom for i in range(10000))
+        assert falsos_positivos < 300
+        assert not bloom.lleno
@@ -0,0 +1,95 @@
+import json
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.db.models import Sum
+from .factories import LoteFactory, ProductoFactory
+
+
+@pytest.mark.django_db
+class TestBenchmarkApi:
+
+    def test_guarda_baseline_y_detecta_regresion(self, tmp_path):
+        ProductoFactory() # Con datos no se ejecuta seed_data
+        baseline = tmp_path / 'baseline.json'
+        opciones = dict(solo=['laboratorios_simple_list'], iteraciones=3, baseline=str(baseline))
+
+        call_command('benchmark_api', guardar_baseline=True, **opciones)
+        datos = json.loads(baseline.read_text(encoding='utf-8'))
+        metricas = datos['escenarios']['laboratorios_simple_list']
+        assert metricas['queries'] == 1
+        assert {'p50_ms', 'p95_ms', 'p99_ms', 'memoria_kb'} <= set(metricas)
+
+        # Misma corrida contra un baseline con menos queries -> regresión
+        metricas['queries'] = 0
+        baseline.write_text(json.dumps(datos), encoding='utf-8')
+        with pytest.raises(CommandError, match='queries'):
+            call_command('benchmark_api', **opciones)
+
+
+@pytest.mark.django_db
+class TestSeedData:
+
+    def test_cantidades_exactas_y_stock_consistente(self):
+        from ..models import Laboratorio, Lote, Producto
+        call_command('seed_data', laboratorios=3, productos=25, lotes=60, tamano_tanda=7, procesos=1, sin_busqueda=True)
+
+        assert (Laboratorio.objects.count(), Producto.objects.count(), Lote.objects.count()) == (3, 25, 60)
+        vendible = Lote.objects.filter(activo=True, defectuoso=False).aggregate(t=Sum('cantidad'))['t']
+        assert Producto.objects.aggregate(t=Sum('stock_disponible'))['t'] == vendible
+        assert not Producto.objects.con_stock_desincronizado().exists()
+
+    def test_generacion_determinista(self):
+        from datetime import date
+        from ..management.commands._generadores_seed import ean13, generar_lotes, generar_productos
+
+        assert generar_productos((7, 0, 0, 50, 3)) == generar_productos((7, 0, 0, 50, 3))
+        assert generar_lotes((7, 1, 0, 50, 10, date(2026, 1, 1))) != generar_lotes((8, 1, 0, 50, 10, date(2026, 1, 1)))
+        # EAN-13 con dígito verificador válido
+        codigo = ean13(123)
+        suma = sum(int(d) * (3 if i % 2 else 1) for i, d in enumerate(codigo[:12]))
+        assert len(codigo) == 13 and int(codigo[12]) == (10 - suma % 10) % 10
+
+
+# transaction=True: las vistas corren en los hilos de asgiref, con su propia conexión
+@pytest.mark.django_db(transaction=True)
+class TestCargaTerminales:
+
+    def test_sesion_acciones_y_stock_compensado(self, tmp_path):
+        from datetime import timedelta
+        from django.utils import timezone
+        hoy = timezone.localdate()
+        lote = LoteFactory(
+            producto=ProductoFactory(nombre="Paracetamol", activo=True), cantidad=10,
+            activo=True, defectuoso=False, fecha_vencimiento=hoy + timedelta(days=200),
+        )
+        salida = tmp_path / 'carga.json'
+        # SQLite en memoria compartida no admite dos escritores: 'database table is locked'
+        terminales = 2 if connection.vendor == 'postgresql' else 1
+        call_command(
+            'carga_terminales', terminales=terminales, duracion=2, rampa=0, factor_espera=0.05,
+            mezcla='lote=1', salida=str(salida), max_errores=0,
+        )
+
+        endpoints = json.loads(salida.read_text(encoding='utf-8'))['endpoints']
+        assert endpoints['login']['requests'] == endpoints['perfil']['requests'] == terminales
+        assert endpoints['lote_movimiento']['requests'] >= 2
+        assert all(sum(datos['histograma'].values()) == datos['requests'] for datos in endpoints.values())
+        lote.refresh_from_db()
+        assert lote.cantidad == 10 # Cada ajuste +1 va seguido de su -1
+        # Los usuarios de la corrida (clave al azar) no quedan en la BD
+        assert not get_user_model().objects.filter(username__startswith='carga-').exists()
+
+    def test_no_pisa_usuarios_existentes(self):
+        LoteFactory(producto=ProductoFactory(activo=True), activo=True, defectuoso=False)
+        existente = get_user_model().objects.create_user(username='carga-000', password='propia-123')
+        with pytest.raises(CommandError, match='carga-000'):
+            call_command('carga_terminales', terminales=1, duracion=1)
+        existente.refresh_from_db()
+        assert existente.check_password('propia-123')
+
+    def test_mezcla_invalida(self):
+        with pytest.raises(CommandError, match='mezcla'):
+            call_command('carga_terminales', mezcla='vender=1')
@@ -0,0 +1,92 @@
+import csv
+import gzip
+import io
+import json
+import pytest
+from datetime import timedelta
+from django.utils import timezone
+from rest_framework.test import APIClient
+from .factories import LaboratorioFactory, ProductoFactory, LoteFactory
+
+
+def contenido(response):
+    assert response.streaming
+    return b''.join(response.streaming_content)
+
+
+@pytest.mark.django_db
+class TestExportacion:
+
+    def setup_method(self):
+        self.client = APIClient()
+
+    def test_lotes_csv_respeta_filtros(self):
+        hoy = timezone.localdate()
+        producto = ProductoFactory(laboratorio=LaboratorioFactory(nombre="Lab Export"))
+        for dias in (10, 20, 400):
+            LoteFactory(producto=producto, fecha_vencimiento=hoy + timedelta(days=dias))
+
+        limite = (hoy + timedelta(days=90)).isoformat()
+        response = self.client.get(f'/api/lotes/exportar/?fecha_vencimiento__lte={limite}')
+        assert response.status_code == 200
+        assert response['Content-Disposition'] == 'attachment; filename="lotes.csv"'
+        filas = list(csv.DictReader(io.StringIO(contenido(response).decode('utf-8'))))
+        assert len(filas) == 2
+        assert {f['laboratorio'] for f in filas} == {"Lab Export"}
+
+    def test_productos_ndjson_gzip(self):
+        lab = LaboratorioFactory()
+        for _ in range(3):
+            ProductoFactory(laboratorio=lab)
+
+        response = self.client.get('/api/productos/exportar/?formato=ndjson&gzip=1')
+        assert response['Content-Type'] == 'application/gzip'
+        lineas = gzip.decompress(contenido(response)).decode('utf-8').splitlines()
+        assert len(lineas) == 3
+        assert {'id', 'codigo_serie', 'laboratorio', 'stock_disponible'} <= set(json.loads(lineas[0]))
+
+    def test_asgi_iterador_async_por_trozos(self, monkeypatch):
+        """Con ASGI el contenido es async: Django no lo junta entero antes del primer byte."""
+        from asgiref.sync import async_to_sync, sync_to_async
+        from django.core import signals
+        from django.db import close_old_connections, connection
+        from django.test import AsyncRequestFactory
+        from ..models import Producto
+        from ..utils import exportacion
+        monkeypatch.setattr(exportacion, 'FILAS_POR_ENVIO', 2)
+        productos = [ProductoFactory() for _ in range(5)]
+
+        def respuesta():
+            return exportacion.respuesta_exportacion(
+                Producto.objects.order_by('pk'), [('id', 'id'), ('nombre', 'nombre')], 'productos',
+                request=AsyncRequestFactory().get('/'),
+            )
+
+        async def leer(response, cuantos=None):
+            trozos = []
+            async for trozo in response:
+                trozos.append(trozo)
+                if len(trozos) == cuantos:
+                    break
+            # Lo que hace ASGIHandler al terminar; sin cerrar la conexión del test (como el test client)
+            signals.request_finished.disconnect(close_old_connections)
+            try:
+                await sync_to_async(response.close)()
+            finally:
+                signals.request_finished.connect(close_old_connections)
+            return trozos
+
+        # async_to_sync desde este hilo: los trozos (thread_sensitive) usan esta conexión
+        response = respuesta()
+        assert response.is_async
+        trozos = async_to_sync(leer)(response)
+        assert len(trozos) == 4 # Encabezado + 3 trozos de hasta 2 filas
+        assert b''.join(trozos).decode('utf-8').splitlines()[1:] == [f"{p.id},{p.nombre}" for p in productos]
+
+        # Descarga cortada: la transacción de lectura se cierra igual
+        anidadas = len(connection.savepoint_ids)
+        assert len(async_to_sync(leer)(respuesta(), cuantos=2)) == 2
+        assert len(connection.savepoint_ids) == anidadas
+
+    def test_formato_invalido(self):
+        assert self.client.get('/api/lotes/exportar/?formato=xml').status_code == 400
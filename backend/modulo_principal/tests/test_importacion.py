@@ -0,0 +1,199 @@
+import io
+import threading
+import pytest
+from datetime import date
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.db.models import Sum
+from rest_framework.test import APIClient
+from .factories import LaboratorioFactory, ProductoFactory, LoteFactory
+from ..importacion import get_importador, importar, reanudar
+from ..models import FilaImportacionLote, ImportacionInventario, Laboratorio, Lote, Producto
+
+
+def csv_bytes(*lineas):
+    return io.BytesIO(('\n'.join(lineas) + '\n').encode('utf-8'))
+
+
+def libro_cuadra(lotes):
+    """La cantidad de cada lote es la suma de sus movimientos."""
+    return all((lote.movimientos.aggregate(t=Sum('cantidad'))['t'] or 0) == lote.cantidad for lote in lotes)
+
+
+ENCABEZADO_PRODUCTOS = 'codigo_serie,nombre,descripcion,laboratorio,cantidad_mg,cantidad_capsulas,es_bioequivalente,precio_venta'
+ENCABEZADO_LOTES = 'codigo_serie;codigo_lote;fecha_creacion;fecha_vencimiento;cantidad;defectuoso'
+
+
+@pytest.mark.django_db
+class TestImportacionProductos:
+
+    def test_upsert_y_reporte_de_errores(self):
+        lab = LaboratorioFactory(nombre="Lab Existente")
+        sin_lotes = ProductoFactory(laboratorio=lab, codigo_serie='7800000000011', cantidad_mg=100, precio_venta=500)
+        con_lotes = ProductoFactory(laboratorio=lab, codigo_serie='7800000000028', cantidad_mg=100, cantidad_capsulas=10)
+        LoteFactory(producto=con_lotes)
+
+        archivo = csv_bytes(
+            ENCABEZADO_PRODUCTOS,
+            '7800000000035,Nuevo 500,desc,Lab Nuevo,500,20,si,1990',        # 2: alta + laboratorio nuevo
+            '7800000000011,Renombrado,,Lab Existente,250,10,no,700',        # 3: update (sin lotes: mg cambia)
+            '7800000000035,Repetido,,Lab Nuevo,500,20,no,1990',             # 4: duplicado en archivo
+            '7800000000042,Malo,,Lab Nuevo,abc,20,no,100',                  # 5: mg no numérico
+            '7800000000028,Con lotes,,Lab Existente,999,10,no,100',         # 6: mg inmutable (tiene lotes)
+        )
+        importacion = importar('productos', archivo)
+
+        assert importacion.estado == ImportacionInventario.COMPLETADA
+        assert (importacion.filas_leidas, importacion.filas_aplicadas, importacion.filas_con_error) == (5, 2, 3)
+
+        nuevo = Producto.objects.get(codigo_serie='7800000000035')
+        assert nuevo.nombre == "Nuevo 500" and nuevo.laboratorio.nombre == "Lab Nuevo"
+        sin_lotes.refresh_from_db()
+        assert (sin_lotes.nombre, sin_lotes.cantidad_mg, sin_lotes.precio_venta) == ("Renombrado", 250, 700)
+        con_lotes.refresh_from_db()
+        assert con_lotes.cantidad_mg == 100
+
+        errores = dict(importacion.filas_producto.exclude(errores='').values_list('fila', 'errores'))
+        assert errores[4] == "codigo_serie: Duplicado en el archivo (primera aparición en la fila 2)."
+        assert errores[5].startswith("cantidad_mg: 'abc' no es un número entero.")
+        assert errores[6] == "cantidad_mg: Denegado: Producto con lotes asociados."
+
+
+@pytest.mark.django_db
+class TestImportacionLotes:
+
+    def test_reanuda_tras_falla_y_aplica(self, monkeypatch):
+        producto = ProductoFactory(codigo_serie='7800000000011')
+        existente = LoteFactory(
+            producto=producto, codigo_lote='L-1', cantidad=5, activo=True, defectuoso=False,
+            fecha_creacion=date(2026, 1, 1), fecha_vencimiento=date(2028, 1, 1),
+        )
+        contenido = csv_bytes(
+            ENCABEZADO_LOTES,
+            '7800000000011;L-1;2026-01-01;2028-01-01;40;no',      # update de cantidad
+            '7800000000011;L-2;2026-02-01;2028-02-01;10;no',      # alta
+            '7800000000011;L-3;01-03-2026;01-03-2028;0;no',       # alta, queda inactivo (cantidad 0)
+            '7800000000099;L-4;2026-02-01;2028-02-01;10;no',      # producto inexistente
+            '7800000000011;L-1;2026-01-01;2030-01-01;40;no',      # duplicado + fecha inmutable
+        ).getvalue()
+
+        # La segunda tanda falla: queda cargada solo la primera
+        original = FilaImportacionLote.objects.bulk_create
+        llamadas = []
+        def bulk_create_con_falla(filas, *args, **kwargs):
+            llamadas.append(len(filas))
+            if len(llamadas) == 2:
+                raise ConnectionError("conexión perdida")
+            return original(filas, *args, **kwargs)
+        monkeypatch.setattr(FilaImportacionLote.objects, 'bulk_create', bulk_create_con_falla)
+
+        with pytest.raises(ConnectionError):
+            importar('lotes', io.BytesIO(contenido), tamano_tanda=2)
+        importacion = ImportacionInventario.objects.get()
+        assert importacion.estado == ImportacionInventario.CARGANDO
+        assert importacion.filas_leidas == 2
+
+        importacion = reanudar(importacion, io.BytesIO(contenido), tamano_tanda=2)
+        assert importacion.estado == ImportacionInventario.COMPLETADA
+        assert list(importacion.filas_lote.order_by('fila').values_list('fila', flat=True)) == [2, 3, 4, 5, 6]
+        assert (importacion.filas_aplicadas, importacion.filas_con_error) == (3, 2)
+
+        existente.refresh_from_db()
+        assert existente.cantidad == 40 and existente.fecha_vencimiento == date(2028, 1, 1)
+        assert Lote.objects.get(codigo_lote='L-3').activo is False
+        producto.refresh_from_db()
+        assert producto.stock_disponible == 50
+
+        errores = importacion.filas_lote.get(fila=6).errores
+        assert "Duplicado en el archivo" in errores and "No puedes cambiar la fecha de vencimiento" in errores
+        assert "No existe un producto" in importacion.filas_lote.get(fila=5).errores
+
+    def test_aplicacion_diferida_con_lote_creado_despues_de_validar(self):
+        """El lote se crea entre aplicar=false y /aplicar/: ajuste por la diferencia, no otra recepción."""
+        producto = ProductoFactory(codigo_serie='7800000000011')
+        importacion = importar('lotes', csv_bytes(ENCABEZADO_LOTES, '7800000000011;L-9;2026-01-01;2028-01-01;30;no'), aplicar=False)
+        assert importacion.estado == ImportacionInventario.VALIDADA
+        lote = LoteFactory(
+            producto=producto, codigo_lote='L-9', cantidad=100, activo=True, defectuoso=False,
+            fecha_creacion=date(2026, 1, 1), fecha_vencimiento=date(2028, 1, 1),
+        )
+
+        get_importador(importacion).aplicar()
+        lote.refresh_from_db()
+        assert lote.cantidad == 30
+        assert list(lote.movimientos.values_list('tipo', 'cantidad')) == [('recepcion', 100), ('ajuste', -70)]
+        assert libro_cuadra([lote])
+
+    def test_segundo_aplicar_con_estado_viejo_no_reaplica(self):
+        ProductoFactory(codigo_serie='7800000000011')
+        importacion = importar('lotes', csv_bytes(ENCABEZADO_LOTES, '7800000000011;L-1;2026-01-01;2028-01-01;30;no'), aplicar=False)
+        vieja = ImportacionInventario.objects.get(pk=importacion.pk) # Otra solicitud, leída antes de aplicar
+
+        get_importador(importacion).aplicar()
+        with pytest.raises(ValidationError):
+            get_importador(vieja).aplicar()
+        importacion.refresh_from_db()
+        assert importacion.filas_aplicadas == 1
+        lote = Lote.objects.get(codigo_lote='L-1')
+        assert lote.cantidad == 30 and libro_cuadra([lote])
+
+    def test_reanudar_exige_el_mismo_archivo(self):
+        importacion = ImportacionInventario.objects.create(tipo='lotes', huella='0' * 64)
+        with pytest.raises(ValidationError):
+            reanudar(importacion, csv_bytes(ENCABEZADO_LOTES))
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.skipif(connection.vendor != 'postgresql', reason="Bloqueo de filas solo en PostgreSQL")
+class TestAplicacionConcurrente:
+
+    def test_dos_aplicar_simultaneos_aplican_cada_fila_una_vez(self):
+        producto = ProductoFactory(codigo_serie='7800000000011')
+        lineas = [f'7800000000011;L-{i};2026-01-01;2028-01-01;{i + 1};no' for i in range(40)]
+        importacion = importar('lotes', csv_bytes(ENCABEZADO_LOTES, *lineas), aplicar=False)
+
+        barrera, errores = threading.Barrier(2), []
+        def aplicar():
+            try:
+                barrera.wait()
+                get_importador(ImportacionInventario.objects.get(pk=importacion.pk), tamano_tanda=3).aplicar()
+            except ValidationError:
+                pass # La otra solicitud terminó primero
+            except Exception as e:
+                errores.append(e)
+            finally:
+                connection.close()
+
+        hilos = [threading.Thread(target=aplicar) for _ in range(2)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        assert errores == []
+        importacion.refresh_from_db()
+        assert (importacion.estado, importacion.filas_aplicadas) == (ImportacionInventario.COMPLETADA, 40)
+        lotes = list(Lote.objects.filter(producto=producto))
+        assert len(lotes) == 40 and libro_cuadra(lotes)
+        producto.refresh_from_db()
+        assert producto.stock_disponible == sum(range(1, 41))
+
+
+@pytest.mark.django_db
+class TestImportacionApi:
+
+    def test_subida_y_reporte_csv(self):
+        client = APIClient()
+        archivo = csv_bytes(ENCABEZADO_PRODUCTOS, '7800000000035,Nuevo,,Lab API,500,20,si,1990', 'x,Sin datos,,,,,,')
+        archivo.name = 'catalogo.csv'
+
+        resp = client.post('/api/importaciones/', {'tipo': 'productos', 'archivo': archivo}, format='multipart')
+        assert resp.status_code == 201
+        assert resp.data['filas_aplicadas'] == 1
+        assert resp.data['errores'][0]['fila'] == 3
+
+        reporte = client.get(f"/api/importaciones/{resp.data['id']}/errores/")
+        lineas = b''.join(reporte.streaming_content).decode('utf-8').splitlines()
+        assert lineas[0] == 'fila,codigo_serie,nombre,laboratorio,errores'
+        assert len(lineas) == 2
+        assert Laboratorio.objects.filter(nombre="Lab API").exists()
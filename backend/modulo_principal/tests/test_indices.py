@@ -0,0 +1,92 @@
+import json
+import pytest
+from datetime import timedelta
+from django.db import connection
+from django.db.models import F
+from django.utils import timezone
+from punto_venta.services import lotes_elegibles
+from ..models import Laboratorio, Lote, Producto
+from ..views import LoteViewSet, ProductoViewSet
+
+PRODUCTOS = 5000
+LOTES_POR_PRODUCTO = 10
+TABLAS_CALIENTES = {Lote._meta.db_table, Producto._meta.db_table}
+
+
+def cargar_volumen():
+    """
+    Volumen tipo producción con INSERT ... SELECT (segundos, sin factories) + ANALYZE:
+    con tablas chicas el planner prefiere Seq Scan y el test no probaría nada.
+    """
+    hoy = timezone.localdate()
+    lab = Laboratorio.objects.create(nombre="Lab Volumen")
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            INSERT INTO {Producto._meta.db_table}
+                (nombre, descripcion, cantidad_mg, cantidad_capsulas, es_bioequivalente, codigo_serie,
+                 precio_venta, activo, laboratorio_id, stock_disponible, tiene_stock)
+            SELECT 'Producto ' || i, '', 500, 30, false, lpad(i::text, 13, '0'),
+                   1000, i %% 10 <> 0, %s, (i * 7) %% 500, true
+            FROM generate_series(1, %s) AS i
+        """, [lab.pk, PRODUCTOS])
+        cursor.execute(f"""
+            INSERT INTO {Lote._meta.db_table}
+                (producto_id, codigo_lote, fecha_creacion, fecha_vencimiento, cantidad, defectuoso, activo)
+            SELECT p.id, 'L-' || n, %s, %s::date + ((p.id * 37 + n * 53) %% 730)::int, (p.id + n) %% 50,
+                   (p.id + n) %% 50 = 1, (p.id + n) %% 50 <> 0
+            FROM {Producto._meta.db_table} p, generate_series(1, %s) AS n
+        """, [hoy - timedelta(days=30), hoy - timedelta(days=30), LOTES_POR_PRODUCTO])
+        cursor.execute(f"ANALYZE {Producto._meta.db_table}")
+        cursor.execute(f"ANALYZE {Lote._meta.db_table}")
+
+
+def nodos(plan):
+    yield plan
+    for hijo in plan.get('Plans', []):
+        yield from nodos(hijo)
+
+
+def querysets_calientes():
+    hoy = timezone.localdate()
+    producto_id = Producto.objects.order_by('pk').values_list('pk', flat=True)[PRODUCTOS // 2]
+    lotes = LoteViewSet().get_queryset()
+    productos = ProductoViewSet().get_queryset()
+    return {
+        'lotes_listado': lotes.values(*LoteViewSet.lectura_rapida.columnas)[:10],
+        'lotes_cursor': lotes.order_by('defectuoso', '-activo', 'fecha_vencimiento', 'pk')[:11],
+        'productos_listado': productos[:10],
+        'productos_cursor': productos.order_by(
+            F('activo').desc(), F('stock_disponible').desc(), F('nombre').asc(), F('pk').asc()
+        )[:11],
+        'productos_laboratorio': productos.filter(activo=True, tiene_stock=True)[:10],
+        'stock_producto': Producto.objects.filter(pk=producto_id).annotate(
+            stock=Producto.objects.stock_real(), con_stock=Producto.objects.tiene_stock_real()
+        ),
+        'lotes_fefo': lotes_elegibles(producto_id, hoy)[:4],
+        'lotes_por_vencer': Lote.objects.filter(
+            activo=True, defectuoso=False, fecha_vencimiento__range=(hoy, hoy + timedelta(days=30))
+        ),
+    }
+
+
+@pytest.mark.skipif(connection.vendor != 'postgresql', reason="Planes e índices parciales/covering de PostgreSQL")
+# transaction=True: el flush final (TRUNCATE) deja las tablas sin estadísticas. Con rollback,
+# el reltuples del ANALYZE (escrito fuera de la transacción) quedaría para los demás tests
+@pytest.mark.django_db(transaction=True)
+class TestPlanesConsultasCalientes:
+
+    def test_sin_seq_scan(self):
+        cargar_volumen() # Una sola carga para todas las consultas
+        regresiones = {}
+        for nombre, queryset in querysets_calientes().items():
+            plan = queryset.explain(format='json')
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            if any(
+                nodo['Node Type'] == 'Seq Scan' and nodo.get('Relation Name') in TABLAS_CALIENTES
+                for nodo in nodos(plan[0]['Plan'])
+            ):
+                regresiones[nombre] = queryset.explain()
+        assert not regresiones, "Consultas que volvieron a Seq Scan:\n" + "\n\n".join(
+            f"{nombre}:\n{plan}" for nombre, plan in regresiones.items()
+        )
@@ -0,0 +1,58 @@
+import json
+import logging
+import pytest
+from django.http import HttpResponse
+from django.test import RequestFactory, override_settings
+from ..middleware import InstrumentacionSQLMiddleware
+from ..models import Producto
+from .factories import LaboratorioFactory, ProductoFactory
+
+
+@pytest.mark.django_db
+class TestInstrumentacionSQL:
+
+    @override_settings(INSTRUMENTACION_SQL={'MUESTREO': 1.0, 'UMBRAL_REPETIDAS': 3})
+    def test_cuenta_queries_y_detecta_n_mas_1(self, caplog):
+        lab = LaboratorioFactory()
+        ids = [ProductoFactory(laboratorio=lab).pk for _ in range(4)]
+
+        def vista(request):
+            for pk in ids: # Una query por fila: el patrón que se quiere detectar
+                Producto.objects.filter(pk=pk).exists()
+            return HttpResponse('ok')
+
+        middleware = InstrumentacionSQLMiddleware(vista)
+        with caplog.at_level(logging.INFO, logger='modulo_principal.instrumentacion'):
+            response = middleware(RequestFactory().get('/api/productos/'))
+
+        assert 'db;dur=' in response['Server-Timing']
+        assert '4 queries' in response['Server-Timing']
+        registro = caplog.records[-1]
+        assert registro.levelno == logging.WARNING
+        linea = json.loads(registro.getMessage())
+        assert linea['queries'] == 4
+        assert linea['n_mas_1'][0]['veces'] == 4
+
+    @override_settings(INSTRUMENTACION_SQL={'MUESTREO': 0.0, 'LENTO_MS': 10_000})
+    def test_sin_muestreo_solo_tiempo_total(self, caplog):
+        middleware = InstrumentacionSQLMiddleware(lambda request: HttpResponse('ok'))
+        with caplog.at_level(logging.INFO, logger='modulo_principal.instrumentacion'):
+            response = middleware(RequestFactory().get('/'))
+
+        assert response['Server-Timing'].startswith('total;dur=')
+        assert not caplog.records
+
+    @override_settings(INSTRUMENTACION_SQL={'MUESTREO': 1.0})
+    def test_cadena_async_mide_queries_del_hilo_sync(self):
+        from asgiref.sync import async_to_sync, sync_to_async
+        lab = LaboratorioFactory()
+        ProductoFactory(laboratorio=lab)
+
+        async def vista(request):
+            # Como una vista sync bajo ASGI: el ORM corre en el hilo thread-sensitive
+            await sync_to_async(lambda: list(Producto.objects.all()))()
+            return HttpResponse('ok')
+
+        middleware = InstrumentacionSQLMiddleware(vista)
+        response = async_to_sync(middleware)(RequestFactory().get('/api/productos/'))
+        assert '1 queries' in response['Server-Timing']
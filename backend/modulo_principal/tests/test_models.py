@@ -96,6 +96,39 @@ class TestProducto:
         
         assert prod.stock_total == 10
     
+    def test_producto_contador_stock_persistido(self):
+        """El contador persistido sigue los cambios de los lotes (crear, defectuoso, borrar)."""
+        from ..models import Producto
+        prod = ProductoFactory()
+        lote = LoteFactory(producto=prod, cantidad=10, activo=True, defectuoso=False)
+        LoteFactory(producto=prod, cantidad=7, activo=True, defectuoso=False)
+
+        db = Producto.objects.get(pk=prod.pk)
+        assert db.stock_disponible == 17
+        assert db.tiene_stock is True
+
+        lote.defectuoso = True
+        lote.save()
+        db = Producto.objects.get(pk=prod.pk)
+        assert db.stock_disponible == 7
+
+        assert not Producto.objects.con_stock_desincronizado().exists()
+
+    def test_recalcular_stock_command(self):
+        """El comando detecta y repara contadores desincronizados."""
+        from django.core.management import call_command
+        from django.core.management.base import CommandError
+        from ..models import Producto
+        prod = ProductoFactory()
+        LoteFactory(producto=prod, cantidad=10, activo=True, defectuoso=False)
+        Producto.objects.filter(pk=prod.pk).update(stock_disponible=999)
+
+        with pytest.raises(CommandError):
+            call_command('recalcular_stock', '--verificar')
+
+        call_command('recalcular_stock')
+        assert Producto.objects.get(pk=prod.pk).stock_disponible == 10
+
     @property
     def stock_total(self):
         hoy = timezone.now().date()
@@ -262,4 +295,357 @@ class TestIntegracionCascada:
         lote_a.save() 
 
         prod.refresh_from_db()
-        assert prod.activo is True
\ No newline at end of file
+        assert prod.activo is True
+
+# ==============================================================================
+# 5. BÚSQUEDA GLOBAL (Backend de tokens)
+# ==============================================================================
+
+@pytest.mark.django_db
+class TestBusquedaGlobal:
+
+    def test_busqueda_por_prefijo_y_relevancia(self):
+        """Tokens mantenidos por señales: encuentra por prefijo de palabra, sin tildes."""
+        from ..search import TokenSearchBackend
+        lab = LaboratorioFactory(nombre="Laboratorio Chile")
+        exacto = ProductoFactory(nombre="Losartán Potásico", laboratorio=lab)
+        parcial = ProductoFactory(nombre="Losartanol Forte")
+        ProductoFactory(nombre="Ibuprofeno")
+
+        backend = TokenSearchBackend()
+        ids = [p['id'] for p in backend.buscar_productos("losartan", 5)]
+        assert ids == [exacto.id, parcial.id]
+
+        # Productos vía nombre del laboratorio
+        ids = [p['id'] for p in backend.buscar_productos("chile", 5)]
+        assert exacto.id in ids
+
+    def test_busqueda_reindexa_al_renombrar(self):
+        from ..search import TokenSearchBackend
+        prod = ProductoFactory(nombre="Paracetamol")
+        prod.nombre = "Ketoprofeno"
+        prod.save()
+
+        backend = TokenSearchBackend()
+        assert backend.buscar_productos("para", 5) == []
+        assert [p['id'] for p in backend.buscar_productos("keto", 5)] == [prod.id]
+
+        assert backend.reconstruir() > 0
+        assert [p['id'] for p in backend.buscar_productos("keto", 5)] == [prod.id]
+
+
+@pytest.mark.django_db(transaction=True) # Las secciones corren en otros hilos/conexiones
+class TestBusquedaGlobalAsync:
+
+    def teardown_method(self):
+        from ..search import cerrar_pool_busqueda
+        cerrar_pool_busqueda()
+
+    def test_misma_respuesta_que_la_vista_sync(self):
+        from asgiref.sync import async_to_sync
+        from django.test import AsyncClient
+        from rest_framework.test import APIClient
+        lab = LaboratorioFactory(nombre="Laboratorio Losartek")
+        prod = ProductoFactory(nombre="Losartán Potásico", laboratorio=lab)
+        LoteFactory(producto=prod, codigo_lote="LOS-123")
+
+        sync = APIClient().get('/api/global-search/?q=los').json()
+        asincrona = async_to_sync(AsyncClient().get)('/api/global-search-async/?q=los')
+        assert asincrona.status_code == 200
+        assert asincrona.json() == sync
+        assert sync['productos'] and sync['laboratorios']
+
+    def test_seccion_lenta_no_bloquea_las_demas(self, monkeypatch, settings):
+        import time
+        from asgiref.sync import async_to_sync
+        from django.test import AsyncClient
+        from ..search import get_search_backend
+        settings.BUSQUEDA_ASYNC = {**settings.BUSQUEDA_ASYNC, 'TIMEOUT_SECCION': 0.1}
+        ProductoFactory(nombre="Paracetamol")
+        monkeypatch.setattr(type(get_search_backend()), 'buscar_lotes', lambda self, q, l: time.sleep(1) or [])
+
+        inicio = time.perf_counter()
+        data = async_to_sync(AsyncClient().get)('/api/global-search-async/?q=para').json()
+        assert time.perf_counter() - inicio < 0.8
+        assert data['incompletas'] == ['lotes']
+        assert data['lotes'] == []
+        assert [p['titulo'] for p in data['productos']] == ["Paracetamol"]
+
+
+# ==============================================================================
+# 6. AUTOCOMPLETADO (Índice en memoria)
+# ==============================================================================
+
+@pytest.mark.django_db
+class TestAutocompletado:
+
+    def test_autocompletado_sin_bd_y_actualizacion_por_senales(self, django_assert_num_queries, django_capture_on_commit_callbacks):
+        """Tras construirse, las consultas no tocan la BD; los cambios llegan por señales."""
+        from ..search.autocompletado import indice_autocompletado
+        prod = ProductoFactory(nombre="Amoxicilina Forte", codigo_serie="7801234567890")
+        LoteFactory(producto=prod, codigo_lote="L-AMX-001")
+
+        indice = indice_autocompletado
+        indice.construir()
+        with django_assert_num_queries(0):
+            assert [r['id'] for r in indice.buscar("amox") if r['tipo'] == 'producto'] == [prod.id]
+            assert indice.buscar("780123")[0]['id'] == prod.id
+            assert indice.buscar("L-AMX")[0]['tipo'] == 'lote'
+
+        with django_capture_on_commit_callbacks(execute=True):
+            prod.nombre = "Cefalexina"
+            prod.save()
+        with django_assert_num_queries(0):
+            assert indice.buscar("amox") == []
+            assert indice.buscar("cefa")[0]['id'] == prod.id
+
+    def test_eliminar_lote_y_producto_deja_de_sugerirlos(self, django_capture_on_commit_callbacks):
+        from ..search.autocompletado import indice_autocompletado
+        prod = ProductoFactory(nombre="Ibuprofeno", codigo_serie="7809876543210")
+        lote = LoteFactory(producto=prod, codigo_lote="L-IBU-001", cantidad=0)
+        indice_autocompletado.construir()
+        assert indice_autocompletado.buscar("L-IBU") and indice_autocompletado.buscar("ibupro")
+
+        with django_capture_on_commit_callbacks(execute=True):
+            lote.delete()
+        assert indice_autocompletado.buscar("L-IBU") == []
+        with django_capture_on_commit_callbacks(execute=True):
+            prod.delete()
+        assert indice_autocompletado.buscar("ibupro") == []
+        assert indice_autocompletado.buscar("780987") == []
+
+    def test_reconstruccion_no_bloquea_ni_pierde_cambios(self, django_assert_num_queries, monkeypatch):
+        """Vencido el refresco se sigue respondiendo con el índice viejo; lo confirmado
+        durante la lectura de la BD se reaplica sobre el índice nuevo."""
+        import time
+        from ..models import Producto
+        from ..search import autocompletado
+        ProductoFactory(nombre="Loratadina")
+        borrado = ProductoFactory(nombre="Loperamida")
+        indice = autocompletado.IndicePrefijos(refresco_segundos=60, segundo_plano=False)
+        indice.construir()
+        indice._construido_en -= 120
+
+        with indice._lock_construccion: # Otro hilo reconstruyendo: se responde sin esperar ni consultar
+            with django_assert_num_queries(0):
+                assert indice.buscar("lop")[0]['id'] == borrado.pk
+
+        # Borrado confirmado después de que la reconstrucción leyó el producto
+        original = autocompletado.claves_laboratorio
+        def leer_y_borrar(nombre):
+            indice.eliminar(Producto, borrado.pk)
+            return original(nombre)
+        monkeypatch.setattr(autocompletado, 'claves_laboratorio', leer_y_borrar)
+        assert indice.buscar("lop") == []
+        assert indice.buscar("lor")[0]['titulo'] == "Loratadina"
+        assert time.monotonic() - indice._construido_en < 60 # Sí se reconstruyó
+
+    def test_autocompletado_lru_respeta_tope(self):
+        from ..search.autocompletado import IndicePrefijos
+        for i in range(5):
+            ProductoFactory(nombre=f"Producto{i}")
+        indice = IndicePrefijos(max_bytes=300)
+        indice.construir()
+        for prefijo in ["pro", "prod", "produ", "produc", "product"]:
+            indice.buscar(prefijo)
+        stats = indice.estadisticas()
+        assert stats['bytes_cache'] <= 300 or stats['prefijos_en_cache'] == 1
+        assert stats['prefijos_en_cache'] < 5
+        # Se cuenta lo que ocupa cada entrada, no solo el contenedor
+        assert stats['bytes_cache'] == sum(indice._peso(k, v) for k, v in indice._cache.items())
+        assert stats['bytes_cache'] >= sum(8 * len(v) for v in indice._cache.values())
+
+    def test_claves_compartidas_quedan_ordenadas(self, django_capture_on_commit_callbacks):
+        """Claves repetidas entre objetos: altas y bajas mantienen (clave, referencia) ordenado."""
+        from ..search.autocompletado import IndicePrefijos
+        lab = LaboratorioFactory(nombre="Genericos Sur")
+        productos = [ProductoFactory(nombre=f"Genericos {i} mg", laboratorio=lab) for i in range(4)]
+        indice = IndicePrefijos()
+        indice.construir()
+        indice.eliminar(type(productos[1]), productos[1].pk)
+        productos[2].nombre = "Otro 500 mg"
+        indice.actualizar(productos[2])
+
+        assert list(zip(indice._claves, indice._refs)) == sorted(zip(indice._claves, indice._refs))
+        genericos = [(r['tipo'], r['id']) for r in indice.buscar("generic")]
+        assert genericos == [('producto', productos[0].pk), ('producto', productos[3].pk), ('laboratorio', lab.pk)]
+        assert [r['id'] for r in indice.buscar("otro 500")] == [productos[2].pk]
+
+
+# ==============================================================================
+# 7. RASTREO DE CAMBIOS CON CAMPOS DIFERIDOS (.only / .values)
+# ==============================================================================
+
+@pytest.mark.django_db
+class TestCamposDiferidos:
+
+    @pytest.fixture
+    def datos(self):
+        lab = LaboratorioFactory()
+        for i in range(5):
+            LoteFactory(producto=ProductoFactory(laboratorio=lab), codigo_lote=f"L-{i}")
+
+    @pytest.mark.parametrize('modelo, campos', [
+        ('Producto', ('id', 'nombre')),
+        ('Lote', ('id', 'cantidad')),
+        ('Laboratorio', ('id', 'telefono')),
+    ])
+    def test_only_y_values_una_query(self, datos, modelo, campos, django_assert_num_queries):
+        """Cargar con .only()/.values() no debe recargar campos diferidos por fila."""
+        from .. import models as m
+        Modelo = getattr(m, modelo)
+
+        with django_assert_num_queries(1):
+            filas = list(Modelo.objects.only(*campos))
+            assert filas
+            for fila in filas:
+                for campo in campos:
+                    getattr(fila, campo)
+
+        with django_assert_num_queries(1):
+            assert list(Modelo.objects.values(*campos))
+
+    def test_busqueda_global_queries_constantes(self, datos, django_assert_max_num_queries):
+        from rest_framework.test import APIClient
+        from ..models import Producto
+        nombre = Producto.objects.values_list('nombre', flat=True).first()
+        with django_assert_max_num_queries(6):
+            assert APIClient().get(f'/api/global-search/?q={nombre[:4]}').status_code == 200
+
+    def test_cambio_en_campo_diferido_se_detecta(self, datos):
+        """Asignar un campo inmutable nunca leído sigue siendo validado (original perezoso)."""
+        from ..models import Producto, Lote
+        prod = Producto.objects.filter(lotes__isnull=False).only('id', 'nombre').first()
+        prod.cantidad_mg = 12345
+        with pytest.raises(ValidationError) as exc:
+            prod.save()
+        assert 'cantidad_mg' in exc.value.message_dict
+
+        lote = Lote.objects.only('id', 'cantidad').first()
+        lote.codigo_lote = "OTRO"
+        with pytest.raises(ValidationError) as exc:
+            lote.clean()
+        assert 'codigo_lote' in exc.value.message_dict
+
+
+# ==============================================================================
+# 8. ALTA MASIVA DE LOTES
+# ==============================================================================
+
+@pytest.mark.django_db
+class TestLotesEnBloque:
+
+    def _lotes(self, producto, n, **extra):
+        from ..models import Lote
+        futuro = timezone.now().date() + timedelta(days=365)
+        return [
+            Lote(producto_id=producto.id, codigo_lote=f"REC-{i}", fecha_creacion=timezone.now().date(),
+                 fecha_vencimiento=futuro, cantidad=extra.get('cantidad', 10), defectuoso=False)
+            for i in range(n)
+        ]
+
+    @pytest.mark.parametrize('n', [5, 50])
+    def test_crear_en_bloque_queries_constantes(self, n, django_assert_max_num_queries):
+        """La cantidad de queries no depende del tamaño del envío."""
+        from ..models import Lote, Producto
+        prod = ProductoFactory(activo=False)
+        lotes = self._lotes(prod, n)
+        with django_assert_max_num_queries(8):
+            Lote.objects.crear_en_bloque(lotes)
+
+        prod = Producto.objects.get(pk=prod.pk)
+        assert prod.stock_disponible == 10 * n
+        assert prod.activo is True # Reactivado por regla de stock
+
+    def test_crear_en_bloque_aplica_reglas(self):
+        from ..models import Lote
+        prod = ProductoFactory()
+        existente = LoteFactory(producto=prod, codigo_lote="REC-0")
+
+        lotes = self._lotes(prod, 3)
+        lotes.append(self._lotes(prod, 2)[1]) # REC-1 repetido en el envío
+        with pytest.raises(ValidationError) as exc:
+            Lote.objects.crear_en_bloque(lotes)
+        assert set(exc.value.message_dict) == {'0', '3'}
+        assert Lote.objects.filter(producto=prod).count() == 1 # Nada se insertó
+
+        vacios = self._lotes(ProductoFactory(), 2, cantidad=0)
+        creados = Lote.objects.crear_en_bloque(vacios)
+        assert all(not lote.activo for lote in creados) # Auto-desactivación
+
+    def test_endpoint_bulk(self):
+        from rest_framework.test import APIClient
+        prod = ProductoFactory()
+        client = APIClient()
+        fila = {'producto': prod.id, 'codigo_lote': 'API-1', 'fecha_creacion': '2026-01-01',
+                'fecha_vencimiento': '2027-01-01', 'cantidad': 5}
+
+        resp = client.post('/api/lotes/bulk/', [fila, {**fila, 'codigo_lote': 'API-2'}], format='json')
+        assert resp.status_code == 201
+        assert resp.data['creados'] == 2
+
+        resp = client.post('/api/lotes/bulk/', [{**fila, 'codigo_lote': 'API-3'}, fila], format='json')
+        assert resp.status_code == 400
+        assert '1' in resp.data
+
+    def test_desactivar_vencidos(self):
+        """Job nocturno: en tandas, recalcula productos e idempotente."""
+        from django.core.management import call_command
+        from ..models import Lote, Producto
+        hoy = timezone.now().date()
+        solo_vencido, mixto = ProductoFactory(), ProductoFactory()
+        lote = dict(activo=True, defectuoso=False, cantidad=10)
+        vencidos = [
+            LoteFactory(producto=solo_vencido, fecha_vencimiento=hoy - timedelta(days=1), **lote),
+            LoteFactory(producto=mixto, fecha_vencimiento=hoy - timedelta(days=30), **lote),
+        ]
+        vigente = LoteFactory(producto=mixto, fecha_vencimiento=hoy, **lote) # Vence hoy: aún se vende
+
+        assert Lote.objects.desactivar_vencidos(tamano_tanda=1) == {
+            'lotes': 2, 'productos': 2, 'productos_desactivados': 1,
+        }
+        assert not Lote.objects.filter(pk__in=[l.pk for l in vencidos], activo=True).exists()
+        assert Lote.objects.get(pk=vigente.pk).activo is True
+        assert Producto.objects.filter(pk=solo_vencido.pk, activo=False, stock_disponible=0).exists()
+        assert Producto.objects.filter(pk=mixto.pk, activo=True, stock_disponible=10).exists()
+        assert not Producto.objects.con_stock_desincronizado().exists()
+
+        call_command('desactivar_vencidos') # Segunda corrida: nada que cambiar
+        assert Lote.objects.desactivar_vencidos() == {'lotes': 0, 'productos': 0, 'productos_desactivados': 0}
+
+
+# ==============================================================================
+# 9. LECTURA RÁPIDA (.values() EN LIST/RETRIEVE)
+# ==============================================================================
+
+@pytest.mark.django_db
+class TestLecturaRapida:
+
+    @pytest.mark.parametrize('url, vista', [
+        ('/api/productos/', 'ProductoViewSet'),
+        ('/api/lotes/', 'LoteViewSet'),
+        ('/api/laboratorios/', 'LaboratorioViewSet'),
+    ])
+    def test_mismo_json_que_model_serializer(self, url, vista, django_assert_num_queries):
+        """list y retrieve responden byte a byte lo mismo que el ModelSerializer."""
+        from rest_framework.renderers import JSONRenderer
+        from rest_framework.test import APIClient
+        from .. import views
+        LaboratorioFactory(telefono=None)
+        for i in range(4):
+            LoteFactory(producto=ProductoFactory(), codigo_lote=f"L-{i}")
+
+        viewset = getattr(views, vista)()
+        queryset = viewset.get_queryset()
+        esperado = viewset.serializer_class(queryset, many=True).data
+        client = APIClient()
+
+        with django_assert_num_queries(2): # COUNT + página, sin queries por fila
+            resp = client.get(f'{url}?page=1')
+        assert resp.data['results'] == esperado[:10] # Mismos tipos (fechas ya como str)
+        assert JSONRenderer().render(resp.data['results']) == JSONRenderer().render(esperado[:10])
+
+        primero = esperado[0]
+        resp = client.get(f"{url}{primero['id']}/")
+        assert JSONRenderer().render(resp.data) == JSONRenderer().render(primero)
+        assert client.get(f'{url}999999/').status_code == 404
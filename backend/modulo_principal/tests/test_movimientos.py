@@ -0,0 +1,121 @@
+import pytest
+from datetime import timedelta
+from django.core.exceptions import PermissionDenied, ValidationError
+from django.db.models import Sum
+from django.utils import timezone
+from rest_framework.test import APIClient
+from punto_venta.services import dispensar
+from ..models import Lote, MovimientoStock, SnapshotStock
+from .factories import LaboratorioFactory, ProductoFactory, LoteFactory
+
+
+def saldo_libro(lote):
+    return lote.movimientos.aggregate(total=Sum('cantidad'))['total'] or 0
+
+
+@pytest.mark.django_db
+class TestLibroMovimientos:
+
+    def test_cada_cambio_de_cantidad_queda_registrado(self):
+        hoy = timezone.localdate()
+        prod = ProductoFactory(laboratorio=LaboratorioFactory())
+        lote = LoteFactory(producto=prod, cantidad=20, activo=True, defectuoso=False,
+                           fecha_vencimiento=hoy + timedelta(days=100))
+        lote.cantidad = 15 # Edición directa (admin / PUT): ajuste por la diferencia
+        lote.save()
+        lote.mover_stock(MovimientoStock.DEFECTO, -5, referencia="caja rota")
+        dispensar(prod.id, 4, referencia="boleta-1")
+        Lote.objects.crear_en_bloque([Lote(
+            producto=prod, codigo_lote="BLOQUE-1", fecha_creacion=hoy,
+            fecha_vencimiento=hoy + timedelta(days=200), cantidad=8,
+        )])
+
+        lote.refresh_from_db()
+        assert lote.cantidad == 6
+        assert list(lote.movimientos.values_list('tipo', 'cantidad', 'referencia')) == [
+            ('recepcion', 20, ''), ('ajuste', -5, ''), ('defecto', -5, 'caja rota'), ('venta', -4, 'boleta-1'),
+        ]
+        for l in Lote.objects.filter(producto=prod):
+            assert saldo_libro(l) == l.cantidad
+
+    def test_movimiento_que_deja_stock_negativo_se_rechaza(self):
+        lote = LoteFactory(cantidad=3, activo=True, defectuoso=False)
+        with pytest.raises(ValidationError):
+            lote.mover_stock(MovimientoStock.VENCIMIENTO, -4)
+        assert Lote.objects.get(pk=lote.pk).cantidad == 3
+        assert lote.movimientos.count() == 1
+
+    def test_libro_append_only(self):
+        lote = LoteFactory(cantidad=3)
+        movimiento = lote.movimientos.get()
+        with pytest.raises(PermissionDenied):
+            movimiento.delete()
+        with pytest.raises(PermissionDenied):
+            MovimientoStock.objects.filter(lote=lote).update(cantidad=1)
+        movimiento.cantidad = 1
+        with pytest.raises(PermissionDenied):
+            movimiento.save()
+
+    def test_borrar_lote_o_producto_no_borra_el_libro(self):
+        lote = LoteFactory(cantidad=3)
+        lote.mover_stock(MovimientoStock.AJUSTE, -3) # Stock 0: antes se podía borrar con su historial
+        with pytest.raises(PermissionDenied, match='desactívalo'):
+            lote.delete()
+        with pytest.raises(PermissionDenied, match='desactívalo'):
+            lote.producto.delete()
+        assert Lote.objects.filter(pk=lote.pk).exists()
+        assert saldo_libro(lote) == 0 and lote.movimientos.count() == 2
+
+        vacio = LoteFactory(cantidad=0) # Sin movimientos: error de digitación, se puede borrar
+        vacio.delete()
+        assert not Lote.objects.filter(pk=vacio.pk).exists()
+
+
+@pytest.mark.django_db
+class TestStockHistorico:
+
+    def test_stock_al_con_snapshot_y_cola(self):
+        ahora = timezone.now()
+        lote = LoteFactory(cantidad=0, activo=False)
+        otro = LoteFactory(producto=lote.producto, cantidad=0, activo=False)
+        dias = lambda n: ahora - timedelta(days=n)
+        MovimientoStock.objects.registrar([(lote.pk, MovimientoStock.RECEPCION, 100)], fecha=dias(30))
+        MovimientoStock.objects.registrar([(lote.pk, MovimientoStock.VENTA, -10)], fecha=dias(20))
+        MovimientoStock.objects.registrar([(otro.pk, MovimientoStock.RECEPCION, 7)], fecha=dias(20))
+        MovimientoStock.objects.registrar([(lote.pk, MovimientoStock.VENTA, -5)], fecha=dias(5))
+
+        def stock_al(momento):
+            return dict(SnapshotStock.objects.anotar_stock_al(Lote.objects.all(), momento).values_list('id', 'stock_al'))
+
+        sin_snapshot = [stock_al(dias(n)) for n in (40, 25, 10, 0)]
+        assert [s[lote.pk] for s in sin_snapshot] == [0, 100, 90, 85]
+
+        # Compactar no cambia ningún resultado, solo acota la cola a sumar
+        assert SnapshotStock.objects.compactar(dias(15)) == 2
+        assert SnapshotStock.objects.compactar(dias(15)) == 0 # Idempotente
+        assert SnapshotStock.objects.get(lote=lote).cantidad == 90
+        assert [stock_al(dias(n)) for n in (40, 25, 10, 0)] == sin_snapshot
+        assert stock_al(ahora)[otro.pk] == 7
+
+        # Solo los lotes con movimientos nuevos reciben snapshot
+        assert SnapshotStock.objects.compactar(dias(1)) == 1
+
+    def test_endpoints(self):
+        client = APIClient()
+        lote = LoteFactory(cantidad=10, activo=True, defectuoso=False)
+        resp = client.post(f'/api/lotes/{lote.pk}/movimientos/', {'tipo': 'vencimiento', 'cantidad': -4}, format='json')
+        assert resp.status_code == 201
+        resp = client.post(f'/api/lotes/{lote.pk}/movimientos/', {'tipo': 'venta', 'cantidad': -40}, format='json')
+        assert resp.status_code == 400
+
+        historial = client.get(f'/api/lotes/{lote.pk}/movimientos/').data
+        assert [(m['tipo'], m['cantidad']) for m in historial] == [('vencimiento', -4), ('recepcion', 10)]
+        for limite, esperados in (('1', 1), ('-5', 1), ('0', 1), ('abc', 2)):
+            resp = client.get(f'/api/lotes/{lote.pk}/movimientos/?limite={limite}')
+            assert resp.status_code == 200 and len(resp.data) == esperados
+
+        ayer = (timezone.localdate() - timedelta(days=1)).isoformat()
+        hoy = timezone.localdate().isoformat()
+        assert client.get(f'/api/lotes/stock-al/?fecha={ayer}&producto={lote.producto_id}').data['results'][0]['stock'] == 0
+        assert client.get(f'/api/lotes/stock-al/?fecha={hoy}&producto={lote.producto_id}').data['results'][0]['stock'] == 6
+        assert client.get('/api/lotes/stock-al/').status_code == 400
@@ -0,0 +1,72 @@
+import base64
+import json
+import pytest
+from datetime import timedelta
+from django.utils import timezone
+from rest_framework.test import APIClient
+from .factories import LaboratorioFactory, ProductoFactory, LoteFactory
+
+
+def recorrer(client, url):
+    """Sigue los links 'next' y devuelve todos los ids en orden."""
+    ids = []
+    while url:
+        resp = client.get(url)
+        assert resp.status_code == 200
+        assert 'count' not in resp.data # Sin COUNT(*) en modo cursor
+        ids.extend(item['id'] for item in resp.data['results'])
+        url = resp.data['next']
+    return ids
+
+
+@pytest.mark.django_db
+class TestKeysetPagination:
+
+    def setup_method(self):
+        self.client = APIClient()
+
+    def test_productos_cursor_mismo_orden_que_smart_sorting(self):
+        """Recorrer por cursor entrega todos los productos, sin duplicados y en el orden por defecto."""
+        from ..models import Producto
+        futuro = timezone.now().date() + timedelta(days=365)
+        lab = LaboratorioFactory()
+        for i in range(12):
+            prod = ProductoFactory(laboratorio=lab, activo=True, nombre="Repetido" if i % 2 else f"Prod {i}")
+            if i % 3:
+                LoteFactory(producto=prod, cantidad=i, activo=True, defectuoso=False, fecha_vencimiento=futuro)
+
+        esperado = list(
+            Producto.objects.order_by('-activo', '-stock_disponible', 'nombre', 'pk').values_list('id', flat=True)
+        )
+        assert recorrer(self.client, '/api/productos/?cursor=&page_size=5') == esperado
+
+    def test_lotes_cursor_ida_y_vuelta(self):
+        """El link 'previous' vuelve exactamente a la página anterior."""
+        producto = ProductoFactory()
+        for _ in range(7):
+            LoteFactory(producto=producto)
+
+        primera = self.client.get('/api/lotes/?cursor=&page_size=3&total=1')
+        assert primera.data['previous'] is None
+        assert primera.data['total_aproximado'] == 7
+
+        segunda = self.client.get(primera.data['next'])
+        vuelta = self.client.get(segunda.data['previous'])
+        assert [l['id'] for l in vuelta.data['results']] == [l['id'] for l in primera.data['results']]
+
+    def test_cursor_invalido(self):
+        resp = self.client.get('/api/lotes/?cursor=basura')
+        assert resp.status_code == 404
+
+    @pytest.mark.parametrize('url, valores', [
+        ('/api/productos/', ["x", "x", "x", "x"]),
+        ('/api/lotes/', ["x", "x", "x", "x"]),
+        ('/api/lotes/', [False, True, "2026-02-30", 1]), # Fecha inexistente
+        ('/api/lotes/', [None, True, "2026-01-01", 1]),
+        ('/api/punto-venta/reposicion/', ["abc", 1]), # Orden por anotación (cobertura)
+    ])
+    def test_cursor_adulterado(self, url, valores):
+        """Cursor bien formado (cantidad de valores correcta) pero con tipos equivocados: 404, no 500."""
+        LoteFactory()
+        cursor = base64.urlsafe_b64encode(json.dumps({'v': valores}).encode()).decode()
+        assert self.client.get(f'{url}?cursor={cursor}').status_code == 404
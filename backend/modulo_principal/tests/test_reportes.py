@@ -0,0 +1,74 @@
+import pytest
+from datetime import timedelta
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from .factories import LaboratorioFactory, ProductoFactory, LoteFactory
+
+
+@pytest.mark.django_db(transaction=True) # La invalidación del caché corre en on_commit
+class TestReporteVencimientos:
+
+    def setup_method(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def test_tramos_por_laboratorio_y_cache(self):
+        hoy = timezone.localdate()
+        lab_a = LaboratorioFactory(nombre="Lab A")
+        lab_b = LaboratorioFactory(nombre="Lab B")
+        prod_a = ProductoFactory(laboratorio=lab_a, precio_venta=100)
+        prod_b = ProductoFactory(laboratorio=lab_b, precio_venta=10)
+
+        LoteFactory(producto=prod_a, cantidad=5, activo=True, defectuoso=False, fecha_vencimiento=hoy + timedelta(days=10))
+        LoteFactory(producto=prod_a, cantidad=3, activo=True, defectuoso=False, fecha_vencimiento=hoy + timedelta(days=30))
+        LoteFactory(producto=prod_b, cantidad=7, activo=True, defectuoso=False, fecha_vencimiento=hoy + timedelta(days=45))
+        LoteFactory(producto=prod_b, cantidad=2, activo=True, defectuoso=False, fecha_vencimiento=hoy + timedelta(days=170))
+        # Fuera del reporte: más allá de 180 días, defectuoso o inactivo
+        LoteFactory(producto=prod_b, cantidad=9, activo=True, defectuoso=False, fecha_vencimiento=hoy + timedelta(days=400))
+        LoteFactory(producto=prod_a, cantidad=4, activo=True, defectuoso=True, fecha_vencimiento=hoy + timedelta(days=5))
+        LoteFactory(producto=prod_a, cantidad=0, activo=False, fecha_vencimiento=hoy + timedelta(days=5))
+
+        resp = self.client.get('/api/reportes/vencimientos/')
+        assert resp.status_code == 200
+        totales = resp.data['totales']
+        assert totales['1-30'] == {'unidades': 8, 'lotes': 2, 'valor': 800}
+        assert totales['31-60'] == {'unidades': 7, 'lotes': 1, 'valor': 70}
+        assert totales['61-90'] == {'unidades': 0, 'lotes': 0, 'valor': 0}
+        assert totales['91-180'] == {'unidades': 2, 'lotes': 1, 'valor': 20}
+
+        labs = resp.data['por_laboratorio']
+        assert [l['laboratorio'] for l in labs] == ["Lab A", "Lab B"] # Ordenado por valor
+        assert labs[1]['tramos']['31-60']['unidades'] == 7
+
+        # Segunda lectura: servida desde caché, sin tocar la BD
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get('/api/reportes/vencimientos/')
+        assert len(ctx.captured_queries) == 0
+
+        # Un cambio en lotes invalida el reporte
+        LoteFactory(producto=prod_b, cantidad=1, activo=True, defectuoso=False, fecha_vencimiento=hoy + timedelta(days=80))
+        resp = self.client.get('/api/reportes/vencimientos/')
+        assert resp.data['totales']['61-90'] == {'unidades': 1, 'lotes': 1, 'valor': 10}
+
+    def test_cambio_de_precio_invalida_el_reporte(self):
+        hoy = timezone.localdate()
+        prod = ProductoFactory(precio_venta=1000)
+        LoteFactory(producto=prod, cantidad=10, activo=True, defectuoso=False, fecha_vencimiento=hoy + timedelta(days=10))
+        assert self.client.get('/api/reportes/vencimientos/').data['totales']['1-30']['valor'] == 10000
+
+        prod.precio_venta = 5000
+        prod.save()
+        assert self.client.get('/api/reportes/vencimientos/').data['totales']['1-30']['valor'] == 50000
+
+    def test_version_expulsada_no_revive_reportes_viejos(self):
+        from ..utils.cache import CLAVE_VERSION_LOTES, invalidar_lotes, version_lotes
+        vistas = {version_lotes()}
+        for _ in range(3): # Expulsión de la clave (poda de locmem) alternada con invalidaciones
+            cache.delete(CLAVE_VERSION_LOTES)
+            vistas.add(version_lotes())
+            invalidar_lotes()
+            vistas.add(version_lotes())
+        assert len(vistas) == 7
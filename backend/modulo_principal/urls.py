@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import UsuarioViewSet, ProductoViewSet,LaboratorioViewSet,LoteViewSet, GlobalSearchView
+from .views import UsuarioViewSet, ProductoViewSet,LaboratorioViewSet,LoteViewSet, GlobalSearchView, GlobalSearchAsyncView, AutocompletarView, ReporteVencimientosView, ImportacionViewSet
 
 
 router = DefaultRouter()
@@ -12,9 +12,13 @@ router.register(r'usuarios',UsuarioViewSet, basename = 'usuario')
 router.register(r'productos',ProductoViewSet,basename = 'producto')
 router.register(r'laboratorios',LaboratorioViewSet, basename = 'laboratorio')
 router.register(r'lotes',LoteViewSet,basename='lote')
+router.register(r'importaciones',ImportacionViewSet,basename='importacion')
 
 
 urlpatterns = [
     path('', include(router.urls)),
-    path('global-search/',GlobalSearchView.as_view(), name='global-search')
+    path('global-search/',GlobalSearchView.as_view(), name='global-search'),
+    path('global-search-async/',GlobalSearchAsyncView.as_view(), name='global-search-async'),
+    path('autocompletar/',AutocompletarView.as_view(), name='autocompletar'),
+    path('reportes/vencimientos/',ReporteVencimientosView.as_view(), name='reporte-vencimientos'),
 ]
@@ -0,0 +1,49 @@
+import uuid
+
+from django.core.cache import cache
+
+# Versión global de los lotes: cualquier cambio de stock/estado la reemplaza y
+# así invalida de una vez todo lo cacheado que dependa de lotes (reportes, etc.).
+# Con varios procesos debe usarse un caché compartido (CACHE_URL en settings).
+CLAVE_VERSION_LOTES = 'inventario:version_lotes'
+
+
+def _version(clave):
+    """
+    Versión vigente de `clave`. Las versiones son uuid, no contadores: si la clave se
+    expulsa del caché (locmem poda al pasar MAX_ENTRIES) nace una versión nueva, nunca
+    una ya usada, y lo guardado con versiones anteriores no vuelve a servirse.
+    """
+    version = cache.get(clave)
+    if version is None:
+        nueva = uuid.uuid4().hex
+        # add: si dos procesos llegan a la vez, gana uno y ambos usan la misma
+        version = nueva if cache.add(clave, nueva, timeout=None) else (cache.get(clave) or nueva)
+    return version
+
+
+def _renovar_version(clave):
+    cache.set(clave, uuid.uuid4().hex, timeout=None)
+
+
+def version_lotes():
+    return _version(CLAVE_VERSION_LOTES)
+
+
+def invalidar_lotes():
+    _renovar_version(CLAVE_VERSION_LOTES)
+
+
+# Versión por usuario: la compara el caché de usuarios JWT (authentication.py) en cada
+# acierto, así un cambio de clave o una desactivación invalida también en otros procesos
+def _clave_version_usuario(user_id):
+    return f'usuarios:version:{user_id}'
+
+
+def version_usuario(user_id):
+    # Sin la clave (expulsada) nace otra versión: las entradas guardadas con la anterior no sirven
+    return _version(_clave_version_usuario(user_id))
+
+
+def invalidar_version_usuario(user_id):
+    _renovar_version(_clave_version_usuario(user_id))
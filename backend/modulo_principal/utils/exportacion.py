@@ -0,0 +1,139 @@
+import csv
+import io
+import json
+import zlib
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections, transaction
+from django.http import StreamingHttpResponse
+
+FORMATOS = {
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+}
+# Filas leídas por viaje al cursor de servidor y filas por trozo enviado
+CHUNK_BD = 2000
+FILAS_POR_ENVIO = 500
+# Cota de la transacción de lectura (PostgreSQL): si el cliente deja de leer más que esto
+# entre dos trozos, el servidor corta la sesión y la descarga se interrumpe
+INACTIVIDAD_MAXIMA_MS = 60_000
+
+
+def _filas(queryset, rutas):
+    """
+    Itera dentro de una transacción: fuera de ella Django declara el cursor de servidor
+    WITH HOLD y PostgreSQL materializa el resultado completo al hacer commit (no hay
+    streaming). Además el volcado sale de un snapshot consistente.
+
+    La transacción queda abierta mientras dure la descarga (la marca el cliente): con
+    idle_in_transaction_session_timeout un cliente detenido no la retiene indefinidamente.
+    """
+    conexion = connections[queryset.db]
+    with transaction.atomic(using=queryset.db):
+        if conexion.vendor == 'postgresql':
+            with conexion.cursor() as cursor:
+                cursor.execute(f"SET LOCAL idle_in_transaction_session_timeout = {INACTIVIDAD_MAXIMA_MS}")
+        yield from queryset.values_list(*rutas).iterator(chunk_size=CHUNK_BD)
+
+
+class _IteradorAsgi:
+    """
+    Versión async del iterador de trozos, para ASGI: con un iterador sync,
+    StreamingHttpResponse.__aiter__ lo consume entero (sync_to_async(list)) antes de
+    enviar el primer byte. Cada trozo se pide con thread_sensitive=True, o sea en el hilo
+    de esta request (ASGIHandler abre un ThreadSensitiveContext por request): el cursor
+    de servidor y la transacción viven en la conexión de ese hilo.
+
+    close() es sync a propósito: StreamingHttpResponse lo registra y ASGIHandler lo llama
+    en ese mismo hilo al terminar. Si el cliente corta, request_finished cierra la conexión.
+    """
+
+    def __init__(self, trozos, filas):
+        self.trozos, self.filas = trozos, filas
+        self.siguiente = sync_to_async(lambda: next(trozos, None), thread_sensitive=True)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        trozo = await self.siguiente()
+        if trozo is None:
+            await sync_to_async(self.close, thread_sensitive=True)()
+            raise StopAsyncIteration
+        return trozo
+
+    def close(self):
+        self.trozos.close()
+        self.filas.close()
+
+
+def _lineas_csv(filas, encabezados):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(encabezados)
+    yield buffer.getvalue()  # El encabezado sale antes de la primera query
+    pendientes = 0
+    for fila in filas:
+        if pendientes == 0:
+            buffer.seek(0)
+            buffer.truncate()
+        writer.writerow(fila)
+        pendientes += 1
+        if pendientes == FILAS_POR_ENVIO:
+            yield buffer.getvalue()
+            pendientes = 0
+    if pendientes:
+        yield buffer.getvalue()
+
+
+def _lineas_ndjson(filas, encabezados):
+    trozo = []
+    for fila in filas:
+        trozo.append(json.dumps(dict(zip(encabezados, fila)), cls=DjangoJSONEncoder, ensure_ascii=False))
+        if len(trozo) == FILAS_POR_ENVIO:
+            yield '\n'.join(trozo) + '\n'
+            trozo = []
+    if trozo:
+        yield '\n'.join(trozo) + '\n'
+
+
+def _gzip(trozos):
+    compresor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 -> formato gzip
+    for trozo in trozos:
+        # Z_SYNC_FLUSH por trozo: el cliente recibe datos de inmediato, no cuando se llena el buffer de deflate
+        yield compresor.compress(trozo) + compresor.flush(zlib.Z_SYNC_FLUSH)
+    yield compresor.flush()
+
+
+def es_asgi(request):
+    return isinstance(getattr(request, '_request', request), ASGIRequest) # Request de DRF o HttpRequest
+
+
+def respuesta_exportacion(queryset, columnas, nombre, formato='csv', comprimir=False, request=None):
+    """
+    StreamingHttpResponse con todas las filas del queryset (ya filtrado por la vista).
+
+    `columnas` es una lista de (ruta ORM, encabezado). Se lee con values_list().iterator():
+    en PostgreSQL es un cursor de servidor, así la memoria no depende del total de filas.
+    Con `request` de ASGI el contenido es un iterador async (ver _IteradorAsgi);
+    con WSGI, uno sync.
+    """
+    tipo, extension = FORMATOS[formato]
+    rutas = [ruta for ruta, _ in columnas]
+    encabezados = [encabezado for _, encabezado in columnas]
+    filas = _filas(queryset, rutas)
+
+    generador = _lineas_csv if formato == 'csv' else _lineas_ndjson
+    trozos = (texto.encode('utf-8') for texto in generador(filas, encabezados))
+    archivo = f'{nombre}.{extension}'
+    if comprimir:
+        trozos = _gzip(trozos)
+        tipo, archivo = 'application/gzip', f'{archivo}.gz'
+
+    if request is not None and es_asgi(request):
+        trozos = _IteradorAsgi(trozos, filas)
+    response = StreamingHttpResponse(trozos, content_type=tipo)
+    response['Content-Disposition'] = f'attachment; filename="{archivo}"'
+    return response
@@ -0,0 +1,258 @@
+import base64
+import binascii
+import datetime
+import json
+from collections import OrderedDict
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db import connections
+from django.db.models import F, Q
+from django.db.models.expressions import OrderBy
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Paginación por cursor (keyset) sobre el ORDEN COMPLETO del queryset.
+
+    A diferencia de rest_framework.CursorPagination (que solo posiciona por el
+    primer campo del orden), aquí el cursor guarda el valor de TODAS las columnas
+    del orden + pk como desempate. Así órdenes como '-activo, -stock_disponible, nombre'
+    quedan estables y cada página es un WHERE (...) > (...) LIMIT n: sin COUNT(*)
+    ni OFFSET, la latencia no crece con la profundidad.
+
+    Requisito: los campos del orden deben ser no nulos.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    total_query_param = 'total'
+    umbral_conteo_exacto = 10000
+    page_size = PageNumberPagination.page_size
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(queryset)
+        filtrado = queryset
+
+        posicion, reversa = self.decode_cursor(request, queryset)
+
+        if posicion is not None:
+            queryset = queryset.filter(self._filtro_keyset(posicion, reversa))
+        queryset = queryset.order_by(*self._order_by(reversa))
+
+        filas = list(queryset[:self.page_size + 1])
+        hay_mas = len(filas) > self.page_size
+        filas = filas[:self.page_size]
+        if reversa:
+            filas.reverse()
+
+        if reversa:
+            tiene_siguiente, tiene_anterior = True, hay_mas
+        else:
+            tiene_siguiente, tiene_anterior = hay_mas, posicion is not None
+
+        self.next_position = self._posicion(filas[-1]) if tiene_siguiente and filas else None
+        self.previous_position = self._posicion(filas[0]) if tiene_anterior and filas else None
+
+        self.total_aproximado = None
+        if request.query_params.get(self.total_query_param) in ('1', 'true'):
+            # Se calcula sobre el queryset filtrado original (sin la condición del cursor)
+            self.total_aproximado = self.estimar_total(filtrado)
+
+        return filas
+
+    def get_paginated_response(self, data):
+        contenido = OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+        ])
+        if self.total_aproximado is not None:
+            contenido['total_aproximado'] = self.total_aproximado
+        contenido['results'] = data
+        return Response(contenido)
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'total_aproximado': {'type': 'integer'},
+                'results': schema,
+            },
+        }
+
+    def get_page_size(self, request):
+        try:
+            solicitado = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(solicitado, self.max_page_size))
+
+    # ----------------------------- Orden ---------------------------------
+    def get_ordering(self, queryset):
+        """Lista de (campo, descendente) tomada del queryset, con pk al final."""
+        orden = queryset.query.order_by or queryset.model._meta.ordering
+        campos = []
+        for item in orden:
+            if isinstance(item, OrderBy) and isinstance(item.expression, F):
+                campos.append((item.expression.name, item.descending))
+            elif isinstance(item, str):
+                campos.append((item.lstrip('-'), item.startswith('-')))
+            else:
+                raise ValueError(f"Orden no soportado por KeysetPagination: {item!r}")
+
+        if not any(campo in ('pk', 'id') for campo, _ in campos):
+            campos.append(('pk', False))
+        return campos
+
+    def _order_by(self, reversa):
+        return [
+            F(campo).asc() if desc == reversa else F(campo).desc()
+            for campo, desc in self.ordering
+        ]
+
+    def _filtro_keyset(self, valores, reversa):
+        """
+        (a, b, c) > (x, y, z)  ==>  a > x OR (a = x AND b > y) OR (a = x AND b = y AND c > z)
+        respetando la dirección de cada columna.
+        """
+        filtro = Q()
+        iguales = Q()
+        for (campo, desc), valor in zip(self.ordering, valores):
+            lookup = 'lt' if desc != reversa else 'gt'
+            filtro |= iguales & Q(**{f'{campo}__{lookup}': valor})
+            iguales &= Q(**{campo: valor})
+        return filtro
+
+    def _posicion(self, instancia):
+        valores = []
+        for campo, _ in self.ordering:
+            if isinstance(instancia, dict):
+                # Fila de values(): las columnas del orden deben estar entre las pedidas
+                valor = instancia['id' if campo == 'pk' else campo]
+            else:
+                valor = instancia
+                for parte in campo.split('__'):
+                    valor = getattr(valor, parte)
+            if isinstance(valor, (datetime.date, datetime.datetime)):
+                valor = valor.isoformat()
+            valores.append(valor)
+        return valores
+
+    # ----------------------------- Cursor --------------------------------
+    def decode_cursor(self, request, queryset):
+        codificado = request.query_params.get(self.cursor_query_param)
+        if not codificado:
+            return None, False
+        try:
+            datos = json.loads(base64.urlsafe_b64decode(codificado.encode('ascii')))
+            valores, reversa = datos['v'], bool(datos.get('r'))
+        except (ValueError, KeyError, TypeError, binascii.Error):
+            raise NotFound('Cursor inválido.')
+        if not isinstance(valores, list) or len(valores) != len(self.ordering):
+            raise NotFound('Cursor inválido.')
+        # El cursor viene del cliente: un valor del tipo equivocado no debe llegar al filtro (500)
+        try:
+            valores = [
+                self._convertir(queryset, campo, valor) for (campo, _), valor in zip(self.ordering, valores)
+            ]
+        except (ValidationError, ValueError, TypeError):
+            raise NotFound('Cursor inválido.')
+        return valores, reversa
+
+    @staticmethod
+    def _convertir(queryset, campo, valor):
+        """
+        Valor del cursor -> tipo Python del campo del orden (sigue relaciones 'a__b').
+        Las anotaciones se convierten con su output_field.
+        """
+        if valor is None: # Los campos del orden son no nulos
+            raise ValueError(campo)
+        anotacion = queryset.query.annotations.get(campo)
+        if anotacion is not None:
+            return anotacion.output_field.to_python(valor)
+        modelo = queryset.model
+        try:
+            for parte in campo.split('__'):
+                field = modelo._meta.pk if parte == 'pk' else modelo._meta.get_field(parte)
+                modelo = field.related_model
+        except FieldDoesNotExist:
+            raise ValueError(campo)
+        if field.is_relation:
+            field = field.target_field
+        return field.to_python(valor)
+
+    def encode_cursor(self, valores, reversa):
+        crudo = json.dumps({'v': valores, 'r': int(reversa)}, separators=(',', ':'))
+        cursor = base64.urlsafe_b64encode(crudo.encode('utf-8')).decode('ascii')
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        return self.encode_cursor(self.next_position, False)
+
+    def get_previous_link(self):
+        if self.previous_position is None:
+            return None
+        return self.encode_cursor(self.previous_position, True)
+
+    # ----------------------------- Total ---------------------------------
+    def estimar_total(self, queryset):
+        """
+        En PostgreSQL usa la estimación del planner (EXPLAIN), que no recorre la tabla.
+        Si la estimación es chica el COUNT(*) exacto es barato y se prefiere.
+        En otros motores cae a COUNT(*).
+        """
+        conexion = connections[queryset.db]
+        if conexion.vendor != 'postgresql':
+            return queryset.count()
+
+        sql, params = queryset.order_by().query.sql_with_params()
+        with conexion.cursor() as cursor:
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        estimado = int(plan[0]['Plan']['Plan Rows'])
+        if estimado <= self.umbral_conteo_exacto:
+            return queryset.count()
+        return estimado
+
+
+class InventarioPagination(PageNumberPagination):
+    """
+    Paginación por defecto (número de página) con modo cursor opt-in:
+    si la petición trae ?cursor= (aunque vaya vacío) se usa KeysetPagination.
+    """
+    cursor_class = KeysetPagination
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.cursor_class.cursor_query_param in request.query_params:
+            self._cursor = self.cursor_class()
+            return self._cursor.paginate_queryset(queryset, request, view)
+        self._cursor = None
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self._cursor is not None:
+            return self._cursor.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def get_next_link(self):
+        if self._cursor is not None:
+            return self._cursor.get_next_link()
+        return super().get_next_link()
+
+    def get_previous_link(self):
+        if self._cursor is not None:
+            return self._cursor.get_previous_link()
+        return super().get_previous_link()
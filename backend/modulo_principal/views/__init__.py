@@ -1,8 +1,11 @@
 from .usuariosViews import UsuarioViewSet, UserProfileView
 from .tokenAuthViews import CookieTokenObtainPairView,CookieTokenRefreshView,LogoutView
-from .inventarioViews import ProductoViewSet, LaboratorioViewSet, LoteViewSet,GlobalSearchView
+from .inventarioViews import ProductoViewSet, LaboratorioViewSet, LoteViewSet,GlobalSearchView, GlobalSearchAsyncView, AutocompletarView
+from .reportesViews import ReporteVencimientosView
+from .importacionViews import ImportacionViewSet
 __all__ = [
     'UsuarioViewSet','UserProfileView',
     'CookieTokenObtainPairView','CookieTokenRefreshView',
-    'LogoutView','ProductoViewSet','LaboratorioViewSet','LoteViewSet','GlobalSearchView'
+    'LogoutView','ProductoViewSet','LaboratorioViewSet','LoteViewSet','GlobalSearchView','GlobalSearchAsyncView',
+    'AutocompletarView','ReporteVencimientosView','ImportacionViewSet'
 ]
\ No newline at end of file
@@ -0,0 +1,72 @@
+from rest_framework import mixins, status, viewsets
+from rest_framework.decorators import action
+from rest_framework.permissions import AllowAny
+from rest_framework.response import Response
+
+from ..importacion import get_importador, importar, reanudar
+from ..models import ImportacionInventario
+from ..serializers import ImportacionArchivoSerializer, ImportacionSerializer
+from ..utils.exportacion import respuesta_exportacion
+
+# Filas con error incluidas en la respuesta; el resto en /errores/
+MUESTRA_ERRORES = 50
+
+
+class ImportacionViewSet(mixins.ListModelMixin, mixins.RetrieveModelMixin, viewsets.GenericViewSet):
+    """
+    POST   /importaciones/                 archivo + tipo (+ aplicar=false para solo validar)
+    POST   /importaciones/{id}/reanudar/   retoma una importación interrumpida (mismo archivo)
+    POST   /importaciones/{id}/aplicar/    aplica una importación validada
+    GET    /importaciones/{id}/errores/    reporte completo de filas rechazadas (CSV)
+    """
+    permission_classes = [AllowAny] # quitar en produccion
+    authentication_classes = [] # quitar en produccion
+
+    queryset = ImportacionInventario.objects.all()
+    serializer_class = ImportacionSerializer
+
+    def create(self, request):
+        entrada = ImportacionArchivoSerializer(data=request.data)
+        entrada.is_valid(raise_exception=True)
+        archivo = entrada.validated_data.get('archivo')
+        tipo = entrada.validated_data.get('tipo')
+        if archivo is None or tipo is None:
+            return Response({"detail": "Se requieren 'archivo' y 'tipo'."}, status=status.HTTP_400_BAD_REQUEST)
+
+        # ValidationError de Django -> 400 vía custom_exception_handler
+        importacion = importar(tipo, archivo, nombre_archivo=archivo.name, aplicar=entrada.validated_data['aplicar'])
+        return Response(self.resumen(importacion), status=status.HTTP_201_CREATED)
+
+    @action(detail=True, methods=['post'])
+    def reanudar(self, request, pk=None):
+        entrada = ImportacionArchivoSerializer(data=request.data)
+        entrada.is_valid(raise_exception=True)
+        importacion = reanudar(
+            self.get_object(), entrada.validated_data.get('archivo'), aplicar=entrada.validated_data['aplicar']
+        )
+        return Response(self.resumen(importacion))
+
+    @action(detail=True, methods=['post'])
+    def aplicar(self, request, pk=None):
+        importacion = self.get_object()
+        get_importador(importacion).aplicar()
+        return Response(self.resumen(importacion))
+
+    @action(detail=True, methods=['get'])
+    def errores(self, request, pk=None):
+        importacion = self.get_object()
+        importador = get_importador(importacion)
+        columnas = [(c, c) for c in ('fila', *importador.columnas_reporte, 'errores')]
+        return respuesta_exportacion(
+            importador.reporte_errores(), columnas, f'importacion_{importacion.pk}_errores', request=request
+        )
+
+    def retrieve(self, request, pk=None):
+        return Response(self.resumen(self.get_object()))
+
+    def resumen(self, importacion):
+        datos = ImportacionSerializer(importacion).data
+        datos['errores'] = list(
+            get_importador(importacion).reporte_errores().values('fila', 'errores')[:MUESTRA_ERRORES]
+        )
+        return datos
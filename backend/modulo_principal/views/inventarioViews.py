@@ -1,27 +1,92 @@
-from rest_framework import viewsets, filters
+from rest_framework import viewsets, filters, status
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.decorators import action
-from django.db.models import Q, Case, When, Value, BooleanField, Sum, F
+from datetime import datetime, time
 
-from ..models import Producto, Laboratorio, Lote
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Q, Case, When, Value, BooleanField, F
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.views import View
+
+from ..models import Producto, Laboratorio, Lote, SnapshotStock
+from ..utils.pagination import InventarioPagination
+from ..utils.exportacion import FORMATOS, respuesta_exportacion
+from ..search import get_search_backend
+from ..search.autocompletado import indice_autocompletado
 from ..serializers import (
     ProductoSerializer,
     LaboratorioSerializer,
-    LoteSerializer
+    LoteSerializer,
+    LoteBloqueSerializer,
+    MovimientoStockSerializer,
+    ValoresSerializer
 )
 
+class LecturaRapidaMixin:
+    """
+    list/retrieve desde filas de .values() con `lectura_rapida` (ValoresSerializer del
+    serializer_class): mismo JSON, sin instanciar modelos. Escrituras usan serializer_class.
+    """
+    lectura_rapida = None
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset()).values(*self.lectura_rapida.columnas)
+        pagina = self.paginate_queryset(queryset)
+        if pagina is not None:
+            return self.get_paginated_response(self.lectura_rapida.serializar(pagina))
+        return Response(self.lectura_rapida.serializar(queryset))
+
+    def retrieve(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset()).values(*self.lectura_rapida.columnas)
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        fila = get_object_or_404(queryset, **{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        self.check_object_permissions(request, fila)
+        return Response(self.lectura_rapida.serializar_fila(fila))
+
+
+class ExportacionMixin:
+    """
+    GET .../exportar/?formato=csv|ndjson&gzip=1 con los mismos filtros, búsqueda y orden
+    que el listado, pero sin paginar: todas las filas en streaming (ver utils.exportacion).
+    """
+    columnas_exportacion = []
+    nombre_exportacion = 'exportacion'
+
+    @action(detail=False, methods=['get'], pagination_class=None)
+    def exportar(self, request):
+        formato = request.query_params.get('formato', 'csv')
+        if formato not in FORMATOS:
+            return Response(
+                {"detail": f"Formato no soportado. Opciones: {', '.join(FORMATOS)}."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        comprimir = request.query_params.get('gzip') in ('1', 'true')
+        queryset = self.filter_queryset(self.get_queryset())
+        if not request.query_params.get('ordering'):
+            # Cualquier ORDER BY obliga a ordenar la tabla completa antes de la primera fila
+            # (el plan con joins termina en un Sort). Sin orden, el volcado sale de inmediato
+            queryset = queryset.order_by()
+        return respuesta_exportacion(
+            queryset, self.columnas_exportacion, self.nombre_exportacion, formato, comprimir, request=request
+        )
+
+
 # ---------------------------------------------------------
 # 1. LABORATORIOS
 # ---------------------------------------------------------
-class LaboratorioViewSet(viewsets.ModelViewSet):
+class LaboratorioViewSet(LecturaRapidaMixin, viewsets.ModelViewSet):
     permission_classes = [AllowAny] # quitar en produccion
     authentication_classes = [] # quitar en produccion
 
     queryset = Laboratorio.objects.all()
     serializer_class = LaboratorioSerializer
+    lectura_rapida = ValoresSerializer(LaboratorioSerializer)
     
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
     search_fields = ['nombre', 'telefono'] # Agregué teléfono por si acaso
@@ -38,11 +103,14 @@ class LaboratorioViewSet(viewsets.ModelViewSet):
 # ---------------------------------------------------------
 # 2. PRODUCTOS (El cerebro de la operación)
 # ---------------------------------------------------------
-class ProductoViewSet(viewsets.ModelViewSet):
+class ProductoViewSet(LecturaRapidaMixin, ExportacionMixin, viewsets.ModelViewSet):
     permission_classes = [AllowAny] # quitar en produccion
     authentication_classes = [] # quitar en produccion
 
     serializer_class = ProductoSerializer
+    lectura_rapida = ValoresSerializer(ProductoSerializer)
+    # ?cursor= activa paginación keyset (sin COUNT ni OFFSET) sobre el Smart Sorting
+    pagination_class = InventarioPagination
     
     # Configuración de Filtros Potenciada
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
@@ -55,12 +123,22 @@ class ProductoViewSet(viewsets.ModelViewSet):
     filterset_fields = {
         'laboratorio': ['exact'],
         'activo': ['exact'],
+        'tiene_stock': ['exact'],
         'es_bioequivalente': ['exact'],
         'cantidad_mg': ['gte', 'lte', 'exact'], # Permite filtrar "más de 500mg"
     }
     
     # 3. Ordenamiento manual (Click en cabeceras de tabla)
-    ordering_fields = ['nombre', 'precio_venta', 'cantidad_mg', 'laboratorio__nombre']
+    ordering_fields = ['nombre', 'precio_venta', 'cantidad_mg', 'laboratorio__nombre', 'stock_disponible']
+
+    nombre_exportacion = 'productos'
+    columnas_exportacion = [
+        ('id', 'id'), ('nombre', 'nombre'), ('codigo_serie', 'codigo_serie'),
+        ('laboratorio_id', 'laboratorio_id'), ('laboratorio__nombre', 'laboratorio'),
+        ('cantidad_mg', 'cantidad_mg'), ('cantidad_capsulas', 'cantidad_capsulas'),
+        ('es_bioequivalente', 'es_bioequivalente'), ('precio_venta', 'precio_venta'),
+        ('stock_disponible', 'stock_disponible'), ('activo', 'activo'),
+    ]
 
     def get_queryset(self):
         """
@@ -71,18 +149,11 @@ class ProductoViewSet(viewsets.ModelViewSet):
         """
         qs = Producto.objects.select_related('laboratorio')
         
-        # Anotamos el stock total sumando lotes activos
-        # Coalesce(Sum(...), 0) se asegura de que si no hay lotes devuelva 0 en vez de None
-        qs = qs.annotate(
-            total_stock_disponible=Sum(
-                'lotes__cantidad', 
-                filter=Q(lotes__activo=True, lotes__defectuoso=False)
-            )
-        )
-        
         # Lógica de Ordenamiento por defecto:
         # Primero los ACTIVOS, luego los que tienen MÁS STOCK, luego por NOMBRE
-        return qs.order_by('-activo', F('total_stock_disponible').desc(nulls_last=True), 'nombre')
+        # stock_disponible es un contador persistido (lo mantiene Lote.save), así el orden
+        # usa el índice producto_orden_stock_idx en vez de agrupar toda la tabla de lotes
+        return qs.order_by('-activo', '-stock_disponible', 'nombre')
 
     @action(detail=False, methods=['get'], pagination_class=None)
     def simple_list(self, request):
@@ -94,11 +165,15 @@ class ProductoViewSet(viewsets.ModelViewSet):
 # ---------------------------------------------------------
 # 3. LOTES (Gestión de fechas)
 # ---------------------------------------------------------
-class LoteViewSet(viewsets.ModelViewSet):
+class LoteViewSet(LecturaRapidaMixin, ExportacionMixin, viewsets.ModelViewSet):
     permission_classes = [AllowAny] # quitar en produccion
     authentication_classes = [] # quitar en produccion
     
     serializer_class = LoteSerializer
+    lectura_rapida = ValoresSerializer(LoteSerializer)
+    pagination_class = InventarioPagination
+    MAX_LOTES_BULK = 5000
+    MAX_MOVIMIENTOS = 500
     
     # Bloqueamos DELETE directo en la API por seguridad (ya lo tienes en el modelo, pero doble capa)
     # http_method_names = ['get', 'post', 'put', 'patch', 'head', 'options'] 
@@ -121,6 +196,16 @@ class LoteViewSet(viewsets.ModelViewSet):
 
     ordering_fields = ['fecha_vencimiento', 'fecha_creacion', 'cantidad']
 
+    nombre_exportacion = 'lotes'
+    columnas_exportacion = [
+        ('id', 'id'), ('codigo_lote', 'codigo_lote'),
+        ('fecha_creacion', 'fecha_creacion'), ('fecha_vencimiento', 'fecha_vencimiento'),
+        ('cantidad', 'cantidad'), ('defectuoso', 'defectuoso'), ('activo', 'activo'),
+        ('producto_id', 'producto_id'), ('producto__nombre', 'producto'),
+        ('producto__codigo_serie', 'codigo_serie'), ('producto__precio_venta', 'precio_venta'),
+        ('producto__laboratorio__nombre', 'laboratorio'),
+    ]
+
     def get_queryset(self):
         """
         Smart Sorting Lotes:
@@ -134,10 +219,109 @@ class LoteViewSet(viewsets.ModelViewSet):
             'fecha_vencimiento' # Ascendente -> Los que vencen pronto arriba
         )
 
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def bulk(self, request):
+        """
+        Recepción masiva: POST con una lista de lotes. Todo o nada (una transacción);
+        si hay errores responde 400 con {indice_fila: [mensajes]}.
+        """
+        if not isinstance(request.data, list) or not request.data:
+            return Response({"detail": "Se espera una lista de lotes."}, status=status.HTTP_400_BAD_REQUEST)
+        if len(request.data) > self.MAX_LOTES_BULK:
+            return Response(
+                {"detail": f"Máximo {self.MAX_LOTES_BULK} lotes por envío."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        serializer = LoteBloqueSerializer(data=request.data, many=True)
+        if not serializer.is_valid():
+            errores = {str(i): e for i, e in enumerate(serializer.errors) if e}
+            return Response(errores, status=status.HTTP_400_BAD_REQUEST)
+
+        lotes = [serializer.child.to_lote(datos) for datos in serializer.validated_data]
+        # ValidationError de Django -> 400 vía custom_exception_handler
+        creados = Lote.objects.crear_en_bloque(lotes)
+        return Response(
+            {'creados': len(creados), 'ids': [lote.pk for lote in creados]},
+            status=status.HTTP_201_CREATED
+        )
+
+    @action(detail=True, methods=['get', 'post'], pagination_class=None)
+    def movimientos(self, request, pk=None):
+        """
+        GET: historial del lote (más recientes primero, ?limite=, máx. MAX_MOVIMIENTOS).
+        POST {tipo, cantidad, referencia}: registra un movimiento con signo y ajusta la cantidad.
+        """
+        lote = self.get_object()
+        if request.method == 'POST':
+            serializer = MovimientoStockSerializer(data=request.data)
+            serializer.is_valid(raise_exception=True)
+            # ValidationError (stock insuficiente) -> 400 vía custom_exception_handler
+            movimiento = lote.mover_stock(**serializer.validated_data)
+            return Response(MovimientoStockSerializer(movimiento).data, status=status.HTTP_201_CREATED)
+
+        try:
+            # Acotado a [1, MAX_MOVIMIENTOS]: un slice negativo del queryset sería un 500
+            limite = max(1, min(int(request.query_params.get('limite', self.MAX_MOVIMIENTOS)), self.MAX_MOVIMIENTOS))
+        except ValueError:
+            limite = self.MAX_MOVIMIENTOS
+        data = lote.movimientos.order_by('-fecha', '-id').values(
+            'id', 'tipo', 'cantidad', 'fecha', 'referencia'
+        )[:limite]
+        return Response(list(data))
+
+    @action(detail=False, methods=['get'], url_path='stock-al')
+    def stock_al(self, request):
+        """
+        ?fecha=YYYY-MM-DD: cantidad de cada lote al cierre de ese día, con los mismos
+        filtros que el listado. Lee un snapshot + los movimientos posteriores por lote.
+        """
+        try:
+            dia = datetime.strptime(request.query_params.get('fecha', ''), '%Y-%m-%d').date()
+        except ValueError:
+            return Response({"detail": "Parámetro fecha requerido (YYYY-MM-DD)."}, status=status.HTTP_400_BAD_REQUEST)
+        momento = timezone.make_aware(datetime.combine(dia, time.max))
+
+        queryset = SnapshotStock.objects.anotar_stock_al(self.filter_queryset(self.get_queryset()), momento)
+        pagina = self.paginate_queryset(queryset)
+        data = [
+            {'id': lote.id, 'codigo_lote': lote.codigo_lote, 'producto': lote.producto_id, 'stock': lote.stock_al}
+            for lote in (pagina if pagina is not None else queryset)
+        ]
+        if pagina is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
+
 
 # ---------------------------------------------------------
 # 4. BUSQUEDA GLOBAL (Optimized)
 # ---------------------------------------------------------
+def formatear_busqueda_global(resultados):
+    """Formato de la caja de búsqueda a partir de las secciones del backend (dicts de values())."""
+    return {
+        'productos': [{
+            'id': p['id'],
+            'titulo': p['nombre'],
+            'subtitulo': f"{p['cantidad_mg']}mg - {p['laboratorio__nombre']}",
+            'extra': p['codigo_serie']
+        } for p in resultados['productos']],
+        
+        'lotes': [{
+            'id': l['id'],
+            'titulo': f"Lote: {l['codigo_lote']}",
+            'subtitulo': f"Vence: {l['fecha_vencimiento']}",
+            'extra': l['producto__nombre']
+        } for l in resultados['lotes']],
+        
+        'laboratorios': [{
+            'id': l['id'],
+            'titulo': l['nombre'],
+            'subtitulo': l['telefono'] or "Sin teléfono",
+            'extra': ''
+        } for l in resultados['laboratorios']]
+    }
+
+
 class GlobalSearchView(APIView):
     """
     Busca simultáneamente en Productos, Lotes y Laboratorios.
@@ -151,45 +335,60 @@ class GlobalSearchView(APIView):
         if len(query) < 3:
             return Response([]) 
 
-        # Optimizamos consultas con select_related y values para traer solo lo necesario
-        # PRODUCTOS
-        productos = Producto.objects.filter(
-            Q(nombre__icontains=query) | 
-            Q(codigo_serie__icontains=query) | 
-            Q(laboratorio__nombre__icontains=query)
-        ).select_related('laboratorio').only('id', 'nombre', 'cantidad_mg', 'laboratorio__nombre', 'codigo_serie')[:5]
-
-        # LOTES
-        lotes = Lote.objects.filter(
-            codigo_lote__icontains=query
-        ).select_related('producto').only('id', 'codigo_lote', 'fecha_vencimiento', 'producto__nombre')[:5]
-
-        # LABORATORIOS
-        laboratorios = Laboratorio.objects.filter(
-            nombre__icontains=query
-        ).only('id', 'nombre', 'telefono')[:5]
-
-        data = {
-            'productos': [{
-                'id': p.id,
-                'titulo': p.nombre,
-                'subtitulo': f"{p.cantidad_mg}mg - {p.laboratorio.nombre}",
-                'extra': p.codigo_serie
-            } for p in productos],
-            
-            'lotes': [{
-                'id': l.id,
-                'titulo': f"Lote: {l.codigo_lote}",
-                'subtitulo': f"Vence: {l.fecha_vencimiento}",
-                'extra': l.producto.nombre
-            } for l in lotes],
-            
-            'laboratorios': [{
-                'id': l.id,
-                'titulo': l.nombre,
-                'subtitulo': l.telefono or "Sin teléfono",
-                'extra': ''
-            } for l in laboratorios]
-        }
-
-        return Response(data)
\ No newline at end of file
+        # El backend (trigramas en PostgreSQL, tabla de tokens si no) usa índices
+        # y devuelve cada sección ordenada por relevancia como dicts (values())
+        resultados = get_search_backend().buscar(query, limite=5)
+        return Response(formatear_busqueda_global(resultados))
+
+
+class GlobalSearchAsyncView(View):
+    """
+    Misma búsqueda y formato que GlobalSearchView, pero las tres secciones se consultan
+    en paralelo (BaseSearchBackend.abuscar): latencia = la sección más lenta, no la suma.
+    Pensada para base.asgi (bajo WSGI funciona igual, pero un hilo por request).
+    DRF no soporta vistas async: es una View de Django y responde JsonResponse.
+
+    Si una sección excede BUSQUEDA_ASYNC['TIMEOUT_SECCION'] vuelve vacía y se lista
+    en 'incompletas'; las demás se responden igual.
+    """
+
+    async def get(self, request):
+        query = request.GET.get('q', '').strip()
+
+        if len(query) < 3:
+            return JsonResponse([], safe=False)
+
+        # get_search_backend() puede consultar la BD la primera vez (pg_trgm instalado?)
+        backend = await sync_to_async(get_search_backend)()
+        resultados = await backend.abuscar(
+            query, limite=5, timeout=settings.BUSQUEDA_ASYNC['TIMEOUT_SECCION']
+        )
+        data = formatear_busqueda_global(resultados)
+        if resultados['incompletas']:
+            data['incompletas'] = resultados['incompletas']
+        return JsonResponse(data)
+
+
+# ---------------------------------------------------------
+# 5. AUTOCOMPLETADO (Índice en memoria, sin BD)
+# ---------------------------------------------------------
+class AutocompletarView(APIView):
+    """
+    Sugerencias por prefijo para la caja de búsqueda del mesón.
+    Responde desde el índice en memoria del proceso (ver search.autocompletado).
+    """
+    permission_classes = [AllowAny] 
+    authentication_classes = []
+
+    def get(self, request):
+        query = request.query_params.get('q', '').strip()
+
+        if len(query) < 3:
+            return Response([])
+
+        try:
+            limite = int(request.query_params.get('limite', 0)) or None
+        except ValueError:
+            limite = None
+
+        return Response(indice_autocompletado.buscar(query, limite=limite))
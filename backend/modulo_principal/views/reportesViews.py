@@ -0,0 +1,97 @@
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db.models import Case, Count, F, IntegerField, Sum, Value, When
+from django.utils import timezone
+from rest_framework.permissions import AllowAny
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from ..models import Lote
+from ..utils.cache import version_lotes
+
+# Horizontes en días: cada tramo es (anterior, horizonte]. 0 = ya vencidos.
+HORIZONTES = [30, 60, 90, 180]
+
+
+def _tramos():
+    return ['vencidos'] + [
+        f"{desde + 1}-{hasta}" for desde, hasta in zip([0] + HORIZONTES, HORIZONTES)
+    ]
+
+
+def calcular_reporte_vencimientos(hoy):
+    """
+    Una sola query agregada: filtra por el índice lote_vigencia_idx
+    (activo, defectuoso, fecha_vencimiento) y agrupa por tramo y laboratorio.
+    """
+    tramos = _tramos()
+    tramo = Case(
+        When(fecha_vencimiento__lt=hoy, then=Value(0)),
+        *[
+            When(fecha_vencimiento__lte=hoy + timedelta(days=dias), then=Value(i + 1))
+            for i, dias in enumerate(HORIZONTES)
+        ],
+        output_field=IntegerField(),
+    )
+    filas = (
+        Lote.objects.filter(
+            activo=True,
+            defectuoso=False,
+            fecha_vencimiento__lte=hoy + timedelta(days=HORIZONTES[-1]),
+        )
+        .order_by()
+        .values('producto__laboratorio_id', 'producto__laboratorio__nombre', tramo=tramo)
+        .annotate(
+            unidades=Sum('cantidad'),
+            lotes=Count('id'),
+            valor=Sum(F('cantidad') * F('producto__precio_venta')),
+        )
+    )
+
+    def vacio():
+        return {nombre: {'unidades': 0, 'lotes': 0, 'valor': 0} for nombre in tramos}
+
+    totales = vacio()
+    por_laboratorio = {}
+    for fila in filas:
+        nombre_tramo = tramos[fila['tramo']]
+        lab_id = fila['producto__laboratorio_id']
+        lab = por_laboratorio.setdefault(lab_id, {
+            'laboratorio_id': lab_id,
+            'laboratorio': fila['producto__laboratorio__nombre'],
+            'tramos': vacio(),
+        })
+        for destino in (lab['tramos'][nombre_tramo], totales[nombre_tramo]):
+            destino['unidades'] += fila['unidades']
+            destino['lotes'] += fila['lotes']
+            destino['valor'] += fila['valor']
+
+    return {
+        'fecha': hoy.isoformat(),
+        'horizontes': HORIZONTES,
+        'totales': totales,
+        # Primero los laboratorios con más valor en riesgo
+        'por_laboratorio': sorted(
+            por_laboratorio.values(),
+            key=lambda lab: -sum(t['valor'] for t in lab['tramos'].values())
+        ),
+    }
+
+
+class ReporteVencimientosView(APIView):
+    """
+    Stock por vencer a 30/60/90/180 días (unidades, lotes y valor a precio de venta),
+    por laboratorio. Se cachea hasta el próximo cambio en lotes (ver utils.cache).
+    """
+    permission_classes = [AllowAny] # quitar en produccion
+    authentication_classes = [] # quitar en produccion
+
+    def get(self, request):
+        hoy = timezone.localdate()
+        clave = f"reporte_vencimientos:{hoy.isoformat()}:v{version_lotes()}"
+        reporte = cache.get(clave)
+        if reporte is None:
+            reporte = calcular_reporte_vencimientos(hoy)
+            cache.set(clave, reporte, timeout=60 * 60 * 24)
+        return Response(reporte)
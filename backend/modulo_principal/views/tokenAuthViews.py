@@ -5,6 +5,9 @@ from rest_framework import status
 from django.conf import settings
 from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
 from rest_framework.permissions import AllowAny
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from ..revocacion import registro_revocaciones
 
 
 class CookieTokenObtainPairView(TokenObtainPairView):
@@ -88,7 +91,19 @@ class CookieTokenRefreshView(TokenRefreshView):
             path=settings.AUTH_COOKIE_PATH,
         )
 
-        
+        # Con rotación el refresh anterior quedó revocado: la cookie debe llevar el nuevo
+        refresh_rotado = serializer.validated_data.get('refresh')
+        if refresh_rotado:
+            response.set_cookie(
+                key=settings.AUTH_COOKIE_REFRESH,
+                value=refresh_rotado,
+                domain="localhost",
+                httponly=settings.AUTH_COOKIE_HTTP_ONLY,
+                secure=settings.AUTH_COOKIE_SECURE,
+                samesite=settings.AUTH_COOKIE_SAMESITE,
+                path=settings.AUTH_COOKIE_PATH
+            )
+
         del response.data['access']
         if 'refresh' in response.data:
             del response.data['refresh']
@@ -100,6 +115,17 @@ class LogoutView(APIView):
     permission_classes =[AllowAny]
 
     def post(self, request):
+        # Revoca los tokens de las cookies: borrarlas no basta si alguien guardó una copia.
+        # Un token inválido o vencido no necesita revocación
+        for nombre_cookie, token_class in ((settings.AUTH_COOKIE_REFRESH, RefreshToken), (settings.AUTH_COOKIE, AccessToken)):
+            raw_token = request.COOKIES.get(nombre_cookie)
+            if not raw_token:
+                continue
+            try:
+                registro_revocaciones.revocar_token(token_class(raw_token))
+            except TokenError:
+                pass
+
         response = Response({"message":"Logout exitoso"},status=status.HTTP_200_OK)
 
         response.delete_cookie(settings.AUTH_COOKIE)
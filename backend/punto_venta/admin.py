@@ -1,3 +1,5 @@
 from django.contrib import admin
+from .models import Terminal, Venta
 
-# Register your models here.
+admin.site.register(Terminal)
+admin.site.register(Venta)
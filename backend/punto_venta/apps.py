@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class PuntoVentaConfig(AppConfig):
     name = 'punto_venta'
+
+    def ready(self):
+        from . import signals # noqa: F401 (registra los receivers)
@@ -0,0 +1,336 @@
+"""
+Tabla de códigos de barra del mostrador: codigo_serie -> precio, nombre, mg, laboratorio
+y stock, en memoria del proceso. Un escaneo no toca la BD.
+
+Representación compacta (sin un dict ni una tupla por producto):
+- Arrays tipados paralelos ordenados por clave; la búsqueda es un bisect en O(log n).
+- Clave de un EAN (solo dígitos): int(codigo) << 4 | largo, así '0001' y '01' no chocan.
+  Los códigos no numéricos (SKU internos) reciben claves negativas de un dict aparte.
+- Los nombres de laboratorio se guardan una vez; cada producto guarda su índice.
+- Un segundo par de arrays (id ordenado -> clave) ubica un producto por id sin recorrer la tabla.
+
+Frescura:
+- post_save/post_delete y las señales en bloque releen los productos tocados al confirmar.
+- Las ventas (UPDATE directo, sin señales) descuentan el stock local al confirmar.
+- Lo cambiado en otros procesos llega con una sincronización cada SINCRONIZACION_SEGUNDOS:
+  una query por Producto.actualizado posterior a la marca de la anterior (menos un margen).
+  Corre en un hilo aparte: el escaneo que la dispara responde con lo ya cargado.
+- Cada REFRESCO_COMPLETO_SEGUNDOS se reconstruye entera: recoge los borrados de otros procesos.
+
+Se precarga al arrancar solo si CODIGOS_BARRA['PRECARGAR'] está activo (base/wsgi.py y
+base/asgi.py), o con python manage.py precargar_codigos; si no, se construye en el primer escaneo.
+"""
+import logging
+import sys
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from datetime import timedelta
+from operator import itemgetter
+
+from django.conf import settings
+from django.db import DatabaseError, connection
+from django.utils import timezone
+
+from modulo_principal.models import Producto
+
+logger = logging.getLogger('punto_venta.codigos')
+
+CONFIG_POR_DEFECTO = {
+    'SINCRONIZACION_SEGUNDOS': 2,       # Desfase máximo con cambios hechos en otros procesos
+    'MARGEN_SEGUNDOS': 2,               # Solape: transacciones que confirmaron tarde, relojes desfasados
+    'REFRESCO_COMPLETO_SEGUNDOS': 3600,
+    'PRECARGAR': False,
+    'SEGUNDO_PLANO': True,              # False: la sincronización corre en el escaneo que la dispara
+}
+COLUMNAS = (
+    'id', 'codigo_serie', 'nombre', 'cantidad_mg', 'precio_venta', 'stock_disponible',
+    'activo', 'laboratorio__nombre', 'actualizado',
+)
+
+
+def clave_numerica(codigo):
+    """Clave de un código de solo dígitos ASCII (EAN-13 y similares); None si no lo es."""
+    if codigo and len(codigo) < 16 and codigo.isascii() and codigo.isdigit():
+        return int(codigo) << 4 | len(codigo)
+    return None
+
+
+def _clave(codigo, claves_texto, textos, crear=True):
+    clave = clave_numerica(codigo)
+    if clave is None:
+        clave = claves_texto.get(codigo)
+        if clave is None and crear:
+            textos.append(codigo)
+            clave = claves_texto[codigo] = -len(textos)
+    return clave
+
+
+def _indice(valor, valores, indices):
+    indice = indices.get(valor)
+    if indice is None:
+        valores.append(valor)
+        indice = indices[valor] = len(valores) - 1
+    return indice
+
+
+class TablaCodigos:
+
+    def __init__(self):
+        config = {**CONFIG_POR_DEFECTO, **getattr(settings, 'CODIGOS_BARRA', {})}
+        self.sincronizacion_segundos = config['SINCRONIZACION_SEGUNDOS']
+        self.margen = timedelta(seconds=config['MARGEN_SEGUNDOS'])
+        self.refresco_completo_segundos = config['REFRESCO_COMPLETO_SEGUNDOS']
+        self.precargar_al_iniciar = config['PRECARGAR']
+        self.segundo_plano = config['SEGUNDO_PLANO']
+        self._lock = threading.RLock()
+        self._lock_sincronizacion = threading.Lock()
+        self.reiniciar()
+
+    def reiniciar(self):
+        with self._lock:
+            self._claves = array('q')       # Ordenada; el resto de columnas va en paralelo
+            self._ids = array('q')
+            self._precios = array('I')
+            self._mg = array('I')
+            self._stock = array('I')
+            self._laboratorio = array('I')  # Índice en _laboratorios
+            self._actualizado = array('d')  # Producto.actualizado (timestamp) de lo cargado
+            self._activos = bytearray()
+            self._nombres = []
+            self._ids_ordenados = array('q')  # id -> clave, ordenado por id
+            self._claves_por_id = array('q')
+            self._laboratorios = []
+            self._indice_laboratorio = {}
+            self._claves_texto = {}         # Código no numérico -> clave negativa
+            self._textos = []
+            self._marca = None              # Hasta dónde se sincronizó (hora de la última query)
+            self._construido_en = None
+            self._sincronizado_en = 0.0
+
+    @property
+    def construida(self):
+        return self._construido_en is not None
+
+    def __len__(self):
+        return len(self._claves)
+
+    # ------------------------------ Consulta ------------------------------
+    def buscar(self, codigo):
+        """dict con los datos del producto, o None si el código no existe."""
+        self._asegurar_fresca()
+        with self._lock:
+            i = self._posicion(_clave(codigo, self._claves_texto, self._textos, crear=False))
+            if i is None:
+                return None
+            return {
+                'id': self._ids[i],
+                'codigo_serie': codigo,
+                'nombre': self._nombres[i],
+                'cantidad_mg': self._mg[i],
+                'laboratorio': self._laboratorios[self._laboratorio[i]],
+                'precio_venta': self._precios[i],
+                'stock_disponible': self._stock[i],
+                'activo': bool(self._activos[i]),
+            }
+
+    def _posicion(self, clave):
+        if clave is None:
+            return None
+        i = bisect_left(self._claves, clave)
+        if i < len(self._claves) and self._claves[i] == clave:
+            return i
+        return None
+
+    def _posicion_id(self, producto_id):
+        j = bisect_left(self._ids_ordenados, producto_id)
+        if j < len(self._ids_ordenados) and self._ids_ordenados[j] == producto_id:
+            return self._posicion(self._claves_por_id[j])
+        return None
+
+    # ------------------------------ Construcción ------------------------------
+    def construir(self):
+        """Carga completa: una query, las columnas se arman fuera del lock y se reemplazan juntas."""
+        claves_texto, textos, laboratorios, indice_laboratorio = {}, [], [], {}
+        marca = timezone.now()
+        filas = sorted(
+            (
+                (_clave(fila[1], claves_texto, textos), fila)
+                for fila in Producto.objects.order_by().values_list(*COLUMNAS).iterator(chunk_size=5000)
+            ),
+            key=itemgetter(0),
+        )
+        claves = array('q', [clave for clave, _ in filas])
+        ids = array('q', [fila[0] for _, fila in filas])
+        por_id = sorted(range(len(ids)), key=ids.__getitem__)
+        columnas = {
+            '_claves': claves,
+            '_ids': ids,
+            '_nombres': [fila[2] for _, fila in filas],
+            '_mg': array('I', [fila[3] for _, fila in filas]),
+            '_precios': array('I', [fila[4] for _, fila in filas]),
+            '_stock': array('I', [fila[5] for _, fila in filas]),
+            '_activos': bytearray(fila[6] for _, fila in filas),
+            '_laboratorio': array('I', [
+                _indice(fila[7], laboratorios, indice_laboratorio) for _, fila in filas
+            ]),
+            '_actualizado': array('d', [fila[8].timestamp() for _, fila in filas]),
+            '_ids_ordenados': array('q', [ids[k] for k in por_id]),
+            '_claves_por_id': array('q', [claves[k] for k in por_id]),
+        }
+        del filas
+
+        with self._lock:
+            self.__dict__.update(columnas)
+            self._laboratorios = laboratorios
+            self._indice_laboratorio = indice_laboratorio
+            self._claves_texto = claves_texto
+            self._textos = textos
+            self._marca = marca
+            self._construido_en = self._sincronizado_en = time.monotonic()
+
+    def sincronizar(self):
+        """Aplica lo cambiado desde la sincronización anterior (con margen). Devuelve las filas leídas."""
+        if not self.construida:
+            self.construir()
+            return len(self)
+        marca = timezone.now()
+        filas = list(
+            Producto.objects.order_by().filter(actualizado__gte=self._marca - self.margen).values_list(*COLUMNAS)
+        )
+        with self._lock:
+            for fila in filas:
+                self._poner(fila)
+            self._marca = marca
+            self._sincronizado_en = time.monotonic()
+        return len(filas)
+
+    def _asegurar_fresca(self):
+        if self._construido_en is None:
+            with self._lock_sincronizacion:
+                if self._construido_en is None:
+                    self.construir()
+            return
+        if time.monotonic() - self._sincronizado_en < self.sincronizacion_segundos:
+            return
+        if not self._lock_sincronizacion.acquire(blocking=False):
+            return # Otro hilo ya sincroniza: se responde con lo cargado
+        if self.segundo_plano:
+            threading.Thread(target=self._refrescar, args=(True,), daemon=True).start()
+        else:
+            self._refrescar()
+
+    def _refrescar(self, en_hilo=False):
+        # Se llama con _lock_sincronizacion tomado; lo libera al terminar
+        try:
+            if time.monotonic() - self._construido_en >= self.refresco_completo_segundos:
+                self.construir()
+            else:
+                self.sincronizar()
+        except DatabaseError:
+            logger.exception('No se pudo sincronizar la tabla de códigos de barra')
+            self._sincronizado_en = time.monotonic() # Reintenta en el próximo intervalo, no en cada escaneo
+        finally:
+            self._lock_sincronizacion.release()
+            if en_hilo:
+                connection.close() # La conexión de este hilo no la cierra ningún request
+
+    def precargar(self):
+        """Construcción al arrancar el proceso. Sin BD disponible (ej: sin migrar) queda para el primer escaneo."""
+        try:
+            self.construir()
+        except DatabaseError:
+            logger.warning('Tabla de códigos de barra no precargada: se construirá en el primer escaneo', exc_info=True)
+
+    # ------------------------------ Mantenimiento ------------------------------
+    def refrescar(self, productos):
+        """Relee de la BD los productos del queryset `productos` (tras un cambio confirmado en este proceso)."""
+        if not self.construida:
+            return # Se cargará completa en el primer uso
+        filas = list(productos.order_by().values_list(*COLUMNAS))
+        with self._lock:
+            for fila in filas:
+                self._poner(fila)
+
+    def eliminar(self, producto_id):
+        with self._lock:
+            i = self._posicion_id(producto_id)
+            if i is not None:
+                self._quitar(i)
+
+    def descontar(self, descuentos):
+        """Mismo ajuste que services.descontar_stock_producto ({producto_id: cantidad}), sin ir a la BD."""
+        with self._lock:
+            for producto_id, cantidad in descuentos.items():
+                i = self._posicion_id(producto_id)
+                if i is not None:
+                    self._stock[i] = max(self._stock[i] - cantidad, 0)
+                    self._activos[i] = self._stock[i] > 0
+
+    def _poner(self, fila):
+        producto_id, codigo, nombre, mg, precio, stock, activo, laboratorio, actualizado = fila
+        marca = actualizado.timestamp()
+        clave = _clave(codigo, self._claves_texto, self._textos)
+        i = self._posicion(clave)
+        if i is None or self._ids[i] != producto_id:
+            anterior = self._posicion_id(producto_id)
+            if anterior is not None:
+                if self._actualizado[anterior] > marca:
+                    return # Lectura más vieja que lo cargado (ej: sincronización que terminó tarde)
+                self._quitar(anterior) # Cambió de código
+            i = self._posicion(clave)
+            if i is not None:
+                self._quitar(i) # Entrada de otro producto que ya no tiene este código
+            i = bisect_left(self._claves, clave)
+            for columna, valor in (
+                (self._claves, clave), (self._ids, producto_id), (self._nombres, nombre), (self._mg, mg),
+                (self._precios, precio), (self._stock, stock), (self._activos, activo),
+                (self._laboratorio, 0), (self._actualizado, marca),
+            ):
+                columna.insert(i, valor)
+            j = bisect_left(self._ids_ordenados, producto_id)
+            self._ids_ordenados.insert(j, producto_id)
+            self._claves_por_id.insert(j, clave)
+        elif self._actualizado[i] > marca:
+            return
+        self._nombres[i] = nombre
+        self._mg[i] = mg
+        self._precios[i] = precio
+        self._stock[i] = stock
+        self._activos[i] = activo
+        self._laboratorio[i] = _indice(laboratorio, self._laboratorios, self._indice_laboratorio)
+        self._actualizado[i] = marca
+
+    def _quitar(self, i):
+        j = bisect_left(self._ids_ordenados, self._ids[i])
+        del self._ids_ordenados[j]
+        del self._claves_por_id[j]
+        for columna in (
+            self._claves, self._ids, self._nombres, self._mg, self._precios, self._stock,
+            self._activos, self._laboratorio, self._actualizado,
+        ):
+            del columna[i]
+
+    def estadisticas(self):
+        with self._lock:
+            arrays = (
+                self._claves, self._ids, self._precios, self._mg, self._stock, self._laboratorio,
+                self._actualizado, self._ids_ordenados, self._claves_por_id,
+            )
+            textos = self._nombres + self._laboratorios + self._textos
+            return {
+                'productos': len(self._claves),
+                'laboratorios': len(self._laboratorios),
+                'bytes': (
+                    sum(sys.getsizeof(columna) for columna in arrays) + sys.getsizeof(self._activos)
+                    + sys.getsizeof(self._nombres) + sum(sys.getsizeof(texto) for texto in textos)
+                    + sys.getsizeof(self._laboratorios) + sys.getsizeof(self._indice_laboratorio)
+                    + sys.getsizeof(self._claves_texto) + sys.getsizeof(self._textos)
+                ),
+                'sincronizado_hasta': self._marca,
+            }
+
+
+# Instancia única por proceso
+tabla_codigos = TablaCodigos()
@@ -0,0 +1,124 @@
+import multiprocessing
+import os
+import random
+import statistics
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from rest_framework.test import APIClient
+
+from modulo_principal.models import Producto
+from punto_venta.models import Terminal
+
+PREFIJO_TERMINAL = 'BENCH-'
+
+
+def simular_terminales(codigos, catalogo, lineas, semilla, inicio, fin):
+    """
+    Un hilo (y una conexión) por terminal vendiendo carritos al azar entre `inicio` y `fin`
+    (time.time(), comparables entre procesos). Devuelve (latencias_ms, rechazadas, errores).
+    """
+    latencias, rechazadas, errores = [], [], []
+
+    def terminal(codigo):
+        azar = random.Random(f"{semilla}-{codigo}")
+        client = APIClient(HTTP_HOST='localhost')
+        propias = []
+        try:
+            time.sleep(max(0, inicio - time.time()))
+            while time.time() < fin:
+                carrito = [
+                    {'codigo_serie': codigo_serie, 'cantidad': azar.randint(1, 3), 'precio_unitario': precio}
+                    for codigo_serie, precio in azar.sample(catalogo, lineas)
+                ]
+                antes = time.perf_counter()
+                resp = client.post('/api/punto-venta/ventas/', {'terminal': codigo, 'lineas': carrito}, format='json')
+                if resp.status_code == 201:
+                    propias.append((time.perf_counter() - antes) * 1000)
+                elif resp.status_code == 400 and hasattr(resp, 'data'): # Respuesta de la API, no de Django
+                    rechazadas.append(resp.data) # Sin stock: el carrito se rechaza completo
+                else:
+                    errores.append(resp.status_code)
+        except Exception as e: # Deadlocks u otros errores de BD
+            errores.append(repr(e))
+        finally:
+            latencias.extend(propias)
+            connection.close()
+
+    hilos = [threading.Thread(target=terminal, args=(codigo,)) for codigo in codigos]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    return latencias, len(rechazadas), [str(error) for error in errores]
+
+
+class Command(BaseCommand):
+    help = (
+        'Prueba de carga de POST /api/punto-venta/ventas/: N terminales concurrentes (un hilo y '
+        'una conexión cada una) venden carritos al azar durante un tiempo fijo. Reporta ventas/s '
+        'y latencias. CONSUME STOCK REAL: usar sobre una BD de prueba (ej: seed_data).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--terminales', type=int, default=20, help='Terminales concurrentes (default: 20).')
+        parser.add_argument('--duracion', type=float, default=10, help='Segundos de carga (default: 10).')
+        parser.add_argument('--lineas', type=int, default=4, help='Productos por carrito (default: 4).')
+        parser.add_argument(
+            '--productos', type=int, default=1000,
+            help='Catálogo del que se eligen los carritos: menos productos = más contención (default: 1000).'
+        )
+        parser.add_argument(
+            '--procesos', type=int, default=min(4, os.cpu_count() or 1),
+            help='Procesos entre los que se reparten las terminales, como los workers de un servidor: '
+                 'con uno solo, el GIL limita las ventas/s antes que la BD.'
+        )
+        parser.add_argument('--semilla', type=int, default=7)
+
+    def handle(self, *args, **options):
+        if min(options['terminales'], options['lineas'], options['procesos']) < 1:
+            raise CommandError('--terminales, --lineas y --procesos deben ser mayores que 0.')
+        catalogo = list(
+            Producto.objects.filter(stock_disponible__gte=options['lineas'] * 10)
+            .order_by('-stock_disponible', 'pk')
+            .values_list('codigo_serie', 'precio_venta')[:options['productos']]
+        )
+        if len(catalogo) < options['lineas']:
+            raise CommandError('No hay productos con stock suficiente: ejecuta primero python manage.py seed_data')
+
+        codigos = [f"{PREFIJO_TERMINAL}{t:02d}" for t in range(options['terminales'])]
+        for codigo in codigos:
+            Terminal.objects.get_or_create(codigo=codigo, defaults={'nombre': 'Prueba de carga'})
+
+        procesos = min(options['procesos'], len(codigos))
+        inicio = time.time() + 1 # Margen para que todos los procesos arranquen a la vez
+        tareas = [
+            (codigos[i::procesos], catalogo, options['lineas'], options['semilla'], inicio, inicio + options['duracion'])
+            for i in range(procesos)
+        ]
+        if procesos == 1:
+            resultados = [simular_terminales(*tareas[0])]
+        else:
+            # Las conexiones heredadas por fork no se comparten: cada proceso abre las suyas
+            connections.close_all()
+            metodos = multiprocessing.get_all_start_methods()
+            contexto = multiprocessing.get_context('fork' if 'fork' in metodos else 'spawn')
+            with contexto.Pool(procesos) as pool:
+                resultados = pool.starmap(simular_terminales, tareas)
+
+        latencias = [ms for propias, _, _ in resultados for ms in propias]
+        rechazadas = sum(cantidad for _, cantidad, _ in resultados)
+        errores = [error for _, _, propios in resultados for error in propios]
+        if not latencias:
+            raise CommandError(f'Ninguna venta registrada. Errores: {errores[:5]}')
+        percentiles = statistics.quantiles(latencias, n=100)
+        self.stdout.write(self.style.SUCCESS(
+            f"✓ {len(latencias)} ventas en {options['duracion']:.0f}s con {len(codigos)} terminales "
+            f"({procesos} procesos): {len(latencias) / options['duracion']:.0f} ventas/s  "
+            f"p50={percentiles[49]:.1f}ms  p95={percentiles[94]:.1f}ms  p99={percentiles[98]:.1f}ms  "
+            f"({rechazadas} rechazadas por stock)"
+        ))
+        if errores:
+            raise CommandError(f'{len(errores)} errores durante la carga: {errores[:5]}')
@@ -0,0 +1,51 @@
+import time
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import F
+
+from punto_venta.models import PuntoReposicion
+from punto_venta.reposicion import calcular_reposicion, configuracion
+
+
+class Command(BaseCommand):
+    help = (
+        'Recalcula velocidad de venta, punto de reposición y días de cobertura de todos los '
+        'productos (ej: cron nocturno). Lectura: GET /api/punto-venta/reposicion/.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ventana-dias', type=int, help='Días de historial de ventas (default: settings.REPOSICION).')
+        parser.add_argument('--dias-entrega', type=int, help='Demora de entrega del proveedor en días.')
+        parser.add_argument('--nivel-servicio', type=float, help='Probabilidad de no quebrar stock (0-1, ej: 0.95).')
+        parser.add_argument('--hasta', type=str, help='Fecha YYYY-MM-DD excluida (default: hoy).')
+
+    def handle(self, *args, **options):
+        hasta = None
+        if options['hasta']:
+            try:
+                hasta = datetime.strptime(options['hasta'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError('--hasta debe tener formato YYYY-MM-DD.')
+        nivel = options['nivel_servicio']
+        if nivel is not None and not 0 < nivel < 1:
+            raise CommandError('--nivel-servicio debe estar entre 0 y 1 (exclusivo).')
+        if options['ventana_dias'] is not None and options['ventana_dias'] < 2:
+            raise CommandError('--ventana-dias debe ser al menos 2.')
+
+        config = configuracion(
+            ventana_dias=options['ventana_dias'], dias_entrega=options['dias_entrega'], nivel_servicio=nivel,
+        )
+        inicio = time.perf_counter()
+        procesados = calcular_reposicion(
+            ventana_dias=config['VENTANA_DIAS'], dias_entrega=config['DIAS_ENTREGA'],
+            nivel_servicio=config['NIVEL_SERVICIO'], hasta=hasta,
+        )
+        bajo_punto = PuntoReposicion.objects.filter(
+            velocidad_diaria__gt=0, stock_calculo__lte=F('punto_reposicion')
+        ).count()
+        self.stdout.write(self.style.SUCCESS(
+            f"✓ {procesados} productos en {time.perf_counter() - inicio:.1f}s "
+            f"(ventana {config['VENTANA_DIAS']} días, entrega {config['DIAS_ENTREGA']} días, "
+            f"servicio {config['NIVEL_SERVICIO']:.0%}): {bajo_punto} bajo su punto de reposición."
+        ))
@@ -0,0 +1,46 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from modulo_principal.models import Producto
+from punto_venta.codigos import tabla_codigos
+
+
+class Command(BaseCommand):
+    help = (
+        'Construye la tabla de códigos de barra del mostrador (punto_venta.codigos) y reporta '
+        'productos, memoria, tiempo de carga y de escaneo. Cada proceso tiene su tabla: los '
+        'servidores la precargan al arrancar si CODIGOS_BARRA_PRECARGAR=true (base/wsgi.py); este '
+        'comando sirve de chequeo previo al despliegue y de medición.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--escaneos', type=int, default=10000, help='Búsquedas a medir (default: 10000).')
+        parser.add_argument('--semilla', type=int, default=7)
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        tabla_codigos.construir()
+        segundos = time.perf_counter() - inicio
+        stats = tabla_codigos.estadisticas()
+        if not stats['productos']:
+            raise CommandError('No hay productos: ejecuta primero python manage.py seed_data')
+
+        codigos = list(Producto.objects.order_by('?').values_list('codigo_serie', flat=True)[:1000])
+        azar = random.Random(options['semilla'])
+        muestra = [azar.choice(codigos) for _ in range(options['escaneos'])]
+        tiempos = []
+        for codigo in muestra:
+            antes = time.perf_counter()
+            encontrado = tabla_codigos.buscar(codigo)
+            tiempos.append((time.perf_counter() - antes) * 1_000_000)
+            if encontrado is None:
+                raise CommandError(f'El código {codigo} no quedó en la tabla.')
+
+        self.stdout.write(self.style.SUCCESS(
+            f"✓ {stats['productos']} productos ({stats['laboratorios']} laboratorios) en "
+            f"{segundos:.2f}s, {stats['bytes'] / 1024 / 1024:.1f} MB. Escaneo: "
+            f"p50={statistics.median(tiempos):.1f}µs  máx={max(tiempos):.1f}µs ({len(tiempos)} búsquedas)"
+        ))
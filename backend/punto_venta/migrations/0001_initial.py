@@ -0,0 +1,34 @@
+# Generated by Django 6.0 on 2026-10-18 14:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('modulo_principal', '0009_lote_indices_compuestos'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PuntoReposicion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('velocidad_diaria', models.FloatField(help_text='Unidades vendidas por día (promedio de la ventana)')),
+                ('desviacion_diaria', models.FloatField(help_text='Desviación estándar de las ventas diarias')),
+                ('punto_reposicion', models.PositiveIntegerField(help_text='Demanda esperada durante la entrega + stock de seguridad')),
+                ('stock_calculo', models.PositiveIntegerField(help_text='Stock disponible al momento del cálculo')),
+                ('dias_cobertura', models.FloatField(blank=True, null=True)),
+                ('calculado', models.DateTimeField()),
+                ('producto', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='punto_reposicion', to='modulo_principal.producto')),
+            ],
+            options={
+                'verbose_name': 'Punto de reposición',
+                'verbose_name_plural': 'Puntos de reposición',
+                'indexes': [models.Index(condition=models.Q(('velocidad_diaria__gt', 0)), fields=['producto'], include=('punto_reposicion', 'velocidad_diaria'), name='reposicion_con_ventas_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 6.0 on 2026-10-18 16:00
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('modulo_principal', '0009_lote_indices_compuestos'),
+        ('punto_venta', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Terminal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('codigo', models.CharField(max_length=20, unique=True)),
+                ('nombre', models.CharField(blank=True, max_length=100)),
+                ('ultimo_folio', models.PositiveBigIntegerField(default=0, editable=False)),
+            ],
+            options={
+                'verbose_name': 'Terminal',
+                'verbose_name_plural': 'Terminales',
+            },
+        ),
+        migrations.CreateModel(
+            name='Venta',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('folio', models.PositiveBigIntegerField()),
+                ('fecha', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('total', models.PositiveBigIntegerField()),
+                ('terminal', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='ventas', to='punto_venta.terminal')),
+            ],
+            options={
+                'verbose_name': 'Venta',
+                'verbose_name_plural': 'Ventas',
+            },
+        ),
+        migrations.CreateModel(
+            name='LineaVenta',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cantidad', models.PositiveIntegerField()),
+                ('precio_unitario', models.PositiveIntegerField(help_text='precio_venta del producto al momento de la venta')),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='lineas_venta', to='modulo_principal.producto')),
+                ('venta', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lineas', to='punto_venta.venta')),
+            ],
+            options={
+                'verbose_name': 'Línea de venta',
+                'verbose_name_plural': 'Líneas de venta',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='venta',
+            constraint=models.UniqueConstraint(fields=('terminal', 'folio'), name='venta_terminal_folio_unico'),
+        ),
+    ]
@@ -1,3 +1,108 @@
 from django.db import models
+from django.utils import timezone
 
-# Create your models here.
+from modulo_principal.models import Producto
+
+
+#----------------------------------------------PUNTOS DE REPOSICIÓN-----------------------------------------
+class PuntoReposicion(models.Model):
+    """
+    Resumen por producto que recalcula el comando calcular_reposicion (ver reposicion.py)
+    a partir de las ventas de la ventana móvil. La comparación con el stock se hace en
+    vivo contra Producto.stock_disponible (el stock cambia entre cálculos, el punto no).
+    """
+    producto = models.OneToOneField(Producto, on_delete=models.CASCADE, related_name='punto_reposicion')
+    velocidad_diaria = models.FloatField(help_text="Unidades vendidas por día (promedio de la ventana)")
+    desviacion_diaria = models.FloatField(help_text="Desviación estándar de las ventas diarias")
+    punto_reposicion = models.PositiveIntegerField(
+        help_text="Demanda esperada durante la entrega + stock de seguridad"
+    )
+    stock_calculo = models.PositiveIntegerField(help_text="Stock disponible al momento del cálculo")
+    # NULL = sin ventas en la ventana (cobertura infinita)
+    dias_cobertura = models.FloatField(null=True, blank=True)
+    calculado = models.DateTimeField()
+
+    def __str__(self):
+        return f"Reposición {self.producto_id}: punto {self.punto_reposicion}"
+
+    class Meta:
+        verbose_name = "Punto de reposición"
+        verbose_name_plural = "Puntos de reposición"
+        indexes = [
+            # Solo los productos con ventas pueden quedar bajo su punto de reposición
+            models.Index(
+                fields=['producto'], include=['punto_reposicion', 'velocidad_diaria'],
+                condition=models.Q(velocidad_diaria__gt=0), name='reposicion_con_ventas_idx',
+            ),
+        ]
+
+
+#----------------------------------------------VENTAS (BOLETAS)-----------------------------------------
+class Terminal(models.Model):
+    """
+    Caja del local. Cada terminal numera sus boletas con su propio contador: dos terminales
+    nunca esperan por el mismo lock de folio, y el folio no tiene huecos (se toma dentro de
+    la transacción de la venta, un rollback lo devuelve).
+    """
+    codigo = models.CharField(max_length=20, unique=True)
+    nombre = models.CharField(max_length=100, blank=True)
+    ultimo_folio = models.PositiveBigIntegerField(default=0, editable=False)
+
+    def __str__(self):
+        return self.nombre or self.codigo
+
+    class Meta:
+        verbose_name = "Terminal"
+        verbose_name_plural = "Terminales"
+
+
+class Venta(models.Model):
+    terminal = models.ForeignKey(Terminal, on_delete=models.PROTECT, related_name='ventas')
+    folio = models.PositiveBigIntegerField()
+    fecha = models.DateTimeField(default=timezone.now, db_index=True)
+    total = models.PositiveBigIntegerField()
+    # Solo ventas hechas sin conexión: la genera la terminal (UUID) y evita aplicar dos
+    # veces la misma venta cuando reintenta la sincronización (ver services.sincronizar_ventas)
+    clave_idempotencia = models.UUIDField(null=True, blank=True, editable=False)
+
+    @staticmethod
+    def formatear_numero(codigo_terminal, folio):
+        return f"{codigo_terminal}-{folio:08d}"
+
+    @property
+    def numero(self):
+        # Número impreso en la boleta; también es la referencia de sus movimientos de stock
+        return self.formatear_numero(self.terminal.codigo, self.folio)
+
+    def __str__(self):
+        return f"Boleta {self.numero}"
+
+    class Meta:
+        verbose_name = "Venta"
+        verbose_name_plural = "Ventas"
+        constraints = [
+            models.UniqueConstraint(fields=['terminal', 'folio'], name='venta_terminal_folio_unico'),
+            # Parcial: las ventas en línea (la gran mayoría) no ocupan el índice
+            models.UniqueConstraint(
+                fields=['clave_idempotencia'], condition=models.Q(clave_idempotencia__isnull=False),
+                name='venta_clave_idempotencia_unica',
+            ),
+        ]
+
+
+class LineaVenta(models.Model):
+    venta = models.ForeignKey(Venta, on_delete=models.CASCADE, related_name='lineas')
+    producto = models.ForeignKey(Producto, on_delete=models.PROTECT, related_name='lineas_venta')
+    cantidad = models.PositiveIntegerField()
+    precio_unitario = models.PositiveIntegerField(help_text="precio_venta del producto al momento de la venta")
+
+    @property
+    def subtotal(self):
+        return self.cantidad * self.precio_unitario
+
+    def __str__(self):
+        return f"{self.cantidad} x {self.producto_id}"
+
+    class Meta:
+        verbose_name = "Línea de venta"
+        verbose_name_plural = "Líneas de venta"
@@ -0,0 +1,158 @@
+"""
+Puntos de reposición por velocidad de venta (ver comando calcular_reposicion).
+
+Para cada producto, sobre las ventas de los últimos VENTANA_DIAS días completos:
+- velocidad  v = unidades vendidas / VENTANA_DIAS   (los días sin venta cuentan como 0)
+- desviación s = desviación estándar muestral de las ventas diarias
+- punto de reposición = v * L + z * s * sqrt(L), con L = DIAS_ENTREGA y z del NIVEL_SERVICIO
+- días de cobertura = stock / v
+
+Todo el catálogo se resuelve con UNA query agregada por (producto, día) y operaciones
+vectorizadas de NumPy (bincount), sin una query por producto.
+"""
+import math
+from datetime import datetime, time, timedelta
+from statistics import NormalDist
+
+import numpy as np
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from modulo_principal.models import MovimientoStock, Producto
+
+from .models import PuntoReposicion
+from .services import literal_array
+
+CONFIG_POR_DEFECTO = {
+    'VENTANA_DIAS': 90,       # Historial de ventas considerado
+    'DIAS_ENTREGA': 7,        # Lead time del proveedor
+    'NIVEL_SERVICIO': 0.95,   # Probabilidad de no quebrar stock durante la entrega
+}
+WORK_MEM_AGREGACION = '64MB'
+CAMPOS_RESUMEN = ['velocidad_diaria', 'desviacion_diaria', 'punto_reposicion', 'stock_calculo', 'dias_cobertura', 'calculado']
+
+
+def configuracion(**parametros):
+    config = {**CONFIG_POR_DEFECTO, **getattr(settings, 'REPOSICION', {})}
+    config.update({clave.upper(): valor for clave, valor in parametros.items() if valor is not None})
+    return config
+
+
+def ventas_diarias(desde, hasta):
+    """(producto_ids, unidades) por producto y día local con ventas, en arrays de NumPy."""
+    filas = (
+        MovimientoStock.objects
+        .filter(tipo=MovimientoStock.VENTA, fecha__gte=desde, fecha__lt=hasta)
+        .annotate(dia=TruncDate('fecha'))
+        .order_by()
+        .values('lote__producto_id', 'dia')
+        .annotate(total=Sum('cantidad'))
+        .values_list('lote__producto_id', 'total')
+    )
+    # Cursor directo: cientos de miles de filas de dos enteros no necesitan los conversores del ORM
+    sql, params = filas.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        datos = np.array(cursor.fetchall(), dtype=np.int64).reshape(-1, 2)
+    return datos[:, 0], -datos[:, 1] # Las ventas se registran con signo negativo
+
+
+def estadisticas_ventas(indices, unidades, n_productos, ventana_dias):
+    """
+    Media y desviación estándar muestral de las ventas diarias de cada producto, a partir
+    de solo los días con venta (`indices` = posición del producto, una entrada por día).
+    Sumas y sumas de cuadrados con bincount: los días en 0 no necesitan materializarse.
+    """
+    unidades = unidades.astype(np.float64)
+    suma = np.bincount(indices, weights=unidades, minlength=n_productos)
+    suma_cuadrados = np.bincount(indices, weights=unidades ** 2, minlength=n_productos)
+    media = suma / ventana_dias
+    varianza = (suma_cuadrados - ventana_dias * media ** 2) / max(ventana_dias - 1, 1)
+    return media, np.sqrt(np.clip(varianza, 0, None))
+
+
+def puntos_reposicion(velocidad, desviacion, stock, dias_entrega, nivel_servicio):
+    """Punto de reposición (entero, hacia arriba) y días de cobertura (NaN sin ventas)."""
+    z = NormalDist().inv_cdf(nivel_servicio)
+    punto = np.ceil(velocidad * dias_entrega + z * desviacion * math.sqrt(dias_entrega)).astype(np.int64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cobertura = np.where(velocidad > 0, stock / velocidad, np.nan)
+    return punto, cobertura
+
+
+def calcular_reposicion(ventana_dias=None, dias_entrega=None, nivel_servicio=None, hasta=None, tamano_tanda=5000):
+    """
+    Recalcula PuntoReposicion para todo el catálogo. `hasta` (fecha) excluida: por defecto
+    hoy, así la ventana son días completos. Devuelve la cantidad de productos procesados.
+    `tamano_tanda` solo aplica fuera de PostgreSQL (allí es un único INSERT con arrays).
+    """
+    config = configuracion(ventana_dias=ventana_dias, dias_entrega=dias_entrega, nivel_servicio=nivel_servicio)
+    ventana = config['VENTANA_DIAS']
+    fin = timezone.make_aware(datetime.combine(hasta or timezone.localdate(), time.min))
+    inicio = fin - timedelta(days=ventana)
+
+    # Una transacción: stock y ventas del mismo instante (y SET LOCAL acotado a ella)
+    with transaction.atomic():
+        catalogo = np.array(list(Producto.objects.order_by('pk').values_list('pk', 'stock_disponible')), dtype=np.int64)
+        if not len(catalogo):
+            return 0
+        producto_ids, stock = catalogo[:, 0], catalogo[:, 1]
+
+        if connection.vendor == 'postgresql':
+            # ~1 fila por producto y día con venta: con el work_mem por defecto el
+            # HashAggregate se desborda a disco
+            with connection.cursor() as cursor:
+                cursor.execute(f"SET LOCAL work_mem = '{WORK_MEM_AGREGACION}'")
+        ids_venta, unidades = ventas_diarias(inicio, fin)
+
+        indices = np.searchsorted(producto_ids, ids_venta) # producto_ids viene ordenado
+        velocidad, desviacion = estadisticas_ventas(indices, unidades, len(producto_ids), ventana)
+        punto, cobertura = puntos_reposicion(
+            velocidad, desviacion, stock, config['DIAS_ENTREGA'], config['NIVEL_SERVICIO']
+        )
+
+        columnas = [
+            producto_ids.tolist(), velocidad.tolist(), desviacion.tolist(), punto.tolist(), stock.tolist(),
+            [None if math.isnan(c) else c for c in cobertura.tolist()],
+        ]
+        if connection.vendor == 'postgresql':
+            _guardar_postgresql(columnas, timezone.now())
+        else:
+            _guardar_en_tandas(columnas, timezone.now(), tamano_tanda)
+    return len(producto_ids)
+
+
+def _guardar_postgresql(columnas, calculado):
+    """Un solo INSERT ... SELECT FROM unnest(arrays) ON CONFLICT: sin armar 50k instancias."""
+    tabla = PuntoReposicion._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            INSERT INTO {tabla} (producto_id, velocidad_diaria, desviacion_diaria, punto_reposicion,
+                                 stock_calculo, dias_cobertura, calculado)
+            SELECT producto_id, velocidad, desviacion, punto, stock, cobertura, %s
+            FROM unnest(%s::bigint[], %s::float8[], %s::float8[], %s::integer[], %s::integer[], %s::float8[])
+                AS t(producto_id, velocidad, desviacion, punto, stock, cobertura)
+            ON CONFLICT (producto_id) DO UPDATE SET
+                velocidad_diaria = EXCLUDED.velocidad_diaria,
+                desviacion_diaria = EXCLUDED.desviacion_diaria,
+                punto_reposicion = EXCLUDED.punto_reposicion,
+                stock_calculo = EXCLUDED.stock_calculo,
+                dias_cobertura = EXCLUDED.dias_cobertura,
+                calculado = EXCLUDED.calculado
+        """, [calculado, *[literal_array(columna) for columna in columnas]])
+
+
+def _guardar_en_tandas(columnas, calculado, tamano_tanda):
+    filas = [
+        PuntoReposicion(
+            producto_id=producto_id, velocidad_diaria=v, desviacion_diaria=s, punto_reposicion=p,
+            stock_calculo=st, dias_cobertura=c, calculado=calculado,
+        )
+        for producto_id, v, s, p, st, c in zip(*columnas)
+    ]
+    PuntoReposicion.objects.bulk_create(
+        filas, batch_size=tamano_tanda, update_conflicts=True, unique_fields=['producto'], update_fields=CAMPOS_RESUMEN,
+    )
@@ -0,0 +1,32 @@
+from django.utils import timezone
+from rest_framework import serializers
+
+# Un carrito de mostrador rara vez pasa de unas decenas de líneas
+MAX_LINEAS_VENTA = 200
+# Una jornada completa sin red de una terminal cabe en un envío
+MAX_VENTAS_SINCRONIZACION = 5000
+
+
+class LineaVentaSerializer(serializers.Serializer):
+    codigo_serie = serializers.CharField(max_length=13)
+    cantidad = serializers.IntegerField(min_value=1)
+    # Precio que mostró la terminal: debe coincidir con precio_venta al momento de vender
+    precio_unitario = serializers.IntegerField(min_value=0)
+
+
+class VentaSerializer(serializers.Serializer):
+    """Entrada de POST /api/punto-venta/ventas/ (ver services.registrar_venta)."""
+    terminal = serializers.CharField(max_length=20)
+    lineas = LineaVentaSerializer(many=True, allow_empty=False, max_length=MAX_LINEAS_VENTA)
+
+
+class VentaOfflineSerializer(serializers.Serializer):
+    clave = serializers.UUIDField()
+    fecha = serializers.DateTimeField(default=timezone.now, help_text="Cuándo se vendió en la terminal")
+    lineas = LineaVentaSerializer(many=True, allow_empty=False, max_length=MAX_LINEAS_VENTA)
+
+
+class SincronizacionSerializer(serializers.Serializer):
+    """Entrada de POST /api/punto-venta/ventas/sincronizar/ (ver services.sincronizar_ventas)."""
+    terminal = serializers.CharField(max_length=20)
+    ventas = VentaOfflineSerializer(many=True, allow_empty=False, max_length=MAX_VENTAS_SINCRONIZACION)
@@ -0,0 +1,529 @@
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+from django.db.models import Case, Q, Value, When, BooleanField, F, PositiveIntegerField
+from django.db.models.functions import Greatest, Now
+from django.utils import timezone
+
+from modulo_principal.models import Lote, MovimientoStock, Producto
+from modulo_principal.utils.cache import invalidar_lotes
+
+from .codigos import tabla_codigos
+from .models import LineaVenta, Terminal, Venta
+
+# Lotes que se bloquean por vuelta: casi siempre el primer lote por vencer alcanza
+LOTES_POR_BLOQUEO = 4
+
+
+def lotes_elegibles(producto_id, hoy=None):
+    """Lotes vendibles: activos, sanos, no vencidos y con stock, en orden FEFO."""
+    return _vendibles(hoy).filter(producto_id=producto_id).order_by('fecha_vencimiento', 'id')
+
+
+def _vendibles(hoy=None):
+    return Lote.objects.filter(
+        activo=True,
+        defectuoso=False,
+        fecha_vencimiento__gte=hoy or timezone.localdate(),
+        cantidad__gt=0,
+    )
+
+
+def _bloquear_lotes(producto_id, cantidad, hoy, bloqueados=()):
+    """
+    SELECT ... FOR UPDATE en orden FEFO, de a LOTES_POR_BLOQUEO lotes, hasta cubrir
+    la cantidad. Todas las terminales bloquean en el mismo orden (fecha_vencimiento, id),
+    así que no hay deadlocks, y solo se bloquean los lotes que realmente se consumen.
+    `bloqueados` = lotes ya bloqueados (en orden) desde los que se continúa.
+    """
+    bloqueados = list(bloqueados)
+    disponible = sum(fila[2] for fila in bloqueados)
+    ultimo = (bloqueados[-1][1], bloqueados[-1][0]) if bloqueados else None
+    while disponible < cantidad:
+        qs = lotes_elegibles(producto_id, hoy).select_for_update()
+        if ultimo is not None:
+            fecha, pk = ultimo
+            qs = qs.filter(Q(fecha_vencimiento__gt=fecha) | Q(fecha_vencimiento=fecha, id__gt=pk))
+        tanda = list(qs.values_list('id', 'fecha_vencimiento', 'cantidad')[:LOTES_POR_BLOQUEO])
+        if not tanda:
+            break
+        bloqueados.extend(tanda)
+        disponible += sum(fila[2] for fila in tanda)
+        ultimo = (tanda[-1][1], tanda[-1][0]) # (fecha_vencimiento, id)
+    return bloqueados, disponible
+
+
+def _bloquear_carrito(cantidades, hoy):
+    """
+    _bloquear_lotes para todo un carrito ({producto_id: cantidad}), en orden de producto.
+    En PostgreSQL los primeros LOTES_POR_BLOQUEO lotes FEFO de cada producto se bloquean
+    en UNA query, ordenada por (producto, vencimiento, id); solo un producto que necesite
+    más lotes sigue con _bloquear_lotes, después de todos los demás: el orden global
+    entre terminales se mantiene. Devuelve {producto_id: (bloqueados, disponible)}.
+    """
+    bloqueados = {producto_id: [] for producto_id in cantidades}
+    if connection.vendor == 'postgresql':
+        # SQL directo: el ORM tarda más en compilar la ventana que PostgreSQL en ejecutarla.
+        # Las condiciones de vendible se repiten afuera: tras esperar un lock, PostgreSQL
+        # las re-evalúa sobre la fila nueva (un lote que otra terminal agotó queda fuera)
+        vendible = "activo AND NOT defectuoso AND fecha_vencimiento >= %s AND cantidad > 0"
+        with connection.cursor() as cursor:
+            cursor.execute(f"""
+                SELECT producto_id, id, fecha_vencimiento, cantidad FROM {Lote._meta.db_table}
+                WHERE {vendible} AND id IN (
+                    SELECT id FROM (
+                        SELECT id, row_number() OVER (PARTITION BY producto_id ORDER BY fecha_vencimiento, id) AS orden
+                        FROM {Lote._meta.db_table}
+                        WHERE {vendible} AND producto_id = ANY(%s)
+                    ) AS fefo WHERE orden <= %s
+                )
+                ORDER BY producto_id, fecha_vencimiento, id
+                FOR UPDATE
+            """, [hoy, hoy, list(cantidades), LOTES_POR_BLOQUEO])
+            for producto_id, *fila in cursor.fetchall():
+                bloqueados[producto_id].append(tuple(fila))
+    return {
+        producto_id: _bloquear_lotes(producto_id, cantidades[producto_id], hoy, bloqueados[producto_id])
+        for producto_id in sorted(cantidades)
+    }
+
+
+def dispensar(producto_id, cantidad, referencia=''):
+    """
+    Regla de Negocio (FEFO): una venta consume primero los lotes que vencen antes.
+
+    Devuelve [{'lote_id', 'cantidad'}] con lo consumido de cada lote. Cada consumo queda
+    en el libro de movimientos como venta (con la `referencia` dada, ej: id de la boleta).
+    Si no alcanza el stock vendible lanza ValidationError y no modifica nada.
+    """
+    if cantidad <= 0:
+        raise ValidationError({'cantidad': "La cantidad debe ser mayor que cero."})
+
+    hoy = timezone.localdate()
+    with transaction.atomic():
+        bloqueados, disponible = _bloquear_lotes(producto_id, cantidad, hoy)
+        if disponible < cantidad:
+            raise ValidationError({
+                'cantidad': f"Stock insuficiente: se piden {cantidad} y hay {disponible} vendibles."
+            })
+
+        consumos = _repartir(bloqueados, cantidad)
+        aplicar_consumos(consumos, referencia)
+        descontar_stock_producto({producto_id: cantidad})
+        # UPDATE directo: no hay post_save, invalidamos a mano lo cacheado sobre lotes
+        transaction.on_commit(invalidar_lotes)
+
+    return [{'lote_id': c['lote_id'], 'cantidad': c['cantidad']} for c in consumos]
+
+
+def registrar_venta(terminal, lineas):
+    """
+    Venta de un carrito completo en una transacción: boleta + líneas + consumo FEFO.
+
+    `lineas` = [{'codigo_serie', 'cantidad', 'precio_unitario'}]. Un código repetido se
+    suma en una sola línea. Todo o nada: si alguna línea falla (código inexistente, precio
+    distinto de precio_venta, stock insuficiente) lanza ValidationError con
+    {indice_linea: [mensajes]} y no modifica nada.
+
+    Queries: 1 para resolver todos los códigos, 1 para bloquear los lotes del carrito
+    (ver _bloquear_carrito) y el resto en bloque (folio, boleta, líneas, lotes,
+    movimientos y productos), sin depender del largo del carrito.
+    """
+    errores = {}
+
+    def agregar(i, mensaje):
+        errores.setdefault(str(i), []).append(mensaje)
+
+    carrito = {} # codigo_serie -> [indice de la primera línea, cantidad, precio]
+    for i, linea in enumerate(lineas):
+        if linea['cantidad'] <= 0:
+            agregar(i, "La cantidad debe ser mayor que cero.")
+        item = carrito.setdefault(linea['codigo_serie'], [i, 0, linea['precio_unitario']])
+        item[1] += linea['cantidad']
+        if item[2] != linea['precio_unitario']:
+            agregar(i, f"Precio distinto al de la línea {item[0]} para el mismo producto.")
+    if errores:
+        raise ValidationError(errores)
+
+    hoy = timezone.localdate()
+    with transaction.atomic():
+        productos = {
+            codigo: (pk, precio)
+            for pk, codigo, precio in Producto.objects.filter(codigo_serie__in=list(carrito))
+            .values_list('pk', 'codigo_serie', 'precio_venta')
+        }
+        items = []
+        for codigo, (i, cantidad, precio) in carrito.items():
+            if codigo not in productos:
+                agregar(i, f"No existe un producto con código {codigo}.")
+                continue
+            producto_id, precio_venta = productos[codigo]
+            if precio != precio_venta:
+                agregar(i, f"Precio desactualizado: la línea dice {precio} y el precio vigente es {precio_venta}.")
+            items.append((producto_id, codigo, i, cantidad, precio_venta))
+        if errores:
+            raise ValidationError(errores)
+
+        # Bloqueo en orden de producto (y FEFO dentro de cada uno): dos carritos con los
+        # mismos productos bloquean en el mismo orden, sin deadlocks entre terminales
+        consumos_por_producto = {}
+        bloqueos = _bloquear_carrito({producto_id: cantidad for producto_id, _, _, cantidad, _ in items}, hoy)
+        for producto_id, codigo, i, cantidad, _ in items:
+            bloqueados, disponible = bloqueos[producto_id]
+            if disponible < cantidad:
+                agregar(i, f"Stock insuficiente para {codigo}: se piden {cantidad} y hay {disponible} vendibles.")
+            else:
+                consumos_por_producto[producto_id] = _repartir(bloqueados, cantidad)
+        if errores:
+            raise ValidationError(errores)
+
+        # El folio al final: el lock de la terminal se toma con todo el stock ya asegurado
+        if not Terminal.objects.filter(codigo=terminal).update(ultimo_folio=F('ultimo_folio') + 1):
+            raise ValidationError({'terminal': f"Terminal {terminal} no registrada."})
+        terminal_id, folio = Terminal.objects.filter(codigo=terminal).values_list('pk', 'ultimo_folio').get()
+        venta = Venta.objects.create(
+            terminal=Terminal(pk=terminal_id, codigo=terminal, ultimo_folio=folio),
+            folio=folio,
+            total=sum(cantidad * precio for _, _, _, cantidad, precio in items),
+        )
+        LineaVenta.objects.bulk_create([
+            LineaVenta(venta=venta, producto_id=producto_id, cantidad=cantidad, precio_unitario=precio)
+            for producto_id, _, _, cantidad, precio in items
+        ])
+        aplicar_consumos(
+            [consumo for consumos in consumos_por_producto.values() for consumo in consumos], venta.numero
+        )
+        descontar_stock_producto({producto_id: cantidad for producto_id, _, _, cantidad, _ in items})
+        transaction.on_commit(invalidar_lotes)
+
+    return {
+        'numero': venta.numero,
+        'terminal': terminal,
+        'folio': folio,
+        'fecha': venta.fecha,
+        'total': venta.total,
+        'lineas': [{
+            'producto': producto_id,
+            'codigo_serie': codigo,
+            'cantidad': cantidad,
+            'precio_unitario': precio,
+            'subtotal': cantidad * precio,
+            'lotes': [{'lote_id': c['lote_id'], 'cantidad': c['cantidad']} for c in consumos_por_producto[producto_id]],
+        } for producto_id, codigo, _, cantidad, precio in items],
+    }
+
+
+APLICADA, DUPLICADA, RECHAZADA = 'aplicada', 'duplicada', 'rechazada'
+
+
+def sincronizar_ventas(terminal, ventas):
+    """
+    Ventas que la terminal hizo sin conexión, subidas en bloque al reconectarse.
+
+    `ventas` = [{'clave', 'fecha', 'lineas': [{'codigo_serie', 'cantidad', 'precio_unitario'}]}],
+    con `clave` un UUID generado por la terminal. Devuelve un resultado por venta, en el
+    mismo orden: aplicada (con su número de boleta), duplicada (clave ya aplicada en un
+    envío anterior o repetida en este: se devuelve el número original, nada se aplica dos
+    veces) o rechazada (con {indice_linea: [mensajes]}; no se guarda y puede reintentarse).
+
+    A diferencia de registrar_venta, cada venta se rechaza sola y no el envío completo, y
+    el precio es el que cobró la terminal (el vigente pudo cambiar mientras estaba sin red).
+    Todo el envío es UNA transacción con un número fijo de queries, no uno por venta:
+    claves ya aplicadas (índice único parcial), códigos, bloqueo de lotes de todo el
+    envío, folios, boletas, líneas, un UPDATE por lote con el total consumido, movimientos
+    y contadores de producto. Con stock insuficiente se aplican primero las más antiguas.
+    """
+    resultados = [None] * len(ventas)
+    primeras = {} # clave -> índice de su primera aparición en el envío
+    candidatas = []
+    for i, venta in enumerate(ventas):
+        if venta['clave'] in primeras:
+            continue
+        primeras[venta['clave']] = i
+        candidatas.append(i)
+
+    hoy = timezone.localdate()
+    with transaction.atomic():
+        candidatas = _descartar_aplicadas(ventas, candidatas, resultados)
+        codigos = {linea['codigo_serie'] for i in candidatas for linea in ventas[i]['lineas']}
+        productos = dict(Producto.objects.filter(codigo_serie__in=codigos).values_list('codigo_serie', 'pk'))
+        demanda = {}
+        validas = []
+        for i in candidatas:
+            errores = {}
+            for j, linea in enumerate(ventas[i]['lineas']):
+                producto_id = productos.get(linea['codigo_serie'])
+                if producto_id is None:
+                    errores.setdefault(str(j), []).append(f"No existe un producto con código {linea['codigo_serie']}.")
+                else:
+                    demanda[producto_id] = demanda.get(producto_id, 0) + linea['cantidad']
+            if errores:
+                resultados[i] = {'clave': ventas[i]['clave'], 'estado': RECHAZADA, 'errores': errores}
+            else:
+                validas.append(i)
+
+        # Mismo orden de locks que registrar_venta: lotes por producto y después la terminal
+        bloqueos = _bloquear_carrito(demanda, hoy) if demanda else {}
+        fila_terminal = Terminal.objects.select_for_update().filter(codigo=terminal).values_list('pk', 'ultimo_folio').first()
+        if fila_terminal is None:
+            raise ValidationError({'terminal': f"Terminal {terminal} no registrada."})
+        terminal_id, ultimo_folio = fila_terminal
+        # Un reintento concurrente de la misma terminal esperó el lock: lo que aplicó ya es visible
+        validas = _descartar_aplicadas(ventas, validas, resultados)
+
+        # Reparto FEFO venta por venta, en orden cronológico, sobre los lotes ya bloqueados
+        lotes = {producto_id: [list(fila) for fila in bloqueados] for producto_id, (bloqueados, _) in bloqueos.items()}
+        disponibles = {producto_id: disponible for producto_id, (_, disponible) in bloqueos.items()}
+        aplicables, descuentos = [], {}
+        for i in sorted(validas, key=lambda i: ventas[i]['fecha']):
+            pedidos = {}
+            for linea in ventas[i]['lineas']:
+                producto_id = productos[linea['codigo_serie']]
+                pedidos[producto_id] = pedidos.get(producto_id, 0) + linea['cantidad']
+            errores = {}
+            for j, linea in enumerate(ventas[i]['lineas']):
+                producto_id = productos[linea['codigo_serie']]
+                if pedidos[producto_id] > disponibles[producto_id]:
+                    errores[str(j)] = [
+                        f"Stock insuficiente para {linea['codigo_serie']}: se piden {pedidos[producto_id]} "
+                        f"y quedan {disponibles[producto_id]} vendibles."
+                    ]
+            if errores:
+                resultados[i] = {'clave': ventas[i]['clave'], 'estado': RECHAZADA, 'errores': errores}
+                continue
+            consumos = []
+            for linea in ventas[i]['lineas']:
+                producto_id = productos[linea['codigo_serie']]
+                disponibles[producto_id] -= linea['cantidad']
+                descuentos[producto_id] = descuentos.get(producto_id, 0) + linea['cantidad']
+                consumos.extend(_consumir(lotes[producto_id], linea['cantidad']))
+            aplicables.append((i, consumos))
+
+        if aplicables:
+            Terminal.objects.filter(pk=terminal_id).update(ultimo_folio=F('ultimo_folio') + len(aplicables))
+            numeros = _guardar_boletas(terminal, terminal_id, ultimo_folio + 1, ventas, aplicables, productos)
+            # Un UPDATE con la cantidad final de cada lote, no uno por venta que lo tocó
+            tocados = {lote_id for _, consumos in aplicables for lote_id, _ in consumos}
+            actualizar_lotes({
+                lote_id: restante for filas in lotes.values() for lote_id, _, restante in filas if lote_id in tocados
+            })
+            descontar_stock_producto(descuentos)
+            transaction.on_commit(invalidar_lotes)
+            for numero, (i, _) in zip(numeros, aplicables):
+                resultados[i] = {'clave': ventas[i]['clave'], 'estado': APLICADA, 'numero': numero}
+
+    for i, venta in enumerate(ventas):
+        if resultados[i] is None: # Repetida dentro del envío: mismo resultado que la primera
+            primera = resultados[primeras[venta['clave']]]
+            resultados[i] = {**primera, 'estado': DUPLICADA} if primera['estado'] != RECHAZADA else primera
+    return resultados
+
+
+def _guardar_boletas(terminal, terminal_id, primer_folio, ventas, aplicables, productos):
+    """
+    Boletas (folios correlativos desde `primer_folio`), líneas y movimientos de las ventas
+    `aplicables` = [(indice, [(lote_id, cantidad)])]. Devuelve los números de boleta en ese orden.
+    """
+    folios = range(primer_folio, primer_folio + len(aplicables))
+    numeros = [Venta.formatear_numero(terminal, folio) for folio in folios]
+    totales = [sum(linea['cantidad'] * linea['precio_unitario'] for linea in ventas[i]['lineas']) for i, _ in aplicables]
+    # Fecha del movimiento = cuando cambió el stock en el servidor (no la de la venta):
+    # un movimiento con fecha anterior a un snapshot ya compactado lo desfasaría
+    ahora = timezone.now()
+
+    if connection.vendor == 'postgresql':
+        # Un INSERT ... SELECT FROM unnest por tabla: decenas de miles de instancias
+        # del ORM (bulk_create) cuestan varias veces más que las propias queries
+        with connection.cursor() as cursor:
+            cursor.execute(f"""
+                INSERT INTO {Venta._meta.db_table} (terminal_id, folio, fecha, total, clave_idempotencia)
+                SELECT %s, * FROM unnest(%s::bigint[], %s::timestamptz[], %s::bigint[], %s::uuid[])
+                RETURNING folio, id
+            """, [
+                terminal_id, literal_array(folios), literal_array(ventas[i]['fecha'].isoformat() for i, _ in aplicables),
+                literal_array(totales), literal_array(ventas[i]['clave'] for i, _ in aplicables),
+            ])
+            venta_ids = dict(cursor.fetchall())
+            lineas = [
+                (venta_ids[folio], productos[linea['codigo_serie']], linea['cantidad'], linea['precio_unitario'])
+                for folio, (i, _) in zip(folios, aplicables) for linea in ventas[i]['lineas']
+            ]
+            cursor.execute(f"""
+                INSERT INTO {LineaVenta._meta.db_table} (venta_id, producto_id, cantidad, precio_unitario)
+                SELECT * FROM unnest(%s::bigint[], %s::bigint[], %s::integer[], %s::integer[])
+            """, [literal_array(columna) for columna in zip(*lineas)])
+            movimientos = [
+                (lote_id, -cantidad, n)
+                for n, (_, consumos) in enumerate(aplicables, start=1) for lote_id, cantidad in consumos
+            ]
+            cursor.execute(f"""
+                INSERT INTO {MovimientoStock._meta.db_table} (lote_id, tipo, cantidad, fecha, referencia)
+                SELECT m.lote_id, %s, m.cantidad, %s, (%s::text[])[m.venta]
+                FROM unnest(%s::bigint[], %s::integer[], %s::integer[]) AS m(lote_id, cantidad, venta)
+            """, [MovimientoStock.VENTA, ahora, literal_array(numeros), *[literal_array(c) for c in zip(*movimientos)]])
+        return numeros
+
+    objetivo = Terminal(pk=terminal_id, codigo=terminal)
+    boletas = Venta.objects.bulk_create([
+        Venta(terminal=objetivo, folio=folio, fecha=ventas[i]['fecha'], total=total, clave_idempotencia=ventas[i]['clave'])
+        for folio, total, (i, _) in zip(folios, totales, aplicables)
+    ], batch_size=1000)
+    LineaVenta.objects.bulk_create([
+        LineaVenta(
+            venta=boleta, producto_id=productos[linea['codigo_serie']],
+            cantidad=linea['cantidad'], precio_unitario=linea['precio_unitario'],
+        )
+        for boleta, (i, _) in zip(boletas, aplicables) for linea in ventas[i]['lineas']
+    ], batch_size=5000)
+    MovimientoStock.objects.bulk_create([
+        MovimientoStock(lote_id=lote_id, tipo=MovimientoStock.VENTA, cantidad=-cantidad, fecha=ahora, referencia=numero)
+        for numero, (_, consumos) in zip(numeros, aplicables) for lote_id, cantidad in consumos
+    ], batch_size=5000)
+    return numeros
+
+
+def literal_array(valores):
+    """
+    Literal de array de PostgreSQL ('{1,2,NULL}', '{"a","b"}') para unnest(%s::tipo[]):
+    psycopg2 adapta las listas como ARRAY[...] y parsear decenas de miles de expresiones
+    cuesta ~10 veces más que el literal de texto.
+    """
+    return '{' + ','.join(_elemento_array(valor) for valor in valores) + '}'
+
+
+def _elemento_array(valor):
+    if valor is None:
+        return 'NULL'
+    if isinstance(valor, (int, float)):
+        return repr(valor)
+    return '"' + str(valor).replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+def _descartar_aplicadas(ventas, indices, resultados):
+    """Marca duplicadas las ventas con clave ya aplicada (1 query) y devuelve el resto."""
+    aplicadas = {
+        clave: Venta.formatear_numero(codigo, folio)
+        for clave, codigo, folio in Venta.objects.filter(
+            clave_idempotencia__in=[ventas[i]['clave'] for i in indices]
+        ).values_list('clave_idempotencia', 'terminal__codigo', 'folio')
+    } if indices else {}
+    restantes = []
+    for i in indices:
+        numero = aplicadas.get(ventas[i]['clave'])
+        if numero is None:
+            restantes.append(i)
+        else:
+            resultados[i] = {'clave': ventas[i]['clave'], 'estado': DUPLICADA, 'numero': numero}
+    return restantes
+
+
+def _consumir(filas, cantidad):
+    """FEFO sobre [lote_id, fecha_vencimiento, cantidad] (se descuenta en el lugar). Devuelve [(lote_id, tomado)]."""
+    consumos = []
+    for fila in filas:
+        if cantidad == 0:
+            break
+        tomado = min(fila[2], cantidad)
+        if tomado:
+            fila[2] -= tomado
+            cantidad -= tomado
+            consumos.append((fila[0], tomado))
+    return consumos
+
+
+def _repartir(bloqueados, cantidad):
+    """Consumo FEFO de `cantidad` sobre los lotes bloqueados (ya en orden)."""
+    consumos = []
+    pendiente = cantidad
+    for lote_id, _, stock in bloqueados:
+        if pendiente == 0:
+            break
+        tomado = min(stock, pendiente)
+        consumos.append({'lote_id': lote_id, 'cantidad': tomado, 'restante': stock - tomado})
+        pendiente -= tomado
+    return consumos
+
+
+def aplicar_consumos(consumos, referencia=''):
+    """
+    Un solo UPDATE para todos los lotes tocados (ver actualizar_lotes) más un INSERT
+    al libro de movimientos.
+    """
+    if not consumos:
+        return
+    actualizar_lotes({c['lote_id']: c['restante'] for c in consumos})
+    MovimientoStock.objects.registrar(
+        ((c['lote_id'], MovimientoStock.VENTA, -c['cantidad']) for c in consumos), referencia=referencia
+    )
+
+
+def actualizar_lotes(restantes, tamano_tanda=500):
+    """
+    Deja cada lote de `restantes` ({lote_id: cantidad}) con su cantidad final en un solo
+    UPDATE. Los que quedan en 0 se desactivan, igual que Lote.aplicar_regla_activo().
+    `tamano_tanda` solo aplica fuera de PostgreSQL (un CASE por tanda).
+    """
+    if connection.vendor == 'postgresql':
+        # UPDATE ... FROM unnest: armar un CASE por id en el ORM cuesta más que la query
+        with connection.cursor() as cursor:
+            cursor.execute(f"""
+                UPDATE {Lote._meta.db_table} AS lote
+                SET cantidad = c.restante, activo = lote.activo AND c.restante > 0
+                FROM unnest(%s::bigint[], %s::integer[]) AS c(id, restante)
+                WHERE lote.id = c.id
+            """, [list(restantes), list(restantes.values())])
+        return
+    pendientes = list(restantes.items())
+    for inicio in range(0, len(pendientes), tamano_tanda):
+        tanda = pendientes[inicio:inicio + tamano_tanda]
+        nueva_cantidad = Case(
+            *[When(pk=lote_id, then=Value(restante)) for lote_id, restante in tanda],
+            output_field=PositiveIntegerField(),
+        )
+        agotados = [lote_id for lote_id, restante in tanda if restante == 0]
+        Lote.objects.filter(pk__in=[lote_id for lote_id, _ in tanda]).update(
+            cantidad=nueva_cantidad,
+            activo=Case(When(pk__in=agotados, then=Value(False)), default=F('activo'), output_field=BooleanField()),
+        )
+
+
+def descontar_stock_producto(descuentos, tamano_tanda=500):
+    """
+    Ajusta los contadores de Producto con un delta (sin re-agregar los lotes) y aplica
+    la regla de auto-desactivación: sin stock -> inactivo. Un solo UPDATE para todos los
+    productos de `descuentos` ({producto_id: cantidad}); fuera de PostgreSQL, uno por tanda.
+    Los lotes ya están bloqueados antes que el producto, mismo orden que Lote.save().
+    """
+    if not descuentos:
+        return
+    # UPDATE directo, sin post_save: la tabla de códigos de barra se ajusta a mano al confirmar
+    transaction.on_commit(lambda: tabla_codigos.descontar(descuentos))
+    if connection.vendor == 'postgresql':
+        # Greatest: si el contador estuviera desfasado no viola el CHECK >= 0
+        with connection.cursor() as cursor:
+            cursor.execute(f"""
+                UPDATE {Producto._meta.db_table} AS producto
+                SET stock_disponible = GREATEST(producto.stock_disponible - d.cantidad, 0),
+                    tiene_stock = producto.stock_disponible > d.cantidad,
+                    activo = producto.stock_disponible > d.cantidad,
+                    actualizado = now()
+                FROM unnest(%s::bigint[], %s::integer[]) AS d(id, cantidad)
+                WHERE producto.id = d.id
+            """, [list(descuentos), list(descuentos.values())])
+        return
+    pendientes = list(descuentos.items())
+    for inicio in range(0, len(pendientes), tamano_tanda):
+        tanda = pendientes[inicio:inicio + tamano_tanda]
+        descuento = Case(
+            *[When(pk=producto_id, then=Value(cantidad)) for producto_id, cantidad in tanda],
+            output_field=PositiveIntegerField(),
+        )
+        con_stock = Case(
+            When(stock_disponible__gt=descuento, then=Value(True)),
+            default=Value(False), output_field=BooleanField(),
+        )
+        Producto.objects.filter(pk__in=[producto_id for producto_id, _ in tanda]).update(
+            stock_disponible=Greatest(F('stock_disponible') - descuento, Value(0)),
+            tiene_stock=con_stock,
+            activo=con_stock,
+            actualizado=Now(),
+        )
@@ -0,0 +1,56 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from modulo_principal.models import Laboratorio, Lote, Producto
+from modulo_principal.models.inventario import inventario_importado, lotes_creados_en_bloque
+
+from .codigos import tabla_codigos
+
+
+#-----------------------------------TABLA DE CÓDIGOS DE BARRA-----------------------------------
+# on_commit: la tabla en memoria solo refleja cambios confirmados. Se relee el producto
+# en vez de copiar la instancia: Lote.save() cambia su stock con un UPDATE directo
+@receiver(post_save, sender=Producto)
+def refrescar_codigo_producto(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    pk = instance.pk
+    transaction.on_commit(lambda: tabla_codigos.refrescar(Producto.objects.filter(pk=pk)))
+
+
+@receiver(post_delete, sender=Producto)
+def eliminar_codigo_producto(sender, instance, **kwargs):
+    pk = instance.pk # Tras post_delete Django deja pk en None
+    transaction.on_commit(lambda: tabla_codigos.eliminar(pk))
+
+
+@receiver(post_save, sender=Lote)
+@receiver(post_delete, sender=Lote)
+def refrescar_codigo_stock(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    producto_id = instance.producto_id
+    transaction.on_commit(lambda: tabla_codigos.refrescar(Producto.objects.filter(pk=producto_id)))
+
+
+@receiver(post_save, sender=Laboratorio)
+def refrescar_codigos_laboratorio(sender, instance, created=False, raw=False, **kwargs):
+    if raw or created:
+        return
+    pk = instance.pk
+    transaction.on_commit(lambda: tabla_codigos.refrescar(Producto.objects.filter(laboratorio_id=pk)))
+
+
+@receiver(lotes_creados_en_bloque)
+def refrescar_codigos_lotes_en_bloque(sender, lotes, **kwargs):
+    producto_ids = {lote.producto_id for lote in lotes}
+    transaction.on_commit(lambda: tabla_codigos.refrescar(Producto.objects.filter(pk__in=producto_ids)))
+
+
+@receiver(inventario_importado)
+def refrescar_codigos_importacion(sender, instancias, **kwargs):
+    if sender is not Producto:
+        return # Laboratorios nuevos: aún sin productos
+    producto_ids = [instancia.pk for instancia in instancias]
+    transaction.on_commit(lambda: tabla_codigos.refrescar(Producto.objects.filter(pk__in=producto_ids)))
@@ -1,3 +1,500 @@
-from django.test import TestCase
+import threading
+import uuid
+import numpy as np
+import pytest
+from datetime import datetime, time, timedelta
+from django.core.exceptions import ValidationError
+from django.db import connection, models
+from django.utils import timezone
 
-# Create your tests here.
+from rest_framework.test import APIClient
+
+from modulo_principal.models import Lote, MovimientoStock, Producto
+from modulo_principal.tests.factories import ProductoFactory, LoteFactory
+from .codigos import tabla_codigos
+from .models import LineaVenta, PuntoReposicion, Terminal, Venta
+from .reposicion import calcular_reposicion, estadisticas_ventas
+from .services import dispensar, registrar_venta, sincronizar_ventas
+
+
+def crear_lotes(producto, cantidades_y_dias):
+    hoy = timezone.localdate()
+    return [
+        LoteFactory(producto=producto, codigo_lote=f"FEFO-{i}", cantidad=cantidad, activo=True,
+                    defectuoso=False, fecha_creacion=hoy, fecha_vencimiento=hoy + timedelta(days=dias))
+        for i, (cantidad, dias) in enumerate(cantidades_y_dias)
+    ]
+
+
+# ==============================================================================
+# 1. DISPENSACIÓN FEFO
+# ==============================================================================
+
+@pytest.mark.django_db
+class TestDispensacionFEFO:
+
+    def test_consume_primero_lo_que_vence_antes(self):
+        prod = ProductoFactory()
+        tardio, pronto, medio = crear_lotes(prod, [(10, 300), (5, 30), (8, 90)])
+
+        consumos = dispensar(prod.id, 9)
+
+        assert consumos == [{'lote_id': pronto.id, 'cantidad': 5}, {'lote_id': medio.id, 'cantidad': 4}]
+        pronto.refresh_from_db(); medio.refresh_from_db(); tardio.refresh_from_db()
+        assert (pronto.cantidad, pronto.activo) == (0, False) # Agotado -> desactivado
+        assert medio.cantidad == 4
+        assert tardio.cantidad == 10
+        assert Producto.objects.get(pk=prod.id).stock_disponible == 14
+
+    def test_ignora_vencidos_y_defectuosos(self):
+        prod = ProductoFactory()
+        crear_lotes(prod, [(5, 10)])
+        vencido = LoteFactory(producto=prod, cantidad=50, activo=True, defectuoso=False,
+                              fecha_vencimiento=timezone.localdate() - timedelta(days=1))
+        with pytest.raises(ValidationError):
+            dispensar(prod.id, 6)
+        vencido.refresh_from_db()
+        assert vencido.cantidad == 50
+
+    def test_stock_agotado_desactiva_producto(self, django_assert_max_num_queries):
+        prod = ProductoFactory()
+        crear_lotes(prod, [(3, 10), (2, 20)])
+        # bloqueo + UPDATE lotes + INSERT movimientos + UPDATE producto (+ savepoint)
+        with django_assert_max_num_queries(6):
+            dispensar(prod.id, 5)
+        prod = Producto.objects.get(pk=prod.id)
+        assert prod.activo is False
+        assert prod.stock_disponible == 0
+        assert not Producto.objects.con_stock_desincronizado().exists()
+
+
+# ==============================================================================
+# 2. ESTRÉS CONCURRENTE (requiere PostgreSQL: SQLite no tiene SELECT FOR UPDATE)
+# ==============================================================================
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.skipif(connection.vendor != 'postgresql', reason="Bloqueo de filas solo en PostgreSQL")
+class TestDispensacionConcurrente:
+
+    def test_terminales_concurrentes_sin_sobreventa_ni_deadlocks(self):
+        """20 terminales venden el mismo producto: se vende exactamente el stock disponible."""
+        TERMINALES, VENTAS_POR_TERMINAL, UNIDADES = 20, 15, 2
+        prod = ProductoFactory()
+        lotes = crear_lotes(prod, [(20, d) for d in (10, 20, 30, 40, 50)]) # 100 unidades
+
+        vendidas, rechazadas, errores = [], [], []
+        barrera = threading.Barrier(TERMINALES)
+
+        def terminal():
+            try:
+                barrera.wait()
+                for _ in range(VENTAS_POR_TERMINAL):
+                    try:
+                        dispensar(prod.id, UNIDADES)
+                        vendidas.append(UNIDADES)
+                    except ValidationError:
+                        rechazadas.append(UNIDADES)
+            except Exception as e: # Deadlocks u otros errores de BD
+                errores.append(e)
+            finally:
+                connection.close()
+
+        hilos = [threading.Thread(target=terminal) for _ in range(TERMINALES)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        assert errores == []
+        assert sum(vendidas) == 100
+        assert Lote.objects.filter(pk__in=[l.pk for l in lotes], cantidad__gt=0).count() == 0
+        prod = Producto.objects.get(pk=prod.id)
+        assert (prod.stock_disponible, prod.activo) == (0, False)
+
+
+# ==============================================================================
+# 3. PUNTOS DE REPOSICIÓN
+# ==============================================================================
+
+def vender(lote, ventas_por_dia, hasta):
+    """ventas_por_dia[i] = unidades vendidas i+1 días antes de `hasta` (al mediodía local)."""
+    for i, unidades in enumerate(ventas_por_dia):
+        if unidades:
+            dia = hasta - timedelta(days=i + 1)
+            fecha = timezone.make_aware(datetime.combine(dia, time(12)))
+            MovimientoStock.objects.registrar([(lote.pk, MovimientoStock.VENTA, -unidades)], fecha=fecha)
+
+
+class TestEstadisticasVentas:
+
+    def test_igual_a_la_serie_diaria_completa(self):
+        """bincount sobre los días con venta == media/desviación de la serie con ceros."""
+        azar = np.random.default_rng(7)
+        serie = azar.poisson(2, size=(50, 30)) * (azar.random((50, 30)) < 0.4)
+        productos, dias = np.nonzero(serie)
+        media, desviacion = estadisticas_ventas(productos, serie[productos, dias], 50, 30)
+        assert np.allclose(media, serie.mean(axis=1))
+        assert np.allclose(desviacion, serie.std(axis=1, ddof=1))
+
+
+@pytest.mark.django_db
+class TestPuntosReposicion:
+
+    def test_calculo_y_endpoint(self, django_assert_max_num_queries):
+        hoy = timezone.localdate()
+        rapido, lento, sin_ventas = ProductoFactory(), ProductoFactory(), ProductoFactory()
+        for prod, cantidad in ((rapido, 20), (lento, 100), (sin_ventas, 5)):
+            LoteFactory(producto=prod, cantidad=cantidad, activo=True, defectuoso=False,
+                        fecha_vencimiento=hoy + timedelta(days=365))
+        vender(rapido.lotes.get(), [4, 6] * 5, hoy) # 50 unidades en 10 días
+        vender(lento.lotes.get(), [1] * 10, hoy)
+        vender(lento.lotes.get(), [99], hoy + timedelta(days=1)) # Hoy: fuera de la ventana
+
+        # Catálogo + ventas + upsert (+ savepoint y SET LOCAL), sin query por producto
+        with django_assert_max_num_queries(6):
+            assert calcular_reposicion(ventana_dias=10, dias_entrega=7, nivel_servicio=0.95) == 3
+
+        punto = PuntoReposicion.objects.get(producto=rapido)
+        assert punto.velocidad_diaria == pytest.approx(5.0)
+        assert punto.desviacion_diaria == pytest.approx(np.std([4, 6] * 5, ddof=1))
+        # 5 * 7 + 1.645 * 1.054 * sqrt(7) = 39.6 -> 40
+        assert punto.punto_reposicion == 40
+        assert punto.dias_cobertura == pytest.approx(4.0)
+        assert PuntoReposicion.objects.get(producto=lento).punto_reposicion == 7
+        assert PuntoReposicion.objects.get(producto=sin_ventas).dias_cobertura is None
+
+        resp = APIClient().get('/api/punto-venta/reposicion/')
+        assert resp.status_code == 200
+        assert [(r['producto'], r['dias_cobertura']) for r in resp.data['results']] == [(rapido.id, 4.0)]
+
+        # Comparación en vivo con el stock: una venta posterior al cálculo lo hace aparecer
+        dispensar(lento.id, 95)
+        resp = APIClient().get('/api/punto-venta/reposicion/?cursor=')
+        assert [r['producto'] for r in resp.data['results']] == [rapido.id, lento.id]
+
+        # Recalcular actualiza las filas (upsert), no las duplica
+        calcular_reposicion(ventana_dias=10, dias_entrega=7, nivel_servicio=0.95)
+        assert PuntoReposicion.objects.count() == 3
+
+
+# ==============================================================================
+# 4. VENTAS (BOLETAS MULTI-LÍNEA)
+# ==============================================================================
+
+def linea(producto, cantidad, precio=None):
+    return {'codigo_serie': producto.codigo_serie, 'cantidad': cantidad,
+            'precio_unitario': producto.precio_venta if precio is None else precio}
+
+
+@pytest.mark.django_db
+class TestVentas:
+
+    def test_carrito_completo(self, django_assert_max_num_queries):
+        Terminal.objects.create(codigo="CAJA-1")
+        a, b, c = ProductoFactory(precio_venta=1500), ProductoFactory(precio_venta=990), ProductoFactory(precio_venta=200)
+        pronto, tardio = crear_lotes(a, [(3, 10), (10, 90)])
+        for prod in (b, c):
+            crear_lotes(prod, [(10, 30)])
+
+        # Códigos + bloqueo (1 query en PostgreSQL, 1 por producto en SQLite) + folio (2) + boleta
+        # + líneas + lotes + movimientos + productos (+ savepoint): no depende del largo del carrito
+        with django_assert_max_num_queries(13):
+            venta = registrar_venta("CAJA-1", [linea(a, 2), linea(b, 1), linea(c, 4), linea(a, 3)])
+
+        assert (venta['numero'], venta['total']) == ("CAJA-1-00000001", 5 * 1500 + 990 + 4 * 200)
+        assert [(l['producto'], l['cantidad']) for l in venta['lineas']] == [(a.id, 5), (b.id, 1), (c.id, 4)]
+        assert venta['lineas'][0]['lotes'] == [{'lote_id': pronto.id, 'cantidad': 3}, {'lote_id': tardio.id, 'cantidad': 2}]
+        assert LineaVenta.objects.filter(venta__folio=1).count() == 3
+        assert MovimientoStock.objects.filter(referencia=venta['numero'], tipo=MovimientoStock.VENTA).count() == 4
+        assert Producto.objects.get(pk=a.id).stock_disponible == 8
+        assert not Producto.objects.con_stock_desincronizado().exists()
+
+        # El endpoint usa el mismo servicio; el folio sigue la secuencia de la terminal
+        resp = APIClient().post('/api/punto-venta/ventas/', {'terminal': 'CAJA-1', 'lineas': [linea(b, 1)]}, format='json')
+        assert resp.status_code == 201
+        assert resp.data['numero'] == "CAJA-1-00000002"
+
+    def test_linea_con_mas_lotes_que_un_bloqueo(self):
+        """Un producto que necesita más de LOTES_POR_BLOQUEO lotes sigue bloqueando en orden FEFO."""
+        Terminal.objects.create(codigo="CAJA-1")
+        a, b = ProductoFactory(precio_venta=100), ProductoFactory(precio_venta=100)
+        lotes = crear_lotes(a, [(1, dias) for dias in (60, 10, 50, 20, 40, 30)])
+        crear_lotes(b, [(5, 30)])
+
+        venta = registrar_venta("CAJA-1", [linea(a, 5), linea(b, 2)])
+
+        por_vencimiento = sorted(lotes, key=lambda lote: lote.fecha_vencimiento)
+        assert [c['lote_id'] for c in venta['lineas'][0]['lotes']] == [lote.id for lote in por_vencimiento[:5]]
+        assert Lote.objects.get(pk=por_vencimiento[5].pk).cantidad == 1
+        assert not Producto.objects.con_stock_desincronizado().exists()
+
+    def test_todo_o_nada(self):
+        Terminal.objects.create(codigo="CAJA-1")
+        a, b = ProductoFactory(precio_venta=1000), ProductoFactory(precio_venta=500)
+        lote_a, = crear_lotes(a, [(5, 30)])
+        crear_lotes(b, [(1, 30)])
+
+        carrito = [linea(a, 1), linea(a, 1, precio=900), {**linea(b, 1), 'codigo_serie': 'NO-EXISTE'}, linea(b, 2)]
+        resp = APIClient().post('/api/punto-venta/ventas/', {'terminal': 'CAJA-1', 'lineas': carrito}, format='json')
+        assert resp.status_code == 400
+        assert set(resp.data) == {'1'} # Precios inconsistentes: se corta antes de ir a la BD
+
+        carrito[1] = linea(a, 1, precio=900)
+        carrito[0] = linea(a, 1, precio=900)
+        with pytest.raises(ValidationError) as exc:
+            registrar_venta("CAJA-1", carrito)
+        assert set(exc.value.message_dict) == {'0', '2'} # Precio desactualizado y código inexistente
+
+        with pytest.raises(ValidationError) as exc:
+            registrar_venta("CAJA-1", [linea(a, 2), linea(b, 2)])
+        assert set(exc.value.message_dict) == {'1'} # Stock insuficiente
+        with pytest.raises(ValidationError) as exc:
+            registrar_venta("CAJA-9", [linea(a, 1)])
+        assert 'terminal' in exc.value.message_dict
+
+        lote_a.refresh_from_db()
+        assert lote_a.cantidad == 5
+        assert not Venta.objects.exists()
+        assert Terminal.objects.get(codigo="CAJA-1").ultimo_folio == 0 # El rollback devuelve el folio
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.skipif(connection.vendor != 'postgresql', reason="Bloqueo de filas solo en PostgreSQL")
+class TestVentasConcurrentes:
+
+    def test_carritos_cruzados_sin_deadlocks_ni_huecos_de_folio(self):
+        """20 terminales venden carritos con los mismos productos en distinto orden."""
+        TERMINALES, VENTAS_POR_TERMINAL = 20, 10
+        productos = [ProductoFactory(precio_venta=100) for _ in range(4)]
+        for prod in productos:
+            crear_lotes(prod, [(60, 10), (60, 20)]) # 120 por producto
+        for t in range(TERMINALES):
+            Terminal.objects.create(codigo=f"CAJA-{t}")
+
+        vendidas, errores = [], []
+        barrera = threading.Barrier(TERMINALES)
+
+        def terminal(t):
+            # Cada terminal recorre los productos en otro orden: sin orden de bloqueo común habría deadlocks
+            carrito = [linea(prod, 1 + (t + i) % 2) for i, prod in enumerate(productos[t % 4:] + productos[:t % 4])]
+            try:
+                barrera.wait()
+                for _ in range(VENTAS_POR_TERMINAL):
+                    try:
+                        registrar_venta(f"CAJA-{t}", carrito)
+                        vendidas.append(sum(l['cantidad'] for l in carrito))
+                    except ValidationError:
+                        pass
+            except Exception as e: # Deadlocks u otros errores de BD
+                errores.append(e)
+            finally:
+                connection.close()
+
+        hilos = [threading.Thread(target=terminal, args=(t,)) for t in range(TERMINALES)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        assert errores == []
+        assert sum(vendidas) == 480 - Producto.objects.filter(pk__in=[p.pk for p in productos]).aggregate(
+            t=models.Sum('stock_disponible'))['t']
+        assert not Producto.objects.con_stock_desincronizado().exists()
+        for t in Terminal.objects.all(): # Folios 1..n sin huecos
+            folios = list(Venta.objects.filter(terminal=t).order_by('folio').values_list('folio', flat=True))
+            assert folios == list(range(1, t.ultimo_folio + 1))
+
+    def test_reintento_concurrente_de_la_misma_sincronizacion(self):
+        """La terminal reenvía el lote mientras el primer envío sigue en curso: se aplica una sola vez."""
+        Terminal.objects.create(codigo="CAJA-1")
+        productos = [ProductoFactory(precio_venta=100) for _ in range(3)]
+        for prod in productos:
+            crear_lotes(prod, [(500, 30)])
+        ventas = [offline(*(linea(prod, 1) for prod in productos), minutos=n) for n in range(200)]
+
+        resultados, errores = [], []
+        barrera = threading.Barrier(4)
+
+        def envio():
+            try:
+                barrera.wait()
+                resultados.append(sincronizar_ventas("CAJA-1", ventas))
+            except Exception as e:
+                errores.append(e)
+            finally:
+                connection.close()
+
+        hilos = [threading.Thread(target=envio) for _ in range(4)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        assert errores == []
+        assert sorted(sum(r['estado'] == 'aplicada' for r in envio) for envio in resultados) == [0, 0, 0, 200]
+        assert Venta.objects.count() == 200
+        assert Terminal.objects.get(codigo="CAJA-1").ultimo_folio == 200
+        assert Producto.objects.get(pk=productos[0].pk).stock_disponible == 300
+        assert not Producto.objects.con_stock_desincronizado().exists()
+
+
+def offline(*lineas, minutos=0, clave=None):
+    return {'clave': clave or uuid.uuid4(), 'fecha': timezone.now() - timedelta(minutes=minutos), 'lineas': list(lineas)}
+
+
+@pytest.mark.django_db
+class TestSincronizacionVentas:
+
+    def test_envio_con_reintentos_y_sin_stock(self, django_assert_max_num_queries):
+        Terminal.objects.create(codigo="CAJA-1", ultimo_folio=7)
+        a, b = ProductoFactory(precio_venta=1000), ProductoFactory(precio_venta=500)
+        pronto, tardio = crear_lotes(a, [(3, 10), (20, 90)])
+        crear_lotes(b, [(2, 30)])
+        ventas = [offline(linea(a, 2), linea(b, 1), minutos=50 - n) for n in range(40)]
+        ventas.append(offline(linea(b, 1), minutos=60)) # La más antigua se aplica primero
+        ventas.append(offline({**linea(a, 1), 'codigo_serie': 'NO-EXISTE'}))
+        ventas.append({**ventas[0]}) # Repetida dentro del mismo envío
+
+        # Claves, códigos, bloqueo (1 query en PostgreSQL, 2 por producto en SQLite), terminal,
+        # claves otra vez, folio, boletas, líneas, lotes, movimientos y productos (+ savepoint):
+        # no depende de cuántas ventas trae el envío
+        with django_assert_max_num_queries(16):
+            resultados = sincronizar_ventas("CAJA-1", ventas)
+
+        estados = [r['estado'] for r in resultados]
+        assert estados[:2] == ['aplicada', 'rechazada'] # b se agotó: 1 unidad para la antigua + 1 para la primera
+        assert estados[40:] == ['aplicada', 'rechazada', 'duplicada']
+        assert estados.count('aplicada') == 2
+        assert [r['numero'] for r in resultados if r['estado'] == 'aplicada'] == ["CAJA-1-00000009", "CAJA-1-00000008"]
+        assert resultados[42]['numero'] == resultados[0]['numero']
+        assert set(resultados[41]['errores']) == {'0'}
+        assert set(resultados[1]['errores']) == {'1'}
+        assert Lote.objects.get(pk=pronto.pk).cantidad == 1
+        assert not Producto.objects.con_stock_desincronizado().exists()
+        venta = Venta.objects.get(clave_idempotencia=ventas[0]['clave'])
+        assert venta.fecha == ventas[0]['fecha']
+        assert MovimientoStock.objects.filter(referencia=venta.numero).count() == 2
+
+        # Reintento del mismo envío (ej: se cortó antes de la respuesta): nada se aplica dos veces
+        client = APIClient()
+        resp = client.post('/api/punto-venta/ventas/sincronizar/', {'terminal': 'CAJA-1', 'ventas': [
+            {**venta, 'clave': str(venta['clave']), 'fecha': venta['fecha'].isoformat()} for venta in ventas
+        ]}, format='json')
+        assert resp.status_code == 200
+        assert resp.data['resumen'] == {'aplicada': 0, 'duplicada': 3, 'rechazada': 40}
+        assert resp.data['resultados'][0]['numero'] == resultados[0]['numero']
+        assert Terminal.objects.get(codigo="CAJA-1").ultimo_folio == 9
+        assert Lote.objects.get(pk=tardio.pk).cantidad == 20
+
+    def test_terminal_inexistente(self):
+        prod = ProductoFactory()
+        crear_lotes(prod, [(5, 30)])
+        with pytest.raises(ValidationError) as exc:
+            sincronizar_ventas("CAJA-9", [offline(linea(prod, 1))])
+        assert 'terminal' in exc.value.message_dict
+        assert Lote.objects.get(producto=prod).cantidad == 5
+
+
+# ==============================================================================
+# 5. CÓDIGOS DE BARRA (TABLA EN MEMORIA)
+# ==============================================================================
+
+@pytest.fixture
+def tabla():
+    """La tabla global, vacía y sincronizando en el mismo hilo (el del test tiene la BD de prueba)."""
+    tabla_codigos.reiniciar()
+    tabla_codigos.segundo_plano = False
+    yield tabla_codigos
+    tabla_codigos.segundo_plano = True
+    tabla_codigos.reiniciar()
+
+
+@pytest.mark.django_db
+class TestTablaCodigos:
+
+    def test_escaneo_sin_queries(self, tabla, django_assert_num_queries):
+        ean = ProductoFactory(codigo_serie="0000000000017", precio_venta=1500, cantidad_mg=500)
+        crear_lotes(ean, [(7, 30)])
+        sku = ProductoFactory(codigo_serie="SKU-INTERNO", precio_venta=300)
+        ProductoFactory(codigo_serie="17") # Mismo número que el EAN, distinto código
+        tabla.construir()
+
+        with django_assert_num_queries(0):
+            encontrado = tabla.buscar("0000000000017")
+            assert tabla.buscar("SKU-INTERNO")['id'] == sku.id
+            assert tabla.buscar("7891234567890") is None
+            assert tabla.buscar("017") is None
+
+        assert encontrado == {
+            'id': ean.id, 'codigo_serie': "0000000000017", 'nombre': ean.nombre, 'cantidad_mg': 500,
+            'laboratorio': ean.laboratorio.nombre, 'precio_venta': 1500, 'stock_disponible': 7, 'activo': True,
+        }
+        assert tabla.buscar("17")['id'] != ean.id
+
+    def test_senales_y_ventas_al_confirmar(self, tabla, django_capture_on_commit_callbacks):
+        Terminal.objects.create(codigo="CAJA-1")
+        prod = ProductoFactory(precio_venta=1000)
+        lote, = crear_lotes(prod, [(10, 30)])
+        otro = ProductoFactory()
+        tabla.construir()
+
+        with django_capture_on_commit_callbacks(execute=True):
+            prod.precio_venta = 1200
+            prod.save()
+            lote.cantidad = 4
+            lote.save()
+        assert (tabla.buscar(prod.codigo_serie)['precio_venta'], tabla.buscar(prod.codigo_serie)['stock_disponible']) == (1200, 4)
+
+        with django_capture_on_commit_callbacks(execute=True):
+            registrar_venta("CAJA-1", [linea(prod, 4, precio=1200)])
+        assert tabla.buscar(prod.codigo_serie)['stock_disponible'] == 0 # Sin releer la BD
+        assert tabla.buscar(prod.codigo_serie)['activo'] is False
+
+        codigo = otro.codigo_serie
+        with django_capture_on_commit_callbacks(execute=True):
+            otro.codigo_serie = "NUEVO-1"
+            otro.save()
+        assert tabla.buscar(codigo) is None
+        assert tabla.buscar("NUEVO-1")['id'] == otro.id
+
+        with django_capture_on_commit_callbacks(execute=True):
+            otro.delete()
+        assert tabla.buscar("NUEVO-1") is None
+
+    def test_sincroniza_cambios_de_otros_procesos(self, tabla, django_assert_num_queries):
+        prod = ProductoFactory(precio_venta=1000)
+        crear_lotes(prod, [(10, 30)])
+        tabla.construir()
+
+        # UPDATE de otro proceso: aquí no corre ninguna señal ni on_commit
+        Producto.objects.filter(pk=prod.pk).update(precio_venta=800, actualizado=timezone.now())
+        Lote.objects.filter(producto=prod).update(cantidad=3)
+        Producto.objects.filter(pk=prod.pk).recalcular_stock()
+        nuevo = ProductoFactory(codigo_serie="7800000000001")
+
+        assert tabla.buscar(prod.codigo_serie)['precio_venta'] == 1000 # Dentro del intervalo: sin query
+        tabla._sincronizado_en -= tabla.sincronizacion_segundos
+        with django_assert_num_queries(1):
+            datos = tabla.buscar(prod.codigo_serie)
+        assert (datos['precio_venta'], datos['stock_disponible']) == (800, 3)
+        assert tabla.buscar("7800000000001")['id'] == nuevo.id
+
+    @pytest.mark.parametrize('modulo', ['base.wsgi', 'base.asgi'])
+    def test_importar_el_servidor_no_lee_la_bd(self, tabla, modulo, django_assert_num_queries):
+        """Sin CODIGOS_BARRA_PRECARGAR la precarga no corre al importar wsgi/asgi."""
+        import importlib
+        import sys
+        sys.modules.pop(modulo, None)
+        ProductoFactory()
+        with django_assert_num_queries(0):
+            importlib.import_module(modulo)
+        assert not tabla.construida
+
+    def test_endpoint(self, tabla):
+        prod = ProductoFactory(codigo_serie="7801234567890")
+        client = APIClient()
+
+        resp = client.get('/api/punto-venta/codigos/7801234567890/')
+        assert resp.status_code == 200
+        assert resp.data['id'] == prod.id
+        assert client.get('/api/punto-venta/codigos/7800000000000/').status_code == 404
@@ -0,0 +1,10 @@
+from django.urls import path
+from .views import CodigoBarraView, ReposicionView, SincronizacionVentasView, VentaView
+
+
+urlpatterns = [
+    path('reposicion/', ReposicionView.as_view(), name='reposicion'),
+    path('ventas/', VentaView.as_view(), name='ventas'),
+    path('ventas/sincronizar/', SincronizacionVentasView.as_view(), name='ventas-sincronizar'),
+    path('codigos/<str:codigo>/', CodigoBarraView.as_view(), name='codigo-barra'),
+]
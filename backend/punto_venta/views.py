@@ -1,3 +1,115 @@
-from django.shortcuts import render
+from django.db.models import F, FloatField
+from django.db.models.functions import Cast
+from rest_framework import generics, status
+from rest_framework.exceptions import NotFound
+from rest_framework.permissions import AllowAny
+from rest_framework.response import Response
 
-# Create your views here.
+from modulo_principal.utils.pagination import InventarioPagination
+
+from .codigos import tabla_codigos
+from .models import PuntoReposicion
+from .serializers import SincronizacionSerializer, VentaSerializer
+from .services import APLICADA, DUPLICADA, RECHAZADA, registrar_venta, sincronizar_ventas
+
+
+class ReposicionView(generics.GenericAPIView):
+    """
+    Productos bajo su punto de reposición: stock ACTUAL <= punto calculado por
+    calcular_reposicion. Los que se agotan antes primero (menos días de cobertura).
+    ?laboratorio=<id> filtra por laboratorio.
+    """
+    permission_classes = [AllowAny] # quitar en produccion
+    authentication_classes = [] # quitar en produccion
+    pagination_class = InventarioPagination
+
+    def get_queryset(self):
+        queryset = (
+            PuntoReposicion.objects
+            .filter(velocidad_diaria__gt=0, producto__stock_disponible__lte=F('punto_reposicion'))
+            .annotate(
+                stock=F('producto__stock_disponible'),
+                cobertura=Cast(F('producto__stock_disponible'), FloatField()) / F('velocidad_diaria'),
+            )
+            .order_by('cobertura', 'id')
+        )
+        laboratorio = self.request.query_params.get('laboratorio')
+        if laboratorio and laboratorio.isdigit():
+            queryset = queryset.filter(producto__laboratorio_id=laboratorio)
+        return queryset
+
+    def get(self, request):
+        queryset = self.get_queryset().values(
+            'id', 'producto_id', 'producto__nombre', 'producto__codigo_serie', 'producto__laboratorio__nombre',
+            'stock', 'punto_reposicion', 'velocidad_diaria', 'desviacion_diaria', 'cobertura', 'calculado',
+        )
+        pagina = self.paginate_queryset(queryset)
+        data = [{
+            'producto': fila['producto_id'],
+            'nombre': fila['producto__nombre'],
+            'codigo_serie': fila['producto__codigo_serie'],
+            'laboratorio': fila['producto__laboratorio__nombre'],
+            'stock': fila['stock'],
+            'punto_reposicion': fila['punto_reposicion'],
+            'velocidad_diaria': round(fila['velocidad_diaria'], 3),
+            'desviacion_diaria': round(fila['desviacion_diaria'], 3),
+            'dias_cobertura': round(fila['cobertura'], 1),
+            'calculado': fila['calculado'],
+        } for fila in (pagina if pagina is not None else queryset)]
+        if pagina is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
+
+
+class VentaView(generics.GenericAPIView):
+    """
+    POST {terminal, lineas: [{codigo_serie, cantidad, precio_unitario}]}: registra la boleta
+    completa en una transacción. 201 con la boleta (número, total, lotes consumidos por línea);
+    400 con {indice_linea: [mensajes]} si alguna línea no se puede vender (nada se guarda).
+    """
+    permission_classes = [AllowAny] # quitar en produccion
+    authentication_classes = [] # quitar en produccion
+    serializer_class = VentaSerializer
+
+    def post(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        # ValidationError de Django -> 400 vía custom_exception_handler
+        venta = registrar_venta(**serializer.validated_data)
+        return Response(venta, status=status.HTTP_201_CREATED)
+
+
+
+class SincronizacionVentasView(generics.GenericAPIView):
+    """
+    POST {terminal, ventas: [{clave, fecha, lineas}]}: ventas hechas sin conexión, en un
+    solo envío al reconectarse. 200 con un resultado por venta (aplicada / duplicada /
+    rechazada) y el resumen; reintentar el mismo envío es seguro (claves de idempotencia).
+    """
+    permission_classes = [AllowAny] # quitar en produccion
+    authentication_classes = [] # quitar en produccion
+    serializer_class = SincronizacionSerializer
+
+    def post(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        resultados = sincronizar_ventas(**serializer.validated_data)
+        resumen = {estado: 0 for estado in (APLICADA, DUPLICADA, RECHAZADA)}
+        for resultado in resultados:
+            resumen[resultado['estado']] += 1
+        return Response({'resumen': resumen, 'resultados': resultados})
+
+class CodigoBarraView(generics.GenericAPIView):
+    """
+    GET /codigos/<codigo>/: lo que el mostrador necesita al escanear (precio, nombre, mg,
+    laboratorio, stock), desde la tabla en memoria del proceso (ver codigos.py): sin query.
+    404 si el código no existe.
+    """
+    permission_classes = [AllowAny] # quitar en produccion
+    authentication_classes = [] # quitar en produccion
+
+    def get(self, request, codigo):
+        producto = tabla_codigos.buscar(codigo)
+        if producto is None:
+            raise NotFound('No existe un producto con este código.')
+        return Response(producto)